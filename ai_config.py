@@ -384,7 +384,7 @@ USER_PROMPT_TEMPLATE = """## 用户配置
 
 ## 流动性市场列表
 
-以下是当前可用的流动性市场（按 volatilty/reward 比率排序）：
+以下是当前可用的流动性市场（已按奖励和波动率预先筛选，评分从高到低排列）：
 
 {liquidity_markets}
 
@@ -2,23 +2,32 @@
 """
 AI 自动化市场选择器
 使用 LangChain + OpenAI 自动分析和选择最优市场
+
+- 调用 LLM 之前先用确定性的评分预先筛选候选市场（shortlist_markets），
+  提示词只包含 AI_SHORTLIST_SIZE 个市场，当前已选择的市场始终保留
+- 以规范化输入（候选市场、当前选择、超参数、配置、模型和提示词）的哈希为键缓存决策，
+  输入相同时直接复用上一次的决策，不调用 LLM；钱包余额按 AI_CACHE_BALANCE_STEP 向下取整后参与缓存键
+
+使用示例:
+    run_ai_selector()                                  # 使用 OpenAI
+    run_ai_selector(config, agent=StubAgent(config))   # 使用本地桩模型，不访问 LLM
+
+    python ai_market_selector.py --stub-llm            # 使用本地桩模型运行一次选择
 """
 
 import os
 import json
+import math
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
-# LangChain imports
-from langchain_openai import ChatOpenAI
-from langchain.tools import tool
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
 # 本地导入
+# LangChain 和 PolymarketClient 导入较重，在实际使用时才导入
 from poly_utils.google_utils import get_spreadsheet
-from poly_data.polymarket_client import PolymarketClient
+from poly_utils.market_catalog import get_catalog, SELECTIONS_MAX_AGE
+from poly_utils.decision_cache import DecisionCache
 import ai_config
 
 # 加载环境变量
@@ -28,29 +37,55 @@ load_dotenv()
 _spreadsheet = None
 _original_markets_df = None
 
+# 最近一次 update_selected_markets 写入的行（不含表头），用于缓存决策
+_last_decision = None
+
+# 选择列表的写入函数，默认写入表格和本地目录；测试时替换为只记录的函数
+_selection_writer = None
+
+# 提示词中包含的候选市场数量
+AI_SHORTLIST_SIZE = int(os.getenv('AI_SHORTLIST_SIZE', '25'))
+
+# 缓存键中钱包余额的取整步长（USDC）：余额包含持仓市值，每次运行都不同，
+# 按步长向下取整后余额在同一档内变化时复用决策
+AI_CACHE_BALANCE_STEP = float(os.getenv('AI_CACHE_BALANCE_STEP', '50'))
+
+# 提示词中的市场字段
+PROMPT_COLUMNS = [
+    'question', 'spread', 'rewards_daily_rate', 'volatility_sum',
+    'volatilty/reward', 'min_size', 'best_bid', 'best_ask',
+    '1_hour', '3_hour', '6_hour', '12_hour', '24_hour'
+]
+
+SELECTION_HEADERS = ['question', 'max_size', 'trade_size', 'param_type', 'comments']
+
 
 def get_wallet_balance():
-    """获取钱包余额"""
+    """获取钱包余额（USDC 余额 + 持仓价值），通过共享余额服务查询，不创建 PolymarketClient"""
     try:
-        client = PolymarketClient()
-        # 使用 get_total_balance() 获取 USDC 余额 + 持仓价值
-        balance = client.get_total_balance()
-        return float(balance)
+        from poly_data.balance_service import get_balance_service
+        return float(get_balance_service().get_total_balance())
     except Exception as e:
         print(f"⚠️  无法获取钱包余额: {e}")
         return 200.0  # 默认值
 
 
-def get_liquidity_markets(sheet_name='Volatility Markets'):
-    """获取流动性市场列表"""
+def _read_worksheet(sheet_name):
+    """从表格读取工作表，本地目录中没有数据时使用"""
     global _spreadsheet
-    
+
     if _spreadsheet is None:
         _spreadsheet = get_spreadsheet(read_only=True)
-    
+
     ws = _spreadsheet.worksheet(sheet_name)
-    data = ws.get_all_records()
-    df = pd.DataFrame(data)
+    return pd.DataFrame(ws.get_all_records())
+
+
+def get_liquidity_markets(sheet_name='Volatility Markets'):
+    """获取流动性市场列表，优先从本地市场目录读取"""
+    df = get_catalog().read_view(sheet_name)
+    if len(df) == 0:
+        df = _read_worksheet(sheet_name)
     
     # 按 volatilty/reward 比率排序（越低越好）
     if 'volatilty/reward' in df.columns:
@@ -60,34 +95,105 @@ def get_liquidity_markets(sheet_name='Volatility Markets'):
 
 
 def get_current_selections():
-    """获取当前选择列表"""
-    global _spreadsheet
-    
-    if _spreadsheet is None:
-        _spreadsheet = get_spreadsheet(read_only=True)
-    
-    ws = _spreadsheet.worksheet('Selected Markets')
-    data = ws.get_all_records()
-    df = pd.DataFrame(data)
-    
-    return df
+    """获取当前选择列表，本地市场目录中的列表最近与表格同步过时优先使用"""
+    records = get_catalog().read_selections(max_age=SELECTIONS_MAX_AGE)
+    if records:
+        return pd.DataFrame(records)
+    return _read_worksheet('Selected Markets')
 
 
 def get_hyperparameters():
-    """获取超参数表"""
+    """获取超参数表，优先从本地市场目录读取"""
+    records = get_catalog().read_hyperparameters()
+    if records:
+        return pd.DataFrame(records)
+    return _read_worksheet('Hyperparameters')
+
+
+def _numeric(df, column):
+    """读取数值列，缺失或无法转换的值为 NaN"""
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    return pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)
+
+
+def market_scores(df: pd.DataFrame) -> np.ndarray:
+    """
+    候选市场的确定性评分：奖励越高、波动率越低越好
+
+    score = log(1 + gm_reward_per_100) - 0.5 * log(1 + volatility_sum)
+    没有 gm_reward_per_100 时使用 rewards_daily_rate；缺少数据的市场评分为 -inf
+    """
+    reward = _numeric(df, 'gm_reward_per_100')
+    if np.isnan(reward).all():
+        reward = _numeric(df, 'rewards_daily_rate')
+    volatility = _numeric(df, 'volatility_sum')
+
+    scores = np.log1p(np.clip(reward, 0, None)) - 0.5 * np.log1p(np.clip(volatility, 0, None))
+    return np.where(np.isnan(scores), -np.inf, scores)
+
+
+def shortlist_markets(df: pd.DataFrame, current_questions=(), limit: int = AI_SHORTLIST_SIZE) -> pd.DataFrame:
+    """
+    预先筛选提示词中的候选市场
+
+    当前已选择的市场始终保留，其余按 market_scores 从高到低补足 limit 个；
+    评分相同时按问题文本排序，结果与输入行的顺序无关。
+
+    返回:
+        DataFrame: 按评分从高到低排列，索引从 0 开始（即 row_id）
+    """
+    if len(df) == 0:
+        return df.reset_index(drop=True)
+
+    scores = market_scores(df)
+    questions = df['question'].astype(str).to_numpy()
+    selected = np.isin(questions, list(current_questions))
+
+    # np.lexsort 以最后一个键为主键：已选择优先，其次评分从高到低，最后按问题文本
+    order = np.lexsort((questions, -scores, ~selected))
+    keep = max(limit, int(selected.sum()))
+    order = order[:keep]
+
+    # 输出按评分排序，已选择的市场混在其中
+    order = order[np.lexsort((questions[order], -scores[order]))]
+    return df.iloc[order].reset_index(drop=True)
+
+
+def set_selection_writer(writer):
+    """
+    替换选择列表的写入函数
+
+    参数:
+        writer: writer(all_rows)，all_rows 第一行为表头；None 时恢复写入表格和本地目录
+    """
+    global _selection_writer
+    _selection_writer = writer
+
+
+def write_selection_rows(all_rows):
+    """写入 Selected Markets 工作表和本地目录，all_rows 第一行为表头"""
     global _spreadsheet
-    
+
+    if _selection_writer is not None:
+        _selection_writer(all_rows)
+        return
+
     if _spreadsheet is None:
-        _spreadsheet = get_spreadsheet(read_only=True)
-    
-    ws = _spreadsheet.worksheet('Hyperparameters')
-    data = ws.get_all_records()
-    df = pd.DataFrame(data)
-    
-    return df
+        _spreadsheet = get_spreadsheet(read_only=False)
+
+    ws = _spreadsheet.worksheet('Selected Markets')
+
+    # 清空现有数据
+    ws.clear()
+
+    # 使用 batch_update 一次性写入所有数据
+    ws.update(values=all_rows, range_name='A1', value_input_option='RAW')
+
+    # 同时写入本地目录，机器人无需等待下一次表格导入
+    get_catalog().write_selections([dict(zip(all_rows[0], row)) for row in all_rows[1:]])
 
 
-@tool
 def update_selected_markets(markets: Optional[List[Dict[str, Any]]] = None) -> str:
     """
     更新 Google Sheets 中的 Selected Markets 工作表
@@ -112,23 +218,14 @@ def update_selected_markets(markets: Optional[List[Dict[str, Any]]] = None) -> s
         markets = []
 
     try:
-        global _spreadsheet, _original_markets_df
-
-        if _spreadsheet is None:
-            _spreadsheet = get_spreadsheet(read_only=False)
+        global _last_decision
 
         # 检查原始市场数据
         if _original_markets_df is None or len(_original_markets_df) == 0:
             return "❌ 错误: 无法获取原始市场数据"
 
-        ws = _spreadsheet.worksheet('Selected Markets')
-
-        # 清空现有数据
-        ws.clear()
-
         # 准备所有数据（包括表头）
-        headers = ['question', 'max_size', 'trade_size', 'param_type', 'comments']
-        all_rows = [headers]
+        all_rows = [SELECTION_HEADERS]
 
         # 添加市场数据
         for i, market in enumerate(markets):
@@ -157,8 +254,8 @@ def update_selected_markets(markets: Optional[List[Dict[str, Any]]] = None) -> s
             ]
             all_rows.append(row)
 
-        # 使用 batch_update 一次性写入所有数据
-        ws.update(values=all_rows, range_name='A1', value_input_option='RAW')
+        write_selection_rows(all_rows)
+        _last_decision = all_rows[1:]
 
         return f"✅ 成功更新 {len(all_rows)-1} 个市场到 Selected Markets 工作表"
 
@@ -179,11 +276,7 @@ def format_markets_for_prompt(df: pd.DataFrame, limit: int = 50) -> str:
     df_with_id.insert(0, 'row_id', range(len(df_with_id)))
 
     # 选择关键字段（row_id 放在最前面）
-    columns = [
-        'row_id', 'question', 'spread', 'rewards_daily_rate', 'volatility_sum',
-        'volatilty/reward', 'min_size', 'best_bid', 'best_ask',
-        '1_hour', '3_hour', '6_hour', '12_hour', '24_hour'
-    ]
+    columns = ['row_id'] + PROMPT_COLUMNS
 
     # 过滤存在的列
     available_columns = [col for col in columns if col in df_with_id.columns]
@@ -214,6 +307,10 @@ def format_hyperparameters(df: pd.DataFrame) -> str:
 
 def create_ai_agent(config: Dict[str, Any]):
     """创建 AI Agent"""
+    from langchain_openai import ChatOpenAI
+    from langchain.tools import tool
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
     # 初始化 OpenAI 客户端
     llm = ChatOpenAI(
@@ -224,7 +321,7 @@ def create_ai_agent(config: Dict[str, Any]):
     )
 
     # 定义工具
-    tools = [update_selected_markets]
+    tools = [tool(update_selected_markets)]
 
     # 创建提示词模板
     prompt = ChatPromptTemplate.from_messages([
@@ -248,37 +345,116 @@ def create_ai_agent(config: Dict[str, Any]):
     return agent_executor
 
 
-def run_ai_selector(config: Dict[str, Any] = None):
-    """运行 AI 市场选择器"""
+class StubAgent:
+    """
+    本地桩模型，接口与 AgentExecutor 相同，用于不访问 LLM 的测试
 
-    print("🤖 AI 市场选择器启动中...")
-    print("=" * 80)
+    总是选择候选列表中评分最高的 max_markets 个市场，trade_size 为余额的 70%，max_size 为其 4 倍。
+    """
 
-    # 使用默认配置或用户提供的配置
-    if config is None:
-        config = ai_config.DEFAULT_CONFIG.copy()
+    model_name = 'stub'
 
-    # 获取钱包余额
-    print("\n📊 正在获取数据...")
-    wallet_balance = get_wallet_balance()
-    config['wallet_balance'] = wallet_balance
-    print(f"💵 钱包余额: {wallet_balance} USDC")
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.calls = 0
+        self.prompt_chars = 0
 
-    # 获取流动性市场列表
-    liquidity_markets_df = get_liquidity_markets()
-    print(f"📈 流动性市场数量: {len(liquidity_markets_df)}")
+    def invoke(self, inputs: Dict[str, Any]) -> Dict[str, Any]:
+        self.calls += 1
+        self.prompt_chars += len(inputs['input'])
 
-    # 保存到全局变量供修复使用
-    global _original_markets_df
-    _original_markets_df = liquidity_markets_df.copy()
+        trade_size = round(self.config['wallet_balance'] * 0.7, 2)
+        count = min(self.config['max_markets'], len(_original_markets_df))
+        markets = [{'row_id': i, 'trade_size': trade_size, 'max_size': trade_size * 4,
+                    'param_type': 'mid', 'comments': 'stub'} for i in range(count)]
+        return {'output': update_selected_markets(markets)}
 
-    # 获取当前选择列表
-    current_selections_df = get_current_selections()
-    print(f"📋 当前选择数量: {len(current_selections_df)}")
 
-    # 获取超参数表
-    hyperparameters_df = get_hyperparameters()
-    print(f"⚙️  超参数配置: {len(hyperparameters_df)} 条")
+def _selection_key_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """选择列表中参与缓存键的字段（备注由 AI 生成，每次都不同，不参与）"""
+    columns = [col for col in SELECTION_HEADERS if col != 'comments' and col in df.columns]
+    return df[columns].to_dict('records')
+
+
+# 缓存键中只有市场数据按有效数字舍入；选择列表、超参数和配置精确比较，修改额度后不会复用旧决策
+ROUNDED_INPUTS = ('markets',)
+
+
+def balance_bucket(balance: float, step: float = None) -> float:
+    """缓存键使用的钱包余额：按 AI_CACHE_BALANCE_STEP 向下取整，step 不大于 0 时不取整"""
+    step = AI_CACHE_BALANCE_STEP if step is None else step
+    if step <= 0:
+        return balance
+    return math.floor(float(balance) / step) * step
+
+
+def build_selector_inputs(liquidity_markets_df: pd.DataFrame, current_selections_df: pd.DataFrame,
+                          hyperparameters_df: pd.DataFrame, config: Dict[str, Any], model_name: str):
+    """
+    预先筛选候选市场并生成缓存键的输入
+
+    返回:
+        tuple: (候选市场 DataFrame, 缓存键输入 dict)
+    """
+    current_questions = set(current_selections_df['question']) if 'question' in current_selections_df.columns else set()
+    shortlist = shortlist_markets(liquidity_markets_df, current_questions)
+
+    columns = [col for col in PROMPT_COLUMNS if col in shortlist.columns]
+    payload = {
+        'markets': shortlist[columns].to_dict('records'),
+        'selections': _selection_key_records(current_selections_df),
+        'hyperparameters': hyperparameters_df.to_dict('records'),
+        'config': {**{key: config.get(key) for key in ('risk_preference', 'max_markets', 'additional_preferences')},
+                   'wallet_balance': balance_bucket(config['wallet_balance'])},
+        'model': model_name,
+        'prompts': DecisionCache.key([ai_config.SYSTEM_PROMPT, ai_config.USER_PROMPT_TEMPLATE]),
+    }
+    return shortlist, payload
+
+
+def _apply_cached_decision(decision, current_selections_df):
+    """复用缓存的决策；当前选择已与决策一致时不写入"""
+    rows = decision['rows']
+    decided = pd.DataFrame(rows, columns=SELECTION_HEADERS)
+    unchanged = (DecisionCache.key(_selection_key_records(decided))
+                 == DecisionCache.key(_selection_key_records(current_selections_df)))
+    if unchanged:
+        print("📋 当前选择与缓存的决策一致，无需写入")
+    else:
+        write_selection_rows([SELECTION_HEADERS] + rows)
+        print(f"✅ 已按缓存的决策写入 {len(rows)} 个市场")
+
+
+def select_markets(liquidity_markets_df: pd.DataFrame, current_selections_df: pd.DataFrame,
+                   hyperparameters_df: pd.DataFrame, config: Dict[str, Any], agent=None, cache=None):
+    """
+    根据已读取的数据运行选择：预先筛选、查询缓存、调用 LLM 并保存决策
+
+    参数:
+        agent: 具有 invoke({'input': 提示词}) 方法的对象；None 时创建 OpenAI Agent
+        cache: DecisionCache；None 时使用默认目录
+
+    返回:
+        dict: {'output': AI 输出, 'cached': 是否复用了缓存的决策}；失败时返回 None
+    """
+    global _original_markets_df, _last_decision
+
+    cache = cache or DecisionCache()
+    model_name = getattr(agent, 'model_name', None) or os.getenv('OPENAI_MODEL', 'gpt-5')
+
+    shortlist, payload = build_selector_inputs(liquidity_markets_df, current_selections_df,
+                                               hyperparameters_df, config, model_name)
+    print(f"🔎 预先筛选: {len(liquidity_markets_df)} 个市场 → {len(shortlist)} 个候选")
+
+    key = cache.key(payload, rounded=ROUNDED_INPUTS)
+    decision = cache.get(key)
+    if decision is not None:
+        print(f"♻️  输入与之前相同（{key[:12]}），复用缓存的决策")
+        _apply_cached_decision(decision, current_selections_df)
+        return {'output': decision['output'], 'cached': True}
+
+    # 保存到全局变量供修复使用（row_id 对应候选列表中的行）
+    _original_markets_df = shortlist
 
     # 计算 trade_size 和 max_size 建议值
     wallet_balance = config['wallet_balance']
@@ -302,35 +478,87 @@ def run_ai_selector(config: Dict[str, Any] = None):
         max_size_max=max_size_max,
         max_size_example=max_size_example,
         additional_preferences=config.get('additional_preferences', ''),
-        liquidity_markets=format_markets_for_prompt(liquidity_markets_df),
+        liquidity_markets=format_markets_for_prompt(shortlist, limit=len(shortlist)),
         current_selections=format_markets_for_prompt(current_selections_df, limit=100),
         hyperparameters=format_hyperparameters(hyperparameters_df)
     )
-    
+    print(f"📝 提示词长度: {len(user_prompt)} 字符")
+
     # 创建 AI Agent
-    print("\n🤖 初始化 AI Agent...")
-    agent_executor = create_ai_agent(config)
-    
+    if agent is None:
+        print("\n🤖 初始化 AI Agent...")
+        agent = create_ai_agent(config)
+
     # 运行 AI 分析
     print("\n🧠 AI 分析中...")
     print("=" * 80)
-    
+
     try:
-        result = agent_executor.invoke({"input": user_prompt})
-        
+        _last_decision = None
+        result = agent.invoke({"input": user_prompt})
+
         print("\n" + "=" * 80)
         print("✅ AI 分析完成！")
         print("\n📝 AI 决策:")
         print(result['output'])
-        
-        return result
-        
+
     except Exception as e:
         print(f"\n❌ AI 分析失败: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+    # 只缓存成功写入的决策
+    if _last_decision is not None:
+        decision = {'rows': _last_decision, 'output': result['output']}
+        cache.put(key, decision)
+
+        # 下一次的输入就是刚写入的选择列表，市场数据不变时同样复用这个决策
+        decided_df = pd.DataFrame(_last_decision, columns=SELECTION_HEADERS)
+        _, next_payload = build_selector_inputs(liquidity_markets_df, decided_df,
+                                                hyperparameters_df, config, model_name)
+        cache.put(cache.key(next_payload, rounded=ROUNDED_INPUTS), decision)
+
+    return {'output': result['output'], 'cached': False}
+
+
+def run_ai_selector(config: Dict[str, Any] = None, agent=None, cache=None):
+    """
+    运行 AI 市场选择器
+
+    参数:
+        config: 选择配置；None 时使用默认配置并读取钱包余额
+        agent: 具有 invoke 方法的 Agent（如 StubAgent）；None 时使用 OpenAI
+        cache: DecisionCache；None 时使用默认目录
+    """
+
+    print("🤖 AI 市场选择器启动中...")
+    print("=" * 80)
+
+    # 使用默认配置或用户提供的配置
+    if config is None:
+        config = ai_config.DEFAULT_CONFIG.copy()
+
+        # 获取钱包余额
+        print("\n📊 正在获取数据...")
+        config['wallet_balance'] = get_wallet_balance()
+    print(f"💵 钱包余额: {config['wallet_balance']} USDC")
+
+    # 获取流动性市场列表
+    liquidity_markets_df = get_liquidity_markets()
+    print(f"📈 流动性市场数量: {len(liquidity_markets_df)}")
+
+    # 获取当前选择列表
+    current_selections_df = get_current_selections()
+    print(f"📋 当前选择数量: {len(current_selections_df)}")
+
+    # 获取超参数表
+    hyperparameters_df = get_hyperparameters()
+    print(f"⚙️  超参数配置: {len(hyperparameters_df)} 条")
+
+    return select_markets(liquidity_markets_df, current_selections_df, hyperparameters_df,
+                          config, agent=agent, cache=cache)
+
 
 if __name__ == '__main__':
     import argparse
@@ -343,6 +571,7 @@ if __name__ == '__main__':
                         default=int(os.getenv('AI_MAX_MARKETS', '3')),
                         help='最大市场数量')
     parser.add_argument('--preferences', type=str, default='', help='额外偏好（如：避免加密货币相关市场）')
+    parser.add_argument('--stub-llm', action='store_true', help='使用本地桩模型代替 LLM')
 
     args = parser.parse_args()
 
@@ -358,5 +587,4 @@ if __name__ == '__main__':
     }
     
     # 运行 AI 选择器
-    run_ai_selector(config)
-
+    run_ai_selector(config, agent=StubAgent(config) if args.stub_llm else None)
@@ -0,0 +1,197 @@
+"""
+基准测试用的合成数据 - 订单簿、websocket 消息、市场配置、桩客户端和内存表格
+
+所有数据由固定种子生成，同一版本的代码每次运行得到相同的输入。
+订单簿深度与实际市场接近：0.01 的最小价格单位下每边约 40 档，数量为对数正态分布。
+"""
+import re
+import random
+import itertools
+
+import pandas as pd
+from sortedcontainers import SortedDict
+
+# 每边的档位数
+BOOK_DEPTH = 40
+
+
+def make_levels(rng, mid=0.52, tick=0.01, depth=BOOK_DEPTH):
+    """
+    生成两边的价格档位
+
+    返回:
+        tuple: (bids, asks)，均为 [(价格, 数量), ...]，bids 价格升序（最优买价在最后），asks 价格降序
+    """
+    bids, asks = [], []
+    for k in range(1, depth + 1):
+        bid = round(mid - k * tick, 4)
+        ask = round(mid + k * tick, 4)
+        if bid >= tick:
+            bids.append((bid, round(rng.lognormvariate(5, 1.2), 2)))
+        if ask <= 1 - tick:
+            asks.append((ask, round(rng.lognormvariate(5, 1.2), 2)))
+    bids.reverse()
+    asks.reverse()
+    return bids, asks
+
+
+def book_message(rng, market, asset_id, **kwargs):
+    """websocket 'book' 事件，价格和数量为字符串，与实际消息相同"""
+    bids, asks = make_levels(rng, **kwargs)
+    return {
+        'event_type': 'book',
+        'market': market,
+        'asset_id': asset_id,
+        'bids': [{'price': str(p), 'size': str(s)} for p, s in bids],
+        'asks': [{'price': str(p), 'size': str(s)} for p, s in asks],
+    }
+
+
+def sorted_book(rng, asset_id, **kwargs):
+    """global_state.all_data 中的订单簿结构"""
+    bids, asks = make_levels(rng, **kwargs)
+    return {'asset_id': asset_id, 'bids': SortedDict(bids), 'asks': SortedDict(asks)}
+
+
+def price_changes(rng, book, count=1000):
+    """
+    对订单簿现有档位的增量更新 [(side, price, size), ...]
+
+    约 20% 是删除档位，紧接着的一条把该档位加回来，反复应用时订单簿深度保持不变。
+    """
+    updates = []
+    levels = [('bids', price) for price in book['bids']] + [('asks', price) for price in book['asks']]
+    while len(updates) < count:
+        side, price = rng.choice(levels)
+        if rng.random() < 0.2:
+            updates.append((side, price, 0.0))
+        updates.append((side, price, round(rng.lognormvariate(5, 1.2), 2)))
+    return updates[:count]
+
+
+def market_row(market, token1, token2, **overrides):
+    """Selected Markets 与 All Markets 合并后的一行配置"""
+    row = {
+        'question': f'Benchmark market {market}?', 'answer1': 'Yes', 'answer2': 'No',
+        'condition_id': market, 'token1': token1, 'token2': token2,
+        'tick_size': 0.01, 'min_size': 20, 'trade_size': 50, 'max_size': 200,
+        'max_spread': 3.5, 'neg_risk': 'FALSE', 'param_type': 'mid', 'multiplier': '',
+        'best_bid': 0.51, 'best_ask': 0.53, '3_hour': 1.0,
+    }
+    row.update(overrides)
+    return row
+
+
+PARAMS = {
+    'mid': {'stop_loss_threshold': -5, 'spread_threshold': 0.05, 'volatility_threshold': 50,
+            'sleep_period': 1, 'take_profit_threshold': 3},
+}
+
+
+def orders_frame(tokens):
+    """get_all_orders 的结果：每个 token 各一笔买单和卖单"""
+    rows = []
+    for i, token in enumerate(tokens):
+        rows.append({'asset_id': token, 'side': 'BUY', 'price': '0.5', 'original_size': 100.0 + i,
+                     'size_matched': 10.0})
+        rows.append({'asset_id': token, 'side': 'SELL', 'price': '0.55', 'original_size': 80.0,
+                     'size_matched': 0.0})
+    return pd.DataFrame(rows)
+
+
+class StubClient:
+    """只记录调用次数的 PolymarketClient 替身"""
+
+    def __init__(self, orders=None):
+        self.orders = orders if orders is not None else pd.DataFrame()
+        self.calls = {}
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def create_order(self, marketId, action, price, size, neg_risk=False):
+        self._count('create_order')
+        return {}
+
+    def cancel_all_asset(self, asset_id):
+        self._count('cancel_all_asset')
+
+    def cancel_all_market(self, marketId):
+        self._count('cancel_all_market')
+
+    def get_all_orders(self):
+        self._count('get_all_orders')
+        return self.orders
+
+    def get_position(self, tokenId):
+        self._count('get_position')
+        return 0, 0
+
+    def merge_positions(self, amount_to_merge, condition_id, is_neg_risk_market):
+        self._count('merge_positions')
+
+
+class InMemoryWorksheet:
+    """gspread Worksheet 的内存替身，支持 DiffSheetWriter 和 get_sel_df 用到的方法"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, title, values=None, rows=1000, cols=26):
+        self.id = next(self._ids)
+        self.title = title
+        self.values = [list(row) for row in values or []]
+        self.row_count = max(rows, len(self.values))
+        self.col_count = max([cols] + [len(row) for row in self.values])
+        self.cells_written = 0
+
+    def get_all_values(self):
+        return [list(row) for row in self.values]
+
+    def get_all_records(self):
+        if not self.values:
+            return []
+        header = self.values[0]
+        return [dict(zip(header, row + [''] * (len(header) - len(row)))) for row in self.values[1:]]
+
+    def resize(self, rows=None, cols=None):
+        self.row_count = rows or self.row_count
+        self.col_count = cols or self.col_count
+        # 缩小网格时删除网格之外的单元格
+        self.values = [row[:self.col_count] for row in self.values[:self.row_count]]
+
+    def batch_update(self, updates, value_input_option=None):
+        for update in updates:
+            row, col = _a1_start(update['range'])
+            for i, values in enumerate(update['values']):
+                while len(self.values) <= row + i:
+                    self.values.append([])
+                target = self.values[row + i]
+                if len(target) < col + len(values):
+                    target.extend([''] * (col + len(values) - len(target)))
+                target[col:col + len(values)] = values
+                self.cells_written += len(values)
+
+
+def _a1_start(a1_range):
+    """A1 范围左上角的行列号（从 0 开始）"""
+    letters, digits = re.match(r'([A-Z]+)(\d+)', a1_range).groups()
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - 64
+    return int(digits) - 1, col - 1
+
+
+class InMemorySpreadsheet:
+    """gspread Spreadsheet 的内存替身，访问不存在的工作表时创建空表"""
+
+    def __init__(self, sheets=None):
+        self.sheets = {title: InMemoryWorksheet(title, values) for title, values in (sheets or {}).items()}
+
+    def worksheet(self, title):
+        if title not in self.sheets:
+            self.sheets[title] = InMemoryWorksheet(title)
+        return self.sheets[title]
+
+
+def rng(seed=7):
+    return random.Random(seed)
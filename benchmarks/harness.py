@@ -0,0 +1,291 @@
+"""
+基准测试框架 - 计时、机器校准和基线对比
+
+每个用例提供一个无参数的操作函数，框架自动确定每轮执行次数（每轮至少 MIN_ROUND_SECONDS 秒），
+执行 REPEATS 轮。
+
+不同机器的速度不同，因此每轮用例之前紧挨着执行一轮固定的校准负载，
+基线保存为各轮「单次耗时 / 校准耗时」的中位数，在笔记本和服务器上都可以直接对比，
+运行过程中机器负载的变化也同时作用于两者。相对值超过基线的 tolerance 倍时视为性能退化。
+
+默认使用纯 Python 校准负载。以 pandas 小表筛选和逐行取值为主的用例（如 update_orders）
+与纯 Python 代码在不同机器、不同 pandas 版本上的速度比例并不固定，
+用 pandas 校准负载归一化（见 run_cases 的 calibration_of）。
+
+基线文件格式:
+    {"calibration_us": 记录基线时的纯 Python 校准耗时,
+     "calibrations_us": {校准负载: 耗时},
+     "results": {用例名: {"us": 单次耗时（微秒）, "relative": 相对值, "calibration": 校准负载}}}
+"""
+import os
+import gc
+import json
+import time
+import random
+import statistics
+
+# 每轮的最短时间（秒）和轮数
+MIN_ROUND_SECONDS = float(os.getenv('BENCH_MIN_ROUND_SECONDS', '0.1'))
+REPEATS = int(os.getenv('BENCH_REPEATS', '7'))
+
+# 相对值超过基线多少倍时视为退化
+BENCH_TOLERANCE = float(os.getenv('BENCH_TOLERANCE', '1.5'))
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def _calibration_workload():
+    """固定的纯 Python 负载：排序、字典读写和浮点运算"""
+    rng = random.Random(42)
+    values = [rng.random() for _ in range(2000)]
+    values.sort()
+    table = {}
+    for i, value in enumerate(values):
+        table[round(value, 3)] = table.get(round(value, 3), 0.0) + value * i
+    return sum(table.values())
+
+
+_pandas_frame = None
+
+
+def _pandas_calibration_workload():
+    """固定的 pandas 负载：在 80 行的小表上按键做布尔筛选并逐行取标量，与订单状态更新的模式相同"""
+    global _pandas_frame
+    if _pandas_frame is None:
+        import pandas as pd
+
+        keys = [str(1000 + i // 2) for i in range(80)]
+        _pandas_frame = pd.DataFrame({'key': keys, 'side': ['BUY', 'SELL'] * 40,
+                                      'value': [float(i) for i in range(80)]})
+
+    frame = _pandas_frame
+    total = 0.0
+    for key in frame['key'].unique()[:10]:
+        rows = frame[frame['key'] == key]
+        buys = rows[rows['side'] == 'BUY']
+        total += float(buys.iloc[0]['value'])
+    return total
+
+
+# 可用的校准负载
+CALIBRATIONS = {
+    'python': _calibration_workload,
+    'pandas': _pandas_calibration_workload,
+}
+
+
+def _round_size(op, min_round_seconds):
+    """
+    确定每轮执行次数，使每轮至少 min_round_seconds 秒
+
+    返回:
+        tuple: (每轮次数, 最后一次试跑的单次耗时)
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            op()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_seconds:
+            return number, elapsed / number
+        number = max(number * 2, int(number * min_round_seconds / max(elapsed, 1e-9)))
+
+
+def _time_round(op, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        op()
+    return (time.perf_counter() - start) / number
+
+
+def time_operation(op, min_round_seconds=MIN_ROUND_SECONDS, repeats=REPEATS):
+    """
+    测量操作的单次耗时
+
+    返回:
+        float: 各轮单次耗时的最小值（秒）
+    """
+    number, best = _round_size(op, min_round_seconds)
+
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats - 1):
+            best = min(best, _time_round(op, number))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return best
+
+
+def time_relative(op, calibration_op, min_round_seconds=MIN_ROUND_SECONDS, repeats=REPEATS):
+    """
+    交替执行校准负载和操作，测量操作相对校准负载的耗时
+
+    每一轮校准紧挨着一轮操作，机器负载变化时两者受到相同的影响；
+    取各轮比值的中位数，不受个别被打断的轮次影响。
+
+    返回:
+        tuple: (操作单次耗时的最小值（秒）, 校准负载单次耗时的最小值（秒）, 相对值)
+    """
+    op_number, _ = _round_size(op, min_round_seconds)
+    calibration_number, _ = _round_size(calibration_op, min_round_seconds)
+
+    op_times, calibration_times = [], []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            calibration_times.append(_time_round(calibration_op, calibration_number))
+            op_times.append(_time_round(op, op_number))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    ratios = [op_time / calibration_time for op_time, calibration_time in zip(op_times, calibration_times)]
+    return min(op_times), min(calibration_times), statistics.median(ratios)
+
+
+def calibrate(kind='python'):
+    """校准负载的单次耗时（秒）"""
+    return time_operation(CALIBRATIONS[kind])
+
+
+def run_cases(cases, only=None, calibration_of=None):
+    """
+    执行用例
+
+    参数:
+        cases: {用例名: setup 函数}，setup() 返回操作函数
+        only: 只执行名称包含其中任一子串的用例
+        calibration_of: {用例名: 校准负载}，未列出的用例使用 'python'
+
+    返回:
+        dict: {"calibration_us": ..., "calibrations_us": {...},
+               "results": {用例名: {"us": ..., "relative": ..., "calibration": ...}}}
+    """
+    calibration_of = calibration_of or {}
+    calibrations = {}
+    results = {}
+    for name, setup in cases.items():
+        if only and not any(part in name for part in only):
+            continue
+        kind = calibration_of.get(name, 'python')
+        seconds, calibration, relative = time_relative(setup(), CALIBRATIONS[kind])
+        calibrations[kind] = min(calibrations.get(kind, calibration), calibration)
+        results[name] = {'us': round(seconds * 1e6, 3), 'relative': float(f'{relative:.4g}'),
+                         'calibration': kind}
+    if 'python' not in calibrations:
+        calibrations['python'] = calibrate()
+    return {'calibration_us': round(calibrations['python'] * 1e6, 3),
+            'calibrations_us': {kind: round(value * 1e6, 3) for kind, value in calibrations.items()},
+            'results': results}
+
+
+def baseline_path(suite):
+    return os.path.join(BASELINE_DIR, f'{suite}.json')
+
+
+def load_baseline(suite):
+    try:
+        with open(baseline_path(suite), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(suite, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(baseline_path(suite), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(report, baseline, tolerance=BENCH_TOLERANCE, min_delta_us=0):
+    """
+    与基线对比
+
+    参数:
+        tolerance: 相对值超过基线多少倍时视为退化
+        min_delta_us: 折算到本机的变慢量（微秒）低于此值时不视为退化，避免很短的用例因噪声误报
+
+    返回:
+        list: [(用例名, 当前相对值, 基线相对值, 比值, 是否退化)]；没有基线或基线使用不同校准负载的用例比值为 None
+    """
+    rows = []
+    base_results = (baseline or {}).get('results', {})
+    calibrations = report.get('calibrations_us') or {'python': report['calibration_us']}
+    for name, result in report['results'].items():
+        base = base_results.get(name)
+        kind = result.get('calibration', 'python')
+        if base is None or base.get('calibration', 'python') != kind:
+            rows.append((name, result['relative'], None, None, False))
+            continue
+        ratio = result['relative'] / base['relative']
+        delta_us = (result['relative'] - base['relative']) * calibrations[kind]
+        rows.append((name, result['relative'], base['relative'], ratio,
+                     ratio > tolerance and delta_us >= min_delta_us))
+    return rows
+
+
+def format_report(report, rows):
+    """生成结果表格文本"""
+    calibrations = report.get('calibrations_us') or {'python': report['calibration_us']}
+    lines = ['校准负载: ' + ', '.join(f'{kind} {us:.1f} us' for kind, us in calibrations.items()),
+             f"{'用例':<34}{'单次耗时':>14}{'相对值':>12}{'基线':>12}{'比值':>8}"]
+    for name, relative, base, ratio, regressed in rows:
+        us = report['results'][name]['us']
+        base_text = f'{base:.4g}' if base is not None else '-'
+        ratio_text = f'{ratio:.2f}x' if ratio is not None else '-'
+        mark = '  ❌' if regressed else ''
+        lines.append(f"{name:<34}{us:>11.2f} us{relative:>12.4g}{base_text:>12}{ratio_text:>8}{mark}")
+    return '\n'.join(lines)
+
+
+def main(suite, cases, argv=None, calibration_of=None):
+    """
+    基准测试命令行入口
+
+    参数:
+        suite: 套件名，基线保存在 baselines/<suite>.json
+        cases: {用例名: setup 函数}
+        calibration_of: {用例名: 校准负载}，见 run_cases
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description=f'{suite} 基准测试')
+    parser.add_argument('only', nargs='*', help='只运行名称包含这些子串的用例')
+    parser.add_argument('--check', action='store_true', help='与基线对比，有用例退化时以非零状态码退出')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入基线')
+    parser.add_argument('--tolerance', type=float, default=BENCH_TOLERANCE,
+                        help='相对值超过基线多少倍时视为退化')
+    args = parser.parse_args(argv)
+
+    report = run_cases(cases, args.only, calibration_of)
+    baseline = load_baseline(suite)
+    rows = compare(report, baseline, args.tolerance)
+    print(format_report(report, rows))
+
+    if args.update_baseline:
+        if args.only and baseline:
+            # 只更新本次运行的用例
+            merged = dict(baseline['results'])
+            merged.update(report['results'])
+            calibrations = dict(baseline.get('calibrations_us', {}))
+            calibrations.update(report['calibrations_us'])
+            report = {'calibration_us': report['calibration_us'], 'calibrations_us': calibrations,
+                      'results': merged}
+        save_baseline(suite, report)
+        print(f"已更新基线 {baseline_path(suite)}")
+
+    if args.check:
+        regressed = [name for name, _, _, _, bad in rows if bad]
+        if baseline is None:
+            print(f"❌ 没有基线 {baseline_path(suite)}，先用 --update-baseline 记录")
+            return 1
+        if regressed:
+            print(f"❌ {len(regressed)} 个用例退化超过 {args.tolerance}x: {', '.join(regressed)}")
+            return 1
+        print("✅ 没有用例退化")
+    return 0
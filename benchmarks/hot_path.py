@@ -0,0 +1,171 @@
+"""
+交易热路径微基准
+
+覆盖 websocket 订单簿处理、订单簿查询、报价和数量计算、持仓和订单状态更新，
+以及 perform_trade 的完整决策过程（桩客户端，不访问网络）。
+
+perform_trade 末尾的 gc.collect() 和 asyncio.sleep(2) 是节流而不是决策逻辑，
+基准中替换为空操作；日志照常写入文件（临时目录），只关闭控制台输出。
+
+使用示例:
+    python -m benchmarks.hot_path                      # 运行并与基线对比
+    python -m benchmarks.hot_path --check              # 有用例比基线慢 1.5 倍以上时以非零状态码退出
+    python -m benchmarks.hot_path perform_trade        # 只运行名称包含 perform_trade 的用例
+    python -m benchmarks.hot_path --update-baseline    # 优化后记录新的基线
+"""
+import os
+import sys
+import asyncio
+import tempfile
+from types import SimpleNamespace
+
+import pandas as pd
+
+from benchmarks import fixtures
+from benchmarks.harness import main
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MARKET = '0xbench'
+TOKEN1 = '1001'
+TOKEN2 = '1002'
+
+
+def _import_bot():
+    """在临时目录中导入交易模块，日志和 positions/ 不写入仓库"""
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    os.chdir(tempfile.mkdtemp(prefix='bench_'))
+
+    import trading
+    import poly_data.global_state as global_state
+    return trading, global_state
+
+
+trading, global_state = _import_bot()
+
+from poly_data import logger  # noqa: E402
+from poly_data.data_processing import process_book_data, process_price_change  # noqa: E402
+from poly_data.trading_utils import (find_best_price_with_size, get_best_bid_ask_deets,  # noqa: E402
+                                     get_order_prices, get_buy_sell_amount)
+from poly_data.data_utils import set_position, update_orders  # noqa: E402
+
+
+# 关闭控制台输出，日志仍写入临时目录中的文件
+for _bot_logger in logger._loggers.values():
+    _bot_logger.console_output = False
+
+
+def _reset_state(rng):
+    """单个市场的全局状态：订单簿、配置、参数、持仓和桩客户端"""
+    row = fixtures.market_row(MARKET, TOKEN1, TOKEN2)
+    global_state.df = pd.DataFrame([row])
+    global_state.params = fixtures.PARAMS
+    global_state.REVERSE_TOKENS = {TOKEN1: TOKEN2, TOKEN2: TOKEN1}
+    global_state.all_data = {MARKET: fixtures.sorted_book(rng, TOKEN1)}
+    global_state.positions = {TOKEN1: {'size': 60.0, 'avgPrice': 0.48}}
+    global_state.orders = {}
+    global_state.client = fixtures.StubClient()
+    return global_state.df.iloc[0]
+
+
+def bench_process_book_data():
+    message = fixtures.book_message(fixtures.rng(), MARKET, TOKEN1)
+    return lambda: process_book_data(MARKET, message)
+
+
+def bench_process_price_change():
+    rng = fixtures.rng()
+    _reset_state(rng)
+    updates = fixtures.price_changes(rng, global_state.all_data[MARKET])
+    state = {'i': 0}
+
+    def op():
+        side, price, size = updates[state['i']]
+        state['i'] = (state['i'] + 1) % len(updates)
+        process_price_change(MARKET, side, price, size)
+    return op
+
+
+def bench_find_best_price_with_size():
+    book = fixtures.sorted_book(fixtures.rng(), TOKEN1)
+    return lambda: find_best_price_with_size(book['bids'], 100, reverse=True)
+
+
+def bench_get_best_bid_ask_deets():
+    _reset_state(fixtures.rng())
+    names = ['token1', 'token2']
+    state = {'i': 0}
+
+    def op():
+        state['i'] ^= 1
+        get_best_bid_ask_deets(MARKET, names[state['i']], 100, 0.1)
+    return op
+
+
+def bench_get_order_prices():
+    row = _reset_state(fixtures.rng())
+    return lambda: get_order_prices(0.51, 150.0, 0.51, 0.53, 420.0, 0.53, 0.48, row)
+
+
+def bench_get_buy_sell_amount():
+    row = _reset_state(fixtures.rng())
+    return lambda: get_buy_sell_amount(60.0, 0.51, row, 10.0)
+
+
+def bench_set_position():
+    _reset_state(fixtures.rng())
+    sides = ['BUY', 'SELL']
+    state = {'i': 0}
+
+    def op():
+        state['i'] ^= 1
+        set_position(TOKEN1, sides[state['i']], 5, 0.5)
+    return op
+
+
+def bench_update_orders():
+    _reset_state(fixtures.rng())
+    tokens = [str(2000 + i) for i in range(40)]
+    global_state.client = fixtures.StubClient(orders=fixtures.orders_frame(tokens))
+    return update_orders
+
+
+def bench_perform_trade():
+    _reset_state(fixtures.rng())
+    trading.gc = SimpleNamespace(collect=lambda: 0)
+
+    async def no_sleep(_seconds):
+        return None
+    trading.asyncio = SimpleNamespace(Lock=asyncio.Lock, sleep=no_sleep)
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    def op():
+        # 每次从没有挂单的状态开始，覆盖下单路径
+        global_state.orders = {}
+        loop.run_until_complete(trading.perform_trade(MARKET))
+    return op
+
+
+CASES = {
+    'process_book_data': bench_process_book_data,
+    'process_price_change': bench_process_price_change,
+    'find_best_price_with_size': bench_find_best_price_with_size,
+    'get_best_bid_ask_deets': bench_get_best_bid_ask_deets,
+    'get_order_prices': bench_get_order_prices,
+    'get_buy_sell_amount': bench_get_buy_sell_amount,
+    'set_position': bench_set_position,
+    'update_orders': bench_update_orders,
+    'perform_trade': bench_perform_trade,
+}
+
+# update_orders 以 pandas 小表筛选为主，用 pandas 校准负载归一化，纯 Python 负载不能反映它在不同机器上的速度
+CALIBRATION_OF = {
+    'update_orders': 'pandas',
+}
+
+
+if __name__ == '__main__':
+    raise SystemExit(main('hot_path', CASES, calibration_of=CALIBRATION_OF))
@@ -0,0 +1,322 @@
+"""
+update_markets 端到端流水线基准 - fetch_and_process_data 各阶段的墙钟时间、CPU 时间和峰值内存
+
+每个市场规模依次:
+1. 在独立进程中启动模拟服务（poly_mock），回放录制的 API 响应，市场不足时复制补足
+2. 在新的进程和临时目录中运行一次 fetch_and_process_data：表格换成内存替身，AI 选择不启动，
+   价格历史、市场目录和日志都写入临时目录（默认冷启动，即本地没有价格历史）
+3. 第二个进程在 tracemalloc 下重复一次，得到各阶段的峰值内存（tracemalloc 会拖慢执行，不与计时同时进行）
+
+阶段是 update_markets 中被 fetch_and_process_data 调用的函数，在模块上替换为计时版本，不修改业务代码；
+sheet_sync 是发布后等待后台表格写入完成的时间。扫描阶段另外输出 ScanMetrics 的子阶段忙碌时间
+（各并发任务之和，可能超过墙钟时间）。
+
+CPU 时间是整个进程的（包括线程池和后台写表线程），模拟服务在另一个进程中，不计入。
+
+默认使用模拟交易所生成的录制数据（固定种子，不访问网络）；用 poly_mock.recording 录制真实 API
+后通过 --fixture 回放。默认不限速，--rate-limit 10 与生产配置相同。
+
+使用示例:
+    python -m benchmarks.update_markets_pipeline                         # 100、1000、5000 个市场
+    python -m benchmarks.update_markets_pipeline --markets 1000 --latency-ms 30
+    python -m benchmarks.update_markets_pipeline --warm                  # 本地已有价格历史（每小时运行的常态）
+    python -m benchmarks.update_markets_pipeline --fixture data/recordings/live.json.gz
+    python -m benchmarks.update_markets_pipeline --check                 # 墙钟时间比基线慢 1.5 倍且 50 ms 以上时以非零状态码退出
+    python -m benchmarks.update_markets_pipeline --update-baseline
+"""
+import os
+import sys
+import time
+import functools
+import tempfile
+import contextlib
+import traceback
+import tracemalloc
+import multiprocessing
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUITE = 'update_markets_pipeline'
+
+DEFAULT_MARKETS = [100, 1000, 5000]
+
+# 比基线慢的墙钟时间（折算到本机）低于此值的阶段不视为退化：几毫秒的阶段受调度和 GC 影响，比值波动很大
+MIN_REGRESSION_MS = float(os.getenv('BENCH_PIPELINE_MIN_DELTA_MS', '50'))
+
+# 合成录制数据的市场数量，更大的规模由模拟服务复制补足
+FIXTURE_MARKETS = 250
+
+# Selected Markets 中的市场数量（取录制数据的前几个）
+SELECTED_MARKETS = 20
+
+# 单次运行的最长时间（秒）
+RUN_TIMEOUT = 30 * 60
+
+# 依次调用的阶段
+STAGES = ['open_worksheets', 'get_selected_df', 'scan_all_with_volatility', 'get_markets',
+          'merge_volatility', 'build_views', 'publish_views']
+SYNC_STAGE = 'sheet_sync'
+
+
+class StageProfiler:
+    """累计各阶段的墙钟时间、CPU 时间，以及 tracemalloc 开启时阶段内相对起点的峰值内存"""
+
+    def __init__(self):
+        self.stages = {}
+        # 所有阶段中 tracemalloc 的最高占用（绝对值）
+        self.traced_peak = 0
+
+    def measure(self, name, func, *args, **kwargs):
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'peak_mib': None})
+            stage['wall'] += time.perf_counter() - wall
+            stage['cpu'] += time.process_time() - cpu
+            stage['calls'] += 1
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.traced_peak = max(self.traced_peak, peak)
+                stage['peak_mib'] = max(stage['peak_mib'] or 0.0, (peak - base) / 2**20)
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def wrapped(*args, **kwargs):
+            return self.measure(name, func, *args, **kwargs)
+        return wrapped
+
+
+def _run_pipeline(env, selected, options):
+    """在当前（新的）进程中运行一次流水线，返回各阶段的测量结果"""
+    workdir = tempfile.mkdtemp(prefix='bench_pipeline_')
+    os.environ.update(env)
+    # 地址和存储路径在导入时读取，必须在导入业务模块之前设置
+    os.environ.update({
+        'PRICE_HISTORY_DIR': os.path.join(workdir, 'price_history'),
+        'MARKET_CATALOG_PATH': os.path.join(workdir, 'market_catalog.db'),
+        'LIVE_BOOKS_PATH': os.path.join(workdir, 'live_books.json'),
+    })
+    os.chdir(workdir)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+    from benchmarks import fixtures
+    from poly_data import logger
+    from data_updater.market_scanner import ScanMetrics
+    import update_markets
+
+    for bot_logger in logger._loggers.values():
+        bot_logger.console_output = False
+
+    spreadsheet = fixtures.InMemorySpreadsheet({'Selected Markets': [['question']] + [[q] for q in selected]})
+    update_markets.get_spreadsheet = lambda: spreadsheet
+    update_markets.ai_job = SimpleNamespace(submit=lambda *args: False)
+
+    scans = []
+    scan_all_with_volatility = update_markets.scan_all_with_volatility
+
+    def scan(client, is_candidate):
+        scans.append(ScanMetrics(log_interval=float('inf')))
+        return scan_all_with_volatility(client, is_candidate, metrics=scans[-1], rate_limit=options['rate_limit'])
+
+    profiler = StageProfiler()
+    originals = {name: getattr(update_markets, name) for name in STAGES}
+    originals['scan_all_with_volatility'] = scan
+
+    def run():
+        for name, func in originals.items():
+            setattr(update_markets, name, profiler.wrap(name, func))
+        update_markets.fetch_and_process_data()
+        if not profiler.measure(SYNC_STAGE, update_markets.sheet_publisher.flush, RUN_TIMEOUT):
+            raise RuntimeError('表格同步超时')
+
+    if options['warm']:
+        # 先完整运行一次，填充本地价格历史和表格写入器的缓存
+        run()
+        profiler.stages.clear()
+
+    if options['memory']:
+        tracemalloc.start()
+        profiler.traced_peak = 0
+    wall, cpu = time.perf_counter(), time.process_time()
+    run()
+    total = {'wall': time.perf_counter() - wall, 'cpu': time.process_time() - cpu, 'calls': 1, 'peak_mib': None}
+    if options['memory']:
+        total['peak_mib'] = max(profiler.traced_peak, tracemalloc.get_traced_memory()[1]) / 2**20
+        tracemalloc.stop()
+
+    return {
+        'stages': {**profiler.stages, 'total': total},
+        'scan': scans[-1].summary(),
+        'cells_written': sum(sheet.cells_written for sheet in spreadsheet.sheets.values()),
+        'max_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+    }
+
+
+def _child(result_queue, *args):
+    try:
+        # 业务代码的进度输出不混入报告
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = _run_pipeline(*args)
+        result_queue.put(result)
+    except BaseException:
+        result_queue.put({'error': traceback.format_exc()})
+
+
+def run_in_process(env, selected, options):
+    """在新的进程中运行 _run_pipeline，每次运行的导入、缓存和本地存储互不影响"""
+    context = multiprocessing.get_context('spawn')
+    result_queue = context.Queue()
+    process = context.Process(target=_child, args=(result_queue, env, selected, options), name='bench-pipeline')
+    process.start()
+    try:
+        result = result_queue.get(timeout=RUN_TIMEOUT)
+    finally:
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+    if 'error' in result:
+        raise RuntimeError(f"流水线运行失败:\n{result['error']}")
+    return result
+
+
+def run_size(markets, fixture, selected, options):
+    """
+    对一个市场规模运行计时和内存两遍
+
+    返回:
+        dict: 计时结果，各阶段的 peak_mib 来自内存那一遍
+    """
+    from poly_mock.server import serve_in_process
+
+    with serve_in_process(markets=markets, replay=fixture, rate=0, latency_ms=options['latency_ms']) as env:
+        result = run_in_process(env, selected, dict(options, memory=False))
+        if options['memory']:
+            traced = run_in_process(env, selected, dict(options, memory=True))
+            for name, stage in result['stages'].items():
+                stage['peak_mib'] = traced['stages'].get(name, {}).get('peak_mib')
+    return result
+
+
+def format_size(markets, result, rows):
+    scan = result['scan']
+    regressed = {name.split('/', 1)[1] for name, _, _, _, bad in rows if bad and name.startswith(f'{markets}/')}
+    ratios = {name.split('/', 1)[1]: ratio for name, _, _, ratio, _ in rows if name.startswith(f'{markets}/')}
+    rss = f"，进程 RSS 峰值 {result['max_rss_mib']:.0f} MiB" if result['max_rss_mib'] else ''
+    lines = [f"📊 {markets} 个市场: 扫描 {scan['results']} 个，请求订单簿 {scan['book_requests']} 次，"
+             f"价格历史 {scan['histories']} 个，写入 {result['cells_written']} 个单元格{rss}",
+             f"    {'阶段':<26}{'墙钟(s)':>10}{'CPU(s)':>10}{'峰值内存(MiB)':>16}{'比基线':>10}"]
+    for name, stage in result['stages'].items():
+        peak = f"{stage['peak_mib']:.1f}" if stage['peak_mib'] is not None else '-'
+        ratio = f'{ratios[name]:.2f}x' if ratios.get(name) is not None else '-'
+        mark = '  ❌' if name in regressed else ''
+        lines.append(f"    {name:<26}{stage['wall']:>10.3f}{stage['cpu']:>10.3f}{peak:>16}{ratio:>10}{mark}")
+        if name == 'scan_all_with_volatility':
+            lines.append(f"      └ 忙碌时间: 分页 {scan['pagination_seconds']}s，订单簿 {scan['books_seconds']}s，"
+                         f"奖励计算 {scan['processing_seconds']}s，波动率 {scan['volatility_seconds']}s")
+    return '\n'.join(lines)
+
+
+def to_report(results, calibration, options):
+    """转换为 harness 的报告格式，relative 为墙钟时间 / 校准耗时"""
+    report = {'calibration_us': round(calibration * 1e6, 3), 'options': options, 'results': {}}
+    for markets, result in results.items():
+        for name, stage in result['stages'].items():
+            report['results'][f'{markets}/{name}'] = {
+                'us': round(stage['wall'] * 1e6, 1),
+                'cpu_us': round(stage['cpu'] * 1e6, 1),
+                'peak_mib': round(stage['peak_mib'], 2) if stage['peak_mib'] is not None else None,
+                'relative': float(f"{stage['wall'] / calibration:.4g}"),
+            }
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    from benchmarks.harness import (calibrate, compare, load_baseline, save_baseline, baseline_path,
+                                    BENCH_TOLERANCE)
+
+    parser = argparse.ArgumentParser(description='update_markets 端到端流水线基准')
+    parser.add_argument('--markets', type=int, nargs='+', default=DEFAULT_MARKETS, help='市场规模')
+    parser.add_argument('--fixture', help='poly_mock.recording 录制的文件；默认生成合成录制数据')
+    parser.add_argument('--latency-ms', type=float, default=0, help='模拟服务每个 REST 请求的延迟（毫秒）')
+    parser.add_argument('--rate-limit', type=float, default=1e6, help='扫描器的全局请求速率上限（每秒），生产配置为 10')
+    parser.add_argument('--warm', action='store_true', help='先运行一次，测量本地已有价格历史时的增量运行')
+    parser.add_argument('--no-memory', action='store_true', help='跳过 tracemalloc 那一遍')
+    parser.add_argument('--check', action='store_true', help='与基线对比，有阶段退化时以非零状态码退出')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次结果写入基线')
+    parser.add_argument('--tolerance', type=float, default=BENCH_TOLERANCE, help='墙钟时间超过基线多少倍时视为退化')
+    parser.add_argument('--min-delta-ms', type=float, default=MIN_REGRESSION_MS,
+                        help='比基线慢的时间低于多少毫秒时不视为退化')
+    args = parser.parse_args(argv)
+
+    options = {'latency_ms': args.latency_ms, 'rate_limit': args.rate_limit, 'warm': args.warm,
+               'memory': not args.no_memory, 'fixture': os.path.basename(args.fixture) if args.fixture else 'synthetic'}
+
+    fixture = os.path.abspath(args.fixture) if args.fixture else None
+    # 模拟服务和日志都在临时目录中运行，不在仓库中留下文件
+    os.chdir(tempfile.mkdtemp(prefix='bench_pipeline_'))
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+    from poly_mock.recording import load_recording, record_synthetic, save_recording
+
+    if fixture:
+        recording = load_recording(fixture)
+    else:
+        print(f"🔧 生成 {FIXTURE_MARKETS} 个市场的合成录制数据")
+        recording = record_synthetic(FIXTURE_MARKETS)
+        fixture = os.path.abspath('synthetic.json.gz')
+        save_recording(recording, fixture)
+    selected = [market['question'] for market in recording['markets'][:SELECTED_MARKETS]]
+    del recording
+
+    baseline = load_baseline(SUITE)
+    if baseline and baseline.get('options') != options:
+        print(f"⚠️ 基线的运行参数 {baseline.get('options')} 与本次 {options} 不同，对比结果仅供参考")
+
+    calibration = calibrate()
+    results = {}
+    for markets in args.markets:
+        print(f"⏱️ 运行 {markets} 个市场...")
+        results[markets] = run_size(markets, fixture, selected, options)
+
+    report = to_report(results, calibration, options)
+    rows = compare(report, baseline, args.tolerance, args.min_delta_ms * 1000)
+    print(f"校准负载: {report['calibration_us']:.1f} us")
+    for markets, result in results.items():
+        print(format_size(markets, result, rows))
+
+    if args.update_baseline:
+        if baseline and baseline.get('options') == options:
+            # 只更新本次运行的规模
+            report['results'] = {**baseline['results'], **report['results']}
+        save_baseline(SUITE, report)
+        print(f"已更新基线 {baseline_path(SUITE)}")
+
+    if args.check:
+        regressed = [name for name, _, _, _, bad in rows if bad]
+        if baseline is None:
+            print(f"❌ 没有基线 {baseline_path(SUITE)}，先用 --update-baseline 记录")
+            return 1
+        if regressed:
+            print(f"❌ {len(regressed)} 个阶段退化超过 {args.tolerance}x 且慢 {args.min_delta_ms:g} ms 以上: "
+                  f"{', '.join(regressed)}")
+            return 1
+        print("✅ 没有阶段退化")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,200 @@
+"""
+AI 市场选择后台任务 - 在独立进程中运行 AI 选择器，不阻塞市场扫描
+
+- 提交时把 Volatility Markets、Selected Markets 和 Hyperparameters 冻结为快照文件，
+  子进程只读取快照，不依赖 update_markets 之后的状态
+- 子进程（spawn 启动）负责获取钱包余额、调用 LLM，决策写入结果文件而不是直接写表格
+- 父进程中的监视线程等待子进程，超过 AI_SELECTOR_TIMEOUT 秒时终止子进程；
+  正常结束时由监视线程写入 Selected Markets，子进程被终止时不会留下写了一半的表格
+- 同一时间只运行一个任务，上一个任务未结束时新的提交被跳过
+
+使用示例:
+    job = AISelectionJob()
+    job.submit(volatility_df, sel_df, catalog.read_hyperparameters())  # 立即返回
+    job.wait(timeout=60)                                               # 需要时等待结束
+"""
+import os
+import json
+import time
+import threading
+import traceback
+import multiprocessing
+
+import pandas as pd
+
+from poly_data.logger import get_logger
+from poly_utils.decision_cache import AI_CACHE_DIR
+
+# 创建 AI 选择任务日志记录器
+job_logger = get_logger('ai_selection_job', console_output=True)
+
+# 单次选择的最长运行时间（秒），超过后终止子进程
+AI_SELECTOR_TIMEOUT = float(os.getenv('AI_SELECTOR_TIMEOUT', '600'))
+
+# 终止子进程后等待其退出的时间（秒），超过后强制结束
+TERMINATE_GRACE = 5
+
+# 快照和结果文件目录
+JOB_DIR = os.path.join(AI_CACHE_DIR, 'jobs')
+
+
+def _run_job(snapshot_path, result_path, stub=False):
+    """子进程入口：读取快照运行选择器，把决策写入结果文件"""
+    result = {'rows': None, 'output': None, 'cached': False, 'error': None}
+    try:
+        import ai_config
+        import ai_market_selector as selector
+
+        written = []
+        selector.set_selection_writer(written.append)
+
+        snapshot = pd.read_pickle(snapshot_path)
+        config = ai_config.DEFAULT_CONFIG.copy()
+        config['wallet_balance'] = selector.get_wallet_balance()
+
+        hyperparameters = snapshot['hyperparameters']
+        if len(hyperparameters) == 0:
+            hyperparameters = selector.get_hyperparameters()
+
+        agent = selector.StubAgent(config) if stub else None
+        selection = selector.select_markets(snapshot['liquidity'], snapshot['selections'], hyperparameters,
+                                            config, agent=agent)
+        if selection is None:
+            result['error'] = 'AI 分析失败'
+        else:
+            result.update(output=selection['output'], cached=selection['cached'])
+            if written:
+                result['rows'] = written[-1]
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+        traceback.print_exc()
+
+    tmp_path = result_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, result_path)
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class AISelectionJob:
+    """在独立进程中运行 AI 选择器，带超时，结果由后台线程发布"""
+
+    def __init__(self, timeout=AI_SELECTOR_TIMEOUT, job_dir=JOB_DIR, stub=False, publish=None):
+        """
+        参数:
+            timeout: 单次选择的最长运行时间（秒）
+            job_dir: 快照和结果文件目录
+            stub: 是否使用本地桩模型代替 LLM
+            publish: 发布回调 publish(all_rows)，all_rows 第一行为表头；
+                     默认写入 Selected Markets 工作表和本地目录
+        """
+        self.timeout = timeout
+        self.job_dir = job_dir
+        self.stub = stub
+        self.publish = publish
+        self.last_result = None
+        self._thread = None
+        self._context = multiprocessing.get_context('spawn')
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, liquidity_df, selections_df, hyperparameters):
+        """
+        冻结当前数据并在后台开始一次选择，立即返回
+
+        参数:
+            liquidity_df: Volatility Markets
+            selections_df: Selected Markets
+            hyperparameters: Hyperparameters 记录列表或 DataFrame；为空时子进程自行读取
+
+        返回:
+            bool: 是否已开始（上一次选择仍在运行时返回 False）
+        """
+        if self.running():
+            job_logger.info("上一次 AI 选择仍在运行，跳过本次")
+            return False
+
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_id = f'{int(time.time() * 1000)}'
+        snapshot_path = os.path.join(self.job_dir, f'snapshot-{job_id}.pkl')
+        result_path = os.path.join(self.job_dir, f'result-{job_id}.json')
+
+        snapshot = {
+            'liquidity': liquidity_df.copy(),
+            'selections': selections_df.copy(),
+            'hyperparameters': pd.DataFrame(hyperparameters),
+        }
+        pd.to_pickle(snapshot, snapshot_path)
+
+        process = self._context.Process(target=_run_job, args=(snapshot_path, result_path, self.stub),
+                                        name=f'ai-selection-{job_id}', daemon=True)
+        process.start()
+
+        self._thread = threading.Thread(target=self._watch, args=(process, snapshot_path, result_path),
+                                        name='ai-selection-watcher', daemon=True)
+        self._thread.start()
+        job_logger.info(f"AI 选择已在后台开始（进程 {process.pid}，超时 {self.timeout:g} 秒）")
+        return True
+
+    def wait(self, timeout=None):
+        """
+        等待当前选择结束（包括发布）
+
+        返回:
+            bool: 超时前是否结束
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return not self.running()
+
+    def _watch(self, process, snapshot_path, result_path):
+        started = time.time()
+        try:
+            process.join(self.timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(TERMINATE_GRACE)
+                if process.is_alive():
+                    process.kill()
+                    process.join()
+                self.last_result = {'error': 'timeout'}
+                job_logger.warning(f"AI 选择超过 {self.timeout:g} 秒未完成，已终止")
+                return
+
+            try:
+                with open(result_path, encoding='utf-8') as f:
+                    result = json.load(f)
+            except (OSError, ValueError):
+                result = {'error': f'子进程异常退出（退出码 {process.exitcode}）'}
+            self.last_result = result
+
+            seconds = time.time() - started
+            if result.get('error'):
+                job_logger.error(f"AI 选择失败（{seconds:.1f} 秒）: {result['error']}")
+            elif result.get('rows') is None:
+                job_logger.info(f"AI 选择完成（{seconds:.1f} 秒），选择列表无需更新")
+            else:
+                self._publish(result['rows'])
+                job_logger.info(f"AI 选择完成（{seconds:.1f} 秒），已发布 {len(result['rows']) - 1} 个市场"
+                                f"{'（复用缓存的决策）' if result.get('cached') else ''}")
+        except Exception as e:
+            job_logger.error(f"AI 选择任务出错: {type(e).__name__}: {e}")
+            job_logger.debug(traceback.format_exc())
+        finally:
+            _remove(snapshot_path, result_path, result_path + '.tmp')
+
+    def _publish(self, all_rows):
+        if self.publish is not None:
+            self.publish(all_rows)
+            return
+
+        from ai_market_selector import write_selection_rows
+        write_selection_rows(all_rows)
@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 import os
-import requests
 import time
 import warnings
 warnings.filterwarnings("ignore")
@@ -20,30 +19,14 @@ def get_sel_df(spreadsheet, sheet_name='Selected Markets'):
         return pd.DataFrame()
 
 def get_all_markets(client):
-    cursor = ""
-    all_markets = []
+    """
+    获取全部奖励市场
 
-    while True:
-        try:
-            markets = client.get_sampling_markets(next_cursor = cursor)
-            markets_df = pd.DataFrame(markets['data'])
-
-
-            cursor = markets['next_cursor']
+    逐页流式获取，任一页失败时抛出异常，不再静默返回不完整的结果。
+    """
+    from data_updater.market_scanner import iter_sampling_markets
 
-
-
-            all_markets.append(markets_df)
-
-            if cursor is None:
-                break
-        except:
-            break
-
-    all_df = pd.concat(all_markets)
-    all_df = all_df.reset_index(drop=True)
-
-    return all_df
+    return pd.DataFrame(list(iter_sampling_markets(client)))
 
 def get_bid_ask_range(ret, TICK_SIZE):
     bid_from = ret['midpoint'] - ret['max_spread'] / 100
@@ -112,7 +95,17 @@ def add_formula_params(curr_df, midpoint, v, daily_reward):
     curr_df['reward_per_100'] = (curr_df['Q'] / curr_df['Q'].sum()) * daily_reward / 2 / curr_df['size'] * curr_df['100']
     return curr_df
 
-def process_single_row(row, client):
+def process_single_row(row, client, book=None):
+    """
+    计算单个市场的奖励指标
+
+    这是逐行的参考实现；批量计算使用 reward_engine.score_markets，两者结果一致。
+
+    参数:
+        row: get_sampling_markets 返回的市场数据
+        client: CLOB客户端，未提供 book 时用于获取订单簿
+        book: 已获取的 token1 订单簿（可选）
+    """
     ret = {}
     ret['question'] = row['question']
     ret['neg_risk'] = row['neg_risk']
@@ -133,7 +126,8 @@ def process_single_row(row, client):
             break
 
     ret['rewards_daily_rate'] = rate
-    book = client.get_order_book(token1)
+    if book is None:
+        book = client.get_order_book(token1)
 
     bids = pd.DataFrame()
     asks = pd.DataFrame()
@@ -217,28 +211,15 @@ def process_single_row(row, client):
 
 
 def get_all_results(all_df, client, max_workers=5):
-    all_results = []
+    """
+    计算 all_df 中每个市场的奖励指标
 
-    def process_with_progress(args):
-        idx, row = args
-        try:
-            return process_single_row(row, client)
-        except:
-            print("获取市场时出错")
-            return None
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(process_with_progress, (idx, row)) for idx, row in all_df.iterrows()]
-
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            if result is not None:
-                all_results.append(result)
+    订单簿通过异步扫描器批量获取，进度和各阶段耗时写入 market_scanner 日志。
+    """
+    from data_updater.market_scanner import scan_all_results
 
-            if len(all_results) % (max_workers * 2) == 0:
-                print(f'{len(all_results)} / {len(all_df)}')
-
-    return all_results
+    rows = [row for _, row in all_df.iterrows()]
+    return scan_all_results(client, rows=rows, max_concurrency=max_workers)
 
 def get_combined_markets(new_df, new_markets, sel_df):
 
@@ -254,6 +235,8 @@ def get_combined_markets(new_df, new_markets, sel_df):
     return all_markets
 
 import concurrent.futures
+from data_updater.price_history import get_price_history
+from data_updater.volatility import multi_horizon_volatility, volatility_stats
 
 def calculate_annualized_volatility(df, hours):
     end_time = df['t'].max()
@@ -264,57 +247,47 @@ def calculate_annualized_volatility(df, hours):
     return round(annualized_volatility, 2)
 
 def add_volatility(row):
-    res = requests.get(f'https://clob.polymarket.com/prices-history?interval=1m&market={row["token1"]}&fidelity=10')
-    price_df = pd.DataFrame(res.json()['history'])
-    price_df['t'] = pd.to_datetime(price_df['t'], unit='s')
-    price_df['p'] = price_df['p'].round(2)
-
-    price_df.to_csv(f'data/{row["token1"]}.csv', index=False)
-
-    price_df['log_return'] = np.log(price_df['p'] / price_df['p'].shift(1))
+    # 只获取本地存储中最后一个数据点之后的价格
+    t, p = get_price_history(row["token1"])
+    if len(t) == 0:
+        raise ValueError(f"{row['token1']} 没有价格历史")
 
-    row_dict = row.copy()
+    return {**row.copy(), **volatility_stats(t, p)}
 
-    stats = {
-        '1_hour': calculate_annualized_volatility(price_df, 1),
-        '3_hour': calculate_annualized_volatility(price_df, 3),
-        '6_hour': calculate_annualized_volatility(price_df, 6),
-        '12_hour': calculate_annualized_volatility(price_df, 12),
-        '24_hour': calculate_annualized_volatility(price_df, 24),
-        '7_day': calculate_annualized_volatility(price_df, 24 * 7),
-        '14_day': calculate_annualized_volatility(price_df, 24 * 14),
-        '30_day': calculate_annualized_volatility(price_df, 24 * 30),
-        'volatility_price': price_df['p'].iloc[-1]
-    }
+def add_volatility_to_df(df, max_workers=2, metrics=None):
+    """
+    为每个市场添加各时间窗口的波动率
 
-    new_dict = {**row_dict, **stats}
-    return new_dict
+    价格历史在线程池中并行获取，波动率在所有历史获取完成后一次批量计算。
+    获取失败的市场被丢弃，记录在扫描器日志和 metrics（ScanMetrics）的 errors 计数中。
+    """
+    from data_updater.market_scanner import ScanMetrics, scanner_logger
 
-def add_volatility_to_df(df, max_workers=2):
-
-    results = []
+    metrics = metrics or ScanMetrics()
     df = df.reset_index(drop=True)
+    rows = [row.to_dict() for _, row in df.iterrows()]
+    failed = []
 
-    def process_volatility_with_progress(args):
-        idx, row = args
+    def fetch_history(row):
         try:
-            ret = add_volatility(row.to_dict())
-            return ret
-        except:
-            print("获取波动性时出错")
+            t, p = get_price_history(row['token1'])
+            return (t, p) if len(t) else None
+        except Exception as e:
+            scanner_logger.warning(f"获取 {row['token1']} 的价格历史失败: {type(e).__name__}: {e}")
+            failed.append(row['token1'])
             return None
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(process_volatility_with_progress, (idx, row)) for idx, row in df.iterrows()]
-
-        for future in concurrent.futures.as_completed(futures):
-            result = future.result()
-            if result is not None:
-                results.append(result)
+        histories = list(executor.map(fetch_history, rows))
+    metrics.add('histories', len(rows))
+    metrics.add('errors', len(failed))
 
-            if len(results) % (max_workers * 2) == 0:
-                print(f'{len(results)} / {len(df)}')
+    start = time.time()
+    kept = [(row, history) for row, history in zip(rows, histories) if history is not None]
+    stats = multi_horizon_volatility([history for _, history in kept])
+    metrics.add_time('volatility', time.time() - start)
 
+    results = [{**row, **{name: values[i] for name, values in stats.items()}} for i, (row, _) in enumerate(kept)]
     return pd.DataFrame(results)
 
 
@@ -1,5 +1,3 @@
-from google.oauth2.service_account import Credentials
-import gspread
 import os
 import pandas as pd
 import requests
@@ -24,7 +22,10 @@ def get_spreadsheet(read_only=False):
         else:
             raise FileNotFoundError("找不到credentials.json。使用read_only=True进行只读访问。")
 
-    # 正常的认证访问
+    # 正常的认证访问；gspread 和 google-auth 导入较慢，只在需要时导入
+    from google.oauth2.service_account import Credentials
+    import gspread
+
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     credentials = Credentials.from_service_account_file('credentials.json', scopes=scope)
     client = gspread.authorize(credentials)
@@ -0,0 +1,441 @@
+"""
+异步市场扫描器
+
+将 get_sampling_markets 分页、订单簿获取和奖励计算组织成流水线：
+- 分页结果一到达就进入订单簿阶段，不必等待所有页面
+- 交易进程已订阅的市场直接使用其发布的实时订单簿，其余市场才通过 REST 获取
+- 订单簿优先通过多token批量接口获取，不可用时退回逐个请求
+- 所有请求共享一个全局限速器
+- 每批订单簿到达后用向量化奖励引擎一次计算整批市场
+- 结果以异步生成器的形式逐个产出，可以边扫描边处理
+- with_volatility 阶段在扫描的同时为候选市场获取价格历史并批量计算波动率
+
+各阶段之间都是有界队列，内存占用不随市场数量增长；任何阶段出错都会抛出，不会静默截断结果。
+
+使用示例:
+    all_results, volatility = scan_all_with_volatility(client, is_candidate=lambda r: r['gm_reward_per_100'] >= 1)
+"""
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from poly_data.logger import get_logger
+from poly_data.network_utils import retry_on_network_error
+from poly_data.book_feed import load_live_books
+from data_updater.reward_engine import score_markets
+from data_updater.price_history import get_price_history
+from data_updater.volatility import multi_horizon_volatility
+
+
+def _book_params_class():
+    """批量订单簿请求参数类；py_clob_client.clob_types 导入 eth_utils，较慢，扫描时才导入"""
+    try:
+        from py_clob_client.clob_types import BookParams
+    except ImportError:
+        return None
+    return BookParams
+
+
+# 创建扫描器日志记录器
+scanner_logger = get_logger('market_scanner', console_output=True)
+
+# CLOB API 分页结束标记
+END_CURSOR = 'LTE='
+
+
+@retry_on_network_error(max_retries=3, delay=2, endpoint='clob')
+def _fetch_sampling_page(client, cursor):
+    return client.get_sampling_markets(next_cursor=cursor)
+
+
+def iter_sampling_markets(client, metrics=None):
+    """
+    同步生成器：逐页获取奖励市场并逐个产出
+
+    任一页在重试后仍然失败时抛出异常，调用方不会拿到被静默截断的列表。
+    """
+    cursor = ''
+    while cursor is not None and cursor != END_CURSOR:
+        page = _fetch_sampling_page(client, cursor)
+        if metrics is not None:
+            metrics.add('pages')
+        cursor = page.get('next_cursor')
+        yield from page['data']
+
+
+class RateLimiter:
+    """
+    异步令牌桶限速器
+
+    必须在事件循环内创建和使用。所有阶段共享同一个实例，以控制总请求速率。
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        参数:
+            rate: 每秒允许的请求数
+            burst: 允许的突发请求数，默认与 rate 相同
+        """
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ScanMetrics:
+    """
+    扫描过程的计数和各阶段耗时
+
+    阶段耗时是各并发任务的忙碌时间之和，可以与总耗时对比判断瓶颈所在。
+    """
+
+    def __init__(self, log_interval=10):
+        self.start = time.time()
+        self.log_interval = log_interval
+        self._last_log = self.start
+        self.counters = {
+            'pages': 0,
+            'markets': 0,
+            'book_requests': 0,
+            'books': 0,
+            'live_books': 0,
+            'histories': 0,
+            'results': 0,
+            'errors': 0,
+        }
+        self.stage_seconds = {
+            'pagination': 0.0,
+            'books': 0.0,
+            'processing': 0.0,
+            'volatility': 0.0,
+        }
+
+    def add(self, counter, n=1):
+        self.counters[counter] += n
+
+    def add_time(self, stage, seconds):
+        self.stage_seconds[stage] += seconds
+
+    def summary(self):
+        elapsed = time.time() - self.start
+        return {
+            'elapsed': round(elapsed, 2),
+            **self.counters,
+            **{f'{stage}_seconds': round(sec, 2) for stage, sec in self.stage_seconds.items()},
+            'results_per_second': round(self.counters['results'] / elapsed, 2) if elapsed > 0 else 0,
+        }
+
+    def maybe_log(self, force=False):
+        """每隔 log_interval 秒输出一次进度"""
+        now = time.time()
+        if force or now - self._last_log >= self.log_interval:
+            self._last_log = now
+            scanner_logger.info(f"扫描进度: {self.summary()}")
+
+
+def _batch_tokens(batch, metrics):
+    """
+    取出每个市场 token1 的 ID，跳过结构异常的市场
+
+    返回:
+        tuple: (有效的市场列表, 对应的 token ID 列表)
+    """
+    valid, tokens = [], []
+    for r in batch:
+        try:
+            tokens.append(str(r['tokens'][0]['token_id']))
+        except (KeyError, IndexError, TypeError) as e:
+            question = r.get('question', '') if isinstance(r, dict) else ''
+            scanner_logger.warning(f"市场数据缺少 token，跳过: {question} ({type(e).__name__}: {e})")
+            metrics.add('errors')
+            continue
+        valid.append(r)
+    return valid, tokens
+
+
+async def scan_markets(client, rows=None, max_concurrency=8, rate_limit=10.0, batch_size=20,
+                       queue_size=500, metrics=None, live_books=None):
+    """
+    异步扫描奖励市场并计算奖励指标
+
+    参数:
+        client: CLOB客户端
+        rows: 要处理的市场列表；为 None 时通过 get_sampling_markets 分页获取全部奖励市场
+        max_concurrency: 并发的订单簿请求数
+        rate_limit: 全局请求速率上限（每秒）
+        batch_size: 每次批量获取订单簿的token数
+        queue_size: 各阶段之间缓冲队列的大小
+        metrics: ScanMetrics 实例，用于读取扫描统计
+        live_books: {token_id: 订单簿}；为 None 时读取交易进程发布的实时订单簿，传入 {} 则全部使用 REST
+
+    产出:
+        dict: 每个市场的奖励指标，格式与 process_single_row 相同
+
+    异常:
+        分页失败时，在已获取的结果全部产出后抛出异常，而不是静默截断
+    """
+    metrics = metrics or ScanMetrics()
+    if live_books is None:
+        live_books = load_live_books()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_concurrency)
+    limiter = RateLimiter(rate_limit)
+    market_queue = asyncio.Queue(maxsize=queue_size)
+    result_queue = asyncio.Queue(maxsize=queue_size)
+    BookParams = _book_params_class()
+    use_batch_books = BookParams is not None and hasattr(client, 'get_order_books')
+
+    async def call(func, *args, **kwargs):
+        """在线程池中执行阻塞的客户端调用，受全局限速器约束"""
+        await limiter.acquire()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    @retry_on_network_error(max_retries=3, delay=2, endpoint='clob')
+    async def fetch_page(cursor):
+        return await call(client.get_sampling_markets, next_cursor=cursor)
+
+    async def produce():
+        try:
+            if rows is not None:
+                for row in rows:
+                    metrics.add('markets')
+                    await market_queue.put(row)
+                return
+
+            cursor = ''
+            while cursor is not None and cursor != END_CURSOR:
+                start = time.time()
+                page = await fetch_page(cursor)
+                metrics.add_time('pagination', time.time() - start)
+                metrics.add('pages')
+
+                cursor = page.get('next_cursor')
+                for row in page['data']:
+                    metrics.add('markets')
+                    await market_queue.put(row)
+        finally:
+            # 通知每个订单簿任务结束
+            for _ in range(max_concurrency):
+                await market_queue.put(None)
+
+    async def fetch_books(token_ids):
+        """获取一批token的订单簿，返回 {token_id: book}"""
+        nonlocal use_batch_books
+        start = time.time()
+        try:
+            if use_batch_books:
+                try:
+                    metrics.add('book_requests')
+                    books = await call(client.get_order_books, [BookParams(token_id=t) for t in token_ids])
+                    return {str(book.asset_id): book for book in books}
+                except AttributeError:
+                    scanner_logger.warning("客户端不支持批量订单簿接口，改为逐个请求")
+                    use_batch_books = False
+                except Exception as e:
+                    scanner_logger.warning(f"批量获取订单簿失败，本批次改为逐个请求: {type(e).__name__}: {e}")
+
+            metrics.add('book_requests', len(token_ids))
+            books = await asyncio.gather(*[call(client.get_order_book, t) for t in token_ids],
+                                         return_exceptions=True)
+            return {str(t): b for t, b in zip(token_ids, books) if not isinstance(b, Exception)}
+        finally:
+            metrics.add_time('books', time.time() - start)
+
+    async def book_worker():
+        finished = False
+        while not finished:
+            row = await market_queue.get()
+            if row is None:
+                break
+
+            # 取出队列中已有的市场组成一批，最多 batch_size 个
+            batch = [row]
+            while len(batch) < batch_size:
+                try:
+                    next_row = market_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if next_row is None:
+                    finished = True
+                    break
+                batch.append(next_row)
+
+            # 单个市场或批次出错时只跳过它们；工作任务退出会使生产者阻塞在已满的队列上
+            batch, tokens = _batch_tokens(batch, metrics)
+            if not batch:
+                continue
+
+            try:
+                books = {t: live_books[t] for t in tokens if t in live_books}
+                metrics.add('live_books', len(books))
+
+                missing = [t for t in tokens if t not in books]
+                if missing:
+                    fetched = await fetch_books(missing)
+                    metrics.add('books', len(fetched))
+                    books.update(fetched)
+
+                start = time.time()
+                results = score_markets(batch, [books.get(t) for t in tokens])
+                metrics.add_time('processing', time.time() - start)
+            except Exception as e:
+                scanner_logger.error(f"处理 {len(batch)} 个市场时出错，跳过本批次: {type(e).__name__}: {e}")
+                metrics.add('errors', len(batch))
+                continue
+
+            for r, result in zip(batch, results):
+                if result is None:
+                    scanner_logger.warning(f"获取市场时出错: {r.get('question', '')}")
+                    metrics.add('errors')
+                    continue
+                await result_queue.put(result)
+
+    async def close_results():
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            await result_queue.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    workers = [asyncio.ensure_future(book_worker()) for _ in range(max_concurrency)]
+    closer = asyncio.ensure_future(close_results())
+
+    try:
+        while True:
+            result = await result_queue.get()
+            if result is None:
+                break
+            metrics.add('results')
+            metrics.maybe_log()
+            yield result
+
+        # 分页出错时在这里抛出
+        await producer
+    finally:
+        for task in [producer, closer, *workers]:
+            task.cancel()
+        executor.shutdown(wait=False)
+        metrics.maybe_log(force=True)
+
+
+def scan_all_results(client, metrics=None, **kwargs):
+    """
+    同步接口：扫描所有奖励市场并返回结果列表
+
+    参数与 scan_markets 相同。
+    """
+    async def collect():
+        return [result async for result in scan_markets(client, metrics=metrics, **kwargs)]
+
+    return asyncio.run(collect())
+
+
+async def with_volatility(results, is_candidate, metrics=None, batch_size=50, max_workers=2, max_batches=2):
+    """
+    异步生成器阶段：为候选市场获取价格历史并计算波动率
+
+    候选市场每攒够 batch_size 个就提交一批历史请求，最多 max_batches 批同时进行；
+    达到上限后等待最早的一批完成再继续读取上游，从而形成背压。每批的波动率用一次批量计算得到。
+
+    参数:
+        results: scan_markets 产出的异步迭代器
+        is_candidate: 判断结果是否需要波动率的函数
+        metrics: ScanMetrics 实例
+
+    产出:
+        tuple: (结果, 波动率字段)；非候选市场或没有价格历史时波动率字段为 None。
+               候选市场按批次产出，顺序与输入不完全相同。
+    """
+    metrics = metrics or ScanMetrics()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    in_flight = []
+    batch = []
+
+    def fetch_history(result):
+        try:
+            t, p = get_price_history(result['token1'])
+            return (t, p) if len(t) else None
+        except Exception as e:
+            scanner_logger.warning(f"获取 {result['token1']} 的价格历史失败: {type(e).__name__}: {e}")
+            return None
+
+    def submit(batch):
+        futures = [loop.run_in_executor(executor, fetch_history, result) for result in batch]
+        in_flight.append((batch, asyncio.ensure_future(asyncio.gather(*futures))))
+
+    async def finish_oldest():
+        batch, future = in_flight.pop(0)
+        histories = await future
+        metrics.add('histories', len(batch))
+
+        start = time.time()
+        kept = [i for i, history in enumerate(histories) if history is not None]
+        stats = multi_horizon_volatility([histories[i] for i in kept])
+        volatility = [None] * len(batch)
+        for j, i in enumerate(kept):
+            volatility[i] = {name: values[j] for name, values in stats.items()}
+        metrics.add_time('volatility', time.time() - start)
+        return zip(batch, volatility)
+
+    try:
+        async for result in results:
+            if not is_candidate(result):
+                yield result, None
+                continue
+
+            batch.append(result)
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+            if len(in_flight) >= max_batches:
+                for item in await finish_oldest():
+                    yield item
+
+        if batch:
+            submit(batch)
+        while in_flight:
+            for item in await finish_oldest():
+                yield item
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def scan_all_with_volatility(client, is_candidate, metrics=None, **kwargs):
+    """
+    同步接口：扫描所有奖励市场，同时为候选市场计算波动率
+
+    参数:
+        is_candidate: 判断结果是否需要波动率的函数
+        其余参数与 scan_markets 相同
+
+    返回:
+        tuple: (结果列表, {condition_id: 波动率字段})，没有价格历史的候选市场不在字典中
+    """
+    metrics = metrics or ScanMetrics()
+
+    async def collect():
+        all_results, volatility = [], {}
+        stream = with_volatility(scan_markets(client, metrics=metrics, **kwargs), is_candidate, metrics=metrics)
+        async for result, stats in stream:
+            all_results.append(result)
+            if stats is not None:
+                volatility[result['condition_id']] = stats
+        return all_results, volatility
+
+    return asyncio.run(collect())
@@ -0,0 +1,99 @@
+"""
+价格历史存储 - 增量获取 prices-history 数据并保存在本地列式存储中
+
+每个 token 只请求上次保存之后的新数据点，历史在重启后保留。
+本地已有数据时，请求失败会退回使用本地数据。
+"""
+import os
+import time
+
+import numpy as np
+import requests
+
+from poly_data.logger import get_logger
+from poly_data.endpoints import CLOB_HOST
+from poly_utils.segment_store import SegmentStore
+
+# 创建价格历史日志记录器
+history_logger = get_logger('price_history', console_output=True)
+
+PRICES_HISTORY_URL = f'{CLOB_HOST}/prices-history'
+
+# 本地存储目录
+PRICE_HISTORY_DIR = os.getenv('PRICE_HISTORY_DIR', 'data/price_history')
+
+# 最长的波动率窗口为 30 天，多保留一天
+RETENTION_SECONDS = 31 * 24 * 3600
+
+# 数据点间隔（分钟）
+FIDELITY = 10
+
+_store = None
+
+
+def get_store():
+    """获取进程内共享的价格历史存储"""
+    global _store
+    if _store is None:
+        _store = SegmentStore(PRICE_HISTORY_DIR, columns=['p'], max_segments=24, retention=RETENTION_SECONDS)
+    return _store
+
+
+def fetch_prices(token, start_ts=None):
+    """
+    从 API 获取价格历史
+
+    参数:
+        token: token ID
+        start_ts: 起始时间戳；为 None 时获取最近一个月
+
+    返回:
+        tuple: (时间戳数组, 价格数组)
+    """
+    params = {'market': token, 'fidelity': FIDELITY}
+    if start_ts is None:
+        params['interval'] = '1m'
+    else:
+        params['startTs'] = int(start_ts)
+        params['endTs'] = int(time.time())
+
+    res = requests.get(PRICES_HISTORY_URL, params=params, timeout=10)
+    res.raise_for_status()
+    history = res.json()['history']
+
+    t = np.array([point['t'] for point in history], dtype=np.int64)
+    p = np.array([point['p'] for point in history], dtype=np.float64)
+    return t, p
+
+
+def get_price_history(token, window=RETENTION_SECONDS):
+    """
+    获取 token 的价格历史，先增量更新本地存储
+
+    参数:
+        token: token ID
+        window: 返回最近多长时间的数据（秒）
+
+    返回:
+        tuple: (时间戳数组, 价格数组)，按时间升序
+
+    异常:
+        本地没有数据且请求失败时抛出原始异常
+    """
+    store = get_store()
+    now = int(time.time())
+    last = store.last_timestamp(token)
+
+    # 本地数据已超出保留期时，重新获取完整的一个月
+    start_ts = last + 1 if last is not None and now - last < RETENTION_SECONDS else None
+
+    try:
+        t, p = fetch_prices(token, start_ts)
+        store.append(token, t, p=p)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        if last is None:
+            raise
+        history_logger.warning(f"获取 {token} 的价格历史失败，使用本地数据: {type(e).__name__}: {e}")
+
+    t, cols = store.read(token, since=now - window)
+    return t, cols['p']
@@ -0,0 +1,333 @@
+"""
+持续增量重新评分服务
+
+代替每小时一次的完整重建：服务常驻运行，只重新计算有变化或到期的市场。
+
+- 奖励市场列表（只分页，不取订单簿）每隔 sampling_interval 秒获取一次，与上一次对比，
+  新增市场和奖励参数（rates、min_size、max_spread、tick_size）变化的市场立即重新评分，
+  下架的市场直接移除
+- 每个市场有一个到期时间，放在按到期时间排序的优先队列中。奖励越高，到期间隔越短；
+  连续几次评分结果（SCORE_FIELDS：最优买卖价和奖励）不变的市场逐步延长间隔。
+  订单簿的活跃程度只通过评分结果体现：奖励区间之外的深度变化不影响发布的任何字段，
+  不会使间隔缩短
+- 每轮最多重新评分 max_books_per_round 个到期市场（订单簿通过扫描器批量获取），
+  最早到期（最陈旧）的市场优先
+- 波动率只为候选市场（已选择或奖励达到 maker_reward）计算，每个市场每 vol_interval 秒更新一次
+- 有变化时最多每 publish_interval 秒调用一次 publish 回调
+
+使用示例:
+    service = RescoringService(client, publish=publish_rescored, selected_questions=lambda: set())
+    service.run_forever()
+"""
+import json
+import time
+import heapq
+import traceback
+import concurrent.futures
+
+from poly_data.logger import get_logger
+from data_updater.market_scanner import scan_all_results, iter_sampling_markets, ScanMetrics
+from data_updater.price_history import get_price_history
+from data_updater.volatility import multi_horizon_volatility
+
+# 创建重新评分服务日志记录器
+rescoring_logger = get_logger('rescoring_service', console_output=True)
+
+# 到期间隔（秒）：基础间隔按奖励缩短，限制在最短和最长间隔之间
+BASE_INTERVAL = 60 * 60
+MIN_INTERVAL = 5 * 60
+MAX_INTERVAL = 4 * 60 * 60
+
+# 连续多少次评分不变后不再延长间隔（每次翻倍）
+MAX_QUIET_STEPS = 3
+
+# 评分失败的市场在这个时间后重试（秒）
+RETRY_INTERVAL = 60
+
+# 判断评分结果是否变化时比较的字段；奖励按奖励区间内的深度计算，区间内的订单簿变化会反映在奖励上
+SCORE_FIELDS = ('best_bid', 'best_ask', 'bid_reward_per_100', 'ask_reward_per_100', 'gm_reward_per_100',
+                'rewards_daily_rate')
+
+
+def reward_signature(row):
+    """市场的奖励参数，任一项变化时需要重新评分"""
+    return json.dumps([row.get('rewards'), row.get('minimum_tick_size'), row.get('neg_risk')],
+                      sort_keys=True, default=str)
+
+
+def score_signature(result):
+    return tuple(result.get(field) for field in SCORE_FIELDS)
+
+
+def rescore_interval(result, quiet_steps):
+    """
+    计算市场下一次重新评分的间隔（秒）
+
+    参数:
+        result: 最新评分结果
+        quiet_steps: 连续评分不变（score_signature 相同）的次数；只看评分结果，不单独跟踪订单簿变化
+    """
+    reward = max(float(result.get('gm_reward_per_100') or 0), 0)
+    interval = BASE_INTERVAL / (1 + reward) * 2 ** min(quiet_steps, MAX_QUIET_STEPS)
+    return min(max(interval, MIN_INTERVAL), MAX_INTERVAL)
+
+
+class RescoreQueue:
+    """
+    按到期时间排序的优先队列
+
+    重新安排市场时不删除旧条目，弹出时跳过与最新到期时间不符的条目。
+    """
+
+    def __init__(self):
+        self._heap = []
+        # {condition_id: 最新到期时间}
+        self._due = {}
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, condition_id):
+        return condition_id in self._due
+
+    def schedule(self, condition_id, due):
+        self._due[condition_id] = due
+        heapq.heappush(self._heap, (due, condition_id))
+
+    def remove(self, condition_id):
+        self._due.pop(condition_id, None)
+
+    def pop_due(self, now, limit=None):
+        """按到期时间从早到晚弹出已到期的市场，最多 limit 个"""
+        due = []
+        while self._heap and (limit is None or len(due) < limit):
+            when, condition_id = self._heap[0]
+            if when > now:
+                break
+            heapq.heappop(self._heap)
+            if self._due.get(condition_id) != when:
+                continue
+            del self._due[condition_id]
+            due.append(condition_id)
+
+        # 过期条目过多时重建堆
+        if len(self._heap) > 4 * len(self._due) + 1000:
+            self._heap = [(when, cid) for cid, when in self._due.items()]
+            heapq.heapify(self._heap)
+        return due
+
+
+class RescoringService:
+    """持续增量重新评分服务"""
+
+    def __init__(self, client, publish, selected_questions=None, maker_reward=0.75, round_seconds=30,
+                 sampling_interval=10 * 60, max_books_per_round=200, vol_interval=60 * 60,
+                 max_histories_per_round=100, publish_interval=5 * 60, history_workers=2):
+        """
+        参数:
+            client: CLOB客户端
+            publish: 发布回调 publish(all_results, volatility)，
+                     all_results 为评分结果列表，volatility 为 {condition_id: 波动率字段}
+            selected_questions: 返回当前已选择市场问题集合的函数
+            maker_reward: 候选市场的最低 gm_reward_per_100，与 get_markets 的参数一致
+            round_seconds: 每轮之间的间隔
+            sampling_interval: 获取奖励市场列表的间隔
+            max_books_per_round: 每轮最多重新评分的市场数（首次评分不受限制）
+            vol_interval: 每个市场波动率的更新间隔
+            max_histories_per_round: 每轮最多更新波动率的市场数（首次计算不受限制）
+            publish_interval: 两次发布之间的最短间隔
+            history_workers: 并行获取价格历史的线程数
+        """
+        self.client = client
+        self.publish = publish
+        self.selected_questions = selected_questions or set
+        self.maker_reward = maker_reward
+        self.round_seconds = round_seconds
+        self.sampling_interval = sampling_interval
+        self.max_books_per_round = max_books_per_round
+        self.vol_interval = vol_interval
+        self.max_histories_per_round = max_histories_per_round
+        self.publish_interval = publish_interval
+        self.history_workers = history_workers
+
+        # {condition_id: 奖励市场列表中的行}
+        self.rows = {}
+        self.signatures = {}
+        # {condition_id: 最新评分结果}
+        self.results = {}
+        self.quiet_steps = {}
+        # {condition_id: (波动率字段, 计算时间)}
+        self.volatility = {}
+        self.queue = RescoreQueue()
+
+        self.last_sampling = 0
+        self.last_publish = 0
+        self.dirty = False
+        self.api_calls = {'pages': 0, 'book_requests': 0, 'histories': 0}
+
+    def fetch_sampling_markets(self):
+        """获取全部奖励市场；任一页失败时抛出异常，不使用不完整的列表"""
+        metrics = ScanMetrics()
+        rows = list(iter_sampling_markets(self.client, metrics=metrics))
+        self.api_calls['pages'] += metrics.counters['pages']
+        return rows
+
+    def refresh_sampling(self, now):
+        """
+        与上一次的奖励市场列表对比，安排新增和参数变化的市场立即重新评分
+
+        返回:
+            tuple: (新增数, 下架数, 参数变化数)
+        """
+        rows = {row['condition_id']: row for row in self.fetch_sampling_markets()}
+        self.last_sampling = now
+
+        added = changed = 0
+        for condition_id, row in rows.items():
+            signature = reward_signature(row)
+            old = self.signatures.get(condition_id)
+            self.rows[condition_id] = row
+            self.signatures[condition_id] = signature
+            if old is None:
+                added += 1
+            elif old == signature:
+                continue
+            else:
+                changed += 1
+            self.quiet_steps[condition_id] = 0
+            self.queue.schedule(condition_id, now)
+
+        removed = [cid for cid in self.rows if cid not in rows]
+        for condition_id in removed:
+            for state in (self.rows, self.signatures, self.results, self.quiet_steps, self.volatility):
+                state.pop(condition_id, None)
+            self.queue.remove(condition_id)
+        if removed:
+            self.dirty = True
+
+        return added, len(removed), changed
+
+    def rescore_due(self, now):
+        """
+        重新评分已到期的市场
+
+        返回:
+            tuple: (评分的市场数, 结果有变化的市场数)
+        """
+        limit = self.max_books_per_round if self.results else None
+        due = self.queue.pop_due(now, limit)
+        if not due:
+            return 0, 0
+
+        metrics = ScanMetrics()
+        results = scan_all_results(self.client, rows=[self.rows[cid] for cid in due], metrics=metrics)
+        self.api_calls['book_requests'] += metrics.counters['book_requests']
+
+        changed = 0
+        scored = set()
+        for result in results:
+            condition_id = result['condition_id']
+            scored.add(condition_id)
+
+            old = self.results.get(condition_id)
+            if old is None or score_signature(old) != score_signature(result):
+                changed += 1
+                self.quiet_steps[condition_id] = 0
+            else:
+                self.quiet_steps[condition_id] = self.quiet_steps.get(condition_id, 0) + 1
+
+            self.results[condition_id] = result
+            self.queue.schedule(condition_id, now + rescore_interval(result, self.quiet_steps[condition_id]))
+
+        for condition_id in due:
+            if condition_id not in scored:
+                self.queue.schedule(condition_id, now + RETRY_INTERVAL)
+
+        if changed:
+            self.dirty = True
+        return len(results), changed
+
+    def _candidates(self):
+        """需要波动率的市场：已选择的，以及奖励达到 maker_reward 的"""
+        selected = self.selected_questions()
+        return [cid for cid, result in self.results.items()
+                if result['question'] in selected or (result.get('gm_reward_per_100') or 0) >= self.maker_reward]
+
+    def refresh_volatility(self, now):
+        """
+        更新候选市场中波动率已过期的部分，最久未更新的优先
+
+        返回:
+            int: 更新的市场数
+        """
+        stale = [cid for cid in self._candidates()
+                 if cid not in self.volatility or now - self.volatility[cid][1] >= self.vol_interval]
+        if not stale:
+            return 0
+
+        stale.sort(key=lambda cid: self.volatility[cid][1] if cid in self.volatility else 0)
+        if self.volatility:
+            stale = stale[:self.max_histories_per_round]
+
+        def fetch_history(condition_id):
+            try:
+                t, p = get_price_history(self.results[condition_id]['token1'])
+                return (t, p) if len(t) else None
+            except Exception as e:
+                rescoring_logger.warning(f"获取 {condition_id} 的价格历史失败: {type(e).__name__}: {e}")
+                return None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.history_workers) as executor:
+            histories = list(executor.map(fetch_history, stale))
+        self.api_calls['histories'] += len(stale)
+
+        kept = [(cid, history) for cid, history in zip(stale, histories) if history is not None]
+        stats = multi_horizon_volatility([history for _, history in kept])
+        for i, (condition_id, _) in enumerate(kept):
+            self.volatility[condition_id] = ({name: values[i] for name, values in stats.items()}, now)
+
+        if kept:
+            self.dirty = True
+        return len(kept)
+
+    def maybe_publish(self, now):
+        """有变化且距离上次发布足够久时调用发布回调"""
+        if not self.dirty or now - self.last_publish < self.publish_interval:
+            return False
+
+        volatility = {cid: stats for cid, (stats, _) in self.volatility.items()}
+        self.publish(list(self.results.values()), volatility)
+        self.last_publish = now
+        self.dirty = False
+        return True
+
+    def run_round(self, now=None):
+        """执行一轮：按需刷新市场列表，重新评分到期市场，更新波动率，按需发布"""
+        now = time.time() if now is None else now
+
+        if now - self.last_sampling >= self.sampling_interval:
+            try:
+                added, removed, changed = self.refresh_sampling(now)
+                rescoring_logger.info(f"奖励市场列表: {len(self.rows)} 个, 新增 {added}, 下架 {removed}, 参数变化 {changed}")
+            except Exception as e:
+                # 继续使用上一次的列表，稍后重试
+                self.last_sampling = now - self.sampling_interval + RETRY_INTERVAL
+                rescoring_logger.error(f"获取奖励市场列表失败: {type(e).__name__}: {e}")
+
+        scored, changed = self.rescore_due(now)
+        refreshed = self.refresh_volatility(now)
+        published = self.maybe_publish(now)
+
+        if scored or refreshed or published:
+            rescoring_logger.info(f"重新评分 {scored} 个（变化 {changed}），更新波动率 {refreshed} 个，"
+                                  f"{'已发布，' if published else ''}队列 {len(self.queue)} 个，"
+                                  f"累计请求 {self.api_calls}")
+
+    def run_forever(self):
+        while True:
+            try:
+                self.run_round()
+            except Exception as e:
+                rescoring_logger.error(f"重新评分出错: {type(e).__name__}: {e}")
+                rescoring_logger.debug(traceback.format_exc())
+            time.sleep(self.round_seconds)
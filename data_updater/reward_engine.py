@@ -0,0 +1,283 @@
+"""
+向量化奖励计算引擎
+
+将所有市场的候选价格阶梯展开为一个扁平数组，按 (市场, 买/卖方向) 分组，价格以整数tick表示，
+再用分组的 NumPy 运算一次计算 S、Q 和 reward_per_100。
+计算规则与 find_markets.process_single_row 一致（见 tests/test_reward_parity.py）。
+
+使用示例:
+    results = score_markets(rows, books)
+"""
+import numpy as np
+
+from poly_data.logger import get_logger
+from data_updater.find_markets import get_bid_ask_range, generate_numbers
+
+# 创建奖励引擎日志记录器
+engine_logger = get_logger('reward_engine', console_output=True)
+
+# 奖励以 USDC 计价
+USDC_ADDRESS = '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174'.lower()
+
+# 订单簿匹配键：价格按 1e-6 取整，每个分组占用 KEY_STRIDE 个键
+KEY_SCALE = 10 ** 6
+KEY_STRIDE = 10 ** 7
+
+REWARD_COLUMNS = ['bid_reward_per_100', 'ask_reward_per_100', 'sm_reward_per_100', 'gm_reward_per_100']
+
+EMPTY_LEVELS = np.empty((0, 2), dtype=float)
+
+
+def _level_value(level, key):
+    return level[key] if isinstance(level, dict) else getattr(level, key)
+
+
+def parse_levels(levels):
+    """
+    将订单簿一侧转换为 (n, 2) 的 [价格, 数量] 数组，保持原有顺序
+
+    与参考实现一致，无法解析的一侧视为空。
+    """
+    try:
+        parsed = [(float(_level_value(l, 'price')), float(_level_value(l, 'size'))) for l in levels or []]
+    except (TypeError, ValueError, KeyError, AttributeError):
+        return EMPTY_LEVELS
+    return np.array(parsed, dtype=float).reshape(-1, 2)
+
+
+def _ladder_start(start, tick_size):
+    """阶梯的第一个价格，与 generate_numbers 的起点计算完全相同"""
+    return (int(start * 100) + 1) / 100 if start * 100 % 1 != 0 else start + tick_size
+
+
+def _ladder_segment(start, end, tick_size):
+    """
+    描述一个市场一侧的价格阶梯
+
+    返回:
+        tuple: (first, base, step, scale, n)
+            第 0 个价格为 first，第 i 个价格为 (base + i * step) / scale，
+            n 是数量上限，超出 end 的部分由调用方截断
+        None: 起点不在 tick 精度的网格上（如 0.1 的 tick），需要退回 generate_numbers
+    """
+    first = _ladder_start(start, tick_size)
+    if not first < end:
+        return first, 0, 0, 1, 0
+
+    scale = 10 ** len(str(tick_size).split('.')[1])
+    base = round(first * scale)
+    step = round(tick_size * scale)
+    if abs(first * scale - base) > 1e-6 or step <= 0:
+        return None
+
+    return first, base, step, scale, int((end - first) / tick_size) + 2
+
+
+def _market_fields(row, book):
+    """
+    提取市场的基本字段和订单簿，与 process_single_row 的非奖励部分一致
+
+    返回:
+        tuple: (ret, tail, bids, asks, rate)，tail 是排在奖励字段之后的字段
+    """
+    ret = {}
+    ret['question'] = row['question']
+    ret['neg_risk'] = row['neg_risk']
+
+    ret['answer1'] = row['tokens'][0]['outcome']
+    ret['answer2'] = row['tokens'][1]['outcome']
+
+    ret['min_size'] = row['rewards']['min_size']
+    ret['max_spread'] = row['rewards']['max_spread']
+
+    rate = 0
+    for rate_info in row['rewards']['rates']:
+        if rate_info['asset_address'].lower() == USDC_ADDRESS:
+            rate = rate_info['rewards_daily_rate']
+            break
+    ret['rewards_daily_rate'] = rate
+
+    bids = parse_levels(book.bids)
+    asks = parse_levels(book.asks)
+
+    ret['best_bid'] = bids[-1, 0] if len(bids) else 0
+    ret['best_ask'] = asks[-1, 0] if len(asks) else 0
+    ret['midpoint'] = (ret['best_bid'] + ret['best_ask']) / 2
+    ret['tick_size'] = row['minimum_tick_size']
+
+    tail = {
+        'end_date_iso': row['end_date_iso'],
+        'market_slug': row['market_slug'],
+        'token1': row['tokens'][0]['token_id'],
+        'token2': row['tokens'][1]['token_id'],
+        'condition_id': row['condition_id'],
+    }
+    return ret, tail, bids, asks, rate
+
+
+def _build_ladders(ranges, tick_sizes):
+    """
+    将所有分组的价格阶梯展开为扁平数组
+
+    参数:
+        ranges: 每个分组的 (start, end)
+        tick_sizes: 每个分组的 tick 大小
+
+    返回:
+        tuple: (group, price)，按分组顺序排列，且只包含 price < end 的价格
+    """
+    segments, explicit = [], []
+    for g, ((start, end), tick_size) in enumerate(zip(ranges, tick_sizes)):
+        segment = _ladder_segment(start, end, tick_size)
+        if segment is None:
+            explicit.append((g, generate_numbers(start, end, tick_size)))
+        elif segment[4] > 0:
+            segments.append((g, end) + segment)
+
+    if segments:
+        g, end, first, base, step, scale, n = (np.array(col) for col in zip(*segments))
+        n = n.astype(np.int64)
+        offsets = np.repeat(np.cumsum(n) - n, n)
+        idx = np.arange(n.sum(), dtype=np.int64) - offsets
+
+        ticks = np.repeat(base.astype(np.int64), n) + idx * np.repeat(step.astype(np.int64), n)
+        price = ticks / np.repeat(scale.astype(np.int64), n)
+        price[idx == 0] = first
+        group = np.repeat(g, n)
+
+        keep = price < np.repeat(end, n)
+        group, price = group[keep], price[keep]
+    else:
+        group, price = np.empty(0, dtype=np.int64), np.empty(0, dtype=float)
+
+    if explicit:
+        group = np.concatenate([group] + [np.full(len(p), g, dtype=np.int64) for g, p in explicit])
+        price = np.concatenate([price] + [np.asarray(p, dtype=float) for _, p in explicit])
+        order = np.argsort(group, kind='stable')
+        group, price = group[order], price[order]
+
+    return group, price
+
+
+def _match_sizes(group, price, book_group, book_levels):
+    """
+    查找每个阶梯价格在订单簿中的数量，没有挂单的价格数量为 0
+
+    与参考实现的 merge 一致，只匹配完全相等的价格；假设同一侧每个价格只有一档。
+    """
+    size = np.zeros(len(price))
+    if len(book_levels) == 0 or len(price) == 0:
+        return size
+
+    book_keys = book_group * KEY_STRIDE + np.rint(book_levels[:, 0] * KEY_SCALE).astype(np.int64)
+    order = np.argsort(book_keys, kind='stable')
+    book_keys, book_levels = book_keys[order], book_levels[order]
+
+    keys = group * KEY_STRIDE + np.rint(price * KEY_SCALE).astype(np.int64)
+    pos = np.minimum(np.searchsorted(book_keys, keys), len(book_keys) - 1)
+    matched = (book_keys[pos] == keys) & (book_levels[pos, 0] == price)
+    size[matched] = book_levels[pos[matched], 1]
+    return size
+
+
+def _group_rewards(n_groups, group, price, size, midpoint, v, rate):
+    """
+    按分组计算最大 reward_per_100，与 add_formula_params 的公式相同
+
+    参数 midpoint、v、rate 按分组给出。没有阶梯价格的分组返回 NaN。
+    """
+    best = np.full(n_groups, np.nan)
+    if len(price) == 0:
+        return best
+
+    mid, v, rate = midpoint[group], v[group], rate[group]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.abs(price - mid)
+        S = ((v - s) / v) ** 2
+        per_100 = 1 / price * 100
+
+        size = size + per_100
+        Q = S * size
+
+        # 分组在扁平数组中是连续的
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        groups = group[starts]
+        # 与 pandas 的 sum 一致，忽略 NaN
+        Q_sum = np.add.reduceat(np.where(np.isnan(Q), 0, Q), starts)
+        Q_total = np.repeat(Q_sum, np.diff(np.r_[starts, len(Q)]))
+
+        reward = (Q / Q_total) * rate / 2 / size * per_100
+        # 与 pandas 的 max 一致，忽略 NaN
+        best[groups] = np.fmax.reduceat(reward, starts)
+
+    return best
+
+
+def score_markets(rows, books):
+    """
+    一次性计算一批市场的奖励指标
+
+    参数:
+        rows: get_sampling_markets 返回的市场数据列表
+        books: 与 rows 对应的 token1 订单簿列表，缺失的订单簿为 None
+
+    返回:
+        list: 与 process_single_row 格式相同的结果字典；无法处理的市场为 None
+    """
+    results = [None] * len(rows)
+    markets = []
+
+    for i, (row, book) in enumerate(zip(rows, books)):
+        if book is None:
+            continue
+        try:
+            ret, tail, bids, asks, rate = _market_fields(row, book)
+            bid_from, bid_to, ask_from, ask_to = get_bid_ask_range(ret, ret['tick_size'])
+            v = round((ret['max_spread'] / 100), 2)
+            # 确认 tick 大小可以解析，与参考实现在生成阶梯时抛出的异常一致
+            len(str(ret['tick_size']).split('.')[1])
+        except Exception as e:
+            engine_logger.warning(f"处理市场 {row.get('question', '')} 时出错: {type(e).__name__}: {e}")
+            continue
+        markets.append((i, ret, tail, bids, asks, rate, (bid_from, bid_to), (ask_from, ask_to), v))
+
+    if not markets:
+        return results
+
+    # 分组编号: 2 * k 为第 k 个市场的买方，2 * k + 1 为卖方
+    n_groups = 2 * len(markets)
+    ranges, tick_sizes, sides = [], [], []
+    for _, ret, _, bids, asks, _, bid_range, ask_range, _ in markets:
+        ranges += [bid_range, ask_range]
+        tick_sizes += [ret['tick_size'], ret['tick_size']]
+        sides += [bids, asks]
+
+    group, price = _build_ladders(ranges, tick_sizes)
+
+    book_group = np.repeat(np.arange(n_groups, dtype=np.int64), [len(levels) for levels in sides])
+    book_levels = np.concatenate(sides) if len(book_group) else EMPTY_LEVELS
+    size = _match_sizes(group, price, book_group, book_levels)
+
+    midpoint = np.repeat([m[1]['midpoint'] for m in markets], 2).astype(float)
+    v = np.repeat([m[8] for m in markets], 2).astype(float)
+    rate = np.repeat([m[5] for m in markets], 2).astype(float)
+    best = _group_rewards(n_groups, group, price, size, midpoint, v, rate)
+
+    # 参考实现中，空订单簿在 merge 时出错，奖励记为 0；空阶梯的最大值为 NaN
+    has_book = np.array([len(levels) > 0 for levels in sides])
+    best = np.where(has_book, np.round(best, 2), 0.0)
+
+    bid_reward, ask_reward = best[0::2], best[1::2]
+    sm_reward = np.round((bid_reward + ask_reward) / 2, 2)
+    with np.errstate(invalid='ignore'):
+        gm_reward = np.round((bid_reward * ask_reward) ** 0.5, 2)
+
+    for k, (i, ret, tail, *_) in enumerate(markets):
+        ret['bid_reward_per_100'] = float(bid_reward[k])
+        ret['ask_reward_per_100'] = float(ask_reward[k])
+        ret['sm_reward_per_100'] = float(sm_reward[k])
+        ret['gm_reward_per_100'] = float(gm_reward[k])
+        ret.update(tail)
+        results[i] = ret
+
+    return results
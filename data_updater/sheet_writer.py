@@ -0,0 +1,216 @@
+"""
+差异化表格写入 - 只把变化的单元格写回工作表
+
+记住每个工作表上一次写入的内容，下次写入时只发送变化的区域，所有区域通过一次
+batch_update 请求发送。与 set_with_dataframe(resize=True) 一样，工作表网格调整为数据的大小，
+数据变少时多出的行列随网格一起删除，不会在表尾留下旧数据或空行。
+每个工作表只在进程内第一次写入时读取一次现有内容。
+
+SheetPublisher 在后台线程中调用 DiffSheetWriter，调用方不等待表格 API。
+"""
+import threading
+import traceback
+
+import pandas as pd
+
+from poly_data.logger import get_logger
+
+# 创建表格写入日志记录器
+writer_logger = get_logger('sheet_writer', console_output=True)
+
+
+def cell_repr(value):
+    """将值转换为单元格文本，与 gspread_dataframe 的 set_with_dataframe 一致"""
+    if pd.isnull(value) is True:
+        return ''
+    if hasattr(value, 'item'):
+        # numpy 标量转换为 Python 类型
+        value = value.item()
+
+    value = repr(value) if isinstance(value, float) else str(value)
+    if value.startswith("'"):
+        value = "'" + value
+    return value
+
+
+def frame_to_matrix(df):
+    """将 DataFrame 转换为包含表头的二维文本列表"""
+    header = [cell_repr(col) for col in df.columns]
+    rows = [[cell_repr(value) for value in row] for row in df.itertuples(index=False, name=None)]
+    return [header] + rows
+
+
+def _column_letter(col):
+    """将从 1 开始的列号转换为 A1 表示法中的列字母"""
+    letters = ''
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _a1_range(row_start, col_start, row_end, col_end):
+    """从 0 开始的闭区间行列号转换为 A1 范围"""
+    return f"{_column_letter(col_start + 1)}{row_start + 1}:{_column_letter(col_end + 1)}{row_end + 1}"
+
+
+def diff_ranges(old, new):
+    """
+    计算从 old 到 new 需要写入的区域
+
+    两个矩阵都按较大的尺寸用空字符串补齐后比较，因此 new 中不再存在的单元格会被清空。
+    每行的变化合并为一个连续区间，相邻且区间相同的行再合并为一个矩形区域。
+
+    返回:
+        list: [{'range': 'A1:C2', 'values': [[...], ...]}, ...]
+    """
+    n_rows = max(len(old), len(new))
+    n_cols = max([len(r) for r in old] + [len(r) for r in new] + [0])
+
+    def cell(matrix, r, c):
+        if r < len(matrix) and c < len(matrix[r]):
+            return matrix[r][c]
+        return ''
+
+    spans = []
+    for r in range(n_rows):
+        old_row = old[r] if r < len(old) else []
+        new_row = new[r] if r < len(new) else []
+        if old_row == new_row:
+            continue
+        changed = [c for c in range(n_cols) if cell(old, r, c) != cell(new, r, c)]
+        if changed:
+            spans.append((r, changed[0], changed[-1]))
+
+    updates = []
+    i = 0
+    while i < len(spans):
+        row_start, col_start, col_end = spans[i]
+        row_end = row_start
+        while i + 1 < len(spans) and spans[i + 1] == (row_end + 1, col_start, col_end):
+            i += 1
+            row_end += 1
+        values = [[cell(new, r, c) for c in range(col_start, col_end + 1)] for r in range(row_start, row_end + 1)]
+        updates.append({'range': _a1_range(row_start, col_start, row_end, col_end), 'values': values})
+        i += 1
+
+    return updates
+
+
+class DiffSheetWriter:
+    """
+    记住上一次写入内容的工作表写入器
+
+    使用示例:
+        writer = DiffSheetWriter()
+        writer.write(worksheet, df)
+    """
+
+    def __init__(self):
+        # {worksheet.id: 上一次写入后的单元格矩阵}
+        self._last = {}
+
+    def invalidate(self, worksheet=None):
+        """丢弃缓存的工作表内容，下次写入时重新读取"""
+        if worksheet is None:
+            self._last.clear()
+        else:
+            self._last.pop(worksheet.id, None)
+
+    def _baseline(self, worksheet):
+        if worksheet.id not in self._last:
+            self._last[worksheet.id] = worksheet.get_all_values()
+        return self._last[worksheet.id]
+
+    def write(self, worksheet, df):
+        """
+        将 DataFrame（含表头）写入工作表，只发送变化的单元格
+
+        返回:
+            int: 写入的单元格数量
+        """
+        new = frame_to_matrix(df)
+        # 表格 API 不允许 0 列的网格
+        n_rows, n_cols = len(new), max(len(new[0]), 1)
+        # 网格之外的单元格在调整大小时删除，只需比较保留下来的区域
+        old = [row[:n_cols] for row in self._baseline(worksheet)[:n_rows]]
+        updates = diff_ranges(old, new)
+        resize = (worksheet.row_count, worksheet.col_count) != (n_rows, n_cols)
+
+        if not updates and not resize:
+            writer_logger.info(f"{worksheet.title}: 没有变化")
+            return 0
+
+        try:
+            if resize:
+                worksheet.resize(rows=n_rows, cols=n_cols)
+            if updates:
+                worksheet.batch_update(updates, value_input_option='USER_ENTERED')
+        except Exception:
+            # 写入结果未知，下次重新读取
+            self.invalidate(worksheet)
+            raise
+
+        self._last[worksheet.id] = new
+        cells = sum(len(u['values']) * len(u['values'][0]) for u in updates)
+        size = f", 调整为 {n_rows} 行 {n_cols} 列" if resize else ''
+        writer_logger.info(f"{worksheet.title}: 写入 {len(updates)} 个区域, {cells} 个单元格{size}")
+        return cells
+
+
+class SheetPublisher:
+    """
+    在后台线程中把 DataFrame 发布到工作表
+
+    每个工作表只保留最新一次提交的数据，写入较慢时中间版本会被跳过。
+    写入失败只记录日志，下一次提交时重试。
+
+    使用示例:
+        publisher = SheetPublisher()
+        publisher.publish(worksheet, df)
+        publisher.flush(timeout=60)
+    """
+
+    def __init__(self, writer=None):
+        self.writer = writer or DiffSheetWriter()
+        # {worksheet.id: (worksheet, df)}
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._busy = False
+        self._thread = None
+
+    def publish(self, worksheet, df):
+        """提交一个工作表的最新数据，立即返回"""
+        with self._cond:
+            self._pending[worksheet.id] = (worksheet, df.copy())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='sheet-publisher', daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """
+        等待已提交的数据写完
+
+        返回:
+            bool: 超时前是否全部写完
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending)
+                _, (worksheet, df) = self._pending.popitem()
+                self._busy = True
+
+            try:
+                self.writer.write(worksheet, df)
+            except Exception as e:
+                writer_logger.error(f"{worksheet.title}: 写入失败: {type(e).__name__}: {e}")
+                writer_logger.debug(traceback.format_exc())
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
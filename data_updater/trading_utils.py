@@ -3,9 +3,6 @@ from py_clob_client.client import ClobClient
 from py_clob_client.clob_types import OrderArgs, BalanceAllowanceParams, AssetType
 from py_clob_client.order_builder.constants import BUY
 
-from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware
-
 import json
 
 from dotenv import load_dotenv
@@ -15,10 +12,12 @@ import time
 
 import os
 
+from poly_data.endpoints import CLOB_HOST, POLYGON_RPC_URL
+
 MAX_INT = 2**256 - 1
 
 def get_clob_client():
-    host = "https://clob.polymarket.com"
+    host = CLOB_HOST
     key = os.getenv("PK")
     chain_id = POLYGON
 
@@ -40,7 +39,10 @@ def get_clob_client():
 
 
 def approveContracts():
-    web3 = Web3(Web3.HTTPProvider("https://polygon-rpc.com"))
+    from web3 import Web3
+    from web3.middleware import ExtraDataToPOAMiddleware
+
+    web3 = Web3(Web3.HTTPProvider(POLYGON_RPC_URL))
     web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
     wallet = web3.eth.account.from_key(os.getenv("PK"))
 
@@ -0,0 +1,114 @@
+"""
+多时间窗口波动率计算
+
+所有窗口都以最后一个数据点为终点，因此对按时间排序的收益率序列做一次前缀和
+（收益率和收益率平方），每个窗口的标准差只需两次查表。多个市场的序列拼接为一个
+扁平数组一起计算。结果与 find_markets.calculate_annualized_volatility 一致
+（见 tests/test_volatility_parity.py）。
+
+使用示例:
+    stats = multi_horizon_volatility([(t1, p1), (t2, p2)])
+"""
+import numpy as np
+
+# 输出列名及对应的窗口长度（小时），与 add_volatility 的结果字段相同
+HORIZONS = {
+    '1_hour': 1,
+    '3_hour': 3,
+    '6_hour': 6,
+    '12_hour': 12,
+    '24_hour': 24,
+    '7_day': 24 * 7,
+    '14_day': 24 * 14,
+    '30_day': 24 * 30,
+}
+
+# 分钟级收益率年化系数
+ANNUALIZATION = np.sqrt(60 * 24 * 252)
+
+# 拼接多个市场时，每个市场的时间戳偏移量（秒），需大于任何时间戳
+_MARKET_STRIDE = 10 ** 10
+
+
+def multi_horizon_volatility(series, horizons=HORIZONS):
+    """
+    批量计算多个市场在各时间窗口的年化波动率
+
+    参数:
+        series: [(时间戳数组, 价格数组), ...]，每个序列按时间升序，时间戳单位为秒
+        horizons: {列名: 窗口小时数}
+
+    返回:
+        dict: {列名: 波动率数组, 'volatility_price': 最新价格数组}，数组顺序与 series 相同。
+              与 pandas 的 std 一致，有效收益率少于 2 个或包含无穷值时为 NaN。
+    """
+    n_markets = len(series)
+    result = {name: np.full(n_markets, np.nan) for name in horizons}
+    result['volatility_price'] = np.full(n_markets, np.nan)
+    if n_markets == 0:
+        return result
+
+    lengths = np.array([len(t) for t, _ in series], dtype=np.int64)
+    market = np.repeat(np.arange(n_markets, dtype=np.int64), lengths)
+    t = np.concatenate([np.asarray(t, dtype=np.int64) for t, _ in series]) if lengths.sum() else np.empty(0, np.int64)
+    p = np.concatenate([np.asarray(p, dtype=np.float64) for _, p in series]) if lengths.sum() else np.empty(0)
+    p = np.round(p, 2)
+
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    has_data = lengths > 0
+    result['volatility_price'][has_data] = p[ends[has_data] - 1]
+
+    # 对数收益率，每个市场的第一个点没有收益率
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.empty(len(p))
+        r[1:] = np.log(p[1:] / p[:-1])
+    r[starts[has_data]] = np.nan
+
+    valid = ~np.isnan(r)
+    infinite = np.isinf(r)
+    finite = valid & ~infinite
+
+    # 先减去每个市场的平均收益率，减小平方和相减时的精度损失
+    counts = np.bincount(market[finite], minlength=n_markets)
+    sums = np.bincount(market[finite], weights=r[finite], minlength=n_markets)
+    with np.errstate(invalid='ignore'):
+        shift = np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+    x = np.where(finite, r - shift[market], 0.0)
+
+    prefix_n = np.r_[0, np.cumsum(finite)]
+    prefix_inf = np.r_[0, np.cumsum(infinite)]
+    prefix_s1 = np.r_[0.0, np.cumsum(x)]
+    prefix_s2 = np.r_[0.0, np.cumsum(x * x)]
+
+    keys = market * _MARKET_STRIDE + t
+    end_t = np.where(has_data, t[np.maximum(ends - 1, 0)] if len(t) else 0, 0)
+
+    for name, hours in horizons.items():
+        # 窗口包含时间戳 >= 终点 - hours 的所有点
+        targets = np.arange(n_markets, dtype=np.int64) * _MARKET_STRIDE + end_t - int(hours * 3600)
+        lo = np.searchsorted(keys, targets, side='left')
+
+        n = prefix_n[ends] - prefix_n[lo]
+        s1 = prefix_s1[ends] - prefix_s1[lo]
+        s2 = prefix_s2[ends] - prefix_s2[lo]
+        n_inf = prefix_inf[ends] - prefix_inf[lo]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            var = np.maximum(s2 - s1 * s1 / n, 0.0) / (n - 1)
+        vol = np.sqrt(var) * ANNUALIZATION
+        vol[(n < 2) | (n_inf > 0) | ~has_data] = np.nan
+        result[name] = np.round(vol, 2)
+
+    return result
+
+
+def volatility_stats(t, p):
+    """
+    计算单个市场的波动率字段
+
+    返回:
+        dict: 与 add_volatility 添加的字段相同
+    """
+    batch = multi_horizon_volatility([(t, p)])
+    return {name: batch[name][0] for name in list(HORIZONS) + ['volatility_price']}
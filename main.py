@@ -3,12 +3,16 @@ import time                    # 时间函数
 import asyncio                 # 异步I/O
 import traceback               # 异常处理
 import threading               # 线程管理
+import os                      # 环境变量
+import argparse                # 命令行参数
+import signal                  # 信号处理
+import sys                     # 退出
 
-from poly_data.polymarket_client import PolymarketClient
-from poly_data.data_utils import update_markets, update_positions, update_orders
-from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket
+# 交易客户端（py_clob_client、eth_account）和依赖 pandas 的数据模块导入较慢，在使用它们的函数中才导入，
+# 分片运行时协调进程和只导入 remove_from_pending 等函数的工作进程不需要为此付出导入时间
 import poly_data.global_state as global_state
-from poly_data.data_processing import remove_from_performing
+from poly_data.network_utils import get_breaker_metrics
+from poly_data.risk_limits import refresh_limits
 from poly_data.logger import get_logger
 from dotenv import load_dotenv
 
@@ -21,10 +25,11 @@ def update_once():
     """
     通过获取市场数据、持仓和订单来初始化应用程序状态
     """
+    from poly_data.bootstrap import fetch_initial_state
+
     main_logger.info("开始初始化应用程序状态...")
-    update_markets()    # 从Google Sheets获取市场信息
-    update_positions()  # 从Polymarket获取当前持仓
-    update_orders()     # 从Polymarket获取当前订单
+    # 并行从Google Sheets获取市场信息、从Polymarket获取当前持仓和订单
+    fetch_initial_state().report("初始化")
     main_logger.info("应用程序状态初始化完成")
 
 def remove_from_pending():
@@ -32,6 +37,8 @@ def remove_from_pending():
     清理挂起时间过长的陈旧交易（>15秒）
     这可以防止系统卡在可能已失败的交易上
     """
+    from poly_data.data_processing import remove_from_performing
+
     try:
         current_time = time.time()
 
@@ -52,13 +59,73 @@ def remove_from_pending():
         main_logger.error(f"remove_from_pending 错误: {str(e)}")
         main_logger.exception("详细错误信息", e)
 
+def log_breaker_metrics():
+    """
+    输出非正常状态的熔断器指标，便于在API故障期间观察
+    """
+    for endpoint, metrics in get_breaker_metrics().items():
+        if metrics['state'] != 'closed':
+            main_logger.warning(f"熔断器 {endpoint}: {metrics}")
+
+def save_state_snapshot():
+    """
+    保存状态快照供下次重启热启动使用，失败不影响交易
+    """
+    from poly_data.snapshot import save_snapshot
+
+    try:
+        save_snapshot()
+    except Exception as e:
+        main_logger.warning(f"保存状态快照失败: {e}")
+
+def publish_live_books():
+    """
+    发布实时订单簿供 data_updater 使用，失败不影响交易
+    """
+    from poly_data.book_feed import publish_books
+
+    try:
+        publish_books()
+    except Exception as e:
+        main_logger.warning(f"发布实时订单簿失败: {e}")
+
+def record_pnl_snapshot():
+    """
+    记录持仓、标记价格和挂单快照，失败不影响交易
+    """
+    from poly_data.pnl_history import get_recorder
+
+    try:
+        get_recorder().snapshot()
+    except Exception as e:
+        main_logger.warning(f"记录PnL快照失败: {e}")
+
+def update_markets_periodically():
+    """
+    后台线程函数，每30秒检查一次市场配置
+
+    表格请求较慢且有速率限制，放在独立线程中，避免拖慢持仓和订单的轮询。
+    """
+    from poly_data.data_utils import update_markets
+
+    while True:
+        time.sleep(30)
+
+        try:
+            update_markets()
+        except Exception as e:
+            main_logger.error(f"update_markets_periodically 错误: {str(e)}")
+            main_logger.error(traceback.format_exc())
+
 def update_periodically():
     """
-    后台线程函数，定期更新市场数据、持仓和订单
-    - 持仓和订单每5秒更新一次
-    - 市场数据每30秒更新一次（每6个周期）
-    - 每个周期都会移除陈旧的挂起交易
+    后台线程函数，定期更新持仓和订单
+    - 持仓、订单和风险额度每5秒更新一次
+    - 每30秒（每6个周期）输出熔断器状态，保存状态快照并记录PnL快照
+    - 每个周期都会移除陈旧的挂起交易并发布实时订单簿
     """
+    from poly_data.data_utils import update_positions, update_orders
+
     i = 1
     while True:
         time.sleep(5)  # 每5秒更新一次
@@ -70,10 +137,15 @@ def update_periodically():
             # 每个周期更新持仓和订单
             update_positions(avgOnly=True)  # 只更新平均价格，不更新持仓数量
             update_orders()
+            refresh_limits()
+
+            publish_live_books()
 
-            # 每第6个周期更新市场数据（30秒）
+            # 每第6个周期（30秒）
             if i % 6 == 0:
-                update_markets()
+                log_breaker_metrics()
+                save_state_snapshot()
+                record_pnl_snapshot()
                 i = 1
 
             gc.collect()  # 强制垃圾回收以释放内存
@@ -86,12 +158,16 @@ async def main():
     """
     主应用程序入口点。初始化客户端、数据并管理websocket连接
     """
-    # 初始化客户端
-    global_state.client = PolymarketClient()
+    from poly_data.polymarket_client import PolymarketClient
+    from poly_data.bootstrap import bootstrap
+    from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket
 
-    # 初始化状态并获取初始数据
+    # 初始化客户端和状态；开启 WARM_START 且有新鲜快照时先从快照热启动，再在后台校正。
+    # 热启动后在校正完成前会按快照中的持仓和订单报价，因此默认关闭
     global_state.all_tokens = []
-    update_once()
+    warm_start = os.getenv('WARM_START', 'false').lower() in ('1', 'true', 'yes')
+    bootstrap(PolymarketClient, use_snapshot=warm_start)
+    refresh_limits()
     main_logger.info(f"初始更新后 - 订单: {len(global_state.orders)}, 持仓: {len(global_state.positions)}")
     main_logger.info(f"共有 {len(global_state.df)} 个市场, {len(global_state.positions)} 个持仓和 {len(global_state.orders)} 个订单")
     main_logger.debug(f"起始持仓详情: {global_state.positions}")
@@ -100,6 +176,9 @@ async def main():
     update_thread = threading.Thread(target=update_periodically, daemon=True)
     update_thread.start()
 
+    markets_thread = threading.Thread(target=update_markets_periodically, daemon=True)
+    markets_thread.start()
+
     # 主循环 - 维护websocket连接
     while True:
         try:
@@ -116,5 +195,23 @@ async def main():
         await asyncio.sleep(1)
         gc.collect()  # 清理内存
 
+def exit_on_signal(signum, frame):
+    """把 SIGTERM 和 SIGHUP（stop.sh 关闭 screen 会话）转换为正常退出，退出前写入PnL快照并停止工作进程"""
+    main_logger.info(f"收到信号 {signum}，正在退出")
+    sys.exit(0)
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    for name in ('SIGTERM', 'SIGHUP'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), exit_on_signal)
+
+    parser = argparse.ArgumentParser(description='Polymarket 做市机器人')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('TRADING_WORKERS', '1')),
+                        help='交易工作进程数：1 为单进程运行，大于 1 时按市场分片到多个进程，0 为每个 CPU 核心一个')
+    args = parser.parse_args()
+
+    if args.workers == 1:
+        asyncio.run(main())
+    else:
+        from poly_data.supervisor import Supervisor
+        Supervisor(args.workers).run()
\ No newline at end of file
@@ -0,0 +1,278 @@
+"""
+共享余额服务 - 查询 USDC 余额、持仓价值和持仓列表，不需要 API 凭证
+
+- USDC 余额通过 JSON-RPC eth_call 直接查询合约的 balanceOf，不创建 Web3 连接和合约对象
+- 持仓价值和持仓列表来自公开的 data-api，只需要钱包地址
+- 结果按字段分别带时间戳保存在 BALANCE_CACHE_PATH，同一台机器上的交易进程、
+  update_markets、AI 选择器和统计任务共享；未超过 BALANCE_TTL 秒时直接读取文件，不访问网络
+- 多个进程同时过期时通过获取锁（.fetch.lock）只让一个进程获取，其余进程读取它的结果
+- 写文件锁（.lock）只在读取-合并-写回期间持有，不包括网络请求
+- 交易进程获取持仓后（data_utils.update_positions 和分片协调进程）显式调用 publish_positions，
+  其他进程因此总能读到较新的持仓；写文件锁被占用时跳过本次发布，交易进程不会等待
+
+文件格式:
+    {"wallet": 地址,
+     "usdc": {"value": 余额, "fetched_at": 时间戳},
+     "position_value": {"value": 持仓价值, "fetched_at": 时间戳},
+     "positions": {"value": [data-api 持仓记录, ...], "fetched_at": 时间戳}}
+
+使用示例:
+    service = get_balance_service()
+    total = service.get_total_balance()      # USDC + 持仓价值
+    positions = service.get_positions()      # DataFrame，与 PolymarketClient.get_all_positions 相同
+"""
+import os
+import json
+import time
+import threading
+
+import pandas as pd
+import requests
+
+from poly_data.network_utils import retry_on_network_error
+from poly_data.logger import get_logger
+from poly_data.endpoints import DATA_API_URL, POLYGON_RPC_URL
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX 系统不加锁，最多重复获取一次
+    fcntl = None
+
+# 创建余额服务日志记录器
+balance_logger = get_logger('balance_service', console_output=False)
+
+# 共享文件路径
+BALANCE_CACHE_PATH = os.getenv('BALANCE_CACHE_PATH', 'data/balances.json')
+
+# 缓存的有效期（秒）
+BALANCE_TTL = float(os.getenv('BALANCE_TTL', '60'))
+
+# Polygon 上的 USDC.e 合约（与 PolymarketClient 的 collateral 相同）
+USDC_ADDRESS = '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174'
+
+# ERC20 balanceOf(address) 的函数选择器
+BALANCE_OF_SELECTOR = '0x70a08231'
+
+# 交易进程发布持仓的最短间隔（秒），避免每次轮询都写文件
+PUBLISH_INTERVAL = 10
+
+
+class BalanceService:
+    """以共享文件为缓存的余额和持仓查询"""
+
+    def __init__(self, wallet=None, path=BALANCE_CACHE_PATH, ttl=BALANCE_TTL, rpc_url=POLYGON_RPC_URL):
+        """
+        参数:
+            wallet: 钱包地址；默认读取 BROWSER_ADDRESS
+            path: 共享文件路径
+            ttl: 缓存的有效期（秒）
+            rpc_url: Polygon RPC 节点
+        """
+        self.wallet = wallet or os.getenv('BROWSER_ADDRESS')
+        self.path = path
+        self.ttl = ttl
+        self.rpc_url = rpc_url
+        self.session = requests.Session()
+        self._lock = threading.Lock()        # 写文件
+        self._fetch_lock = threading.Lock()  # 获取
+        # 上一次读取的文件内容和修改时间，文件未变化时不重新解析
+        self._data = {}
+        self._mtime = None
+
+    def _read(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return {}
+        # 文件通过 os.replace 整体替换，inode 和修改时间任一变化都需要重新读取
+        mtime = (stat.st_ino, stat.st_mtime_ns)
+        if mtime != self._mtime:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                balance_logger.warning(f"读取余额缓存失败: {e}")
+                return {}
+            # 换了钱包时不使用旧数据
+            self._data = data if str(data.get('wallet', '')).lower() == str(self.wallet).lower() else {}
+            self._mtime = mtime
+        return self._data
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _locked(self, suffix='.lock', blocking=True):
+        """
+        进程间的互斥
+
+        返回:
+            需要关闭的锁文件；blocking=False 且锁被占用时返回 None
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lock_file = open(self.path + suffix, 'a')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return None
+        return lock_file
+
+    def _store(self, field, value, blocking=True):
+        """
+        读取最新文件，只替换一个字段后写回；只在此期间持有写文件锁
+
+        返回:
+            bool: 是否已写入（blocking=False 且锁被占用时为 False）
+        """
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            lock_file = self._locked(blocking=blocking)
+            if lock_file is None:
+                return False
+            try:
+                data = dict(self._read())
+                data['wallet'] = self.wallet
+                data[field] = {'value': value, 'fetched_at': time.time()}
+                self._write(data)
+                return True
+            finally:
+                lock_file.close()
+        finally:
+            self._lock.release()
+
+    def _fresh(self, field, max_age):
+        entry = self._read().get(field)
+        if entry is not None and time.time() - entry['fetched_at'] <= max_age:
+            return entry
+        return None
+
+    def _get(self, field, fetch, max_age=None):
+        """
+        读取字段，过期时获取一次并写回共享文件
+
+        获取失败时如果有旧值则返回旧值，否则抛出异常。
+        网络请求期间只持有获取锁，写文件锁只在写回时持有。
+        """
+        max_age = self.ttl if max_age is None else max_age
+        entry = self._fresh(field, max_age)
+        if entry is not None:
+            return entry['value']
+
+        with self._fetch_lock:
+            fetch_lock = self._locked('.fetch.lock')
+            try:
+                # 等锁期间其他进程可能已经获取
+                entry = self._fresh(field, max_age)
+                if entry is not None:
+                    return entry['value']
+
+                try:
+                    value = fetch()
+                except Exception as e:
+                    stale = self._read().get(field)
+                    if stale is None:
+                        raise
+                    balance_logger.warning(f"获取 {field} 失败，使用 {time.time() - stale['fetched_at']:.0f} 秒前的值: "
+                                           f"{type(e).__name__}: {e}")
+                    return stale['value']
+
+                self._store(field, value)
+                return value
+            finally:
+                fetch_lock.close()
+
+    @retry_on_network_error(max_retries=3, delay=2, endpoint='polygon-rpc')
+    def fetch_usdc_balance(self):
+        """通过 eth_call 查询 USDC 余额"""
+        call_data = BALANCE_OF_SELECTOR + self.wallet.lower().replace('0x', '').rjust(64, '0')
+        payload = {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_call',
+                   'params': [{'to': USDC_ADDRESS, 'data': call_data}, 'latest']}
+        res = self.session.post(self.rpc_url, json=payload, timeout=10)
+        res.raise_for_status()
+        body = res.json()
+        if 'error' in body:
+            raise ValueError(f"eth_call 失败: {body['error']}")
+        return int(body['result'], 16) / 10**6
+
+    @retry_on_network_error(max_retries=3, delay=2, endpoint='data-api')
+    def fetch_position_value(self):
+        res = self.session.get(f'{DATA_API_URL}/value', params={'user': self.wallet}, timeout=10)
+        res.raise_for_status()
+        data = res.json()
+        # API 返回的是列表，取第一个元素的 value 字段
+        if isinstance(data, list) and len(data) > 0:
+            return float(data[0]['value'])
+        return 0.0
+
+    @retry_on_network_error(max_retries=2, delay=1, endpoint='data-api')
+    def fetch_positions(self):
+        res = self.session.get(f'{DATA_API_URL}/positions', params={'user': self.wallet}, timeout=10)
+        res.raise_for_status()
+        return res.json()
+
+    def get_usdc_balance(self, max_age=None):
+        """USDC 余额"""
+        return self._get('usdc', self.fetch_usdc_balance, max_age)
+
+    def get_position_value(self, max_age=None):
+        """所有持仓的总价值（USDC 计价）"""
+        return self._get('position_value', self.fetch_position_value, max_age)
+
+    def get_total_balance(self, max_age=None):
+        """USDC 余额加持仓价值，与 PolymarketClient.get_total_balance 相同"""
+        return self.get_usdc_balance(max_age) + self.get_position_value(max_age)
+
+    def get_positions(self, max_age=None):
+        """
+        所有持仓
+
+        返回:
+            DataFrame: data-api 的持仓记录，与 PolymarketClient.get_all_positions 相同
+        """
+        return pd.DataFrame(self._get('positions', self.fetch_positions, max_age))
+
+    def publish_positions(self, records):
+        """
+        交易进程发布刚获取的持仓记录
+
+        距离上次写入不足 PUBLISH_INTERVAL 秒，或写文件锁正被其他进程占用时跳过，不阻塞交易进程。
+
+        参数:
+            records: data-api 持仓记录列表，或 PolymarketClient.get_all_positions 返回的 DataFrame
+        """
+        if self._fresh('positions', PUBLISH_INTERVAL) is not None:
+            return False
+        if isinstance(records, pd.DataFrame):
+            records = records.to_dict('records')
+        try:
+            published = self._store('positions', records, blocking=False)
+        except OSError as e:
+            balance_logger.warning(f"发布持仓失败: {e}")
+            return False
+        if not published:
+            balance_logger.debug("余额缓存正被其他进程写入，跳过本次持仓发布")
+        return published
+
+
+# 进程内共享的服务实例
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_balance_service():
+    """返回进程内共享的 BalanceService"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = BalanceService()
+        return _service
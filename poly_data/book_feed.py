@@ -0,0 +1,127 @@
+"""
+实时订单簿共享 - 交易进程把 websocket 维护的订单簿发布到本地文件，供 data_updater 读取
+
+交易进程每个轮询周期调用 publish_books()，先写临时文件再原子替换，读取方不会读到写了一半的文件。
+只发布本进程收到过 websocket 数据的市场，热启动时从快照恢复、尚未校正的订单簿不会发布。
+
+文件格式:
+    {"saved_at": 时间戳,
+     "books": {token1: {"market": condition_id, "updated": 时间戳,
+                        "bids": [[价格, 数量], ...],   # 价格升序，最优买价在最后
+                        "asks": [[价格, 数量], ...]}}} # 价格降序，最优卖价在最后
+
+价格顺序与 REST 订单簿接口相同，读取结果可以直接交给 process_single_row 和 score_markets。
+
+多进程分片运行（见 poly_data.supervisor）时每个工作进程写入自己的分片文件
+（data/live_books.shard0.json 等），load_live_books 合并主文件和所有未过期的分片文件。
+
+使用示例:
+    books = load_live_books()
+    book = books.get(token1)  # 没有实时订单簿时为 None，退回 REST
+"""
+import os
+import glob
+import json
+import time
+from types import SimpleNamespace
+
+import poly_data.global_state as global_state
+from poly_data.market_features import get_features
+from poly_data.logger import get_logger
+
+# 创建订单簿共享日志记录器
+feed_logger = get_logger('book_feed', console_output=False)
+
+# 共享文件路径
+LIVE_BOOKS_PATH = os.getenv('LIVE_BOOKS_PATH', 'data/live_books.json')
+
+# 文件超过此时间（秒）未更新时视为交易进程已停止，不再使用
+LIVE_BOOKS_MAX_AGE = float(os.getenv('LIVE_BOOKS_MAX_AGE', '30'))
+
+
+def shard_path(shard, path=LIVE_BOOKS_PATH):
+    """分片工作进程的发布路径，例如 data/live_books.shard0.json"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.shard{shard}{ext}'
+
+
+def _collect_books():
+    """复制订单簿；事件循环可能同时在修改，失败的市场直接跳过"""
+    books = {}
+    for market, book in list(global_state.all_data.items()):
+        features = get_features(market)
+        if features is None:
+            continue
+
+        try:
+            books[str(book['asset_id'])] = {
+                'market': market,
+                'updated': features['updated'],
+                'bids': [[price, size] for price, size in book['bids'].items()],
+                'asks': [[price, size] for price, size in reversed(book['asks'].items())],
+            }
+        except RuntimeError:
+            feed_logger.debug(f"订单簿 {market} 正在更新，跳过发布")
+    return books
+
+
+def publish_books(path=LIVE_BOOKS_PATH):
+    """
+    将当前订单簿写入共享文件
+
+    返回:
+        int: 发布的订单簿数量
+    """
+    books = _collect_books()
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'saved_at': time.time(), 'books': books}, f)
+    os.replace(tmp_path, path)
+    return len(books)
+
+
+def _level(price, size):
+    return {'price': str(price), 'size': str(size)}
+
+
+def _read_books(path, max_age):
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        feed_logger.warning(f"读取实时订单簿 {path} 失败: {e}")
+        return {}
+
+    age = time.time() - data.get('saved_at', 0)
+    if age > max_age:
+        feed_logger.info(f"实时订单簿 {path} 已 {age:.0f} 秒未更新，不使用")
+        return {}
+    return data.get('books', {})
+
+
+def load_live_books(path=LIVE_BOOKS_PATH, max_age=LIVE_BOOKS_MAX_AGE):
+    """
+    读取交易进程发布的订单簿，包括分片工作进程发布的文件
+
+    返回:
+        dict: {token1: 订单簿}，订单簿具有 asset_id、bids、asks 属性，与 REST 返回的结构相同。
+              文件不存在、无法解析或已过期时返回空字典。
+    """
+    books = _read_books(path, max_age)
+    root, ext = os.path.splitext(path)
+    for shard_file in sorted(glob.glob(f'{glob.escape(root)}.shard*{ext}')):
+        books.update(_read_books(shard_file, max_age))
+
+    return {
+        token: SimpleNamespace(asset_id=token, market=book['market'],
+                               bids=[_level(p, s) for p, s in book['bids']],
+                               asks=[_level(p, s) for p, s in book['asks']])
+        for token, book in books.items()
+    }
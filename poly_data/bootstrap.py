@@ -0,0 +1,123 @@
+"""
+启动引导模块 - 并行获取初始状态，并支持从快照热启动
+"""
+import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import poly_data.global_state as global_state
+from poly_data.data_utils import update_markets, update_positions, update_orders
+from poly_data.snapshot import load_snapshot, SNAPSHOT_MAX_AGE
+from poly_data.logger import get_logger
+
+# 创建启动日志记录器
+bootstrap_logger = get_logger('bootstrap', console_output=True)
+
+
+class PhaseTimer:
+    """
+    记录启动各阶段耗时
+
+    各阶段可能在不同线程中并行执行，因此记录时加锁。
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def timed(self, name, func, *args, **kwargs):
+        """执行func并记录耗时"""
+        phase_start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.phases[name] = time.time() - phase_start
+
+    def report(self, title="启动"):
+        total = time.time() - self.start
+        details = ', '.join(f"{name}: {elapsed:.2f}s" for name, elapsed in self.phases.items())
+        bootstrap_logger.info(f"{title}耗时 {total:.2f}s ({details})")
+        return total
+
+
+def fetch_initial_state(timer=None):
+    """
+    并行获取市场配置、持仓和订单
+
+    Google Sheets 读取与 Polymarket API 请求互不依赖，放在不同线程中同时进行。
+    """
+    timer = timer or PhaseTimer()
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(timer.timed, 'markets', update_markets),
+            executor.submit(timer.timed, 'positions', update_positions),
+            executor.submit(timer.timed, 'orders', update_orders),
+        ]
+        for future in futures:
+            future.result()
+
+    return timer
+
+
+def reconcile_in_background():
+    """在后台线程中用最新数据校正从快照恢复的状态"""
+    def run():
+        timer = PhaseTimer()
+        try:
+            fetch_initial_state(timer)
+            timer.report("快照校正")
+        except Exception as e:
+            bootstrap_logger.error(f"快照校正失败: {e}")
+            bootstrap_logger.error(traceback.format_exc())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def bootstrap(client_factory, use_snapshot=True, max_snapshot_age=SNAPSHOT_MAX_AGE):
+    """
+    初始化客户端和应用程序状态
+
+    流程：
+    1. 在后台线程中创建客户端（派生API凭证）
+    2. 同时尝试从快照恢复状态；快照可用时立即返回，并在后台校正
+    3. 快照不可用时，客户端就绪后并行获取市场、持仓和订单
+
+    参数:
+        client_factory: 创建交易客户端的可调用对象
+        use_snapshot: 是否尝试从快照热启动
+        max_snapshot_age: 快照最大有效期（秒）
+
+    返回:
+        bool: 是否从快照热启动
+    """
+    timer = PhaseTimer()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        client_future = executor.submit(timer.timed, 'client', client_factory)
+        # 市场配置不依赖客户端，可以与凭证派生同时进行
+        markets_future = None
+
+        restored = use_snapshot and timer.timed('snapshot', load_snapshot, max_age=max_snapshot_age)
+        if not restored:
+            markets_future = executor.submit(timer.timed, 'markets', update_markets)
+
+        global_state.client = client_future.result()
+
+        if not restored:
+            positions_future = executor.submit(timer.timed, 'positions', update_positions)
+            timer.timed('orders', update_orders)
+            positions_future.result()
+            markets_future.result()
+
+    timer.report("热启动" if restored else "启动")
+
+    if restored:
+        reconcile_in_background()
+
+    return restored
@@ -7,6 +7,7 @@ from trading import perform_trade
 import time
 import asyncio
 from poly_data.data_utils import set_position, set_order, update_positions
+from poly_data.market_features import update_market_features
 from poly_data.logger import get_logger
 
 # 创建数据处理日志记录器
@@ -47,6 +48,7 @@ def process_data(json_datas, trade=True):
 
         if event_type == 'book':
             process_book_data(asset, json_data)
+            update_market_features(asset)
 
             if trade:
                 asyncio.create_task(perform_trade(asset))
@@ -61,6 +63,8 @@ def process_data(json_datas, trade=True):
                 if trade:
                     asyncio.create_task(perform_trade(asset))
 
+            update_market_features(asset)
+
 
         # pretty_print(f'收到 {asset} 的订单簿更新:', global_state.all_data[asset])
 
@@ -1,5 +1,9 @@
+import pandas as pd
+
 import poly_data.global_state as global_state
-from poly_data.utils import get_sheet_df
+from poly_data.sheet_config import get_config_source
+from poly_data.network_utils import retry_on_network_error
+from poly_data.balance_service import get_balance_service
 from poly_data.logger import get_logger
 import time
 
@@ -8,10 +12,26 @@ data_logger = get_logger('data_utils', console_output=True)
 # 创建市场更新专用日志记录器
 markets_logger = get_logger('update_markets', console_output=True)
 
+# 分片运行时由工作进程设置（见 poly_data.supervisor）：工作进程不获取整个账户的持仓，
+# 改为请求协调进程重新获取后只分发本分片的部分
+state_refresh = None
+
 # 这里似乎会移除持仓
 def update_positions(avgOnly=False):
+    if state_refresh is not None:
+        state_refresh(avgOnly)
+        return
+
     pos_df = global_state.client.get_all_positions()
+    publish_positions(pos_df)
+    apply_positions(pos_df, avgOnly)
+
+def publish_positions(pos_df):
+    """把交易进程刚获取的持仓共享给同一台机器上的其他进程（update_markets、AI 选择器、统计任务）"""
+    get_balance_service().publish_positions(pos_df)
 
+def apply_positions(pos_df, avgOnly=False):
+    """用 get_all_positions 的结果更新持仓；分片运行时由协调进程获取后按 token 分发"""
     for idx, row in pos_df.iterrows():
         asset = str(row['asset'])
 
@@ -94,8 +114,10 @@ def set_position(token, side, size, price, source='websocket'):
     data_logger.info(f"从 {source} 更新持仓 {token}，设置为 {global_state.positions[token]}")
 
 def update_orders():
-    all_orders = global_state.client.get_all_orders()
+    apply_orders(global_state.client.get_all_orders())
 
+def apply_orders(all_orders):
+    """用 get_all_orders 的结果替换挂单状态；分片运行时由协调进程获取后按 token 分发"""
     orders = {}
 
     if len(all_orders) > 0:
@@ -150,30 +172,85 @@ def set_order(token, side, size, price):
 
 
 
-def update_markets():
-    markets_logger.info("开始更新市场数据...")
-    received_df, received_params = get_sheet_df()
+@retry_on_network_error(max_retries=1, delay=2, endpoint='google-sheets')
+def refresh_config():
+    return get_config_source().refresh()
 
-    if len(received_df) > 0:
-        global_state.df, global_state.params = received_df.copy(), received_params
-        markets_logger.info(f"成功更新 {len(received_df)} 个市场")
+def update_markets():
+    """
+    从表格配置源刷新市场配置
+
+    配置源在表格修订版本和内容都未变化时直接返回，只有新增或变化的市场才会重新注册token。
+
+    返回:
+        ConfigUpdate: 已应用的配置变化；配置未变化或为空时返回 None
+    """
+    markets_logger.debug("检查市场配置更新...")
+    update = refresh_config()
+
+    if update is None:
+        markets_logger.debug("市场配置未变化")
+        return None
+
+    return update if apply_market_update(update) else None
+
+def apply_market_update(update):
+    """
+    应用配置变化：替换配置并注册新增或变化市场的token
+
+    返回:
+        bool: 是否已应用（配置为空时不应用）
+    """
+    if len(update.df) > 0:
+        global_state.df, global_state.params = update.df.copy(), update.params
+        markets_logger.info(f"成功更新 {len(update.df)} 个市场，其中 {len(update.changed)} 个有变化，"
+                            f"{len(update.removed)} 个已移除")
     else:
         markets_logger.warning("未获取到市场数据")
+        return False
 
+    for _, row in update.changed.iterrows():
+        token1, token2 = str(row['token1']), str(row['token2'])
 
-    for _, row in global_state.df.iterrows():
-        for col in ['token1', 'token2']:
-            row[col] = str(row[col])
-
-        if row['token1'] not in global_state.all_tokens:
-            global_state.all_tokens.append(row['token1'])
+        if token1 not in global_state.all_tokens:
+            global_state.all_tokens.append(token1)
 
-        if row['token1'] not in global_state.REVERSE_TOKENS:
-            global_state.REVERSE_TOKENS[row['token1']] = row['token2']
+        if token1 not in global_state.REVERSE_TOKENS:
+            global_state.REVERSE_TOKENS[token1] = token2
 
-        if row['token2'] not in global_state.REVERSE_TOKENS:
-            global_state.REVERSE_TOKENS[row['token2']] = row['token1']
+        if token2 not in global_state.REVERSE_TOKENS:
+            global_state.REVERSE_TOKENS[token2] = token1
 
-        for col2 in [f"{row['token1']}_buy", f"{row['token1']}_sell", f"{row['token2']}_buy", f"{row['token2']}_sell"]:
+        for col2 in [f"{token1}_buy", f"{token1}_sell", f"{token2}_buy", f"{token2}_sell"]:
             if col2 not in global_state.performing:
-                global_state.performing[col2] = set()
\ No newline at end of file
+                global_state.performing[col2] = set()
+
+    return True
+
+def clear_markets():
+    """
+    清空本进程的市场配置：撤销所有市场的订单并移除其token
+
+    分片运行时某个分片的最后一个市场被移除，协调进程会发送空分片消息。
+    这与表格读取失败不同（apply_market_update 会保留旧配置），这里必须清空配置，
+    否则工作进程会继续为已移除的市场报价。
+    """
+    old_df = global_state.df
+    if old_df is None or len(old_df) == 0:
+        global_state.df = old_df if old_df is not None else pd.DataFrame(columns=['condition_id'])
+        return
+
+    for _, row in old_df.iterrows():
+        try:
+            global_state.client.cancel_all_market(row['condition_id'])
+        except Exception as e:
+            markets_logger.error(f"撤销已移除市场 {row['condition_id']} 的订单失败: {type(e).__name__}: {e}")
+
+        for token in (str(row['token1']), str(row['token2'])):
+            global_state.REVERSE_TOKENS.pop(token, None)
+            if token in global_state.all_tokens:
+                global_state.all_tokens.remove(token)
+
+    # 保留列，perform_trade 按 condition_id 查找时直接跳过
+    global_state.df = old_df.iloc[0:0]
+    markets_logger.info(f"已清空 {len(old_df)} 个市场的配置并撤销其订单")
@@ -0,0 +1,29 @@
+"""
+外部服务地址 - CLOB REST、data-api、websocket 和 Polygon RPC
+
+默认指向 Polymarket 的生产服务。压测或离线调试时通过环境变量指向本地模拟服务（poly_mock）:
+    CLOB_HOST=http://127.0.0.1:8700
+    DATA_API_URL=http://127.0.0.1:8700/data-api
+    CLOB_WS_URL=ws://127.0.0.1:8701/ws
+    POLYGON_RPC_URL=http://127.0.0.1:8700/rpc
+"""
+import os
+
+from dotenv import load_dotenv
+
+# 地址在导入时读取，需要先加载 .env
+load_dotenv()
+
+# CLOB REST API（下单、撤单、订单簿、奖励市场、价格历史）
+CLOB_HOST = os.getenv('CLOB_HOST', 'https://clob.polymarket.com').rstrip('/')
+
+# 公开的持仓和持仓价值 API
+DATA_API_URL = os.getenv('DATA_API_URL', 'https://data-api.polymarket.com').rstrip('/')
+
+# websocket 订阅地址，市场和用户频道分别为 /market 和 /user
+CLOB_WS_URL = os.getenv('CLOB_WS_URL', 'wss://ws-subscriptions-clob.polymarket.com/ws').rstrip('/')
+MARKET_WS_URL = f'{CLOB_WS_URL}/market'
+USER_WS_URL = f'{CLOB_WS_URL}/user'
+
+# 查询链上余额和持仓的 Polygon RPC 节点
+POLYGON_RPC_URL = os.getenv('POLYGON_RPC_URL', 'https://polygon-rpc.com')
@@ -1,5 +1,4 @@
 import threading
-import pandas as pd
 
 # ============ 市场数据 ============
 
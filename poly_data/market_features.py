@@ -0,0 +1,160 @@
+"""
+实时市场特征 - 根据 websocket 订单簿事件增量计算波动率、价差和订单簿不平衡度
+
+表格中的波动率每小时才由 update_markets.py 更新一次。这里在机器人进程内按固定间隔
+采样中间价，用指数加权移动平均（EWMA）估计多个时间窗口的波动率，每次事件只做 O(1) 的更新，
+perform_trade 读取时也是 O(1)。预热完成前返回 None，由调用方退回表格中的值。
+"""
+import math
+import time
+from collections import deque
+
+import poly_data.global_state as global_state
+
+# EWMA 时间常数（秒），键名与表格中的波动率列相同
+HORIZONS = {
+    '1_hour': 3600,
+    '3_hour': 3 * 3600,
+    '6_hour': 6 * 3600,
+    '24_hour': 24 * 3600,
+}
+
+# 中间价采样间隔（秒）
+SAMPLE_SECONDS = 60
+
+# 每个市场保留的采样点数量（6小时）
+RING_SIZE = 360
+
+# 观测时长达到时间常数的这个比例后才返回波动率
+WARMUP_FRACTION = 0.5
+
+# 计算不平衡度时使用的档位数量
+IMBALANCE_LEVELS = 5
+
+# 表格中的波动率用 10 分钟间隔的价格计算，再按分钟年化；
+# 这里将每分钟方差换算为 10 分钟方差后使用同样的年化系数，使阈值可以直接比较
+RETURN_MINUTES = 10
+ANNUALIZATION = math.sqrt(60 * 24 * 252)
+
+
+class MarketFeatures:
+    """单个市场的滚动特征"""
+
+    __slots__ = ('samples', 'returns', 'ewma_var', 'first_sample', 'mid', 'spread', 'imbalance', 'updated')
+
+    def __init__(self, ring_size=RING_SIZE):
+        # (时间戳, 中间价) 采样点
+        self.samples = deque(maxlen=ring_size)
+        # (时间戳, 对数收益率)
+        self.returns = deque(maxlen=ring_size)
+        # 每分钟收益率方差的 EWMA
+        self.ewma_var = dict.fromkeys(HORIZONS)
+        self.first_sample = None
+        self.mid = None
+        self.spread = None
+        self.imbalance = None
+        self.updated = None
+
+    def update(self, book, now):
+        """根据最新订单簿更新特征"""
+        bids, asks = book['bids'], book['asks']
+        self.updated = now
+
+        bid_depth = sum(bids.values()[-IMBALANCE_LEVELS:])
+        ask_depth = sum(asks.values()[:IMBALANCE_LEVELS])
+        total = bid_depth + ask_depth
+        self.imbalance = (bid_depth - ask_depth) / total if total > 0 else None
+
+        if not bids or not asks:
+            return
+
+        best_bid = bids.peekitem(-1)[0]
+        best_ask = asks.peekitem(0)[0]
+        self.spread = best_ask - best_bid
+        self.mid = (best_bid + best_ask) / 2
+
+        if self.mid <= 0:
+            return
+
+        if not self.samples:
+            self.samples.append((now, self.mid))
+            self.first_sample = now
+            return
+
+        last_time, last_mid = self.samples[-1]
+        elapsed = now - last_time
+        if elapsed < SAMPLE_SECONDS:
+            return
+
+        ret = math.log(self.mid / last_mid)
+        self.samples.append((now, self.mid))
+        self.returns.append((now, ret))
+
+        # 事件间隔可能超过采样间隔，按实际经过的分钟数换算为每分钟方差
+        per_minute_var = ret * ret / (elapsed / 60)
+        for name, tau in HORIZONS.items():
+            alpha = 1 - math.exp(-elapsed / tau)
+            prev = self.ewma_var[name]
+            self.ewma_var[name] = per_minute_var if prev is None else (1 - alpha) * prev + alpha * per_minute_var
+
+    def volatility(self, horizon, now):
+        """返回年化波动率；预热未完成时返回 None"""
+        var = self.ewma_var.get(horizon)
+        if var is None or now - self.first_sample < HORIZONS[horizon] * WARMUP_FRACTION:
+            return None
+        return math.sqrt(var * RETURN_MINUTES) * ANNUALIZATION
+
+
+# 按市场（condition_id）保存的特征
+_features = {}
+
+
+def update_market_features(market, now=None):
+    """在订单簿更新后调用，增量更新该市场的特征"""
+    book = global_state.all_data.get(market)
+    if book is None:
+        return
+
+    features = _features.get(market)
+    if features is None:
+        features = _features[market] = MarketFeatures()
+    features.update(book, time.time() if now is None else now)
+
+
+def get_volatility(market, horizon='3_hour', fallback=None):
+    """
+    获取市场的实时年化波动率
+
+    参数:
+        market: 市场 condition_id
+        horizon: HORIZONS 中的窗口名
+        fallback: 没有实时数据或预热未完成时返回的值（通常是表格中的值）
+    """
+    features = _features.get(market)
+    if features is None:
+        return fallback
+
+    value = features.volatility(horizon, time.time())
+    return fallback if value is None else value
+
+
+def get_features(market):
+    """
+    获取市场的全部实时特征
+
+    返回:
+        dict 或 None（没有收到过该市场的订单簿时）
+    """
+    features = _features.get(market)
+    if features is None:
+        return None
+
+    now = time.time()
+    return {
+        'mid': features.mid,
+        'spread': features.spread,
+        'imbalance': features.imbalance,
+        'volatility': {name: features.volatility(name, now) for name in HORIZONS},
+        'samples': len(features.samples),
+        'updated': features.updated,
+    }
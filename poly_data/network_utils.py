@@ -1,10 +1,13 @@
 """
-网络工具模块 - 提供网络重试机制和日志功能
+网络工具模块 - 提供网络重试机制、熔断器和日志功能
 """
 import time
+import random
+import asyncio
 import functools
+import threading
 import traceback
-from typing import Callable, Any
+from typing import Callable, Any, Dict, Optional
 import requests
 from py_clob_client.exceptions import PolyApiException
 from poly_data.logger import get_logger
@@ -12,8 +15,8 @@ from poly_data.logger import get_logger
 # 创建网络工具日志记录器
 network_logger = get_logger('network', console_output=True)
 
-
-def retry_on_network_error(max_retries=3, delay=2, backoff=2, exceptions=(
+# 默认需要重试的网络异常类型
+NETWORK_EXCEPTIONS = (
     requests.exceptions.RequestException,
     requests.exceptions.ConnectionError,
     requests.exceptions.SSLError,
@@ -21,50 +24,324 @@ def retry_on_network_error(max_retries=3, delay=2, backoff=2, exceptions=(
     PolyApiException,
     ConnectionError,
     TimeoutError,
-)):
+)
+
+
+class CircuitOpenError(ConnectionError):
+    """熔断器处于打开状态时抛出，调用方应快速失败而不是重试"""
+
+    def __init__(self, endpoint, retry_after):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        super().__init__(f"端点 {endpoint} 熔断中，{retry_after:.1f} 秒后再试")
+
+
+class CircuitBreaker:
+    """
+    按端点划分的熔断器
+
+    状态：
+        closed    - 正常放行请求
+        open      - 连续失败达到阈值后打开，在 recovery_timeout 内直接拒绝请求
+        half_open - 冷却结束后只放行一个探测请求，成功则关闭，失败则重新打开
+
+    同一个熔断器可能同时被事件循环和后台线程使用，因此所有状态变更都在锁内进行。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0):
+        """
+        参数:
+            name: 端点名称（如 'clob'、'data-api'）
+            failure_threshold: 触发熔断的连续失败次数
+            recovery_timeout: 熔断打开后等待多少秒进入半开状态
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+        # 导出的指标
+        self.total_successes = 0
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+        self.last_failure_time = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        """在锁内调用：如果冷却时间已过，从 open 转为 half_open"""
+        if self._state == self.OPEN and time.time() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def retry_after(self):
+        """距离允许下一次探测还有多少秒"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.time() - self._opened_at))
+
+    def allow_request(self):
+        """是否允许发起请求；熔断打开时计入拒绝次数"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.total_rejected += 1
+            return False
+
+    def before_call(self):
+        """请求前检查，熔断打开时抛出 CircuitOpenError"""
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def release_probe(self):
+        """探测请求因非网络原因结束（其他异常或被取消）时释放探测名额，否则熔断器会一直停在半开状态"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                network_logger.info(f"熔断器 {self.name} 探测成功，恢复正常")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+            self.total_successes += 1
+
+    def record_failure(self):
+        with self._lock:
+            self.total_failures += 1
+            self._consecutive_failures += 1
+            self.last_failure_time = time.time()
+            state = self._current_state()
+
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self.times_opened += 1
+                    network_logger.warning(f"熔断器 {self.name} 打开: 连续失败 {self._consecutive_failures} 次，"
+                                           f"{self.recovery_timeout} 秒内快速失败")
+                self._state = self.OPEN
+                self._opened_at = time.time()
+                self._probe_in_flight = False
+
+    def metrics(self):
+        """返回熔断器状态指标"""
+        with self._lock:
+            state = self._current_state()
+            return {
+                'state': state,
+                'open': 1 if state == self.OPEN else 0,
+                'consecutive_failures': self._consecutive_failures,
+                'total_successes': self.total_successes,
+                'total_failures': self.total_failures,
+                'total_rejected': self.total_rejected,
+                'times_opened': self.times_opened,
+                'last_failure_time': self.last_failure_time,
+            }
+
+
+# 全局熔断器注册表，按端点名称共享
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(endpoint, failure_threshold=5, recovery_timeout=30.0) -> CircuitBreaker:
+    """
+    获取或创建端点对应的熔断器
+
+    同一端点只会创建一个熔断器，后续调用传入的阈值参数会被忽略。
+    """
+    with _breakers_lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(endpoint, failure_threshold, recovery_timeout)
+        return _breakers[endpoint]
+
+
+def get_breaker_metrics() -> Dict[str, Dict[str, Any]]:
+    """以字典形式导出所有熔断器的指标"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.metrics() for b in breakers}
+
+
+def format_breaker_metrics() -> str:
+    """以 Prometheus 文本格式导出所有熔断器的指标"""
+    lines = []
+    for name, m in get_breaker_metrics().items():
+        for key in ['open', 'consecutive_failures', 'total_successes', 'total_failures',
+                    'total_rejected', 'times_opened']:
+            lines.append(f'polymaker_circuit_breaker_{key}{{endpoint="{name}"}} {m[key]}')
+    return '\n'.join(lines)
+
+
+def _backoff_delay(current_delay, jitter, max_delay):
+    """计算带抖动的退避时间，避免多个调用方同时重试"""
+    sleep_for = min(current_delay, max_delay)
+    if jitter:
+        sleep_for *= 1 - jitter * random.random()
+    return sleep_for
+
+
+def _breaker_open(breaker):
+    """记录一次失败，并返回熔断器是否已打开（打开后不再重试）；最后一次尝试的失败同样要记录"""
+    if breaker is None:
+        return False
+    breaker.record_failure()
+    return breaker.state == CircuitBreaker.OPEN
+
+
+def _in_event_loop():
+    """当前线程是否正在运行事件循环"""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def retry_on_network_error(max_retries=3, delay=2, backoff=2, exceptions=NETWORK_EXCEPTIONS,
+                           jitter=0.5, max_delay=30, endpoint: Optional[str] = None,
+                           failure_threshold=5, recovery_timeout=30.0):
     """
-    网络请求重试装饰器
-    
+    网络请求重试装饰器，同时支持同步函数和协程函数
+
     参数:
         max_retries: 最大重试次数
         delay: 初始延迟时间(秒)
         backoff: 延迟时间的倍数增长因子
         exceptions: 需要重试的异常类型元组
-    
+        jitter: 抖动比例(0-1)，实际等待时间在 [delay*(1-jitter), delay] 之间随机
+        max_delay: 单次等待的上限(秒)
+        endpoint: 端点名称；指定后共享该端点的熔断器，熔断打开时直接抛出 CircuitOpenError
+        failure_threshold: 熔断器的连续失败阈值（仅在首次创建该端点熔断器时生效）
+        recovery_timeout: 熔断器的冷却时间（仅在首次创建该端点熔断器时生效）
+
+    注意:
+        同步函数如果在事件循环线程中被调用，失败后不会 time.sleep 阻塞整个循环，
+        而是不重试直接抛出异常，由调用方决定下一步（每个函数第一次这样调用时记录一条警告，失败日志中也会注明）；
+        在后台线程中调用时按 max_retries 重试。
+        协程函数使用 asyncio.sleep 等待。每次失败（包括最后一次）都计入熔断器。
+
     使用示例:
-        @retry_on_network_error(max_retries=3, delay=2)
+        @retry_on_network_error(max_retries=3, delay=2, endpoint='clob')
         def fetch_data():
             return requests.get('https://api.example.com/data')
     """
     def decorator(func: Callable) -> Callable:
+        breaker = get_circuit_breaker(endpoint, failure_threshold, recovery_timeout) if endpoint else None
+
+        def on_failure(e, attempt, will_retry, in_loop=False):
+            if will_retry:
+                network_logger.warning(f"{func.__name__} 网络错误 (尝试 {attempt + 1}/{max_retries + 1}): {type(e).__name__}")
+            else:
+                note = '（在事件循环线程中调用，不重试）' if in_loop and max_retries > 0 else ''
+                network_logger.error(f"{func.__name__} 失败，已尝试 {attempt + 1} 次{note}")
+                network_logger.error(f"最后错误: {type(e).__name__}: {str(e)}")
+
+        def on_other_error(e):
+            # 非网络错误，直接抛出
+            network_logger.error(f"{func.__name__} 发生非网络错误: {type(e).__name__}: {str(e)}")
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs) -> Any:
+                current_delay = delay
+                for attempt in range(max_retries + 1):
+                    if breaker:
+                        breaker.before_call()
+                    try:
+                        result = await func(*args, **kwargs)
+                    except CircuitOpenError:
+                        # 内层调用的其他端点熔断，不计入本端点的失败
+                        if breaker:
+                            breaker.release_probe()
+                        raise
+                    except exceptions as e:
+                        breaker_open = _breaker_open(breaker)
+                        will_retry = attempt < max_retries and not breaker_open
+                        on_failure(e, attempt, will_retry)
+                        if not will_retry:
+                            raise
+                        sleep_for = _backoff_delay(current_delay, jitter, max_delay)
+                        network_logger.info(f"等待 {sleep_for:.2f} 秒后重试...")
+                        await asyncio.sleep(sleep_for)
+                        current_delay *= backoff
+                    except BaseException as e:
+                        # 其他异常和 CancelledError 不计入失败，但必须释放半开状态的探测名额
+                        if breaker:
+                            breaker.release_probe()
+                        if isinstance(e, Exception):
+                            on_other_error(e)
+                        raise
+                    else:
+                        if breaker:
+                            breaker.record_success()
+                        return result
+
+            return async_wrapper
+
+        # 每个函数只提示一次在事件循环线程中被调用（此时不重试）
+        loop_warned = False
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
+            nonlocal loop_warned
             current_delay = delay
-            last_exception = None
-            
-            for attempt in range(max_retries + 1):
+            # 在事件循环线程中不能阻塞休眠
+            in_loop = _in_event_loop()
+            retries = 0 if in_loop else max_retries
+            if in_loop and max_retries > 0 and not loop_warned:
+                loop_warned = True
+                network_logger.warning(f"{func.__name__} 在事件循环线程中被同步调用，网络错误时不重试；"
+                                       f"应通过 run_in_executor 在线程池中调用")
+            for attempt in range(retries + 1):
+                if breaker:
+                    breaker.before_call()
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
+                except CircuitOpenError:
+                    if breaker:
+                        breaker.release_probe()
+                    raise
                 except exceptions as e:
-                    last_exception = e
-                    
-                    if attempt < max_retries:
-                        network_logger.warning(f"{func.__name__} 网络错误 (尝试 {attempt + 1}/{max_retries + 1}): {type(e).__name__}")
-                        network_logger.info(f"等待 {current_delay} 秒后重试...")
-                        time.sleep(current_delay)
-                        current_delay *= backoff
-                    else:
-                        network_logger.error(f"{func.__name__} 失败，已达最大重试次数 ({max_retries + 1})")
-                        network_logger.error(f"最后错误: {type(e).__name__}: {str(e)}")
-                except Exception as e:
-                    # 非网络错误，直接抛出
-                    network_logger.error(f"{func.__name__} 发生非网络错误: {type(e).__name__}: {str(e)}")
+                    breaker_open = _breaker_open(breaker)
+                    will_retry = attempt < retries and not breaker_open
+                    on_failure(e, attempt, will_retry, in_loop)
+                    if not will_retry:
+                        raise
+                    sleep_for = _backoff_delay(current_delay, jitter, max_delay)
+                    network_logger.info(f"等待 {sleep_for:.2f} 秒后重试...")
+                    time.sleep(sleep_for)
+                    current_delay *= backoff
+                except BaseException as e:
+                    if breaker:
+                        breaker.release_probe()
+                    if isinstance(e, Exception):
+                        on_other_error(e)
                     raise
-            
-            # 如果所有重试都失败，抛出最后一个异常
-            if last_exception:
-                raise last_exception
-        
+                else:
+                    if breaker:
+                        breaker.record_success()
+                    return result
+
         return wrapper
     return decorator
 
@@ -72,12 +349,12 @@ def retry_on_network_error(max_retries=3, delay=2, backoff=2, exceptions=(
 def safe_api_call(func: Callable, default_value=None, log_error=True) -> Callable:
     """
     安全的API调用包装器，捕获异常并返回默认值
-    
+
     参数:
         func: 要包装的函数
         default_value: 发生错误时返回的默认值
         log_error: 是否打印错误信息
-    
+
     使用示例:
         result = safe_api_call(lambda: client.get_orders(), default_value=[])
     """
@@ -90,6 +367,5 @@ def safe_api_call(func: Callable, default_value=None, log_error=True) -> Callabl
                 network_logger.warning(f"API调用失败: {func.__name__ if hasattr(func, '__name__') else 'unknown'}")
                 network_logger.warning(f"错误: {type(e).__name__}: {str(e)}")
             return default_value
-    
-    return wrapper()
 
+    return wrapper()
@@ -0,0 +1,352 @@
+"""
+PnL 和库存历史 - 在交易进程中定期记录持仓、标记价格和挂单，并增量维护汇总
+
+- 每个 token 的快照先缓存在内存中，每 FLUSH_INTERVAL 秒作为一个段追加到列式存储
+  （poly_utils.segment_store），原始序列可以按时间范围读取
+- 每次快照同时更新 SQLite 中按 (日期, token) 的汇总行：样本数、持仓和敞口的累计值与极值、
+  当日首末未实现盈亏、挂单名义金额。按市场、日期或 param_type 的汇总只需对这张小表 GROUP BY
+- 奖励收益由 update_stats.py 按 (日期, 市场) 写入同一个数据库
+
+快照在 update_periodically 的后台线程中执行，不经过 websocket 事件处理和下单路径。
+进程正常退出时（atexit）以及分片工作进程收到 stop 消息时调用 flush_recorder，缓冲中的快照不会丢失。
+
+使用示例:
+    recorder = get_recorder()
+    recorder.snapshot()                          # 交易进程中定期调用
+    read_rollups(group_by='param_type')          # 分析脚本中读取汇总
+"""
+import os
+import time
+import atexit
+import sqlite3
+import datetime
+import threading
+
+import numpy as np
+import pandas as pd
+
+import poly_data.global_state as global_state
+from poly_data.logger import get_logger
+from poly_utils.segment_store import SegmentStore
+
+# 创建PnL历史日志记录器
+pnl_logger = get_logger('pnl_history', console_output=False)
+
+# 存储目录，汇总数据库也在此目录下
+PNL_HISTORY_DIR = os.getenv('PNL_HISTORY_DIR', 'data/pnl_history')
+
+# 内存中的快照写入列式存储的间隔（秒）
+FLUSH_INTERVAL = 15 * 60
+
+# 原始快照保留时长（秒）；汇总不受影响
+RETENTION_SECONDS = 90 * 24 * 3600
+
+# 列式存储中每个 token 的列
+SERIES_COLUMNS = ['position', 'avg_price', 'mark', 'buy_size', 'buy_price', 'sell_size', 'sell_price']
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    day TEXT NOT NULL,
+    token TEXT NOT NULL,
+    question TEXT,
+    answer TEXT,
+    param_type TEXT,
+    samples INTEGER NOT NULL,
+    position_sum REAL NOT NULL,
+    exposure_sum REAL NOT NULL,
+    max_exposure REAL NOT NULL,
+    open_buy_sum REAL NOT NULL,
+    open_sell_sum REAL NOT NULL,
+    first_unrealized REAL,
+    last_unrealized REAL,
+    last_position REAL,
+    last_mark REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (day, token)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_question ON rollups(question);
+CREATE INDEX IF NOT EXISTS idx_rollups_param_type ON rollups(param_type);
+
+CREATE TABLE IF NOT EXISTS rewards (
+    day TEXT NOT NULL,
+    question TEXT NOT NULL,
+    earnings REAL NOT NULL,
+    PRIMARY KEY (day, question)
+);
+"""
+
+# 每次快照对汇总行的增量更新
+UPSERT_ROLLUP = """
+INSERT INTO rollups(day, token, question, answer, param_type, samples, position_sum, exposure_sum, max_exposure,
+                    open_buy_sum, open_sell_sum, first_unrealized, last_unrealized, last_position, last_mark,
+                    updated_at)
+VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(day, token) DO UPDATE SET
+    question = excluded.question,
+    answer = excluded.answer,
+    param_type = excluded.param_type,
+    samples = samples + 1,
+    position_sum = position_sum + excluded.position_sum,
+    exposure_sum = exposure_sum + excluded.exposure_sum,
+    max_exposure = MAX(max_exposure, excluded.max_exposure),
+    open_buy_sum = open_buy_sum + excluded.open_buy_sum,
+    open_sell_sum = open_sell_sum + excluded.open_sell_sum,
+    first_unrealized = COALESCE(first_unrealized, excluded.first_unrealized),
+    last_unrealized = COALESCE(excluded.last_unrealized, last_unrealized),
+    last_position = excluded.last_position,
+    last_mark = COALESCE(excluded.last_mark, last_mark),
+    updated_at = excluded.updated_at
+"""
+
+
+def _rollup_db_path(root):
+    return os.path.join(root, 'rollups.db')
+
+
+def _connect(root):
+    os.makedirs(root, exist_ok=True)
+    conn = sqlite3.connect(_rollup_db_path(root), timeout=10)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(ROLLUP_SCHEMA)
+    return conn
+
+
+def _day(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).date().isoformat()
+
+
+def _token_info():
+    """token → (question, answer, param_type, condition_id, 是否为 token1)"""
+    df = global_state.df
+    info = {}
+    if df is None or len(df) == 0:
+        return info
+
+    param_types = df['param_type'] if 'param_type' in df.columns else [''] * len(df)
+    for row, param_type in zip(df[['question', 'answer1', 'answer2', 'token1', 'token2', 'condition_id']].itertuples(index=False), param_types):
+        info[str(row.token1)] = (row.question, row.answer1, param_type, row.condition_id, True)
+        info[str(row.token2)] = (row.question, row.answer2, param_type, row.condition_id, False)
+    return info
+
+
+def _mark(condition_id, is_token1):
+    """用订单簿中间价作为标记价格；token2 的价格为 1 - token1 的价格"""
+    book = global_state.all_data.get(condition_id)
+    if book is None:
+        return None
+    try:
+        best_bid = book['bids'].peekitem(-1)[0]
+        best_ask = book['asks'].peekitem(0)[0]
+    except (IndexError, RuntimeError):
+        return None
+    mid = (best_bid + best_ask) / 2
+    return mid if is_token1 else 1 - mid
+
+
+class PnlRecorder:
+    """定期记录持仓、标记价格和挂单"""
+
+    def __init__(self, root=PNL_HISTORY_DIR, flush_interval=FLUSH_INTERVAL):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.store = SegmentStore(os.path.join(root, 'series'), columns=SERIES_COLUMNS, max_segments=24,
+                                  retention=RETENTION_SECONDS)
+        self._conn = None
+        # {token: [(t, position, avg_price, mark, buy_size, buy_price, sell_size, sell_price), ...]}
+        self._buffer = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            self._conn = _connect(self.root)
+        return self._conn
+
+    def _collect(self):
+        """复制当前持仓和挂单；只记录有持仓或挂单的 token"""
+        positions = dict(global_state.positions)
+        orders = dict(global_state.orders)
+        info = _token_info()
+
+        rows = []
+        for token in set(positions) | set(orders):
+            position = positions.get(token, {})
+            order = orders.get(token, {})
+            size = float(position.get('size', 0) or 0)
+            buy = order.get('buy', {}) or {}
+            sell = order.get('sell', {}) or {}
+            buy_size, sell_size = float(buy.get('size', 0) or 0), float(sell.get('size', 0) or 0)
+            if size == 0 and buy_size == 0 and sell_size == 0:
+                continue
+
+            question, answer, param_type, condition_id, is_token1 = info.get(token, (None, None, None, None, True))
+            mark = _mark(condition_id, is_token1) if condition_id is not None else None
+            rows.append((token, question, answer, param_type, size, float(position.get('avgPrice', 0) or 0), mark,
+                         buy_size, float(buy.get('price', 0) or 0), sell_size, float(sell.get('price', 0) or 0)))
+        return rows
+
+    def snapshot(self, now=None):
+        """
+        记录一次快照：写入内存缓冲并增量更新汇总，到期时把缓冲写入列式存储
+
+        返回:
+            int: 记录的 token 数量
+        """
+        now = time.time() if now is None else now
+        rows = self._collect()
+        day = _day(now)
+
+        rollup_rows = []
+        with self._lock:
+            for token, question, answer, param_type, size, avg_price, mark, buy_size, buy_price, sell_size, sell_price in rows:
+                self._buffer.setdefault(token, []).append(
+                    (int(now), size, avg_price, np.nan if mark is None else mark, buy_size, buy_price, sell_size, sell_price))
+
+                exposure = abs(size) * (mark if mark is not None else avg_price)
+                unrealized = (mark - avg_price) * size if mark is not None else None
+                rollup_rows.append((day, token, question, answer, param_type, size, exposure, exposure,
+                                    buy_size * buy_price, sell_size * sell_price, unrealized, unrealized,
+                                    size, mark, now))
+
+        if rollup_rows:
+            conn = self._db()
+            with conn:
+                conn.executemany(UPSERT_ROLLUP, rollup_rows)
+
+        if now - self._last_flush >= self.flush_interval:
+            self.flush(now)
+        return len(rows)
+
+    def flush(self, now=None):
+        """把内存中的快照写入列式存储，每个 token 一个段"""
+        with self._lock:
+            buffer, self._buffer = self._buffer, {}
+            self._last_flush = time.time() if now is None else now
+
+        for token, points in buffer.items():
+            data = np.array(points, dtype=np.float64)
+            self.store.append(token, data[:, 0].astype(np.int64),
+                              **{col: data[:, i + 1] for i, col in enumerate(SERIES_COLUMNS)})
+        if buffer:
+            pnl_logger.info(f"写入 {len(buffer)} 个 token 的PnL快照")
+
+    def read_series(self, token, since=None):
+        """
+        读取 token 的原始快照序列，包括尚未写入存储的部分
+
+        返回:
+            DataFrame: t 以及 SERIES_COLUMNS 中的列
+        """
+        t, cols = self.store.read(token, since)
+        df = pd.DataFrame({'t': np.asarray(t), **{col: np.asarray(values) for col, values in cols.items()}})
+
+        with self._lock:
+            pending = list(self._buffer.get(token, []))
+        if pending:
+            pending_df = pd.DataFrame(pending, columns=['t'] + SERIES_COLUMNS)
+            if since is not None:
+                pending_df = pending_df[pending_df['t'] >= since]
+            df = pd.concat([df, pending_df], ignore_index=True)
+        return df
+
+
+def record_rewards(day, earnings, root=PNL_HISTORY_DIR):
+    """
+    记录某一天各市场的奖励收益，同一天重复记录时覆盖
+
+    参数:
+        day: 'YYYY-MM-DD'
+        earnings: 包含 question 和 earnings 列的 DataFrame
+    """
+    conn = _connect(root)
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO rewards(day, question, earnings) VALUES (?, ?, ?)",
+                         [(day, q, float(e)) for q, e in zip(earnings['question'], earnings['earnings'])])
+    conn.close()
+
+
+# 可以汇总的维度
+ROLLUP_GROUPS = {
+    'market': ['question'],
+    'day': ['day'],
+    'param_type': ['param_type'],
+    'market_day': ['day', 'question'],
+    'token_day': ['day', 'token', 'question', 'answer', 'param_type'],
+}
+
+
+def read_rollups(group_by='market', since_day=None, root=PNL_HISTORY_DIR):
+    """
+    读取预先汇总的PnL和库存指标
+
+    参数:
+        group_by: ROLLUP_GROUPS 中的维度
+        since_day: 只包含该日期（'YYYY-MM-DD'）及之后的数据
+
+    返回:
+        DataFrame: 平均持仓、平均和最大敞口、未实现盈亏变化、平均挂单名义金额和奖励收益（token_day 不含奖励）
+    """
+    keys = ROLLUP_GROUPS[group_by]
+    select_keys = ', '.join(f'r.{k}' for k in keys)
+    where = 'WHERE r.day >= ?' if since_day else ''
+    args = [since_day] if since_day else []
+
+    query = f"""
+        SELECT {select_keys},
+               SUM(r.samples) AS samples,
+               SUM(r.position_sum) / SUM(r.samples) AS avg_position,
+               SUM(r.exposure_sum) / SUM(r.samples) AS avg_exposure,
+               MAX(r.max_exposure) AS max_exposure,
+               SUM(r.last_unrealized - r.first_unrealized) AS unrealized_change,
+               SUM(r.open_buy_sum + r.open_sell_sum) / SUM(r.samples) AS avg_open_notional
+        FROM rollups r {where}
+        GROUP BY {select_keys}
+    """
+    conn = _connect(root)
+    try:
+        df = pd.read_sql_query(query, conn, params=args)
+
+        # 奖励按 (日期, 市场) 记录，先按维度汇总再合并
+        reward_keys = [k for k in keys if k in ('day', 'question')]
+        rewards = pd.read_sql_query(
+            f"SELECT w.day, w.question, w.earnings, MAX(r.param_type) AS param_type FROM rewards w "
+            f"LEFT JOIN rollups r ON r.day = w.day AND r.question = w.question "
+            f"{'WHERE w.day >= ?' if since_day else ''} GROUP BY w.day, w.question", conn, params=args)
+    finally:
+        conn.close()
+
+    if group_by == 'token_day':
+        # 奖励按市场记录，无法分摊到单个 token
+        return df
+    if group_by == 'param_type':
+        reward_keys = ['param_type']
+    if reward_keys and len(rewards):
+        rewards = rewards.groupby(reward_keys, as_index=False)['earnings'].sum()
+        df = df.merge(rewards, on=reward_keys, how='left')
+    else:
+        df['earnings'] = np.nan
+    df['earnings'] = df['earnings'].fillna(0)
+    return df
+
+
+_recorder = None
+
+
+def get_recorder():
+    """获取进程内共享的记录器"""
+    global _recorder
+    if _recorder is None:
+        _recorder = PnlRecorder()
+        atexit.register(flush_recorder)
+    return _recorder
+
+
+def flush_recorder():
+    """退出前把内存中的快照写入存储；进程中没有创建记录器时不做任何事"""
+    if _recorder is None:
+        return
+    try:
+        _recorder.flush()
+    except Exception as e:
+        pnl_logger.warning(f"退出前写入PnL快照失败: {type(e).__name__}: {e}")
@@ -3,13 +3,11 @@ import os                           # 操作系统接口
 
 # Polymarket API客户端库
 from py_clob_client.client import ClobClient
-from py_clob_client.clob_types import OrderArgs, BalanceAllowanceParams, AssetType, PartialCreateOrderOptions
+from py_clob_client.clob_types import OrderArgs, BalanceAllowanceParams, AssetType, PartialCreateOrderOptions, ApiCreds
 from py_clob_client.constants import POLYGON
 
-# Web3库用于区块链交互
-from web3 import Web3
-from web3.middleware import ExtraDataToPOAMiddleware
-from eth_account import Account
+# Web3库用于区块链交互，导入较慢，在首次访问链上数据时才导入（见 _init_web3）
+from eth_utils import to_checksum_address
 
 import requests                     # HTTP请求
 import pandas as pd                 # 数据分析
@@ -24,6 +22,7 @@ from poly_data.abis import NegRiskAdapterABI, ConditionalTokenABI, erc20_abi
 # 网络工具和日志
 from poly_data.network_utils import retry_on_network_error
 from poly_data.logger import get_logger
+from poly_data.endpoints import CLOB_HOST, DATA_API_URL, POLYGON_RPC_URL
 
 # 创建客户端日志记录器
 client_logger = get_logger('polymarket_client', console_output=True)
@@ -52,7 +51,7 @@ class PolymarketClient:
         参数：
             pk (str, optional): 私钥标识符，默认为'default'
         """
-        host="https://clob.polymarket.com"
+        host=CLOB_HOST
 
         # 从环境变量获取凭证
         key=os.getenv("PK")
@@ -61,7 +60,7 @@ class PolymarketClient:
         # 不打印敏感的钱包信息
         client_logger.info("正在初始化Polymarket客户端...")
         chain_id=POLYGON
-        self.browser_wallet=Web3.to_checksum_address(browser_address)
+        self.browser_wallet=to_checksum_address(browser_address)
 
         # 初始化Polymarket API客户端
         self.client = ClobClient(
@@ -72,20 +71,10 @@ class PolymarketClient:
             signature_type=2
         )
 
-        # 设置API凭证
-        self.creds = self.client.create_or_derive_api_creds()
+        # 设置API凭证；环境变量中已配置凭证时跳过网络派生，加快启动
+        self.creds = self._load_api_creds()
         self.client.set_api_creds(creds=self.creds)
 
-        # 初始化到Polygon的Web3连接
-        web3 = Web3(Web3.HTTPProvider("https://polygon-rpc.com"))
-        web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
-
-        # 设置USDC合约用于余额检查
-        self.usdc_contract = web3.eth.contract(
-            address="0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174",
-            abi=erc20_abi
-        )
-
         # 存储关键合约地址
         self.addresses = {
             'neg_risk_adapter': '0xd91E80cF2E7be2e162c6513ceD06f1dD0dA35296',
@@ -93,19 +82,85 @@ class PolymarketClient:
             'conditional_tokens': '0x4D97DCd97eC945f40cF65F87097ACe5EA0476045'
         }
 
+        # Web3连接和合约接口在首次使用时创建
+        self._web3 = None
+        self._contracts = {}
+
+    def _init_web3(self):
+        """
+        创建到Polygon的Web3连接和合约接口。
+
+        只有查询链上余额和持仓时才需要，推迟到首次使用以加快导入和启动。
+        """
+        from web3 import Web3
+        from web3.middleware import ExtraDataToPOAMiddleware
+
+        # 初始化到Polygon的Web3连接
+        web3 = Web3(Web3.HTTPProvider(POLYGON_RPC_URL))
+        web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+
+        # 设置USDC合约用于余额检查
+        self._contracts['usdc'] = web3.eth.contract(
+            address=self.addresses['collateral'],
+            abi=erc20_abi
+        )
+
         # 初始化合约接口
-        self.neg_risk_adapter = web3.eth.contract(
+        self._contracts['neg_risk_adapter'] = web3.eth.contract(
             address=self.addresses['neg_risk_adapter'],
             abi=NegRiskAdapterABI
         )
 
-        self.conditional_tokens = web3.eth.contract(
+        self._contracts['conditional_tokens'] = web3.eth.contract(
             address=self.addresses['conditional_tokens'],
             abi=ConditionalTokenABI
         )
 
-        self.web3 = web3
+        self._web3 = web3
+
+    @property
+    def web3(self):
+        if self._web3 is None:
+            self._init_web3()
+        return self._web3
+
+    @property
+    def usdc_contract(self):
+        if self._web3 is None:
+            self._init_web3()
+        return self._contracts['usdc']
+
+    @property
+    def neg_risk_adapter(self):
+        if self._web3 is None:
+            self._init_web3()
+        return self._contracts['neg_risk_adapter']
+
+    @property
+    def conditional_tokens(self):
+        if self._web3 is None:
+            self._init_web3()
+        return self._contracts['conditional_tokens']
+
+    def _load_api_creds(self):
+        """
+        获取API凭证。
+
+        优先使用环境变量 CLOB_API_KEY / CLOB_SECRET / CLOB_PASS_PHRASE，
+        未配置时通过网络创建或派生。
+
+        返回：
+            ApiCreds: API凭证
+        """
+        api_key = os.getenv("CLOB_API_KEY")
+        api_secret = os.getenv("CLOB_SECRET")
+        api_passphrase = os.getenv("CLOB_PASS_PHRASE")
+
+        if api_key and api_secret and api_passphrase:
+            client_logger.info("使用环境变量中的API凭证")
+            return ApiCreds(api_key=api_key, api_secret=api_secret, api_passphrase=api_passphrase)
 
+        return self.client.create_or_derive_api_creds()
 
     def create_order(self, marketId, action, price, size, neg_risk=False):
         """
@@ -168,7 +223,7 @@ class PolymarketClient:
         """
         return self.usdc_contract.functions.balanceOf(self.browser_wallet).call() / 10**6
 
-    @retry_on_network_error(max_retries=3, delay=2)
+    @retry_on_network_error(max_retries=3, delay=2, endpoint='data-api')
     def get_pos_balance(self):
         """
         获取连接钱包所有持仓的总价值。
@@ -176,7 +231,7 @@ class PolymarketClient:
         返回：
             float: USDC计价的总持仓价值
         """
-        res = requests.get(f'https://data-api.polymarket.com/value?user={self.browser_wallet}', timeout=10)
+        res = requests.get(f'{DATA_API_URL}/value?user={self.browser_wallet}', timeout=10)
         data = res.json()
         # API 返回的是列表，取第一个元素的 value 字段
         if isinstance(data, list) and len(data) > 0:
@@ -192,6 +247,7 @@ class PolymarketClient:
         """
         return self.get_usdc_balance() + self.get_pos_balance()
 
+    @retry_on_network_error(max_retries=2, delay=1, endpoint='data-api')
     def get_all_positions(self):
         """
         获取连接钱包在所有市场的所有持仓。
@@ -199,7 +255,7 @@ class PolymarketClient:
         返回：
             DataFrame: 包含市场、规模、平均价格等详情的所有持仓
         """
-        res = requests.get(f'https://data-api.polymarket.com/positions?user={self.browser_wallet}')
+        res = requests.get(f'{DATA_API_URL}/positions?user={self.browser_wallet}', timeout=10)
         return pd.DataFrame(res.json())
 
     def get_raw_position(self, tokenId):
@@ -234,7 +290,7 @@ class PolymarketClient:
 
         return raw_position, shares
 
-    @retry_on_network_error(max_retries=3, delay=2)
+    @retry_on_network_error(max_retries=3, delay=2, endpoint='clob')
     def get_all_orders(self):
         """
         获取连接钱包的所有未成交订单。
@@ -273,6 +329,8 @@ class PolymarketClient:
         return orders_df
 
 
+    # 撤单是保护性操作，使用独立的熔断器，订单簿/价格读取故障打开 'clob' 熔断器时撤单仍会发出
+    @retry_on_network_error(max_retries=0, endpoint='clob-cancel')
     def cancel_all_asset(self, asset_id):
         """
         取消特定资产token的所有订单。
@@ -284,6 +342,7 @@ class PolymarketClient:
 
 
 
+    @retry_on_network_error(max_retries=0, endpoint='clob-cancel')
     def cancel_all_market(self, marketId):
         """
         取消特定市场的所有订单。
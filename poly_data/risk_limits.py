@@ -0,0 +1,181 @@
+"""
+全局风险和余额限制 - 新买单不能使总敞口超过上限，挂出的买单不能超过可用 USDC
+
+- 敞口 = 持仓数量 × 平均成本 + 买单剩余数量 × 价格，对本进程的所有 token 求和
+- MAX_TOTAL_EXPOSURE > 0 时限制敞口；CHECK_USDC_BALANCE 开启时限制买单名义金额之和不超过
+  USDC 余额减去 USDC_RESERVE（余额来自共享余额服务，最多 BALANCE_TTL 秒前的值）
+- 替换某个 token 的买单时，该 token 现有的买单不计入，新旧订单不会被重复计算
+
+单进程运行时本进程的额度就是全局上限。多进程分片运行（见 poly_data.supervisor）时由协调进程
+计算全局上限，先扣除不属于任何分片的 token（如已移除市场的持仓）占用的额度，
+再按各工作进程的市场数量拆分后下发，各进程额度与扣除部分之和等于全局上限，
+因此不依赖工作进程报告的时效性，也不需要在下单路径上跨进程询问。
+
+两项限制都未开启时 allow_buy 直接返回 True，行为与之前相同。
+
+使用示例:
+    refresh_limits()                              # 单进程：定期按余额刷新额度
+    if allow_buy(token, price, size): ...         # 下买单前检查
+"""
+import os
+import threading
+
+import poly_data.global_state as global_state
+from poly_data.logger import get_logger
+
+# 创建风险限制日志记录器
+risk_logger = get_logger('risk_limits', console_output=True)
+
+# 总敞口上限（USDC），0 表示不限制
+MAX_TOTAL_EXPOSURE = float(os.getenv('MAX_TOTAL_EXPOSURE', '0'))
+
+# 是否限制买单名义金额不超过 USDC 余额，以及保留不用的 USDC
+CHECK_USDC_BALANCE = os.getenv('CHECK_USDC_BALANCE', 'false').lower() in ('1', 'true', 'yes')
+USDC_RESERVE = float(os.getenv('USDC_RESERVE', '0'))
+
+LIMIT_KEYS = ('exposure', 'open_buys')
+
+
+def _initial_limits():
+    # 余额未知时不允许新买单，直到第一次刷新成功
+    return {'exposure': MAX_TOTAL_EXPOSURE if MAX_TOTAL_EXPOSURE > 0 else None,
+            'open_buys': 0.0 if CHECK_USDC_BALANCE else None}
+
+
+# 本进程的额度，None 表示该项不限制
+_limits = _initial_limits()
+_lock = threading.Lock()
+
+
+def enabled():
+    """是否开启了任一项限制"""
+    return MAX_TOTAL_EXPOSURE > 0 or CHECK_USDC_BALANCE
+
+
+def global_limits(balance_service=None):
+    """
+    按当前余额计算全局上限
+
+    返回:
+        dict: {'exposure': ..., 'open_buys': ...}，未开启的项为 None
+
+    异常:
+        开启了余额限制且余额获取失败（没有可用的旧值）时抛出
+    """
+    limits = {'exposure': MAX_TOTAL_EXPOSURE if MAX_TOTAL_EXPOSURE > 0 else None, 'open_buys': None}
+    if CHECK_USDC_BALANCE:
+        if balance_service is None:
+            from poly_data.balance_service import get_balance_service
+            balance_service = get_balance_service()
+        limits['open_buys'] = max(float(balance_service.get_usdc_balance()) - USDC_RESERVE, 0.0)
+    return limits
+
+
+def split_limits(limits, weights):
+    """
+    把全局上限按权重拆分为各进程的额度
+
+    返回:
+        list: 与 weights 对应的额度；权重之和为 0 时各进程额度为 0
+    """
+    total = float(sum(weights))
+    return [{key: None if limits[key] is None else (limits[key] * weight / total if total > 0 else 0.0)
+             for key in LIMIT_KEYS} for weight in weights]
+
+
+def reserve_limits(limits, exposure, open_buys):
+    """从全局上限中扣除已占用的敞口和买单金额（不低于 0）"""
+    reserved = dict(limits)
+    for key, used in (('exposure', exposure), ('open_buys', open_buys)):
+        if reserved[key] is not None:
+            reserved[key] = max(reserved[key] - used, 0.0)
+    return reserved
+
+
+def frame_usage(positions, orders):
+    """
+    由 get_all_positions / get_all_orders 的结果计算敞口和买单名义金额
+
+    返回:
+        tuple: (敞口, 买单名义金额)，与 current_usage 的口径相同
+    """
+    position_cost = 0.0
+    if positions is not None and len(positions) > 0:
+        sizes = positions['size'].astype(float).clip(lower=0)
+        position_cost = float((sizes * positions['avgPrice'].astype(float)).sum())
+
+    open_buys = 0.0
+    if orders is not None and len(orders) > 0:
+        buys = orders[orders['side'] == 'BUY']
+        open_buys = float(((buys['original_size'] - buys['size_matched']) * buys['price']).sum())
+
+    return position_cost + open_buys, open_buys
+
+
+def set_limits(limits):
+    with _lock:
+        _limits.update({key: limits.get(key) for key in LIMIT_KEYS})
+
+
+def get_limits():
+    with _lock:
+        return dict(_limits)
+
+
+def refresh_limits():
+    """单进程运行时按当前余额刷新额度；获取失败时保留之前的额度"""
+    if not enabled():
+        return
+    try:
+        set_limits(global_limits())
+    except Exception as e:
+        risk_logger.warning(f"刷新风险额度失败，保留之前的额度 {get_limits()}: {type(e).__name__}: {e}")
+
+
+def current_usage(exclude_buy_token=None):
+    """
+    本进程当前的敞口和买单名义金额
+
+    参数:
+        exclude_buy_token: 不计入该 token 的买单（即将被替换）
+
+    返回:
+        tuple: (敞口, 买单名义金额)
+    """
+    position_cost = 0.0
+    for position in list(global_state.positions.values()):
+        position_cost += max(float(position.get('size', 0) or 0), 0.0) * float(position.get('avgPrice', 0) or 0)
+
+    open_buys = 0.0
+    for token, order in list(global_state.orders.items()):
+        if token == exclude_buy_token:
+            continue
+        buy = order.get('buy') or {}
+        open_buys += float(buy.get('size', 0) or 0) * float(buy.get('price', 0) or 0)
+
+    return position_cost + open_buys, open_buys
+
+
+def allow_buy(token, price, size):
+    """
+    检查新买单是否在额度内
+
+    参数:
+        token: token ID，该 token 现有的买单视为被替换
+        price / size: 新买单的价格和数量
+    """
+    limits = get_limits()
+    if limits['exposure'] is None and limits['open_buys'] is None:
+        return True
+
+    exposure, open_buys = current_usage(exclude_buy_token=str(token))
+    notional = float(price) * float(size)
+    if limits['exposure'] is not None and exposure + notional > limits['exposure']:
+        risk_logger.warning(f"买单 {token} {size}@{price} 将使敞口达到 {exposure + notional:.2f}，"
+                            f"超过额度 {limits['exposure']:.2f}")
+        return False
+    if limits['open_buys'] is not None and open_buys + notional > limits['open_buys']:
+        risk_logger.warning(f"买单 {token} {size}@{price} 将使买单金额达到 {open_buys + notional:.2f}，"
+                            f"超过可用 USDC {limits['open_buys']:.2f}")
+        return False
+    return True
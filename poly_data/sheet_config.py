@@ -0,0 +1,425 @@
+"""
+表格配置源 - 按修订版本缓存 Google Sheets 中的市场配置和超参数
+
+- 认证模式下先查询表格的最后修改时间，未变化时不下载任何数据
+- 三个工作表通过一次 values_batch_get 批量读取
+- 内容哈希未变化时跳过 pandas 合并和超参数解析
+- 最近一次成功读取的数据保存在本地缓存文件中，用于表格不可用时的回退和快速启动
+- 默认（CONFIG_SOURCE=catalog）从本地市场目录读取，表格只在后台定期导入
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+import traceback
+from collections import namedtuple
+
+import pandas as pd
+
+from poly_utils.google_utils import get_spreadsheet
+from poly_utils.market_catalog import get_catalog, ALL_MARKETS_VIEW
+from poly_data.logger import get_logger
+
+# 创建配置日志记录器
+config_logger = get_logger('sheet_config', console_output=True)
+
+SELECTED_SHEET = 'Selected Markets'
+ALL_SHEET = 'All Markets'
+PARAMS_SHEET = 'Hyperparameters'
+CONFIG_SHEETS = [SELECTED_SHEET, ALL_SHEET, PARAMS_SHEET]
+
+# 本地缓存文件路径
+CONFIG_CACHE_FILE = os.getenv('CONFIG_CACHE_FILE', 'data/sheet_config_cache.json')
+
+# 配置来源: catalog 从本地市场目录读取（默认），sheets 直接读取表格
+CONFIG_SOURCE = os.getenv('CONFIG_SOURCE', 'catalog')
+
+# 从表格导入 Selected Markets 和 Hyperparameters 到本地目录的间隔（秒）
+SHEET_IMPORT_INTERVAL = float(os.getenv('SHEET_IMPORT_INTERVAL', '30'))
+
+# 本机写入的 All Markets 超过此时间（秒）未更新时，改为从表格导入
+LOCAL_VIEW_MAX_AGE = 2 * 60 * 60
+
+# 一次配置更新的结果
+# df: 合并后的完整市场配置; params: 超参数
+# changed: 新增或内容变化的行; removed: 已删除行的键列表
+ConfigUpdate = namedtuple('ConfigUpdate', ['df', 'params', 'changed', 'removed', 'revision'])
+
+
+def _numericise(value):
+    """与 gspread 的 numericise 相同：能转换为数字的字符串转为 int/float"""
+    if not isinstance(value, str) or value == '' or '_' in value:
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+
+def sheet_value(value):
+    """与表格读取结果保持一致：布尔值表示为 'TRUE'/'FALSE' 字符串"""
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    return value
+
+
+def values_to_records(values):
+    """
+    将工作表的二维值列表转换为字典列表，与 gspread 的 get_all_records 格式一致
+
+    参数:
+        values: 第一行为表头的二维列表
+    """
+    if not values:
+        return []
+
+    headers = values[0]
+    records = []
+    for row in values[1:]:
+        row = list(row) + [''] * (len(headers) - len(row))
+        records.append({header: _numericise(value) for header, value in zip(headers, row)})
+    return records
+
+
+def parse_hyperparameters(records):
+    """
+    解析 Hyperparameters 工作表
+
+    表格中只有每组的第一行填写 type，后续行沿用上一个 type。
+
+    返回:
+        dict: {param_type: {param: value}}
+    """
+    hyperparams, current_type = {}, None
+
+    for r in records:
+        # 只有在有非空类型值时才更新current_type
+        # 处理来自pandas的字符串和NaN值
+        type_value = r['type']
+        if type_value and str(type_value).strip() and str(type_value) != 'nan':
+            current_type = str(type_value).strip()
+
+        # 跳过没有设置current_type的行
+        if current_type:
+            # 将数值转换为适当的类型
+            value = r['value']
+            try:
+                # 如果是数字，尝试转换为float
+                if isinstance(value, str) and value.replace('.', '').replace('-', '').isdigit():
+                    value = float(value)
+                elif isinstance(value, (int, float)):
+                    value = float(value)
+            except (ValueError, TypeError):
+                pass  # 如果转换失败，保持为字符串
+
+            hyperparams.setdefault(current_type, {})[r['param']] = value
+
+    return hyperparams
+
+
+def build_market_df(selected_records, all_records):
+    """将 Selected Markets 与 All Markets 按 question 合并"""
+    df = pd.DataFrame(selected_records)
+    df2 = pd.DataFrame(all_records)
+
+    if len(df) == 0 or len(df2) == 0:
+        return pd.DataFrame()
+
+    df = df[df['question'] != ""].reset_index(drop=True)
+    df2 = df2[df2['question'] != ""].reset_index(drop=True)
+
+    return df.merge(df2, on='question', how='inner')
+
+
+def _row_key(row):
+    return str(row['condition_id']) if 'condition_id' in row else str(row['question'])
+
+
+def diff_rows(old_df, new_df):
+    """
+    比较新旧配置，找出新增或变化的行以及被删除的行
+
+    返回:
+        tuple: (changed_df, removed_keys)
+    """
+    if new_df is None or len(new_df) == 0:
+        removed = [_row_key(r) for _, r in old_df.iterrows()] if old_df is not None else []
+        return pd.DataFrame(), removed
+
+    new_keys = new_df.apply(_row_key, axis=1)
+    new_sigs = new_df.apply(lambda r: json.dumps(r.to_dict(), sort_keys=True, default=str), axis=1)
+
+    if old_df is None or len(old_df) == 0:
+        return new_df, []
+
+    old_sigs = dict(zip(old_df.apply(_row_key, axis=1),
+                        old_df.apply(lambda r: json.dumps(r.to_dict(), sort_keys=True, default=str), axis=1)))
+
+    changed_mask = [old_sigs.get(key) != sig for key, sig in zip(new_keys, new_sigs)]
+    new_key_set = set(new_keys)
+    removed = [key for key in old_sigs if key not in new_key_set]
+    return new_df[changed_mask], removed
+
+
+class SheetConfigSource:
+    """
+    带修订版本检查和本地缓存的表格配置源
+
+    使用示例:
+        source = SheetConfigSource()
+        update = source.refresh()
+        if update is not None:
+            df, params = update.df, update.params
+    """
+
+    def __init__(self, read_only=None, cache_file=CONFIG_CACHE_FILE):
+        """
+        参数:
+            read_only: 是否只读模式；None 时根据凭证文件是否存在自动检测
+            cache_file: 本地缓存文件路径
+        """
+        if read_only is None:
+            creds_file = 'credentials.json' if os.path.exists('credentials.json') else '../credentials.json'
+            read_only = not os.path.exists(creds_file)
+            if read_only:
+                config_logger.info("未找到凭证，使用只读模式")
+
+        self.read_only = read_only
+        self.cache_file = cache_file
+        self._spreadsheet = None
+
+        self.revision = None
+        self.content_hash = None
+        # 最后一次成功读取表格（包括确认未变化）的时间
+        self.synced_at = None
+        self.records = None
+        self.df = None
+        self.params = None
+
+    def _get_spreadsheet(self):
+        if self._spreadsheet is None:
+            try:
+                self._spreadsheet = get_spreadsheet(read_only=self.read_only)
+            except FileNotFoundError:
+                config_logger.warning("未找到凭证，回退到只读模式")
+                self.read_only = True
+                self._spreadsheet = get_spreadsheet(read_only=True)
+        return self._spreadsheet
+
+    def _get_revision(self, spreadsheet):
+        """获取表格的最后修改时间作为修订版本；只读模式或查询失败时返回 None"""
+        if not hasattr(spreadsheet, 'get_lastUpdateTime'):
+            return None
+        try:
+            return spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            config_logger.debug(f"获取表格修订版本失败: {e}")
+            return None
+
+    def _fetch_records(self, spreadsheet):
+        """一次批量读取所有配置工作表；只读模式下逐个读取"""
+        if hasattr(spreadsheet, 'values_batch_get'):
+            ranges = [f"'{title}'" for title in CONFIG_SHEETS]
+            response = spreadsheet.values_batch_get(ranges)
+            value_ranges = response.get('valueRanges', [])
+            return {title: values_to_records(vr.get('values', []))
+                    for title, vr in zip(CONFIG_SHEETS, value_ranges)}
+
+        return {title: spreadsheet.worksheet(title).get_all_records() for title in CONFIG_SHEETS}
+
+    def _apply(self, records, revision, content_hash):
+        """解析原始记录并计算变化的行"""
+        df = build_market_df(records[SELECTED_SHEET], records[ALL_SHEET])
+        params = parse_hyperparameters(records[PARAMS_SHEET])
+
+        changed, removed = diff_rows(self.df, df)
+        if params != self.params:
+            # 超参数变化会影响所有市场
+            changed = df
+
+        self.df, self.params, self.records = df, params, records
+        self.revision, self.content_hash = revision, content_hash
+        return ConfigUpdate(df, params, changed, removed, revision)
+
+    def _save_cache(self, records, revision, content_hash):
+        directory = os.path.dirname(self.cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = self.cache_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'saved_at': time.time(), 'revision': revision, 'content_hash': content_hash,
+                       'records': records}, f, default=str)
+        os.replace(tmp_path, self.cache_file)
+
+    def load_cached(self):
+        """
+        从本地缓存文件加载上一次成功读取的配置
+
+        返回:
+            ConfigUpdate 或 None（没有可用缓存时）
+        """
+        if not os.path.exists(self.cache_file):
+            return None
+
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError) as e:
+            config_logger.warning(f"读取配置缓存失败: {e}")
+            return None
+
+        age = time.time() - cached.get('saved_at', 0)
+        config_logger.info(f"使用 {age:.0f} 秒前的本地配置缓存")
+        return self._apply(cached['records'], cached.get('revision'), cached.get('content_hash'))
+
+    def refresh(self, force=False):
+        """
+        检查表格是否有变化，有变化时重新读取
+
+        参数:
+            force: 忽略修订版本和内容哈希，强制重新解析
+
+        返回:
+            ConfigUpdate: 配置有变化（或 force=True）时
+            None: 配置未变化
+
+        表格不可用时，如果内存中还没有配置，则回退到本地缓存；否则抛出异常，保留当前配置。
+        """
+        try:
+            spreadsheet = self._get_spreadsheet()
+
+            revision = self._get_revision(spreadsheet)
+            if not force and revision is not None and revision == self.revision:
+                config_logger.debug(f"表格修订版本未变化 ({revision})，跳过读取")
+                self.synced_at = time.time()
+                return None
+
+            records = self._fetch_records(spreadsheet)
+            self.synced_at = time.time()
+        except Exception as e:
+            # 认证连接可能已失效，下次重新创建
+            self._spreadsheet = None
+            if self.df is None:
+                config_logger.warning(f"读取表格失败，尝试使用本地缓存: {type(e).__name__}: {e}")
+                cached = self.load_cached()
+                if cached is not None:
+                    return cached
+            raise
+
+        content_hash = hashlib.sha1(json.dumps(records, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        if not force and content_hash == self.content_hash:
+            self.revision = revision
+            config_logger.debug("表格内容未变化，跳过解析")
+            return None
+
+        update = self._apply(records, revision, content_hash)
+
+        try:
+            self._save_cache(records, revision, content_hash)
+        except OSError as e:
+            config_logger.warning(f"保存配置缓存失败: {e}")
+
+        return update
+
+
+class CatalogConfigSource(SheetConfigSource):
+    """
+    从本地市场目录读取配置
+
+    读取配置只访问本地 SQLite，不等待表格。表格中人工编辑的 Selected Markets 和
+    Hyperparameters 由后台线程定期导入目录；All Markets 由 update_markets.py 直接写入目录，
+    只有本机没有写入或写入已过期时才从表格导入。
+    """
+
+    def __init__(self, read_only=None, catalog=None, import_interval=SHEET_IMPORT_INTERVAL):
+        super().__init__(read_only=read_only, cache_file=None)
+        self.catalog = catalog or get_catalog()
+        self.sheets = SheetConfigSource(read_only=self.read_only)
+        self.import_interval = import_interval
+        self._last_import = 0
+        self._import_thread = None
+
+    def _get_spreadsheet(self):
+        return self.catalog
+
+    def _get_revision(self, catalog):
+        return catalog.revision()
+
+    def _fetch_records(self, catalog):
+        # 目录中 update_markets.py 写入的布尔字段（如 neg_risk）转换为表格中的 'TRUE'/'FALSE'，
+        # 下游按表格格式比较
+        records = {
+            SELECTED_SHEET: catalog.read_selections(),
+            ALL_SHEET: catalog.read_view_records(ALL_MARKETS_VIEW),
+            PARAMS_SHEET: catalog.read_hyperparameters(),
+        }
+        return {title: [{k: sheet_value(v) for k, v in r.items()} for r in rows]
+                for title, rows in records.items()}
+
+    def _save_cache(self, records, revision, content_hash):
+        # 目录本身就是本地持久化的
+        pass
+
+    def load_cached(self):
+        return None
+
+    def import_sheets(self):
+        """从表格导入配置到本地目录；表格未变化时不写入，只更新选择列表的同步时间"""
+        synced_at = self.sheets.synced_at
+        update = self.sheets.refresh()
+        if update is None:
+            if self.sheets.synced_at != synced_at:
+                self.catalog.mark_selections_synced(self.sheets.synced_at)
+            return False
+
+        records = self.sheets.records
+        self.catalog.write_selections(records[SELECTED_SHEET])
+        self.catalog.write_hyperparameters(records[PARAMS_SHEET])
+
+        info = self.catalog.view_info(ALL_MARKETS_VIEW)
+        if info is None or info['source'] != 'local' or time.time() - info['updated_at'] > LOCAL_VIEW_MAX_AGE:
+            all_records = [r for r in records[ALL_SHEET] if r.get('question') != '']
+            self.catalog.write_view(ALL_MARKETS_VIEW, pd.DataFrame(all_records), source='sheet')
+
+        config_logger.info("已将表格配置导入本地目录")
+        return True
+
+    def _import_in_background(self):
+        try:
+            self.import_sheets()
+        except Exception as e:
+            config_logger.warning(f"从表格导入配置失败，继续使用本地目录: {type(e).__name__}: {e}")
+            config_logger.debug(traceback.format_exc())
+
+    def refresh(self, force=False):
+        # 目录中还没有配置时同步导入一次，之后在后台定期导入
+        if not self.catalog.has_config():
+            self.import_sheets()
+            self._last_import = time.time()
+        elif time.time() - self._last_import >= self.import_interval and \
+                (self._import_thread is None or not self._import_thread.is_alive()):
+            self._last_import = time.time()
+            self._import_thread = threading.Thread(target=self._import_in_background, daemon=True)
+            self._import_thread.start()
+
+        return super().refresh(force=force)
+
+
+# 进程内共享的配置源
+_config_source = None
+
+
+def get_config_source(read_only=None):
+    """获取进程内共享的配置源，由 CONFIG_SOURCE 决定读取本地目录还是表格"""
+    global _config_source
+    if _config_source is None:
+        if CONFIG_SOURCE == 'sheets':
+            _config_source = SheetConfigSource(read_only=read_only)
+        else:
+            _config_source = CatalogConfigSource(read_only=read_only)
+    return _config_source
@@ -0,0 +1,143 @@
+"""
+状态快照模块 - 将配置、持仓、订单和订单簿保存到本地磁盘，用于重启后快速恢复
+"""
+import os
+import json
+import time
+
+import pandas as pd
+from sortedcontainers import SortedDict
+
+import poly_data.global_state as global_state
+from poly_data.logger import get_logger
+
+# 创建快照日志记录器
+snapshot_logger = get_logger('snapshot', console_output=True)
+
+# 快照文件路径
+SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', 'data/bot_snapshot.json')
+
+# 快照最大有效期（秒），超过此时间的快照不会用于热启动
+SNAPSHOT_MAX_AGE = float(os.getenv('SNAPSHOT_MAX_AGE', '300'))
+
+
+def _json_default(obj):
+    """将numpy标量等对象转换为JSON可序列化的值"""
+    if hasattr(obj, 'item'):
+        return obj.item()
+    if isinstance(obj, set):
+        return list(obj)
+    return str(obj)
+
+
+def _serialize_books():
+    """复制订单簿；事件循环可能同时在修改，失败的市场直接跳过"""
+    books = {}
+    for market, book in list(global_state.all_data.items()):
+        try:
+            books[market] = {
+                'asset_id': book['asset_id'],
+                'bids': list(book['bids'].items()),
+                'asks': list(book['asks'].items()),
+            }
+        except RuntimeError:
+            snapshot_logger.debug(f"订单簿 {market} 正在更新，跳过快照")
+    return books
+
+
+def save_snapshot(path=SNAPSHOT_FILE):
+    """
+    将当前全局状态写入快照文件
+
+    先写入临时文件再原子替换，避免进程中途退出留下损坏的快照。
+    """
+    if global_state.df is None:
+        return
+
+    snapshot = {
+        'saved_at': time.time(),
+        'df': global_state.df.to_dict('records'),
+        'params': global_state.params,
+        'positions': dict(global_state.positions),
+        'orders': dict(global_state.orders),
+        'all_tokens': list(global_state.all_tokens),
+        'reverse_tokens': dict(global_state.REVERSE_TOKENS),
+        'books': _serialize_books(),
+    }
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, default=_json_default)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path=SNAPSHOT_FILE, max_age=SNAPSHOT_MAX_AGE):
+    """
+    从快照文件恢复全局状态
+
+    参数:
+        path: 快照文件路径
+        max_age: 快照最大有效期（秒）
+
+    返回:
+        bool: 是否成功恢复
+    """
+    if not os.path.exists(path):
+        snapshot_logger.info("未找到快照文件，跳过热启动")
+        return False
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        snapshot_logger.warning(f"读取快照失败: {e}")
+        return False
+
+    age = time.time() - snapshot.get('saved_at', 0)
+    if age > max_age:
+        snapshot_logger.info(f"快照已过期 ({age:.0f} 秒 > {max_age:.0f} 秒)，跳过热启动")
+        return False
+
+    # 先完整解析，结构不完整的快照不会只恢复一部分全局状态
+    try:
+        df = pd.DataFrame(snapshot['df'])
+        params, positions, orders = snapshot['params'], snapshot['positions'], snapshot['orders']
+        reverse_tokens, all_tokens = dict(snapshot['reverse_tokens']), list(snapshot['all_tokens'])
+        books = {
+            market: {
+                'asset_id': book['asset_id'],
+                'bids': SortedDict({float(p): float(s) for p, s in book['bids']}),
+                'asks': SortedDict({float(p): float(s) for p, s in book['asks']}),
+            }
+            for market, book in snapshot['books'].items()
+        }
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        snapshot_logger.warning(f"快照结构不完整，跳过热启动: {type(e).__name__}: {e}")
+        return False
+
+    if len(df) == 0:
+        return False
+
+    global_state.df = df
+    global_state.params = params
+    global_state.positions = positions
+    global_state.orders = orders
+    global_state.REVERSE_TOKENS.update(reverse_tokens)
+
+    for token in all_tokens:
+        if token not in global_state.all_tokens:
+            global_state.all_tokens.append(token)
+
+    for token in global_state.REVERSE_TOKENS:
+        for col in [f"{token}_buy", f"{token}_sell"]:
+            global_state.performing.setdefault(col, set())
+
+    global_state.all_data.update(books)
+
+    snapshot_logger.info(f"已从 {age:.0f} 秒前的快照恢复: {len(df)} 个市场, {len(global_state.positions)} 个持仓, "
+                         f"{len(global_state.orders)} 个订单, {len(books)} 个订单簿")
+    return True
@@ -0,0 +1,494 @@
+"""
+多进程市场分片 - 协调进程把选中的市场分配给多个交易工作进程，每个进程只处理自己的市场
+
+- 协调进程读取市场配置，按市场（condition_id）分片：已分配的市场保持在原进程，
+  新市场分配给市场最少的进程；每 CONFIG_INTERVAL 秒把变化的部分发给对应的进程
+- 每个工作进程有自己的交易客户端、市场 websocket（只订阅本分片的 token）、用户 websocket
+  和下单路径，订单簿事件在各自的进程中处理，吞吐量随 CPU 核心数增加
+- 持仓和订单由协调进程每 STATE_INTERVAL 秒统一获取一次，按 token 分发；
+  不属于任何分片的 token（如已移除市场的持仓）留在协调进程，不分发给任何工作进程
+- 工作进程需要重新获取持仓时（如交易失败）向协调进程发送 refresh 请求，不自己获取整个账户的持仓
+- 全局风险和余额额度（见 poly_data.risk_limits）由协调进程计算，先扣除未分配 token 占用的部分，
+  再按各进程的市场数量拆分后下发
+- 工作进程异常退出时用该分片的完整状态重新启动
+
+API 凭证由协调进程获取一次，通过环境变量传给工作进程，工作进程不再派生凭证。
+分片运行时不保存热启动快照，每个工作进程把实时订单簿发布到自己的分片文件，PnL 快照各自记录。
+
+使用示例:
+    python main.py --workers 4        # 4 个工作进程
+    TRADING_WORKERS=0 python main.py  # 每个 CPU 核心一个工作进程
+"""
+import gc
+import os
+import time
+import queue
+import signal
+import asyncio
+import threading
+import traceback
+import multiprocessing
+
+import pandas as pd
+
+import poly_data.global_state as global_state
+from poly_data.sheet_config import ConfigUpdate, _row_key
+from poly_data.risk_limits import (global_limits, split_limits, reserve_limits, frame_usage, set_limits,
+                                   current_usage, enabled)
+from poly_data.logger import get_logger
+
+# 创建分片协调日志记录器
+supervisor_logger = get_logger('supervisor', console_output=True)
+
+# 工作进程数：1 为单进程运行，0 为每个 CPU 核心一个
+TRADING_WORKERS = int(os.getenv('TRADING_WORKERS', '1'))
+
+# 持仓、订单和额度的分发间隔（秒），与单进程运行时的轮询间隔相同
+STATE_INTERVAL = 5
+
+# 市场配置的检查间隔（秒）
+CONFIG_INTERVAL = 30
+
+# 各工作进程吞吐量的日志间隔（秒）
+STATUS_LOG_INTERVAL = float(os.getenv('STATUS_LOG_INTERVAL', '60'))
+
+
+class ShardMap:
+    """
+    市场到分片的粘性分配
+
+    使用示例:
+        shard_map = ShardMap(4)
+        shard_map.assign(df)
+        shard_map.shard_of(token)  # 不属于任何分片时为 None
+    """
+
+    def __init__(self, shards):
+        self.shards = shards
+        self.markets = {}  # condition_id -> 分片
+        self.tokens = {}   # token -> 分片
+
+    def counts(self):
+        counts = [0] * self.shards
+        for shard in self.markets.values():
+            counts[shard] += 1
+        return counts
+
+    def assign(self, df):
+        """按新配置更新分配：已移除的市场释放，新市场放到市场最少的分片"""
+        rows = {_row_key(row): row for _, row in df.iterrows()} if df is not None else {}
+        self.markets = {key: shard for key, shard in self.markets.items() if key in rows}
+
+        counts = self.counts()
+        for key in rows:
+            if key not in self.markets:
+                shard = counts.index(min(counts))
+                self.markets[key] = shard
+                counts[shard] += 1
+
+        self.tokens = {}
+        for key, row in rows.items():
+            for col in ('token1', 'token2'):
+                self.tokens[str(row[col])] = self.markets[key]
+
+    def shard_of(self, token):
+        return self.tokens.get(str(token))
+
+    def subset(self, df, shard):
+        """df 中属于 shard 的行"""
+        if df is None or len(df) == 0:
+            return pd.DataFrame()
+        mask = [self.markets.get(_row_key(row)) == shard for _, row in df.iterrows()]
+        return df[mask]
+
+    def split_update(self, update, previous):
+        """
+        把配置变化拆分到各分片
+
+        参数:
+            update: update_markets 返回的 ConfigUpdate
+            previous: 变化前的 {condition_id: 分片}，用于找到已移除市场所在的分片
+
+        返回:
+            list: 每个分片的 ConfigUpdate，没有变化的分片为 None；
+                  分片的市场全部被移除时 df 为空，应以 'clear' 消息发送（见 config_message）
+        """
+        updates = []
+        for shard in range(self.shards):
+            changed = self.subset(update.changed, shard)
+            removed = [key for key in update.removed if previous.get(key) == shard]
+            if len(changed) == 0 and not removed:
+                updates.append(None)
+                continue
+            updates.append(ConfigUpdate(self.subset(update.df, shard), update.params, changed, removed,
+                                        update.revision))
+        return updates
+
+    def full_update(self, shard, revision=None):
+        """分片的完整配置，用于启动或重启工作进程"""
+        df = self.subset(global_state.df, shard)
+        return ConfigUpdate(df, global_state.params, df, [], revision)
+
+    @staticmethod
+    def config_message(update):
+        """分片配置对应的消息；空分片用 'clear' 清空工作进程的配置，而不是被当作读取失败忽略"""
+        return ('config', update) if len(update.df) > 0 else ('clear', None)
+
+    def route(self, frame, column):
+        """按 token 列把持仓或订单拆分到各分片；不属于任何分片的行不包含在内（见 orphans）"""
+        if frame is None or len(frame) == 0 or column not in frame.columns:
+            return [pd.DataFrame() for _ in range(self.shards)]
+        shards = frame[column].map(self.shard_of)
+        return [frame[shards == shard] for shard in range(self.shards)]
+
+    def orphans(self, frame, column):
+        """不属于任何分片的持仓或订单"""
+        if frame is None or len(frame) == 0 or column not in frame.columns:
+            return pd.DataFrame()
+        return frame[frame[column].map(self.shard_of).isna()]
+
+
+def _apply_messages(shard, inbox, ready):
+    """工作进程的收件线程：应用协调进程下发的配置、状态和额度"""
+    from poly_data.data_utils import apply_market_update, apply_positions, apply_orders, clear_markets
+
+    while True:
+        kind, payload = inbox.get()
+        try:
+            if kind == 'stop':
+                # os._exit 不执行 atexit，先写入缓冲中的PnL快照
+                from poly_data.pnl_history import flush_recorder
+                flush_recorder()
+                supervisor_logger.info(f"工作进程 {shard} 退出")
+                os._exit(0)
+            elif kind == 'limits':
+                set_limits(payload)
+            elif kind == 'config':
+                if apply_market_update(payload):
+                    ready.set()
+            elif kind == 'clear':
+                clear_markets()
+            elif kind == 'state':
+                apply_positions(payload['positions'], avgOnly=payload['avg_only'])
+                apply_orders(payload['orders'])
+        except Exception as e:
+            supervisor_logger.error(f"工作进程 {shard} 处理 {kind} 消息出错: {type(e).__name__}: {e}")
+            supervisor_logger.error(traceback.format_exc())
+
+
+def _report_periodically(shard, outbox):
+    """
+    工作进程的后台线程，与单进程运行时的 update_periodically 对应
+    - 每个周期移除陈旧的挂起交易，发布本分片的实时订单簿并向协调进程报告用量
+    - 每第6个周期输出熔断器状态并记录PnL快照
+    """
+    from main import remove_from_pending, log_breaker_metrics, record_pnl_snapshot
+    from poly_data.book_feed import publish_books, shard_path
+    from poly_data.websocket_handlers import message_counts
+
+    i = 1
+    while True:
+        time.sleep(STATE_INTERVAL)
+
+        try:
+            remove_from_pending()
+
+            try:
+                publish_books(shard_path(shard))
+            except Exception as e:
+                supervisor_logger.warning(f"工作进程 {shard} 发布实时订单簿失败: {e}")
+
+            exposure, open_buys = current_usage()
+            outbox.put(('report', shard, {'exposure': exposure, 'open_buys': open_buys,
+                                          'markets': len(global_state.df), 'messages': dict(message_counts)}))
+
+            if i % 6 == 0:
+                log_breaker_metrics()
+                record_pnl_snapshot()
+                i = 1
+
+            gc.collect()
+            i += 1
+        except Exception as e:
+            supervisor_logger.error(f"工作进程 {shard} 周期任务错误: {str(e)}")
+            supervisor_logger.error(traceback.format_exc())
+
+
+def _refresh_requester(shard, outbox):
+    """工作进程的 update_positions：请求协调进程重新获取持仓，只分发回本分片的部分"""
+    def request(avg_only=False):
+        outbox.put(('refresh', shard, {'avg_only': avg_only}))
+    return request
+
+
+async def _trade_forever(shard):
+    from poly_data.websocket_handlers import connect_market_websocket, connect_user_websocket
+
+    # 与单进程运行时的主循环相同，重新连接时订阅最新的 token 列表
+    while True:
+        try:
+            await asyncio.gather(
+                connect_market_websocket(global_state.all_tokens),
+                connect_user_websocket()
+            )
+            supervisor_logger.warning(f"工作进程 {shard} WebSocket连接断开，正在重新连接...")
+        except Exception as e:
+            supervisor_logger.error(f"工作进程 {shard} 主循环错误: {str(e)}")
+            supervisor_logger.error(traceback.format_exc())
+
+        await asyncio.sleep(1)
+        gc.collect()
+
+
+def _worker_main(shard, inbox, outbox):
+    """工作进程入口：等待第一份配置后开始交易"""
+    # Ctrl+C 和关闭 screen 会话由协调进程处理，工作进程收到 stop 消息后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    from poly_data.polymarket_client import PolymarketClient
+    import poly_data.data_utils as data_utils
+
+    global_state.all_tokens = []
+    global_state.client = PolymarketClient()
+    data_utils.state_refresh = _refresh_requester(shard, outbox)
+
+    ready = threading.Event()
+    threading.Thread(target=_apply_messages, args=(shard, inbox, ready), daemon=True).start()
+    ready.wait()
+    supervisor_logger.info(f"工作进程 {shard} 开始交易 {len(global_state.df)} 个市场，"
+                           f"{len(global_state.all_tokens)} 个token")
+
+    threading.Thread(target=_report_periodically, args=(shard, outbox), daemon=True).start()
+    asyncio.run(_trade_forever(shard))
+
+
+class Supervisor:
+    """
+    启动并协调分片工作进程
+
+    使用示例:
+        Supervisor(4).run()  # 阻塞运行，Ctrl+C 时停止所有工作进程
+    """
+
+    def __init__(self, workers=TRADING_WORKERS):
+        """
+        参数:
+            workers: 工作进程数，0 为每个 CPU 核心一个
+        """
+        if workers < 0:
+            raise ValueError(f"工作进程数不能为负数: {workers}")
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_map = ShardMap(self.workers)
+        self.processes = [None] * self.workers
+        self.inboxes = [None] * self.workers
+        self.reports = [None] * self.workers
+        self.limits = [None] * self.workers
+        self.positions = None
+        self.orders = None
+        self.orphan_usage = (0.0, 0.0)  # 未分配 token 的 (敞口, 买单金额)
+        self._context = multiprocessing.get_context('spawn')
+        self._outbox = self._context.Queue()
+        self._lock = threading.Lock()
+        self._stopping = False
+
+    def _export_creds(self):
+        """把 API 凭证写入环境变量，工作进程启动时直接使用"""
+        creds = global_state.client.creds
+        os.environ['CLOB_API_KEY'] = creds.api_key
+        os.environ['CLOB_SECRET'] = creds.api_secret
+        os.environ['CLOB_PASS_PHRASE'] = creds.api_passphrase
+
+    def _start_worker(self, shard):
+        """启动工作进程并发送该分片的完整状态"""
+        inbox = self._context.Queue()
+        process = self._context.Process(target=_worker_main, args=(shard, inbox, self._outbox),
+                                        name=f'trading-shard-{shard}', daemon=True)
+        process.start()
+        self.processes[shard], self.inboxes[shard] = process, inbox
+
+        if self.limits[shard] is not None:
+            inbox.put(('limits', self.limits[shard]))
+        inbox.put(self.shard_map.config_message(self.shard_map.full_update(shard)))
+        if self.positions is not None:
+            inbox.put(('state', {'positions': self.shard_map.route(self.positions, 'asset')[shard],
+                                 'orders': self.shard_map.route(self.orders, 'asset_id')[shard],
+                                 'avg_only': False}))
+        supervisor_logger.info(f"工作进程 {shard} 已启动（进程 {process.pid}），"
+                               f"{self.shard_map.counts()[shard]} 个市场")
+
+    def _poll_state(self, avg_only=True):
+        """获取持仓和订单并按 token 分发"""
+        from poly_data.data_utils import publish_positions
+
+        self.positions = global_state.client.get_all_positions()
+        publish_positions(self.positions)
+        self.orders = global_state.client.get_all_orders()
+
+        with self._lock:
+            positions = self.shard_map.route(self.positions, 'asset')
+            orders = self.shard_map.route(self.orders, 'asset_id')
+            for shard, inbox in enumerate(self.inboxes):
+                if inbox is not None:
+                    inbox.put(('state', {'positions': positions[shard], 'orders': orders[shard],
+                                         'avg_only': avg_only}))
+
+    def _distribute_limits(self):
+        """扣除未分配 token 占用的额度后，按各分片的市场数量拆分全局额度，变化时下发"""
+        if not enabled():
+            return
+        try:
+            limits = global_limits()
+        except Exception as e:
+            supervisor_logger.warning(f"刷新风险额度失败，保留之前的额度: {type(e).__name__}: {e}")
+            return
+
+        with self._lock:
+            self.orphan_usage = frame_usage(self.shard_map.orphans(self.positions, 'asset'),
+                                            self.shard_map.orphans(self.orders, 'asset_id'))
+            limits = reserve_limits(limits, *self.orphan_usage)
+            for shard, shard_limits in enumerate(split_limits(limits, self.shard_map.counts())):
+                if shard_limits != self.limits[shard]:
+                    self.limits[shard] = shard_limits
+                    if self.inboxes[shard] is not None:
+                        self.inboxes[shard].put(('limits', shard_limits))
+
+    def _update_config(self):
+        """检查市场配置，把变化的部分发给对应的工作进程"""
+        from poly_data.data_utils import update_markets
+
+        update = update_markets()
+        if update is None:
+            return
+
+        with self._lock:
+            previous = dict(self.shard_map.markets)
+            self.shard_map.assign(update.df)
+            for shard, shard_update in enumerate(self.shard_map.split_update(update, previous)):
+                if shard_update is not None and self.inboxes[shard] is not None:
+                    self.inboxes[shard].put(self.shard_map.config_message(shard_update))
+        supervisor_logger.info(f"市场配置已分发，各工作进程市场数: {self.shard_map.counts()}")
+
+    def _update_config_periodically(self):
+        while not self._stopping:
+            time.sleep(CONFIG_INTERVAL)
+            try:
+                self._update_config()
+            except Exception as e:
+                supervisor_logger.error(f"分发市场配置出错: {str(e)}")
+                supervisor_logger.error(traceback.format_exc())
+
+    def _drain_reports(self):
+        """
+        读取工作进程的报告和持仓刷新请求
+
+        返回:
+            有刷新请求时返回 avg_only（任一请求需要完整持仓时为 False），否则返回 None
+        """
+        refresh = None
+        while True:
+            try:
+                kind, shard, payload = self._outbox.get_nowait()
+            except queue.Empty:
+                return refresh
+            if kind == 'refresh':
+                refresh = payload['avg_only'] if refresh is None else refresh and payload['avg_only']
+                continue
+            payload['received'] = time.time()
+            self.reports[shard] = payload
+
+    def _log_status(self, previous):
+        """输出各工作进程的事件速率和总敞口，返回本次的报告供下次计算速率"""
+        parts, exposure = [], self.orphan_usage[0]
+        for shard, report in enumerate(self.reports):
+            if report is None:
+                parts.append(f"#{shard} 未报告")
+                continue
+            exposure += report['exposure']
+            rate = ''
+            last = previous[shard]
+            if last is not None and report['received'] > last['received']:
+                events = report['messages']['market'] - last['messages']['market']
+                rate = f", {max(events, 0) / (report['received'] - last['received']):.1f} 事件/秒"
+            parts.append(f"#{shard} {report['markets']} 个市场{rate}")
+        supervisor_logger.info(f"工作进程状态: {'; '.join(parts)}; 未分配 token 敞口 {self.orphan_usage[0]:.2f}; "
+                               f"总敞口 {exposure:.2f}")
+        return list(self.reports)
+
+    def _restart_dead_workers(self):
+        with self._lock:
+            for shard, process in enumerate(self.processes):
+                if process is not None and not process.is_alive() and not self._stopping:
+                    supervisor_logger.error(f"工作进程 {shard} 已退出（退出码 {process.exitcode}），重新启动")
+                    self.reports[shard] = None
+                    self._start_worker(shard)
+
+    def start(self):
+        """获取凭证、市场配置和初始状态，启动所有工作进程"""
+        from poly_data.polymarket_client import PolymarketClient
+        from poly_data.data_utils import update_markets, publish_positions
+
+        global_state.client = PolymarketClient()
+        self._export_creds()
+
+        update_markets()
+        if global_state.df is None or len(global_state.df) == 0:
+            raise RuntimeError("未获取到市场配置，无法分片")
+        self.shard_map.assign(global_state.df)
+
+        self.positions = global_state.client.get_all_positions()
+        publish_positions(self.positions)
+        self.orders = global_state.client.get_all_orders()
+        self._distribute_limits()
+
+        with self._lock:
+            for shard in range(self.workers):
+                self._start_worker(shard)
+        supervisor_logger.info(f"已启动 {self.workers} 个工作进程，共 {len(global_state.df)} 个市场，"
+                               f"各进程市场数: {self.shard_map.counts()}")
+
+        threading.Thread(target=self._update_config_periodically, daemon=True).start()
+
+    def stop(self, timeout=10):
+        """通知所有工作进程退出，超时后终止"""
+        self._stopping = True
+        for inbox in self.inboxes:
+            if inbox is not None:
+                inbox.put(('stop', None))
+        deadline = time.time() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(max(deadline - time.time(), 0))
+            if process.is_alive():
+                process.terminate()
+                process.join(5)
+        supervisor_logger.info("所有工作进程已停止")
+
+    def run(self):
+        """启动工作进程并循环分发状态和额度，直到 Ctrl+C"""
+        self.start()
+        previous = list(self.reports)
+        last_status = time.time()
+        try:
+            while True:
+                time.sleep(STATE_INTERVAL)
+                try:
+                    self._poll_state()
+                    self._distribute_limits()
+                    refresh = self._drain_reports()
+                    if refresh is not None:
+                        # 工作进程在本轮获取之后请求了刷新（如交易失败），立即重新获取
+                        self._poll_state(avg_only=refresh)
+                    if time.time() - last_status >= STATUS_LOG_INTERVAL:
+                        previous = self._log_status(previous)
+                        last_status = time.time()
+                    self._restart_dead_workers()
+                except Exception as e:
+                    supervisor_logger.error(f"协调进程循环错误: {str(e)}")
+                    supervisor_logger.error(traceback.format_exc())
+        except KeyboardInterrupt:
+            supervisor_logger.info("收到中断信号，停止工作进程")
+        finally:
+            self.stop()
@@ -5,11 +5,15 @@ import traceback                   # 异常处理
 
 from poly_data.data_processing import process_data, process_user_data
 from poly_data.logger import get_logger
+from poly_data.endpoints import MARKET_WS_URL, USER_WS_URL
 import poly_data.global_state as global_state
 
 # 创建WebSocket日志记录器
 websocket_logger = get_logger('websocket', console_output=True)
 
+# 收到的消息数，分片运行时用于报告各工作进程的吞吐量
+message_counts = {'market': 0, 'user': 0}
+
 async def connect_market_websocket(chunk):
     """
     连接到Polymarket的市场WebSocket API并处理市场更新
@@ -25,7 +29,7 @@ async def connect_market_websocket(chunk):
     注意：
         如果连接丢失，函数将退出，主循环将在短暂延迟后尝试重新连接
     """
-    uri = "wss://ws-subscriptions-clob.polymarket.com/ws/market"
+    uri = MARKET_WS_URL
     async with websockets.connect(uri, ping_interval=5, ping_timeout=None) as websocket:
         # 准备并发送订阅消息
         message = {"assets_ids": chunk}
@@ -38,6 +42,7 @@ async def connect_market_websocket(chunk):
             while True:
                 message = await websocket.recv()
                 json_data = json.loads(message)
+                message_counts['market'] += 1
                 # 处理订单簿更新并根据需要触发交易
                 # WebSocket 可能返回单个对象或对象列表
                 if isinstance(json_data, list):
@@ -66,7 +71,7 @@ async def connect_user_websocket():
     注意：
         如果连接丢失，函数将退出，主循环将在短暂延迟后尝试重新连接
     """
-    uri = "wss://ws-subscriptions-clob.polymarket.com/ws/user"
+    uri = USER_WS_URL
 
     async with websockets.connect(uri, ping_interval=5, ping_timeout=None) as websocket:
         # 准备带有API凭证的身份验证消息
@@ -89,6 +94,7 @@ async def connect_user_websocket():
             while True:
                 message = await websocket.recv()
                 json_data = json.loads(message)
+                message_counts['user'] += 1
                 # 处理交易和订单更新
                 process_user_data(json_data)
         except websockets.ConnectionClosed:
@@ -0,0 +1,625 @@
+"""
+模拟交易所状态 - 合成市场、订单簿、我方订单、成交和持仓
+
+每个市场有两个 token，只维护 token1 的订单簿，token2 的订单簿是 token1 的互补（价格为 1 - p），
+与 Polymarket 的实际行为一致。行情更新随机修改 token1 订单簿的档位，中间价偶尔移动一个最小价格单位。
+
+我方订单挂在最优价或更优价格时，每次推进按 fill_rate 的概率部分成交，
+产生与用户 websocket 相同格式的 trade 事件（先 MATCHED，之后 CONFIRMED），同时更新持仓和 USDC 余额。
+
+所有方法都是线程安全的：REST 请求在线程池中处理，行情在 websocket 的事件循环中推进。
+
+也可以从录制的 API 响应（见 poly_mock.recording）构建，录制的市场数量不足时复制并改写 ID 补足。
+
+使用示例:
+    exchange = MockExchange(markets=100, seed=7)
+    events = exchange.step(50)             # 推进 50 次行情更新，返回市场 websocket 事件
+    user_events = exchange.drain_user_events()
+
+    exchange = MockExchange.from_recording(load_recording(path), markets=5000)
+"""
+import time
+import random
+import hashlib
+import itertools
+import threading
+from collections import deque
+
+# 每边的档位数
+BOOK_DEPTH = 40
+
+# 默认钱包地址和初始 USDC 余额
+DEFAULT_WALLET = '0x' + '11' * 20
+DEFAULT_USDC = 10000.0
+
+# Polygon 上的 USDC.e 合约
+USDC_ADDRESS = '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174'
+
+# 模拟服务返回的 API 凭证
+MOCK_CREDS = {'apiKey': 'mock-api-key', 'secret': 'bW9jay1zZWNyZXQ=', 'passphrase': 'mock-passphrase'}
+
+# 中间价的范围
+MIN_MID = 0.05
+MAX_MID = 0.95
+
+# 每次行情更新移动中间价的概率
+MID_MOVE_PROB = 0.01
+
+# 成交后多久发送 CONFIRMED（秒）
+CONFIRM_DELAY = 1.0
+
+
+def _hex_id(rng, nbytes=32):
+    return '0x' + ''.join(f'{rng.getrandbits(8):02x}' for _ in range(nbytes))
+
+
+def _fmt(value):
+    """与实际 API 相同，价格和数量以字符串返回"""
+    return f'{value:.6f}'.rstrip('0').rstrip('.') or '0'
+
+
+
+def _noise(seed, t):
+    """由 (seed, t) 决定的价格噪声，近似标准差 0.01 的正态分布；整数哈希比每个点构造一个 Random 快得多"""
+    x = (seed ^ t) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF
+    x = (x ^ (x >> 31)) * 0xBF58476D1CE4E5B9 & 0xFFFFFFFFFFFFFFFF
+    x ^= x >> 29
+    # 三个 21 位均匀数之和的标准差为 0.5，缩放到 0.01
+    mask = (1 << 21) - 1
+    total = (x & mask) + (x >> 21 & mask) + (x >> 42 & mask)
+    return (total / mask - 1.5) * 0.02
+
+class MockExchange:
+    """合成市场和我方账户的内存状态"""
+
+    def __init__(self, markets=50, seed=7, tick=0.01, depth=BOOK_DEPTH, wallet=DEFAULT_WALLET,
+                 usdc=DEFAULT_USDC, fill_rate=0.02):
+        """
+        参数:
+            markets: 市场数量，每个市场两个 token，行情只按 token1 推送
+            seed: 随机种子，相同参数生成相同的市场
+            tick: 最小价格单位
+            depth: 每边的档位数
+            wallet: 我方钱包地址，成交事件中的 maker_address
+            usdc: 初始 USDC 余额
+            fill_rate: 处于最优价的挂单每次推进被部分成交的概率
+        """
+        self.rng = random.Random(seed)
+        self.tick = tick
+        self.depth = depth
+        self.wallet = wallet
+        self.usdc = usdc
+        self.fill_rate = fill_rate
+        self.lock = threading.Lock()
+
+        self.markets = []           # 市场记录，与 /sampling-markets 的格式相同
+        self.by_condition = {}      # condition_id -> 市场
+        self.by_token = {}          # token -> (市场, 是否为 token1)
+        self.mids = {}              # condition_id -> token1 中间价
+        self.books = {}             # condition_id -> {'bids': {价格: 数量}, 'asks': {...}}，token1 的订单簿
+        self.orders = {}            # 订单ID -> 我方挂单
+        self.positions = {}         # token -> {'size', 'avgPrice'}
+        self.histories = {}         # token1 -> (时间戳列表, 价格列表, 时间偏移)，回放录制数据时使用
+        self.pending_confirms = deque()
+        self.user_events = deque()
+        self._ids = itertools.count(1)
+        self.counters = {'updates': 0, 'orders': 0, 'cancels': 0, 'fills': 0}
+
+        for i in range(markets):
+            self._add_market(i)
+
+    # ============ 市场和订单簿 ============
+
+    def _add_market(self, i):
+        rng = self.rng
+        condition_id = _hex_id(rng)
+        token1, token2 = str(rng.getrandbits(252)), str(rng.getrandbits(252))
+        mid = round(round(rng.uniform(0.15, 0.85) / self.tick) * self.tick, 4)
+        market = {
+            'condition_id': condition_id,
+            'question_id': _hex_id(rng),
+            'question': f'Mock market {i}?',
+            'market_slug': f'mock-market-{i}',
+            'end_date_iso': '2030-01-01T00:00:00Z',
+            'active': True, 'closed': False, 'archived': False, 'accepting_orders': True,
+            'minimum_order_size': 5,
+            'minimum_tick_size': self.tick,
+            'neg_risk': i % 5 == 0,
+            'tokens': [
+                {'token_id': token1, 'outcome': 'Yes', 'price': round(mid, 4), 'winner': False},
+                {'token_id': token2, 'outcome': 'No', 'price': round(1 - mid, 4), 'winner': False},
+            ],
+            'rewards': {
+                'rates': [{'asset_address': USDC_ADDRESS, 'rewards_daily_rate': rng.choice([5, 10, 25, 50, 100, 250])}],
+                'min_size': rng.choice([20, 50, 100, 200]),
+                'max_spread': rng.choice([2, 3, 3.5, 4.5, 5.5]),
+            },
+        }
+        self.markets.append(market)
+        self.by_condition[condition_id] = market
+        self.by_token[token1] = (market, True)
+        self.by_token[token2] = (market, False)
+        self.mids[condition_id] = mid
+        self.books[condition_id] = self._make_book(mid)
+
+    def _make_book(self, mid):
+        book = {'bids': {}, 'asks': {}}
+        for k in range(1, self.depth + 1):
+            bid = round(mid - k * self.tick, 4)
+            ask = round(mid + k * self.tick, 4)
+            if bid >= self.tick:
+                book['bids'][bid] = self._size()
+            if ask <= 1 - self.tick:
+                book['asks'][ask] = self._size()
+        return book
+
+    def _size(self):
+        return round(self.rng.lognormvariate(5, 1.2), 2)
+
+    def token_ids(self):
+        """所有 token1，即机器人订阅的 token"""
+        return [m['tokens'][0]['token_id'] for m in self.markets]
+
+    def market_for(self, token):
+        entry = self.by_token.get(str(token))
+        return entry[0] if entry else None
+
+    def book_levels(self, token):
+        """
+        token 的订单簿
+
+        返回:
+            tuple: (bids, asks)，[(价格, 数量), ...]，都从最优价开始；token 不存在时返回 None
+        """
+        entry = self.by_token.get(str(token))
+        if entry is None:
+            return None
+        market, is_token1 = entry
+        book = self.books[market['condition_id']]
+        bids = sorted(book['bids'].items(), reverse=True)
+        asks = sorted(book['asks'].items())
+        if is_token1:
+            return bids, asks
+        # token2 的买单对应 token1 的卖单
+        return [(round(1 - p, 4), s) for p, s in asks], [(round(1 - p, 4), s) for p, s in bids]
+
+    def book_summary(self, token):
+        """与 GET /book 相同格式的订单簿，token 不存在时返回 None"""
+        with self.lock:
+            levels = self.book_levels(token)
+            if levels is None:
+                return None
+            market = self.market_for(token)
+            bids, asks = levels
+            # 实际 API 的 bids 按价格升序、asks 按价格降序，最优价在最后
+            summary = {
+                'market': market['condition_id'],
+                'asset_id': str(token),
+                'timestamp': str(int(time.time() * 1000)),
+                'bids': [{'price': _fmt(p), 'size': _fmt(s)} for p, s in reversed(bids)],
+                'asks': [{'price': _fmt(p), 'size': _fmt(s)} for p, s in reversed(asks)],
+                'min_order_size': str(market['minimum_order_size']),
+                'tick_size': str(market['minimum_tick_size']),
+                'neg_risk': market['neg_risk'],
+            }
+        summary['hash'] = hashlib.sha1(str(summary).encode()).hexdigest()
+        return summary
+
+    def book_event(self, market):
+        """市场 websocket 的 'book' 事件（token1）"""
+        token1 = market['tokens'][0]['token_id']
+        bids, asks = self.book_levels(token1)
+        return {
+            'event_type': 'book',
+            'market': market['condition_id'],
+            'asset_id': token1,
+            'timestamp': str(int(time.time() * 1000)),
+            'bids': [{'price': _fmt(p), 'size': _fmt(s)} for p, s in reversed(bids)],
+            'asks': [{'price': _fmt(p), 'size': _fmt(s)} for p, s in reversed(asks)],
+        }
+
+    def snapshot_events(self, tokens):
+        """订阅时发送的 'book' 事件列表"""
+        with self.lock:
+            events = []
+            for token in tokens:
+                entry = self.by_token.get(str(token))
+                if entry is not None:
+                    events.append(self.book_event(entry[0]))
+            return events
+
+    # ============ 行情推进 ============
+
+    def step(self, count):
+        """
+        推进 count 次行情更新，并按 fill_rate 撮合我方挂单
+
+        返回:
+            dict: {condition_id: 'price_change' 事件}，同一市场的多次更新合并为一个事件
+        """
+        if not self.markets or count <= 0:
+            with self.lock:
+                self._fill_orders()
+            return {}
+
+        events = {}
+        now = str(int(time.time() * 1000))
+        with self.lock:
+            for _ in range(count):
+                market = self.rng.choice(self.markets)
+                condition_id = market['condition_id']
+                changes = self._random_change(condition_id)
+
+                event = events.get(condition_id)
+                if event is None:
+                    event = events[condition_id] = {'event_type': 'price_change', 'market': condition_id,
+                                                    'price_changes': [], 'timestamp': now}
+                token1 = market['tokens'][0]['token_id']
+                book = self.books[condition_id]
+                best_bid = max(book['bids']) if book['bids'] else 0
+                best_ask = min(book['asks']) if book['asks'] else 1
+                for side, price, size in changes:
+                    event['price_changes'].append({
+                        'asset_id': token1, 'price': _fmt(price), 'size': _fmt(size), 'side': side,
+                        'best_bid': _fmt(best_bid), 'best_ask': _fmt(best_ask),
+                    })
+            self.counters['updates'] += count
+            self._fill_orders()
+        return events
+
+    def _random_change(self, condition_id):
+        """修改一个档位，偶尔移动中间价；返回 [(side, price, size)]，side 为 BUY/SELL"""
+        book = self.books[condition_id]
+        mid = self.mids[condition_id]
+        tick = self.tick
+
+        if self.rng.random() < MID_MOVE_PROB:
+            direction = 1 if self.rng.random() < 0.5 else -1
+            new_mid = round(mid + direction * tick, 4)
+            if MIN_MID <= new_mid <= MAX_MID:
+                self.mids[condition_id] = new_mid
+                if direction > 0:
+                    # 原最优卖价被吃掉，原中间价出现新的买单
+                    removed, added = ('asks', 'SELL', round(mid + tick, 4)), ('bids', 'BUY', round(mid, 4))
+                else:
+                    removed, added = ('bids', 'BUY', round(mid - tick, 4)), ('asks', 'SELL', round(mid, 4))
+                book[removed[0]].pop(removed[2], None)
+                size = self._size()
+                book[added[0]][added[2]] = size
+                return [(removed[1], removed[2], 0.0), (added[1], added[2], size)]
+
+        # 在中间价两侧 depth 档的网格上随机选一档：已有档位 20% 删除、其余修改数量，空档位补回，
+        # 订单簿保持约 80% 的档位，最优价附近不会被逐渐掏空
+        side = 'bids' if self.rng.random() < 0.5 else 'asks'
+        k = self.rng.randint(1, self.depth)
+        price = round(mid - k * tick, 4) if side == 'bids' else round(mid + k * tick, 4)
+        if not tick <= price <= 1 - tick:
+            return []
+        levels = book[side]
+        if price in levels and self.rng.random() < 0.2:
+            del levels[price]
+            size = 0.0
+        else:
+            size = levels[price] = self._size()
+        return [('BUY' if side == 'bids' else 'SELL', price, size)]
+
+    # ============ 我方订单 ============
+
+    def _order_in_token1(self, order):
+        """订单在 token1 订单簿上的方向和价格"""
+        if order['is_token1']:
+            return order['side'], order['price']
+        return ('SELL' if order['side'] == 'BUY' else 'BUY'), round(1 - order['price'], 4)
+
+    def place_order(self, token, side, price, size):
+        """
+        挂单
+
+        返回:
+            dict: 与 POST /order 相同格式的响应；token 不存在时返回 None
+        """
+        with self.lock:
+            entry = self.by_token.get(str(token))
+            if entry is None:
+                return None
+            market, is_token1 = entry
+            order_id = '0x' + hashlib.sha256(f'{next(self._ids)}-{token}'.encode()).hexdigest()
+            order = {
+                'id': order_id, 'status': 'LIVE', 'owner': MOCK_CREDS['apiKey'], 'maker_address': self.wallet,
+                'market': market['condition_id'], 'asset_id': str(token), 'side': side,
+                'original_size': float(size), 'size_matched': 0.0, 'price': float(price),
+                'outcome': market['tokens'][0 if is_token1 else 1]['outcome'], 'is_token1': is_token1,
+                'created_at': int(time.time()), 'order_type': 'GTC', 'expiration': '0',
+            }
+            self.orders[order_id] = order
+            self.counters['orders'] += 1
+            self.user_events.append(self._order_event(order, 'PLACEMENT'))
+        return {'success': True, 'errorMsg': '', 'orderID': order_id, 'transactionsHashes': [], 'status': 'live'}
+
+    def cancel_orders(self, market=None, asset_id=None, order_ids=None):
+        """
+        撤单；参数都为空时撤销全部订单
+
+        返回:
+            list: 已撤销的订单ID
+        """
+        with self.lock:
+            canceled = []
+            for order_id, order in list(self.orders.items()):
+                if order_ids is not None and order_id not in order_ids:
+                    continue
+                if market and order['market'] != market:
+                    continue
+                if asset_id and order['asset_id'] != str(asset_id):
+                    continue
+                del self.orders[order_id]
+                canceled.append(order_id)
+                self.user_events.append(self._order_event(order, 'CANCELLATION'))
+            self.counters['cancels'] += len(canceled)
+            return canceled
+
+    def open_orders(self, market=None, asset_id=None):
+        """与 GET /data/orders 相同格式的未成交订单"""
+        with self.lock:
+            rows = []
+            for order in self.orders.values():
+                if market and order['market'] != market:
+                    continue
+                if asset_id and order['asset_id'] != str(asset_id):
+                    continue
+                row = {k: v for k, v in order.items() if k != 'is_token1'}
+                for key in ('original_size', 'size_matched', 'price'):
+                    row[key] = _fmt(order[key])
+                row['associate_trades'] = []
+                rows.append(row)
+            return rows
+
+    def _order_event(self, order, event_type):
+        return {
+            'event_type': 'order', 'type': event_type, 'id': order['id'], 'owner': order['owner'],
+            'status': 'CANCELED' if event_type == 'CANCELLATION' else 'LIVE',
+            'market': order['market'], 'asset_id': order['asset_id'], 'side': order['side'],
+            'price': _fmt(order['price']), 'original_size': _fmt(order['original_size']),
+            'size_matched': _fmt(order['size_matched']), 'outcome': order['outcome'],
+            'timestamp': str(int(time.time() * 1000)),
+        }
+
+    # ============ 成交和持仓 ============
+
+    def _fill_orders(self):
+        """撮合处于最优价或更优价格的挂单，调用方需持有锁"""
+        now = time.time()
+        while self.pending_confirms and self.pending_confirms[0][0] <= now:
+            _, event = self.pending_confirms.popleft()
+            self.user_events.append(event)
+
+        if self.fill_rate <= 0:
+            return
+
+        for order_id, order in list(self.orders.items()):
+            book = self.books[order['market']]
+            side, price = self._order_in_token1(order)
+            if side == 'BUY':
+                at_touch = not book['bids'] or price >= max(book['bids'])
+            else:
+                at_touch = not book['asks'] or price <= min(book['asks'])
+            if not at_touch or self.rng.random() >= self.fill_rate:
+                continue
+
+            remaining = order['original_size'] - order['size_matched']
+            amount = round(min(remaining, max(5.0, remaining * self.rng.uniform(0.2, 1.0))), 2)
+            order['size_matched'] = round(order['size_matched'] + amount, 2)
+            self._apply_fill(order, amount)
+            self.counters['fills'] += 1
+
+            trade = self._trade_event(order, amount, 'MATCHED')
+            self.user_events.append(trade)
+            self.pending_confirms.append((now + CONFIRM_DELAY, dict(trade, status='CONFIRMED')))
+
+            if order['size_matched'] >= order['original_size'] - 1e-9:
+                del self.orders[order_id]
+            else:
+                self.user_events.append(self._order_event(order, 'UPDATE'))
+
+    def _apply_fill(self, order, amount):
+        position = self.positions.setdefault(order['asset_id'], {'size': 0.0, 'avgPrice': 0.0})
+        if order['side'] == 'BUY':
+            total = position['size'] + amount
+            position['avgPrice'] = (position['avgPrice'] * position['size'] + order['price'] * amount) / total
+            position['size'] = total
+            self.usdc -= order['price'] * amount
+        else:
+            position['size'] = max(0.0, position['size'] - amount)
+            self.usdc += order['price'] * amount
+
+    def _trade_event(self, order, amount, status):
+        """我方作为 maker 的 trade 事件；吃单方与我方同一结果、方向相反"""
+        taker_side = 'SELL' if order['side'] == 'BUY' else 'BUY'
+        return {
+            'event_type': 'trade', 'type': 'TRADE', 'id': f'trade-{next(self._ids)}', 'status': status,
+            'market': order['market'], 'asset_id': order['asset_id'], 'side': taker_side,
+            'size': _fmt(amount), 'price': _fmt(order['price']), 'outcome': order['outcome'],
+            'taker_order_id': _hex_id(self.rng), 'owner': order['owner'],
+            'maker_orders': [{
+                'order_id': order['id'], 'maker_address': self.wallet, 'owner': order['owner'],
+                'matched_amount': _fmt(amount), 'price': _fmt(order['price']),
+                'outcome': order['outcome'], 'asset_id': order['asset_id'],
+            }],
+            'timestamp': str(int(time.time() * 1000)),
+        }
+
+    def drain_user_events(self):
+        """取出待发送的用户 websocket 事件"""
+        with self.lock:
+            now = time.time()
+            while self.pending_confirms and self.pending_confirms[0][0] <= now:
+                _, event = self.pending_confirms.popleft()
+                self.user_events.append(event)
+            events = list(self.user_events)
+            self.user_events.clear()
+            return events
+
+    def position_records(self):
+        """与 data-api /positions 相同格式的持仓"""
+        with self.lock:
+            records = []
+            for token, position in self.positions.items():
+                if position['size'] <= 0:
+                    continue
+                market, is_token1 = self.by_token[token]
+                mid = self.mids[market['condition_id']]
+                cur_price = mid if is_token1 else round(1 - mid, 4)
+                records.append({
+                    'proxyWallet': self.wallet, 'asset': token, 'conditionId': market['condition_id'],
+                    'size': position['size'], 'avgPrice': position['avgPrice'],
+                    'initialValue': position['size'] * position['avgPrice'],
+                    'currentValue': position['size'] * cur_price, 'curPrice': cur_price,
+                    'title': market['question'], 'outcome': market['tokens'][0 if is_token1 else 1]['outcome'],
+                    'negativeRisk': market['neg_risk'],
+                })
+            return records
+
+    def position_value(self):
+        return sum(r['currentValue'] for r in self.position_records())
+
+    def raw_position(self, token):
+        """链上 ERC1155 余额（小数转换前）"""
+        with self.lock:
+            position = self.positions.get(str(token))
+            return int(position['size'] * 10**6) if position else 0
+
+    # ============ 价格历史和配置 ============
+
+    def price_history(self, token, start_ts, end_ts, fidelity=10):
+        """
+        与 /prices-history 相同格式的合成价格历史
+
+        同一 token 同一时间点的价格总是相同，增量请求与完整请求的结果一致。
+        """
+        recorded = self.histories.get(str(token))
+        if recorded is not None:
+            ts, ps, offset = recorded
+            return [{'t': t + offset, 'p': p} for t, p in zip(ts, ps) if start_ts <= t + offset <= end_ts]
+
+        market = self.market_for(token)
+        if market is None:
+            return []
+        step = max(int(fidelity), 1) * 60
+        base = self.mids[market['condition_id']]
+        if str(token) != market['tokens'][0]['token_id']:
+            base = 1 - base
+        seed = int(hashlib.sha1(str(token).encode()).hexdigest()[:8], 16)
+
+        history = []
+        first = (int(start_ts) + step - 1) // step * step
+        for t in range(first, int(end_ts) + 1, step):
+            history.append({'t': t, 'p': round(min(max(base + _noise(seed, t), 0.001), 0.999), 4)})
+        return history
+
+    # ============ 录制和回放 ============
+
+    def recording(self, days=30, fidelity=10):
+        """
+        导出与 poly_mock.recording 录制格式相同的数据（token1 的订单簿和价格历史）
+        """
+        now = int(time.time())
+        books, histories = {}, {}
+        for market in self.markets:
+            token1 = market['tokens'][0]['token_id']
+            books[token1] = self.book_summary(token1)
+            histories[token1] = self.price_history(token1, now - days * 86400, now, fidelity)
+        return {'source': 'synthetic', 'recorded_at': now, 'markets': [dict(m) for m in self.markets],
+                'books': books, 'histories': histories}
+
+    @classmethod
+    def from_recording(cls, recording, markets=None, **kwargs):
+        """
+        从录制数据构建
+
+        参数:
+            recording: poly_mock.recording.load_recording 的结果
+            markets: 市场数量；超过录制数量时循环复制录制的市场，复制品使用新的 ID 和问题
+            kwargs: 传给构造函数的其他参数
+        """
+        exchange = cls(markets=0, **kwargs)
+        source = recording['markets']
+        count = len(source) if markets is None else markets
+        now = int(time.time())
+        for i in range(count if source else 0):
+            exchange._add_recorded(recording, source[i % len(source)], i // len(source), now)
+        return exchange
+
+    def _add_recorded(self, recording, src, copy, now):
+        token1 = str(src['tokens'][0]['token_id'])
+        market = dict(src, tokens=[dict(t) for t in src['tokens']])
+        if copy:
+            def derive(value):
+                return hashlib.sha256(f'{value}-{copy}'.encode()).hexdigest()
+            market['condition_id'] = '0x' + derive(src['condition_id'])
+            for token in market['tokens']:
+                token['token_id'] = str(int(derive(token['token_id']), 16) >> 4)
+            market['question'] = f"{src['question']} [{copy}]"
+            market['market_slug'] = f"{src.get('market_slug', '')}-{copy}"
+
+        condition_id = market['condition_id']
+        new_token1, new_token2 = market['tokens'][0]['token_id'], market['tokens'][1]['token_id']
+        self.markets.append(market)
+        self.by_condition[condition_id] = market
+        self.by_token[new_token1] = (market, True)
+        self.by_token[new_token2] = (market, False)
+
+        summary = recording['books'].get(token1)
+        if summary:
+            book = {'bids': {float(level['price']): float(level['size']) for level in summary['bids']},
+                    'asks': {float(level['price']): float(level['size']) for level in summary['asks']}}
+        else:
+            book = {'bids': {}, 'asks': {}}
+        if book['bids'] and book['asks']:
+            mid = (max(book['bids']) + min(book['asks'])) / 2
+        else:
+            mid = float(market['tokens'][0].get('price') or 0.5)
+        self.mids[condition_id] = round(mid, 4)
+        self.books[condition_id] = book
+
+        history = recording['histories'].get(token1)
+        if history:
+            # 时间平移到现在，各时间窗口的波动率与录制时相同
+            ts = [int(point['t']) for point in history]
+            ps = [float(point['p']) for point in history]
+            self.histories[new_token1] = (ts, ps, now - ts[-1])
+
+    def config_records(self, limit=None):
+        """
+        让机器人交易这些市场的本地目录配置
+
+        返回:
+            tuple: (Selected Markets 记录, All Markets 记录, Hyperparameters 记录)
+        """
+        selections, all_markets = [], []
+        for market in self.markets[:limit]:
+            token1, token2 = market['tokens']
+            mid = self.mids[market['condition_id']]
+            rewards = market['rewards']
+            selections.append({'question': market['question'], 'max_size': 200, 'trade_size': 50,
+                               'param_type': 'mid', 'comments': 'mock'})
+            all_markets.append({
+                'question': market['question'], 'answer1': token1['outcome'], 'answer2': token2['outcome'],
+                'condition_id': market['condition_id'], 'token1': token1['token_id'], 'token2': token2['token_id'],
+                'tick_size': market['minimum_tick_size'], 'min_size': rewards['min_size'],
+                'max_spread': rewards['max_spread'], 'neg_risk': 'TRUE' if market['neg_risk'] else 'FALSE',
+                'best_bid': round(mid - self.tick, 4), 'best_ask': round(mid + self.tick, 4),
+                'rewards_daily_rate': rewards['rates'][0]['rewards_daily_rate'],
+                'gm_reward_per_100': 1.0, '3_hour': 1.0, 'volatility_sum': 5.0, 'market_slug': market['market_slug'],
+            })
+        hyperparameters = [
+            {'type': 'mid', 'param': 'stop_loss_threshold', 'value': -5},
+            {'type': '', 'param': 'take_profit_threshold', 'value': 3},
+            {'type': '', 'param': 'volatility_threshold', 'value': 50},
+            {'type': '', 'param': 'spread_threshold', 'value': 0.05},
+            {'type': '', 'param': 'sleep_period', 'value': 1},
+        ]
+        return selections, all_markets, hyperparameters
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, open_orders=len(self.orders), usdc=round(self.usdc, 2))
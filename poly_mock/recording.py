@@ -0,0 +1,122 @@
+"""
+录制 API 响应 - 奖励市场、token1 订单簿和价格历史
+
+录制结果是一个 gzip 压缩的 JSON 文件，模拟服务（MockExchange.from_recording）按原样回放，
+市场数量不足时复制录制的市场并改写 ID 补足，因此录制几百个市场就可以回放 5000 个市场的负载。
+
+录制格式:
+    {"source": 录制来源, "recorded_at": 时间戳,
+     "markets": [sampling-markets 的原始记录],
+     "books": {token1: /book 响应},
+     "histories": {token1: [{"t": 时间戳, "p": 价格}, ...]}}
+
+使用示例:
+    python -m poly_mock.recording live.json.gz --markets 300              # 从 CLOB_HOST 录制
+    python -m poly_mock.recording synthetic.json.gz --synthetic --markets 250
+"""
+import os
+import gzip
+import json
+import time
+
+import requests
+
+from poly_data.endpoints import CLOB_HOST
+
+# 每次批量获取订单簿的 token 数，与市场扫描器相同
+BOOK_BATCH = 20
+
+# 价格历史的数据点间隔（分钟），与 data_updater.price_history 相同
+HISTORY_FIDELITY = 10
+
+END_CURSOR = 'LTE='
+
+
+def save_recording(recording, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as f:
+        json.dump(recording, f)
+
+
+def load_recording(path):
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def record_live(markets=300, host=CLOB_HOST, timeout=15):
+    """
+    从 CLOB API 录制前 markets 个奖励市场
+
+    参数:
+        markets: 录制的市场数量
+        host: CLOB REST 地址
+
+    返回:
+        dict: 录制数据
+    """
+    session = requests.Session()
+
+    def get(path, **params):
+        res = session.get(f'{host}{path}', params=params, timeout=timeout)
+        res.raise_for_status()
+        return res.json()
+
+    rows, cursor = [], ''
+    while len(rows) < markets and cursor != END_CURSOR:
+        page = get('/sampling-markets', next_cursor=cursor)
+        rows += page['data']
+        cursor = page.get('next_cursor') or END_CURSOR
+        print(f"📥 已获取 {len(rows)} 个市场")
+    rows = rows[:markets]
+
+    tokens = [str(row['tokens'][0]['token_id']) for row in rows]
+    books = {}
+    for i in range(0, len(tokens), BOOK_BATCH):
+        batch = tokens[i:i + BOOK_BATCH]
+        res = session.post(f'{host}/books', json=[{'token_id': t} for t in batch], timeout=timeout)
+        res.raise_for_status()
+        books.update({str(book['asset_id']): book for book in res.json()})
+    print(f"📥 已获取 {len(books)} 个订单簿")
+
+    histories = {}
+    for i, token in enumerate(tokens):
+        try:
+            histories[token] = get('/prices-history', market=token, interval='1m',
+                                   fidelity=HISTORY_FIDELITY)['history']
+        except requests.RequestException as e:
+            print(f"⚠️ {token} 的价格历史获取失败: {type(e).__name__}: {e}")
+        if (i + 1) % 100 == 0:
+            print(f"📥 已获取 {i + 1} 个价格历史")
+
+    return {'source': host, 'recorded_at': int(time.time()), 'markets': rows,
+            'books': books, 'histories': histories}
+
+
+def record_synthetic(markets=250, seed=7):
+    """由模拟交易所生成同样格式的录制数据，不访问网络"""
+    from poly_mock.exchange import MockExchange
+
+    return MockExchange(markets=markets, seed=seed).recording(fidelity=HISTORY_FIDELITY)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='录制奖励市场、订单簿和价格历史供模拟服务回放')
+    parser.add_argument('path', help='输出文件，以 .gz 结尾时压缩')
+    parser.add_argument('--markets', type=int, default=300, help='录制的市场数量')
+    parser.add_argument('--host', default=CLOB_HOST, help='CLOB REST 地址')
+    parser.add_argument('--synthetic', action='store_true', help='用模拟交易所生成，不访问网络')
+    parser.add_argument('--seed', type=int, default=7, help='--synthetic 的随机种子')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        recording = record_synthetic(args.markets, args.seed)
+    else:
+        recording = record_live(args.markets, args.host)
+    save_recording(recording, args.path)
+    print(f"✅ 已将 {len(recording['markets'])} 个市场写入 {args.path}")
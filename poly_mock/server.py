@@ -0,0 +1,741 @@
+"""
+本地模拟 Polymarket 服务 - CLOB REST、data-api、Polygon RPC 和两个 websocket 频道
+
+用于没有网络时端到端压测 main.py 和 update_markets.py：
+- REST（HTTP/1.1 keep-alive，线程池处理）:
+    CLOB: /time /auth/api-key /auth/derive-api-key /tick-size /neg-risk /fee-rate /book /books
+          /sampling-markets /markets /prices-history /order /data/orders /cancel-market-orders /cancel-all
+    data-api: /data-api/value /data-api/positions
+    RPC: /rpc（eth_call 查询 USDC 和条件 token 余额）
+- websocket: /ws/market 按订阅的 token 推送 book 和 price_change，/ws/user 推送我方订单和成交事件
+- 行情总速率为 rate 次更新/秒，平均分布在所有市场上；连接只收到自己订阅的市场，
+  分片订阅时各连接的速率之和等于总速率
+- 故障注入：REST 延迟和抖动、按比例返回错误状态码、websocket 按比例主动断开
+
+使用示例:
+    # 启动 200 个市场、每秒 2000 次更新，并写入让机器人交易这些市场的本地目录
+    python -m poly_mock.server --markets 200 --rate 2000 --catalog data/mock/market_catalog.db
+
+    # 按输出的环境变量启动机器人（也可以写入 .env）
+    env $(python -m poly_mock.server --print-env --catalog data/mock/market_catalog.db) python main.py
+
+    # 自检：启动模拟服务，逐个访问接口并测量 websocket 实际速率
+    python -m poly_mock.server --check --rate 5000 --error-rate 0.05
+
+    # 回放录制的 API 响应（见 poly_mock.recording），复制到 5000 个市场
+    python -m poly_mock.server --replay data/recordings/live.json.gz --markets 5000
+
+    # 在代码中使用
+    with MockServer(MockExchange(markets=100), rate=1000, latency_ms=20) as server:
+        os.environ.update(server.env())
+
+    # 在独立进程中运行，测量客户端开销时不包含服务端
+    with serve_in_process(markets=1000, latency_ms=20) as env:
+        os.environ.update(env)
+"""
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import threading
+import traceback
+import contextlib
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from websockets.asyncio.server import serve, broadcast
+from websockets.exceptions import ConnectionClosed
+
+from poly_data.logger import get_logger
+from poly_mock.exchange import MockExchange, MOCK_CREDS
+from poly_mock.recording import load_recording
+
+# 创建模拟服务日志记录器
+mock_logger = get_logger('poly_mock', console_output=True)
+
+# 默认端口
+DEFAULT_REST_PORT = 8700
+DEFAULT_WS_PORT = 8701
+
+# 行情推进的间隔（秒）
+TICK_INTERVAL = 0.02
+
+# 订阅时每条消息包含的 book 事件数，避免超过客户端默认 1MB 的消息上限
+SNAPSHOT_BATCH = 50
+
+# 分页大小，与实际 API 相同
+PAGE_SIZE = 500
+
+# 分页游标: 'MA==' 是 base64('0')，'LTE=' 是 base64('-1') 表示结束
+END_CURSOR = 'LTE='
+
+# 签名用的测试私钥（不对应任何真实资金）
+MOCK_PRIVATE_KEY = '0x' + '4c' * 32
+
+# 未指定目录时，连接模拟服务的进程的运行时状态（快照、实时订单簿、PnL 等）保存在此目录，
+# 不写入真实账户使用的 data/
+MOCK_STATE_DIR = os.getenv('MOCK_STATE_DIR', 'data/mock')
+
+# ERC20 balanceOf(address) 和 ERC1155 balanceOf(address, uint256) 的函数选择器
+ERC20_BALANCE_OF = '0x70a08231'
+ERC1155_BALANCE_OF = '0x00fdd58e'
+
+
+def _encode_cursor(offset):
+    return base64.b64encode(str(offset).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        return max(int(base64.b64decode(cursor).decode()), 0)
+    except (ValueError, UnicodeDecodeError):
+        return 0
+
+
+def _paginate(rows, cursor):
+    offset = _decode_cursor(cursor)
+    page = rows[offset:offset + PAGE_SIZE]
+    end = offset + PAGE_SIZE
+    next_cursor = _encode_cursor(end) if end < len(rows) else END_CURSOR
+    return {'data': page, 'next_cursor': next_cursor, 'limit': PAGE_SIZE, 'count': len(page)}
+
+
+def _order_from_body(body):
+    """
+    从 POST /order 的签名订单中解析 token、方向、价格和数量
+
+    买单 makerAmount 是 USDC、takerAmount 是份额，卖单相反，都以 1e6 为单位。
+    """
+    order = body['order']
+    side = order['side']
+    if side in (0, '0'):
+        side = 'BUY'
+    elif side in (1, '1'):
+        side = 'SELL'
+    maker, taker = float(order['makerAmount']), float(order['takerAmount'])
+    if side == 'BUY':
+        price, size = maker / taker, taker / 10**6
+    else:
+        price, size = taker / maker, maker / 10**6
+    return str(order['tokenId']), side, round(price, 4), round(size, 2)
+
+
+class _RestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.mock.handle_rest(self, 'GET')
+
+    def do_POST(self):
+        self.server.mock.handle_rest(self, 'POST')
+
+    def do_DELETE(self):
+        self.server.mock.handle_rest(self, 'DELETE')
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockServer:
+    """REST 和 websocket 模拟服务，在后台线程中运行"""
+
+    def __init__(self, exchange=None, host='127.0.0.1', rest_port=0, ws_port=0, rate=100.0,
+                 latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, error_status=500, ws_drop_rate=0.0, seed=None):
+        """
+        参数:
+            exchange: MockExchange；默认 50 个市场
+            host: 监听地址
+            rest_port / ws_port: 端口，0 表示自动分配
+            rate: 所有市场合计每秒的行情更新次数
+            latency_ms / jitter_ms: 每个 REST 请求的延迟和随机抖动（毫秒）
+            error_rate: REST 请求返回 error_status 的比例
+            error_status: 注入错误时的状态码（如 500、503、429）
+            ws_drop_rate: 每个 websocket 连接每秒被主动断开的概率
+            seed: 故障注入的随机种子
+        """
+        self.exchange = exchange or MockExchange()
+        self.host = host
+        self.rest_port = rest_port
+        self.ws_port = ws_port
+        self.rate = rate
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.ws_drop_rate = ws_drop_rate
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+        self._http = None
+        self._loop = None
+        self._threads = []
+        self._ready = threading.Event()
+        self._stopping = None
+        self._market_conns = {}     # 连接 -> 订阅的 condition_id 集合
+        self._user_conns = set()
+        self._stats_lock = threading.Lock()
+        self.counters = {'rest_requests': 0, 'rest_errors': 0, 'ws_messages': 0, 'ws_updates': 0, 'ws_drops': 0}
+        self.routes = {
+            ('GET', '/time'): lambda q, b: int(time.time()),
+            ('POST', '/auth/api-key'): lambda q, b: MOCK_CREDS,
+            ('GET', '/auth/derive-api-key'): lambda q, b: MOCK_CREDS,
+            ('GET', '/tick-size'): self._tick_size,
+            ('GET', '/neg-risk'): self._neg_risk,
+            ('GET', '/fee-rate'): lambda q, b: {'base_fee': 0},
+            ('GET', '/book'): self._book,
+            ('POST', '/books'): self._books,
+            ('GET', '/sampling-markets'): self._sampling_markets,
+            ('GET', '/markets'): self._sampling_markets,
+            ('GET', '/prices-history'): self._prices_history,
+            ('POST', '/order'): self._post_order,
+            ('GET', '/data/orders'): self._get_orders,
+            ('DELETE', '/cancel-market-orders'): self._cancel_market_orders,
+            ('DELETE', '/cancel-all'): lambda q, b: {'canceled': self.exchange.cancel_orders(), 'not_canceled': {}},
+            ('DELETE', '/order'): self._cancel_order,
+            ('GET', '/data-api/value'): lambda q, b: [{'user': self.exchange.wallet,
+                                                       'value': self.exchange.position_value()}],
+            ('GET', '/data-api/positions'): lambda q, b: self.exchange.position_records(),
+            ('POST', '/rpc'): self._rpc,
+        }
+
+    # ============ 生命周期 ============
+
+    def start(self):
+        self._http = ThreadingHTTPServer((self.host, self.rest_port), _RestHandler)
+        self._http.daemon_threads = True
+        self._http.mock = self
+        self.rest_port = self._http.server_address[1]
+
+        http_thread = threading.Thread(target=self._http.serve_forever, name='mock-rest', daemon=True)
+        ws_thread = threading.Thread(target=self._run_loop, name='mock-ws', daemon=True)
+        self._threads = [http_thread, ws_thread]
+        for thread in self._threads:
+            thread.start()
+        if not self._ready.wait(10):
+            raise RuntimeError('模拟 websocket 服务启动超时')
+        mock_logger.info(f"模拟服务已启动: REST {self.rest_url}，websocket {self.ws_url}，"
+                         f"{len(self.exchange.markets)} 个市场，{self.rate:g} 次更新/秒")
+        return self
+
+    def stop(self):
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        for thread in self._threads:
+            thread.join(5)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def rest_url(self):
+        return f'http://{self.host}:{self.rest_port}'
+
+    @property
+    def ws_url(self):
+        return f'ws://{self.host}:{self.ws_port}/ws'
+
+    def env(self, catalog_path=None):
+        """
+        让机器人和 data_updater 使用本模拟服务的环境变量
+
+        参数:
+            catalog_path: 已写入模拟市场配置的本地目录；提供时一并设置目录路径并关闭热启动
+
+        快照、实时订单簿、PnL、余额缓存、价格历史等运行时状态始终重定向到目录所在的文件夹
+        （未提供目录时为 MOCK_STATE_DIR），模拟账户的持仓和订单不会被真实机器人热启动时恢复。
+        """
+        env = {
+            'CLOB_HOST': self.rest_url,
+            'DATA_API_URL': f'{self.rest_url}/data-api',
+            'CLOB_WS_URL': self.ws_url,
+            'POLYGON_RPC_URL': f'{self.rest_url}/rpc',
+            'PK': MOCK_PRIVATE_KEY,
+            'BROWSER_ADDRESS': self.exchange.wallet,
+            'CLOB_API_KEY': MOCK_CREDS['apiKey'],
+            'CLOB_SECRET': MOCK_CREDS['secret'],
+            'CLOB_PASS_PHRASE': MOCK_CREDS['passphrase'],
+        }
+        directory = os.path.dirname(catalog_path) if catalog_path else MOCK_STATE_DIR
+        env.update({
+            'WARM_START': 'false',
+            'SNAPSHOT_FILE': os.path.join(directory, 'bot_snapshot.json'),
+            'LIVE_BOOKS_PATH': os.path.join(directory, 'live_books.json'),
+            'PNL_HISTORY_DIR': os.path.join(directory, 'pnl_history'),
+            'BALANCE_CACHE_PATH': os.path.join(directory, 'balances.json'),
+            'CONFIG_CACHE_FILE': os.path.join(directory, 'sheet_config_cache.json'),
+            'PRICE_HISTORY_DIR': os.path.join(directory, 'price_history'),
+            'AI_CACHE_DIR': os.path.join(directory, 'ai_selector'),
+        })
+        if catalog_path:
+            env.update({
+                'MARKET_CATALOG_PATH': catalog_path,
+                'CONFIG_SOURCE': 'catalog',
+            })
+        return env
+
+    def stats(self):
+        with self._stats_lock:
+            counters = dict(self.counters)
+        counters.update(market_connections=len(self._market_conns), user_connections=len(self._user_conns))
+        counters.update(self.exchange.stats())
+        return counters
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.counters[key] += amount
+
+    def _random(self):
+        with self._rng_lock:
+            return self.rng.random()
+
+    # ============ REST ============
+
+    def handle_rest(self, handler, method):
+        url = urlsplit(handler.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        length = int(handler.headers.get('Content-Length') or 0)
+        raw = handler.rfile.read(length) if length else b''
+        self._count('rest_requests')
+
+        delay = self.latency_ms + (self._random() * 2 - 1) * self.jitter_ms
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        if self.error_rate > 0 and self._random() < self.error_rate:
+            self._count('rest_errors')
+            handler.send_json(self.error_status, {'error': 'mock injected error'})
+            return
+
+        route = self.routes.get((method, url.path.rstrip('/') or '/'))
+        if route is None:
+            handler.send_json(404, {'error': f'not found: {method} {url.path}'})
+            return
+
+        try:
+            body = json.loads(raw) if raw else None
+            result = route(query, body)
+        except (KeyError, ValueError, TypeError) as e:
+            handler.send_json(400, {'error': f'{type(e).__name__}: {e}'})
+            return
+        except Exception as e:
+            mock_logger.error(f"处理 {method} {url.path} 出错: {e}")
+            mock_logger.debug(traceback.format_exc())
+            handler.send_json(500, {'error': str(e)})
+            return
+
+        if result is None:
+            handler.send_json(404, {'error': 'not found'})
+        else:
+            handler.send_json(200, result)
+
+    def _market(self, token_id):
+        market = self.exchange.market_for(token_id)
+        if market is None:
+            raise KeyError(f'unknown token {token_id}')
+        return market
+
+    def _tick_size(self, query, body):
+        return {'minimum_tick_size': self._market(query['token_id'])['minimum_tick_size']}
+
+    def _neg_risk(self, query, body):
+        return {'neg_risk': self._market(query['token_id'])['neg_risk']}
+
+    def _book(self, query, body):
+        return self.exchange.book_summary(query['token_id'])
+
+    def _books(self, query, body):
+        return [book for book in (self.exchange.book_summary(p['token_id']) for p in body) if book is not None]
+
+    def _sampling_markets(self, query, body):
+        return _paginate(self.exchange.markets, query.get('next_cursor'))
+
+    def _prices_history(self, query, body):
+        end_ts = int(query.get('endTs') or time.time())
+        if 'startTs' in query:
+            start_ts = int(query['startTs'])
+        else:
+            days = {'1d': 1, '1w': 7, '1m': 30}.get(query.get('interval', '1m'), 30)
+            start_ts = end_ts - days * 86400
+        fidelity = int(query.get('fidelity') or 10)
+        return {'history': self.exchange.price_history(query['market'], start_ts, end_ts, fidelity)}
+
+    def _post_order(self, query, body):
+        token, side, price, size = _order_from_body(body)
+        result = self.exchange.place_order(token, side, price, size)
+        if result is None:
+            return {'success': False, 'errorMsg': f'unknown token {token}', 'orderID': '', 'status': ''}
+        return result
+
+    def _get_orders(self, query, body):
+        rows = self.exchange.open_orders(market=query.get('market'), asset_id=query.get('asset_id'))
+        return _paginate(rows, query.get('next_cursor'))
+
+    def _cancel_market_orders(self, query, body):
+        body = body or {}
+        market, asset_id = body.get('market'), body.get('asset_id')
+        if not market and not asset_id:
+            return {'canceled': [], 'not_canceled': {}}
+        return {'canceled': self.exchange.cancel_orders(market=market, asset_id=asset_id), 'not_canceled': {}}
+
+    def _cancel_order(self, query, body):
+        return {'canceled': self.exchange.cancel_orders(order_ids={body['orderID']}), 'not_canceled': {}}
+
+    def _rpc(self, query, body):
+        if isinstance(body, list):
+            return [self._rpc_call(call) for call in body]
+        return self._rpc_call(body)
+
+    def _rpc_call(self, call):
+        method = call.get('method')
+        result = None
+        if method == 'eth_chainId':
+            result = hex(137)
+        elif method == 'net_version':
+            result = '137'
+        elif method == 'eth_blockNumber':
+            result = hex(int(time.time()))
+        elif method == 'eth_call':
+            data = call['params'][0]['data']
+            if data.startswith(ERC20_BALANCE_OF):
+                result = '0x' + f'{int(max(self.exchange.usdc, 0) * 10**6):064x}'
+            elif data.startswith(ERC1155_BALANCE_OF):
+                token = int(data[len(ERC1155_BALANCE_OF) + 64:], 16)
+                result = '0x' + f'{self.exchange.raw_position(token):064x}'
+        if result is None:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': f'unsupported {method}'}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+    # ============ websocket ============
+
+    def _run_loop(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+
+    async def _serve(self):
+        self._stopping = asyncio.Event()
+        async with serve(self._handle_ws, self.host, self.ws_port, ping_interval=None) as server:
+            self.ws_port = list(server.sockets)[0].getsockname()[1]
+            self._ready.set()
+            ticker = asyncio.create_task(self._tick_loop())
+            await self._stopping.wait()
+            ticker.cancel()
+
+    async def _handle_ws(self, websocket):
+        path = websocket.request.path.rstrip('/')
+        try:
+            if path.endswith('/market'):
+                await self._market_feed(websocket)
+            elif path.endswith('/user'):
+                await self._user_feed(websocket)
+            else:
+                await websocket.close(code=1008, reason='unknown channel')
+        except ConnectionClosed:
+            pass
+
+    async def _market_feed(self, websocket):
+        message = json.loads(await websocket.recv())
+        tokens = [str(t) for t in message.get('assets_ids', [])]
+        conditions = {m['condition_id'] for m in (self.exchange.market_for(t) for t in tokens) if m is not None}
+
+        snapshot = self.exchange.snapshot_events(tokens)
+        for i in range(0, len(snapshot), SNAPSHOT_BATCH):
+            await websocket.send(json.dumps(snapshot[i:i + SNAPSHOT_BATCH]))
+        self._market_conns[websocket] = conditions
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._market_conns.pop(websocket, None)
+
+    async def _user_feed(self, websocket):
+        message = json.loads(await websocket.recv())
+        if 'auth' not in message:
+            await websocket.close(code=1008, reason='missing auth')
+            return
+        self._user_conns.add(websocket)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self._user_conns.discard(websocket)
+
+    async def _tick_loop(self):
+        loop = asyncio.get_running_loop()
+        last = loop.time()
+        carry = 0.0
+        while True:
+            await asyncio.sleep(TICK_INTERVAL)
+            now = loop.time()
+            elapsed, last = now - last, now
+            carry += self.rate * elapsed
+            count = int(carry)
+            carry -= count
+
+            try:
+                events = self.exchange.step(count)
+                self._publish_market(events)
+                user_events = self.exchange.drain_user_events()
+                if user_events and self._user_conns:
+                    broadcast(list(self._user_conns), json.dumps(user_events))
+                    self._count('ws_messages', len(self._user_conns))
+                self._inject_drops(elapsed)
+            except Exception as e:
+                mock_logger.error(f"推进行情出错: {e}")
+                mock_logger.debug(traceback.format_exc())
+
+    def _publish_market(self, events):
+        if not events:
+            return
+        for websocket, conditions in list(self._market_conns.items()):
+            if len(conditions) < len(events):
+                batch = [events[c] for c in conditions if c in events]
+            else:
+                batch = [event for c, event in events.items() if c in conditions]
+            if not batch:
+                continue
+            broadcast([websocket], json.dumps(batch))
+            self._count('ws_messages')
+            self._count('ws_updates', sum(len(event['price_changes']) for event in batch))
+
+    def _inject_drops(self, elapsed):
+        if self.ws_drop_rate <= 0:
+            return
+        probability = self.ws_drop_rate * elapsed
+        for websocket in list(self._market_conns) + list(self._user_conns):
+            if self._random() < probability:
+                self._count('ws_drops')
+                asyncio.ensure_future(websocket.close(code=1011, reason='mock injected drop'))
+
+
+def write_catalog(exchange, path, limit=None):
+    """把模拟市场写入本地目录，机器人以 CONFIG_SOURCE=catalog 运行时交易这些市场"""
+    import pandas as pd
+    from poly_utils.market_catalog import MarketCatalog, ALL_MARKETS_VIEW
+
+    selections, all_markets, hyperparameters = exchange.config_records(limit)
+    catalog = MarketCatalog(path)
+    catalog.write_view(ALL_MARKETS_VIEW, pd.DataFrame(all_markets))
+    catalog.write_selections(selections)
+    catalog.write_hyperparameters(hyperparameters)
+    return len(selections)
+
+
+def make_exchange(markets=50, replay=None, seed=7, **kwargs):
+    """合成市场，或回放 replay 路径的录制数据（markets 为 None 时使用录制的市场数量）"""
+    if replay:
+        return MockExchange.from_recording(load_recording(replay), markets=markets, seed=seed, **kwargs)
+    return MockExchange(markets=markets, seed=seed, **kwargs)
+
+
+def _serve_until(stop, env_queue, exchange_options, server_options):
+    with MockServer(make_exchange(**exchange_options), **server_options) as server:
+        env_queue.put(server.env())
+        stop.wait()
+
+
+@contextlib.contextmanager
+def serve_in_process(markets=50, replay=None, seed=7, startup_timeout=120, **server_options):
+    """
+    在独立进程中运行模拟服务
+
+    参数:
+        markets / replay / seed: 见 make_exchange
+        server_options: 传给 MockServer 的参数（rate、latency_ms 等），端口自动分配
+
+    产出:
+        dict: 指向该服务的环境变量（见 MockServer.env）
+    """
+    context = multiprocessing.get_context('spawn')
+    stop, env_queue = context.Event(), context.Queue()
+    exchange_options = {'markets': markets, 'replay': replay, 'seed': seed}
+    process = context.Process(target=_serve_until, args=(stop, env_queue, exchange_options, server_options),
+                              name='poly-mock', daemon=True)
+    process.start()
+    try:
+        yield env_queue.get(timeout=startup_timeout)
+    finally:
+        stop.set()
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+
+
+def run_check(server, seconds=2.0):
+    """
+    自检：逐个访问 REST 接口，订阅全部市场测量 websocket 实际速率
+
+    返回:
+        int: 0 表示全部通过
+    """
+    import requests
+    from websockets.sync.client import connect
+
+    session = requests.Session()
+    failures = []
+
+    def call(method, path, retries=20, **kwargs):
+        # 注入错误时重试，统计注入的失败次数
+        for _ in range(retries):
+            res = session.request(method, server.rest_url + path, timeout=10, **kwargs)
+            if res.status_code != server.error_status or server.error_rate == 0:
+                break
+        if res.status_code != 200:
+            failures.append(f'{method} {path}: {res.status_code}')
+            return None
+        return res.json()
+
+    def check(name, ok):
+        print(f"{'✅' if ok else '❌'} {name}")
+        if not ok:
+            failures.append(name)
+
+    exchange = server.exchange
+    token = exchange.token_ids()[0]
+
+    markets, cursor = [], ''
+    while cursor != END_CURSOR:
+        page = call('GET', f'/sampling-markets?next_cursor={cursor}')
+        if page is None:
+            break
+        markets += page['data']
+        cursor = page['next_cursor']
+    check(f'sampling-markets 分页获取 {len(markets)} 个市场', len(markets) == len(exchange.markets))
+
+    book = call('GET', f'/book?token_id={token}')
+    check('book 最优价在最后且买价低于卖价',
+          book is not None and float(book['bids'][-1]['price']) < float(book['asks'][-1]['price']))
+    history = call('GET', f'/prices-history?market={token}&interval=1m&fidelity=10')
+    check(f"prices-history 返回 {len(history['history']) if history else 0} 个数据点", bool(history and history['history']))
+
+    with connect(f'{server.ws_url}/user') as user_ws, connect(f'{server.ws_url}/market') as market_ws:
+        user_ws.send(json.dumps({'type': 'user', 'auth': {'apiKey': MOCK_CREDS['apiKey']}}))
+        market_ws.send(json.dumps({'assets_ids': exchange.token_ids()}))
+        books = 0
+        while books < len(exchange.markets):
+            batch = json.loads(market_ws.recv(timeout=10))
+            if batch[0]['event_type'] != 'book':
+                break
+            books += len(batch)
+        check(f'订阅后收到 {books} 个 book 事件', books == len(exchange.markets))
+
+        best_bid = float(book['bids'][-1]['price']) if book else 0.5
+        order = {'order': {'tokenId': token, 'side': 'BUY', 'makerAmount': str(int(best_bid * 100 * 10**6)),
+                           'takerAmount': str(100 * 10**6)}, 'owner': MOCK_CREDS['apiKey'], 'orderType': 'GTC'}
+        placed = call('POST', '/order', json=order)
+        orders = call('GET', '/data/orders?next_cursor=MA==')
+        check('下单后出现在未成交订单中', bool(placed and orders and any(o['id'] == placed['orderID'] for o in orders['data'])))
+        canceled = call('DELETE', '/cancel-market-orders', json={'market': '', 'asset_id': token})
+        check('按 token 撤单', bool(placed and canceled and placed['orderID'] in canceled['canceled']))
+
+        user_events = []
+        updates, messages = 0, 0
+        start = time.time()
+        while time.time() - start < seconds:
+            try:
+                batch = json.loads(market_ws.recv(timeout=0.5))
+            except TimeoutError:
+                continue
+            except ConnectionClosed:
+                # 注入了断开
+                break
+            messages += 1
+            updates += sum(len(event.get('price_changes', [])) for event in batch)
+        elapsed = time.time() - start
+        try:
+            while True:
+                user_events += json.loads(user_ws.recv(timeout=0.5))
+        except (TimeoutError, ConnectionClosed):
+            pass
+
+    achieved = updates / elapsed
+    check(f'市场 websocket {achieved:.0f} 次更新/秒（目标 {server.rate:g}），{messages / elapsed:.0f} 条消息/秒',
+          achieved >= server.rate * 0.8 or server.ws_drop_rate > 0)
+    types = sorted({event.get('type') for event in user_events})
+    check(f'用户 websocket 收到订单事件 {types}',
+          ('PLACEMENT' in types and 'CANCELLATION' in types) or server.ws_drop_rate > 0)
+
+    rpc = call('POST', '/rpc', json={'jsonrpc': '2.0', 'id': 1, 'method': 'eth_call',
+                                     'params': [{'data': ERC20_BALANCE_OF + '0' * 64}, 'latest']})
+    check('RPC 查询 USDC 余额', bool(rpc and abs(int(rpc['result'], 16) / 10**6 - exchange.usdc) < 1e-3))
+
+    stats = server.stats()
+    print(f"REST 请求 {stats['rest_requests']} 次，注入错误 {stats['rest_errors']} 次；"
+          f"websocket 消息 {stats['ws_messages']} 条，主动断开 {stats['ws_drops']} 次")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='本地模拟 Polymarket 服务')
+    parser.add_argument('--markets', type=int, help='市场数量（每个市场两个 token，行情按 token1 推送），'
+                                                    '默认 50，回放时默认为录制的市场数量')
+    parser.add_argument('--replay', help='回放 poly_mock.recording 录制的文件，而不是生成合成市场')
+    parser.add_argument('--rate', type=float, default=100, help='所有市场合计每秒的行情更新次数')
+    parser.add_argument('--latency-ms', type=float, default=0, help='每个 REST 请求的延迟（毫秒）')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='REST 延迟的随机抖动（毫秒）')
+    parser.add_argument('--error-rate', type=float, default=0, help='REST 请求返回错误的比例')
+    parser.add_argument('--error-status', type=int, default=500, help='注入错误时的状态码')
+    parser.add_argument('--ws-drop-rate', type=float, default=0, help='每个 websocket 连接每秒被断开的概率')
+    parser.add_argument('--fill-rate', type=float, default=0.02, help='处于最优价的挂单每次推进被成交的概率')
+    parser.add_argument('--seed', type=int, default=7, help='随机种子')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--rest-port', type=int, default=DEFAULT_REST_PORT)
+    parser.add_argument('--ws-port', type=int, default=DEFAULT_WS_PORT)
+    parser.add_argument('--catalog', help='把模拟市场写入此本地目录，供 main.py 以 CONFIG_SOURCE=catalog 读取')
+    parser.add_argument('--print-env', action='store_true', help='只输出环境变量（KEY=VALUE 每行一个）后退出')
+    parser.add_argument('--check', action='store_true', help='在自动分配的端口上启动并自检')
+    args = parser.parse_args()
+
+    markets = args.markets if args.markets is not None or args.replay else 50
+    exchange = make_exchange(markets, args.replay, seed=args.seed, fill_rate=args.fill_rate)
+    options = dict(rate=args.rate, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                   error_status=args.error_status, ws_drop_rate=args.ws_drop_rate, seed=args.seed)
+
+    if args.check:
+        with MockServer(exchange, host=args.host, **options) as server:
+            raise SystemExit(run_check(server))
+
+    server = MockServer(exchange, host=args.host, rest_port=args.rest_port, ws_port=args.ws_port, **options)
+    if args.print_env:
+        # 端口固定时环境变量不依赖服务是否已启动
+        for key, value in server.env(args.catalog).items():
+            print(f'{key}={value}')
+        raise SystemExit(0)
+
+    if args.catalog:
+        count = write_catalog(exchange, args.catalog)
+        print(f"📝 已将 {count} 个模拟市场写入 {args.catalog}")
+
+    server.start()
+    print("🔧 将机器人指向模拟服务的环境变量:")
+    for key, value in server.env(args.catalog).items():
+        print(f'    {key}={value}')
+
+    try:
+        while True:
+            time.sleep(10)
+            print(f"📊 {server.stats()}")
+    except KeyboardInterrupt:
+        server.stop()
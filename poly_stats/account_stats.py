@@ -1,25 +1,108 @@
+"""
+账户统计 - 汇总订单、持仓和奖励收益，写入 Summary 工作表
+
+token → (question, answer) 索引在两次运行之间缓存：本地目录有 Full Markets 时按目录修订号失效，
+否则每 SHEET_INDEX_TTL 秒重新读取一次表格。订单和持仓通过索引一次查找得到问题和答案。
+
+使用示例:
+    update_stats_once(client)
+"""
+import time
+
+import numpy as np
 import pandas as pd
-from py_clob_client.headers.headers import create_level_2_headers
-from py_clob_client.clob_types import RequestArgs
 
 from poly_utils.google_utils import get_spreadsheet
+from poly_utils.market_catalog import get_catalog, FULL_MARKETS_VIEW, SELECTIONS_MAX_AGE
+from poly_stats.earnings import EarningsFetcher
+from poly_data.pnl_history import record_rewards
+from poly_data.balance_service import get_balance_service
 from gspread_dataframe import set_with_dataframe
-import requests
-import json
-import os
 
 from dotenv import load_dotenv
 load_dotenv()
 
-spreadsheet = get_spreadsheet()
+# 从表格读取的索引和选择列表的缓存时间（秒）
+SHEET_INDEX_TTL = 60 * 60
+SHEET_SELECTED_TTL = 5 * 60
+
 
 def get_markets_df(wk_full):
-    markets_df = pd.DataFrame(wk_full.get_all_records())
+    # 优先从本地市场目录读取，目录中没有时读取表格
+    markets_df = get_catalog().read_view(FULL_MARKETS_VIEW)
+    if len(markets_df) == 0:
+        markets_df = pd.DataFrame(wk_full.get_all_records())
     markets_df = markets_df[['question', 'answer1', 'answer2', 'token1', 'token2']]
     markets_df['token1'] = markets_df['token1'].astype(str)
     markets_df['token2'] = markets_df['token2'].astype(str)
     return markets_df
 
+
+class TokenIndex:
+    """token ID 到 (question, answer) 的索引"""
+
+    def __init__(self, markets_df):
+        # 按市场顺序交错排列 token1 和 token2，重复的 token 保留先出现的市场
+        self.tokens = pd.Index(np.column_stack([markets_df['token1'].astype(str).to_numpy(),
+                                                markets_df['token2'].astype(str).to_numpy()]).ravel())
+        self.questions = np.repeat(markets_df['question'].to_numpy(), 2)
+        self.answers = np.column_stack([markets_df['answer1'].to_numpy(), markets_df['answer2'].to_numpy()]).ravel()
+
+        # 同一个 token 出现在多个市场时保留第一个
+        if self.tokens.has_duplicates:
+            keep = ~self.tokens.duplicated()
+            self.tokens = self.tokens[keep]
+            self.questions = self.questions[keep]
+            self.answers = self.answers[keep]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def lookup(self, token_ids):
+        """
+        批量查找 token
+
+        返回:
+            tuple: (问题数组, 答案数组, 是否找到的布尔数组)
+        """
+        positions = self.tokens.get_indexer(pd.Index(token_ids).astype(str))
+        found = positions >= 0
+        safe = np.where(found, positions, 0)
+        return self.questions[safe], self.answers[safe], found
+
+
+# {'key': 缓存键, 'expires': 过期时间, 'value': 值}
+_index_cache = {}
+_selected_cache = {}
+
+
+def get_token_index(wk_full):
+    """获取 token 索引，目录修订号未变化或表格缓存未过期时直接复用"""
+    catalog = get_catalog()
+    key = ('catalog', catalog.revision()) if catalog.view_info(FULL_MARKETS_VIEW) else ('sheet',)
+    if _index_cache.get('key') == key and _index_cache.get('expires', 0) > time.time():
+        return _index_cache['value']
+
+    index = TokenIndex(get_markets_df(wk_full))
+    ttl = float('inf') if key[0] == 'catalog' else SHEET_INDEX_TTL
+    _index_cache.update(key=key, expires=time.time() + ttl, value=index)
+    return index
+
+
+def get_selected_questions(wk_sel):
+    """已选择市场的问题集合，优先从本地目录读取"""
+    records = get_catalog().read_selections(max_age=SELECTIONS_MAX_AGE)
+    if records:
+        return {r.get('question') for r in records}
+
+    if _selected_cache.get('expires', 0) > time.time():
+        return _selected_cache['value']
+
+    value = set(pd.DataFrame(wk_sel.get_all_records()).get('question', pd.Series(dtype=object)))
+    _selected_cache.update(expires=time.time() + SHEET_SELECTED_TTL, value=value)
+    return value
+
+
 def get_all_orders(client):
     orders = client.client.get_orders()
     orders_df = pd.DataFrame(orders)
@@ -34,84 +117,86 @@ def get_all_orders(client):
         return pd.DataFrame()
 
 def get_all_positions(client):
+    """持仓从共享余额服务读取，交易进程最近获取过时不访问网络"""
     try:
-        positions = client.get_all_positions()
+        positions = get_balance_service().get_positions()
         positions = positions[['asset', 'size', 'avgPrice', 'curPrice', 'percentPnl']]
         positions = positions.rename(columns={'size': 'position_size'})
         return positions
     except:
         return pd.DataFrame()
 
-def combine_dfs(orders_df, positions, markets_df, selected_df):
+def combine_dfs(orders_df, positions, token_index, selected_questions):
+    """
+    合并订单和持仓，并查找每个 token 所属的市场和答案
+
+    参数:
+        orders_df: get_all_orders 的结果
+        positions: get_all_positions 的结果
+        token_index: TokenIndex
+        selected_questions: 已选择市场的问题集合
+    """
+    # 空表的数值列使用 float，fillna 时不需要从 object 向下转换
+    if len(orders_df) == 0:
+        orders_df = pd.DataFrame({'asset_id': pd.Series(dtype=object), 'order_size': pd.Series(dtype=float),
+                                  'order_side': pd.Series(dtype=object), 'order_price': pd.Series(dtype=float)})
+    if len(positions) == 0:
+        positions = pd.DataFrame({'asset': pd.Series(dtype=object), 'position_size': pd.Series(dtype=float),
+                                  'avgPrice': pd.Series(dtype=float), 'curPrice': pd.Series(dtype=float),
+                                  'percentPnl': pd.Series(dtype=float)})
+
     merged_df = orders_df.merge(positions, left_on=['asset_id'], right_on=['asset'], how='outer')
     merged_df['asset_id'] = merged_df['asset_id'].combine_first(merged_df['asset'])
-    merged_df = merged_df.drop(columns='asset', axis=1)
-
-    merge_token1 = merged_df.merge(markets_df, left_on='asset_id', right_on='token1', how='inner')
-    merge_token1['merged_with'] = 'token1'
 
-    # 与token2合并
-    merge_token2 = merged_df.merge(markets_df, left_on='asset_id', right_on='token2', how='inner')
-    merge_token2['merged_with'] = 'token2'
+    questions, answers, found = token_index.lookup(merged_df['asset_id'])
+    if not found.all():
+        print(f"⚠️  {int((~found).sum())} 个订单或持仓的 token 不在 Full Markets 中，已忽略")
 
-    # 合并结果
-    combined_df = pd.concat([merge_token1, merge_token2])
-
-    assert len(merged_df) == len(combined_df)
-
-    combined_df['answer'] = combined_df.apply(
-        lambda row: row['answer1'] if row['merged_with'] == 'token1' else row['answer2'], axis=1
-    )
-
-    combined_df = combined_df[['question', 'answer', 'order_size', 'order_side', 'order_price', 'position_size', 'avgPrice', 'curPrice']]
+    combined_df = merged_df.loc[found, ['order_size', 'order_side', 'order_price', 'position_size', 'avgPrice', 'curPrice']]
+    combined_df.insert(0, 'question', questions[found])
+    combined_df.insert(1, 'answer', answers[found])
     combined_df['order_side'] = combined_df['order_side'].fillna('')
     combined_df = combined_df.fillna(0)
 
-    combined_df['marketInSelected'] = combined_df['question'].isin(selected_df['question'])
-    combined_df = combined_df.sort_values('question')
-    combined_df = combined_df.sort_values('marketInSelected')
+    combined_df['marketInSelected'] = combined_df['question'].isin(selected_questions)
+    combined_df = combined_df.sort_values(['marketInSelected', 'question'], kind='stable')
+    return combined_df.reset_index(drop=True)
+
+def add_earnings(combined_df, earnings):
+    """按问题查找奖励收益，没有收益的市场为 0"""
+    earnings = earnings.drop_duplicates('question').set_index('question')
+    for col in ['earnings', 'earning_percentage']:
+        combined_df[col] = combined_df['question'].map(earnings[col]).fillna(0)
     return combined_df
 
-def get_earnings(client):
-    args = RequestArgs(method='GET', request_path='/rewards/user/markets')
-    l2Headers = create_level_2_headers(client.signer, client.creds, args)
-    url = "https://polymarket.com/api/rewards/markets"
+# 进程内共享的收益获取器，复用认证头和连接
+_earnings_fetcher = None
 
-    cursor = ''
-    markets = []
 
-    params = {
-        "l2Headers": json.dumps(l2Headers),
-        "orderBy": "earnings",
-        "position": "DESC",
-        "makerAddress": os.getenv('BROWSER_WALLET'),
-        "authenticationType": "eoa",
-        "nextCursor": cursor,
-        "requestPath": "/rewards/user/markets"
-    }
+def get_earnings(client):
+    """获取当天所有分页的奖励收益"""
+    global _earnings_fetcher
 
-    r = requests.get(url,  params=params)
-    results = r.json()
+    if _earnings_fetcher is None or _earnings_fetcher.client is not client:
+        _earnings_fetcher = EarningsFetcher(client)
+    return _earnings_fetcher.get_day()
 
-    data = pd.DataFrame(results['data'])
-    data['earnings'] = data['earnings'].apply(lambda x: x[0]['earnings'])
 
-    data = data[data['earnings'] > 0].reset_index(drop=True)
-    data = data[['question', 'earnings', 'earning_percentage']]
-    return data
 
+_spreadsheet = None
 
 
 def update_stats_once(client):
-    spreadsheet = get_spreadsheet()
-    wk_full = spreadsheet.worksheet('Full Markets')
-    wk_summary = spreadsheet.worksheet('Summary')
-
+    global _spreadsheet
 
-    wk_sel = spreadsheet.worksheet('Selected Markets')
-    selected_df = pd.DataFrame(wk_sel.get_all_records())
+    if _spreadsheet is None:
+        _spreadsheet = get_spreadsheet()
+    wk_full = _spreadsheet.worksheet('Full Markets')
+    wk_summary = _spreadsheet.worksheet('Summary')
+    wk_sel = _spreadsheet.worksheet('Selected Markets')
 
-    markets_df = get_markets_df(wk_full)
+    token_index = get_token_index(wk_full)
+    selected_questions = get_selected_questions(wk_sel)
     print("获取了电子表格...")
 
     orders_df = get_all_orders(client)
@@ -120,18 +205,18 @@ def update_stats_once(client):
     print("获取了持仓...")
 
     if len(positions) > 0 or len(orders_df) > 0:
-        combined_df = combine_dfs(orders_df, positions, markets_df, selected_df)
+        combined_df = combine_dfs(orders_df, positions, token_index, selected_questions)
         earnings = get_earnings(client.client)
         print("获取了收益...")
-        combined_df = combined_df.merge(earnings, on='question', how='left')
+        record_rewards(pd.Timestamp.now(tz='UTC').date().isoformat(), earnings)
+        combined_df = add_earnings(combined_df, earnings)
 
-        combined_df = combined_df.fillna(0)
         combined_df = combined_df.round(2)
 
-        combined_df = combined_df.sort_values('earnings', ascending=False)
+        combined_df = combined_df.sort_values('earnings', ascending=False, kind='stable')
         combined_df = combined_df[['question', 'answer', 'order_size', 'position_size', 'marketInSelected', 'earnings', 'earning_percentage']]
         wk_summary.clear()
 
         set_with_dataframe(wk_summary, combined_df, include_index=False, include_column_header=True, resize=True)
     else:
-        print("持仓或订单为空")
\ No newline at end of file
+        print("持仓或订单为空")
@@ -0,0 +1,129 @@
+"""
+奖励收益获取 - 遍历当天收益的所有分页
+
+- 结果通过 next_cursor 逐页获取，直到最后一页
+- L2 认证头在有效期内复用，连接通过 Session 复用
+
+收益接口只返回当天的数据（没有已验证的历史日期参数），因此不按天缓存；
+历史收益由 update_stats 每次运行时通过 pnl_history.record_rewards 按天记录。
+
+使用示例:
+    fetcher = EarningsFetcher(client.client)
+    today = fetcher.get_day()                  # 当天各市场收益
+"""
+import os
+import json
+import time
+
+import pandas as pd
+import requests
+
+from poly_data.logger import get_logger
+from poly_data.network_utils import retry_on_network_error
+
+# 创建收益获取日志记录器
+earnings_logger = get_logger('earnings', console_output=True)
+
+EARNINGS_URL = 'https://polymarket.com/api/rewards/markets'
+REQUEST_PATH = '/rewards/user/markets'
+
+# 分页结束标记
+END_CURSOR = 'LTE='
+
+# L2 认证头的复用时间（秒）
+HEADER_TTL = 60
+
+# 单天最多获取的页数，防止分页标记异常时无限循环
+MAX_PAGES = 200
+
+EARNINGS_COLUMNS = ['question', 'earnings', 'earning_percentage']
+
+
+def _first_earnings(entries):
+    """每个市场的 earnings 是按资产划分的列表，与原有逻辑一致取第一项"""
+    try:
+        return float(entries[0]['earnings'])
+    except (TypeError, IndexError, KeyError, ValueError):
+        return 0.0
+
+
+def to_frame(records):
+    """将接口返回的市场记录转换为只包含收益大于 0 的 DataFrame"""
+    data = pd.DataFrame(records)
+    if len(data) == 0:
+        return pd.DataFrame(columns=EARNINGS_COLUMNS)
+
+    data['earnings'] = data['earnings'].apply(_first_earnings)
+    data = data[data['earnings'] > 0].reset_index(drop=True)
+    return data[EARNINGS_COLUMNS]
+
+
+class EarningsFetcher:
+    """遍历所有分页的当天奖励收益获取器"""
+
+    def __init__(self, client, maker_address=None):
+        """
+        参数:
+            client: py_clob_client 的 ClobClient（需要 signer 和 creds）
+            maker_address: 钱包地址；默认读取 BROWSER_WALLET 或 BROWSER_ADDRESS
+        """
+        self.client = client
+        self.maker_address = maker_address or os.getenv('BROWSER_WALLET') or os.getenv('BROWSER_ADDRESS')
+        self.session = requests.Session()
+        self._headers = None
+        self._headers_at = 0
+
+    def _l2_headers(self):
+        # py_clob_client 的签名模块会导入 eth_account，较慢，第一次请求时才导入
+        from py_clob_client.headers.headers import create_level_2_headers
+        from py_clob_client.clob_types import RequestArgs
+
+        if self._headers is None or time.time() - self._headers_at > HEADER_TTL:
+            args = RequestArgs(method='GET', request_path=REQUEST_PATH)
+            self._headers = json.dumps(create_level_2_headers(self.client.signer, self.client.creds, args))
+            self._headers_at = time.time()
+        return self._headers
+
+    @retry_on_network_error(max_retries=3, delay=2, endpoint='rewards')
+    def _fetch_page(self, cursor):
+        params = {
+            "l2Headers": self._l2_headers(),
+            "orderBy": "earnings",
+            "position": "DESC",
+            "makerAddress": self.maker_address,
+            "authenticationType": "eoa",
+            "nextCursor": cursor,
+            "requestPath": REQUEST_PATH,
+        }
+
+        res = self.session.get(EARNINGS_URL, params=params, timeout=15)
+        res.raise_for_status()
+        return res.json()
+
+    def fetch_day(self):
+        """
+        获取当天所有分页的市场收益记录
+
+        返回:
+            list: 接口返回的原始市场记录
+        """
+        records = []
+        cursor = ''
+        for _ in range(MAX_PAGES):
+            page = self._fetch_page(cursor)
+            records.extend(page.get('data') or [])
+            cursor = page.get('next_cursor') or page.get('nextCursor')
+            if not cursor or cursor == END_CURSOR:
+                return records
+
+        earnings_logger.warning(f"当天收益超过 {MAX_PAGES} 页，结果可能不完整")
+        return records
+
+    def get_day(self):
+        """
+        获取当天各市场的收益
+
+        返回:
+            DataFrame: question, earnings, earning_percentage
+        """
+        return to_frame(self.fetch_day())
@@ -0,0 +1,117 @@
+"""
+决策缓存 - 以规范化输入的哈希为键保存 AI 选择器的决策
+
+输入相同时直接复用上一次的决策，不再调用 LLM。
+规范化时字典按键排序；只有调用方指定的部分（市场数据）的浮点数保留 CACHE_SIG_DIGITS 位有效数字，
+因此价格和波动率的微小变化不会导致缓存失效，而配置和超参数的任何修改都会使缓存失效。
+
+每个决策保存为 AI_CACHE_DIR/<哈希>.json，超过 ttl 秒的决策视为过期。
+
+使用示例:
+    cache = DecisionCache()
+    key = cache.key({'markets': records, 'config': config}, rounded=('markets',))
+    decision = cache.get(key)
+    if decision is None:
+        decision = ...  # 调用 LLM
+        cache.put(key, decision)
+"""
+import os
+import json
+import math
+import time
+import hashlib
+
+# 缓存目录
+AI_CACHE_DIR = os.getenv('AI_CACHE_DIR', 'data/ai_selector')
+
+# 决策的有效期（秒）
+AI_CACHE_TTL = float(os.getenv('AI_CACHE_TTL', str(24 * 60 * 60)))
+
+# 规范化时浮点数保留的有效数字位数
+CACHE_SIG_DIGITS = int(os.getenv('AI_CACHE_SIG_DIGITS', '2'))
+
+
+def normalize(value, digits=CACHE_SIG_DIGITS):
+    """
+    将输入转换为可稳定序列化的结构
+
+    - 浮点数保留 digits 位有效数字（digits 为 None 时不舍入），NaN 和无穷统一为 None
+    - 可以转换为数字的字符串（表格读取的数值列）按数字处理
+    - 字典和列表递归处理
+    """
+    if isinstance(value, dict):
+        return {str(k): normalize(v, digits) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v, digits) for v in value]
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            return value.strip()
+        return normalize(number, digits)
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if not math.isfinite(number):
+        return None
+    if number == 0:
+        return 0.0
+    if digits is None:
+        return number
+    return float(f'{number:.{digits}g}')
+
+
+class DecisionCache:
+    """以内容哈希为键的决策缓存"""
+
+    def __init__(self, cache_dir=AI_CACHE_DIR, ttl=AI_CACHE_TTL):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    @staticmethod
+    def key(payload, rounded=()):
+        """
+        规范化输入的 SHA-256
+
+        参数:
+            payload: 输入
+            rounded: payload（字典）中按 CACHE_SIG_DIGITS 舍入的键，其余部分精确比较
+        """
+        if isinstance(payload, dict):
+            payload = {k: normalize(v, CACHE_SIG_DIGITS if k in rounded else None) for k, v in payload.items()}
+        else:
+            payload = normalize(payload, None)
+        text = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key):
+        """
+        读取决策
+
+        返回:
+            dict: 保存的决策；不存在、无法读取或已过期时返回 None
+        """
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if time.time() - entry.get('saved_at', 0) > self.ttl:
+            return None
+        return entry.get('decision')
+
+    def put(self, key, decision):
+        """保存决策（先写临时文件再原子替换）"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'saved_at': time.time(), 'decision': decision}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
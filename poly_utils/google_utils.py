@@ -1,13 +1,68 @@
-from google.oauth2.service_account import Credentials
-import gspread
 import os
+import re
+import csv
+import json
+import threading
+import urllib.parse
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import requests
-import re
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 只读模式下学习到的 工作表 -> CSV导出地址 映射，持久化后下次只需一次请求
+SHEET_SOURCE_CACHE_FILE = os.getenv('SHEET_SOURCE_CACHE_FILE', 'data/sheet_sources.json')
+
+# 用于校验CSV是否属于目标工作表的必需列
+EXPECTED_COLUMNS = {
+    'Hyperparameters': ['type', 'param', 'value'],
+    'Selected Markets': ['question', 'param_type'],
+    'All Markets': ['question', 'volatility_sum'],
+    'Volatility Markets': ['question', 'volatility_sum'],
+    'Full Markets': ['question', 'token1', 'token2'],
+}
+
+# 将已知表格名称映射到可能的GID位置
+# 基于表格顺序: Full Markets, All Markets, Volatility Markets, Selected Markets, Hyperparameters
+DEFAULT_GID_MAPPING = {
+    'Full Markets': 0,
+    'All Markets': 1,
+    'Volatility Markets': 2,
+    'Selected Markets': 3,
+    'Hyperparameters': 4
+}
+
+_sources_lock = threading.Lock()
+_learned_sources = None
+
+
+def _get_learned_sources():
+    """加载已学习的工作表来源，格式: {sheet_id: {title: {'url': ..., 'gid': ...}}}"""
+    global _learned_sources
+    if _learned_sources is None:
+        try:
+            with open(SHEET_SOURCE_CACHE_FILE, encoding='utf-8') as f:
+                _learned_sources = json.load(f)
+        except (OSError, ValueError):
+            _learned_sources = {}
+    return _learned_sources
+
+
+def _save_learned_sources():
+    directory = os.path.dirname(SHEET_SOURCE_CACHE_FILE)
+    try:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = SHEET_SOURCE_CACHE_FILE + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_learned_sources, f, indent=2)
+        os.replace(tmp_path, SHEET_SOURCE_CACHE_FILE)
+    except OSError as e:
+        print(f"警告: 无法保存工作表来源缓存: {e}")
+
 def get_spreadsheet(read_only=False):
     """
     获取Google电子表格，可选只读模式。
@@ -31,7 +86,10 @@ def get_spreadsheet(read_only=False):
         else:
             raise FileNotFoundError(f"在{creds_file}找不到凭证文件。使用read_only=True进行只读访问。")
 
-    # 正常的认证访问
+    # 正常的认证访问；gspread 和 google-auth 导入较慢，只在需要时导入
+    from google.oauth2.service_account import Credentials
+    import gspread
+
     scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
     credentials = Credentials.from_service_account_file(creds_file, scopes=scope)
     client = gspread.authorize(credentials)
@@ -57,79 +115,135 @@ class ReadOnlySpreadsheet:
         return ReadOnlyWorksheet(self.sheet_id, title)
 
 class ReadOnlyWorksheet:
-    """通过CSV导出获取数据的只读工作表"""
+    """
+    通过CSV导出获取数据的只读工作表
+
+    首次读取时并发尝试多个候选导出地址，找到匹配的地址后持久化，之后只需一次请求。
+    """
 
     def __init__(self, sheet_id, title):
         self.sheet_id = sheet_id
         self.title = title
 
-    def get_all_records(self):
-        """将工作表的所有记录作为字典列表获取"""
+    def _candidate_urls(self):
+        """按优先级排列的候选CSV导出地址（已去重）"""
+        # URL编码表格标题以处理空格和特殊字符
+        encoded_title = urllib.parse.quote(self.title)
+        base = f"https://docs.google.com/spreadsheets/d/{self.sheet_id}"
+
+        # 优先按名称访问，然后是已知的GID位置，最后尝试一些常见的GID位置作为后备
+        urls = [f"{base}/gviz/tq?tqx=out:csv&sheet={encoded_title}"]
+        gids = [DEFAULT_GID_MAPPING[self.title]] if self.title in DEFAULT_GID_MAPPING else []
+        gids += [0, 1, 2, 3, 4]
+
+        for gid in gids:
+            url = f"{base}/export?format=csv&gid={gid}"
+            if url not in urls:
+                urls.append(url)
+        return urls
+
+    def _is_expected_sheet(self, text):
+        """只解析CSV表头，检查是否为目标工作表（不需要完整解析）"""
+        reader = csv.reader(StringIO(text))
+        header = next(reader, None)
+        if not header or len(header) <= 1 or next(reader, None) is None:
+            return False
+
+        expected = EXPECTED_COLUMNS.get(self.title, [])
+        return all(col in header for col in expected)
+
+    def _download(self, csv_url):
+        """下载CSV文本；不是目标工作表时返回 None"""
+        response = requests.get(csv_url, timeout=30)
+        response.raise_for_status()
+
+        # 确保响应使用 UTF-8 编码
+        response.encoding = 'utf-8'
+        text = response.text
+
+        if not self._is_expected_sheet(text):
+            return None
+        return text
+
+    def _to_records(self, text):
+        # 将CSV数据读入DataFrame，转换为字典列表（与gspread相同的格式）
+        df = pd.read_csv(StringIO(text), encoding='utf-8')
+        return df.to_dict('records')
+
+    def _learned_url(self):
+        with _sources_lock:
+            return _get_learned_sources().get(self.sheet_id, {}).get(self.title, {}).get('url')
+
+    def _learn(self, csv_url):
+        match = re.search(r'gid=(\d+)', csv_url)
+        with _sources_lock:
+            sources = _get_learned_sources().setdefault(self.sheet_id, {})
+            sources[self.title] = {'url': csv_url, 'gid': int(match.group(1)) if match else None}
+            _save_learned_sources()
+
+    def _forget(self):
+        with _sources_lock:
+            _get_learned_sources().get(self.sheet_id, {}).pop(self.title, None)
+            _save_learned_sources()
+
+    def _probe(self):
+        """
+        并发请求所有候选地址，按优先级返回第一个匹配的结果
+
+        返回:
+            tuple: (csv_url, csv文本)，都失败时返回 (None, None)
+        """
+        urls = self._candidate_urls()
+        executor = ThreadPoolExecutor(max_workers=len(urls))
+        futures = [executor.submit(self._download, url) for url in urls]
+
         try:
-            # URL编码表格标题以处理空格和特殊字符
-            import urllib.parse
-            encoded_title = urllib.parse.quote(self.title)
-
-            # 将已知表格名称映射到可能的GID位置
-            # 基于表格顺序: Full Markets, All Markets, Volatility Markets, Selected Markets, Hyperparameters
-            sheet_gid_mapping = {
-                'Full Markets': 0,
-                'All Markets': 1,
-                'Volatility Markets': 2,
-                'Selected Markets': 3,
-                'Hyperparameters': 4
-            }
-
-            # 尝试多种URL格式访问表格
-            urls_to_try = [
-                f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/gviz/tq?tqx=out:csv&sheet={encoded_title}",
-                f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/gviz/tq?tqx=out:csv&sheet={self.title}",
-            ]
-
-            # 如果我们知道此表格的可能位置，添加基于GID的URL
-            if self.title in sheet_gid_mapping:
-                gid = sheet_gid_mapping[self.title]
-                urls_to_try.append(f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/export?format=csv&gid={gid}")
-
-            # 也尝试一些常见的GID位置作为后备
-            for gid in [0, 1, 2, 3, 4]:
-                urls_to_try.append(f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/export?format=csv&gid={gid}")
-
-            for csv_url in urls_to_try:
+            for csv_url, future in zip(urls, futures):
                 try:
-                    print(f"尝试从以下位置获取表格'{self.title}': {csv_url}")
-                    response = requests.get(csv_url, timeout=30)
-                    response.raise_for_status()
-
-                    # 确保响应使用 UTF-8 编码
-                    response.encoding = 'utf-8'
-
-                    # 将CSV数据读入DataFrame，明确指定 UTF-8 编码
-                    from io import StringIO
-                    df = pd.read_csv(StringIO(response.text), encoding='utf-8')
-
-                    # 检查是否获得了有意义的数据（不是空的或错误响应）
-                    if not df.empty and len(df.columns) > 1:
-                        # 对于Hyperparameters表格，验证它是否有预期的列
-                        if self.title == 'Hyperparameters':
-                            expected_cols = ['type', 'param', 'value']
-                            if all(col in df.columns for col in expected_cols):
-                                print(f"成功获取{len(df)}条超参数记录")
-                                return df.to_dict('records')
-                            else:
-                                print(f"表格不匹配Hyperparameters格式。列: {list(df.columns)}")
-                                continue
-                        else:
-                            print(f"成功从表格'{self.title}'获取{len(df)}条记录")
-                            # 转换为字典列表（与gspread相同的格式）
-                            return df.to_dict('records')
-
+                    text = future.result()
                 except Exception as url_error:
                     print(f"URL {csv_url}失败: {url_error}")
                     continue
 
-            print(f"表格'{self.title}'的所有URL尝试都失败了")
-            return []
+                if text is not None:
+                    return csv_url, text
+                print(f"URL {csv_url}的内容不匹配表格'{self.title}'")
+        finally:
+            # 已找到结果时不再等待其余请求
+            executor.shutdown(wait=False)
+
+        return None, None
+
+    def _fetch_text(self):
+        """优先使用已学习的地址，失效时重新探测"""
+        learned_url = self._learned_url()
+        if learned_url:
+            try:
+                text = self._download(learned_url)
+                if text is not None:
+                    return text
+                print(f"已缓存的地址不再匹配表格'{self.title}'，重新探测")
+            except Exception as e:
+                print(f"已缓存的地址 {learned_url} 失败: {e}，重新探测")
+            self._forget()
+
+        print(f"正在探测表格'{self.title}'的导出地址...")
+        csv_url, text = self._probe()
+        if csv_url:
+            self._learn(csv_url)
+        return text
+
+    def get_all_records(self):
+        """将工作表的所有记录作为字典列表获取"""
+        try:
+            text = self._fetch_text()
+            if text is None:
+                print(f"表格'{self.title}'的所有URL尝试都失败了")
+                return []
+
+            records = self._to_records(text)
+            print(f"成功从表格'{self.title}'获取{len(records)}条记录")
+            return records
 
         except Exception as e:
             print(f"警告: 无法从表格'{self.title}'获取数据: {e}")
@@ -138,13 +252,12 @@ class ReadOnlyWorksheet:
     def get_all_values(self):
         """将工作表的所有值作为列表的列表获取"""
         try:
-            csv_url = f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/gviz/tq?tqx=out:csv&sheet={self.title}"
-            response = requests.get(csv_url, timeout=30)
-            response.raise_for_status()
+            text = self._fetch_text()
+            if text is None:
+                return []
 
             # 读取CSV并作为列表的列表返回
-            from io import StringIO
-            df = pd.read_csv(StringIO(response.text))
+            df = pd.read_csv(StringIO(text))
 
             # 包含标题并转换为列表的列表
             headers = [df.columns.tolist()]
@@ -154,5 +267,3 @@ class ReadOnlyWorksheet:
         except Exception as e:
             print(f"警告: 无法从表格'{self.title}'获取数据: {e}")
             return []
-
-
@@ -0,0 +1,155 @@
+"""
+导入耗时分析 - 基于 `python -X importtime` 统计各入口的冷启动导入耗时，并检查是否超出预算
+
+使用示例:
+    # 查看 main 的导入耗时，列出最慢的 20 个模块
+    python -m poly_utils.import_profile main --top 20
+
+    # 检查所有入口是否超出预算，超出时以非零状态码退出（可用于 CI）
+    python -m poly_utils.import_profile --check
+"""
+import os
+import sys
+import subprocess
+import argparse
+
+# 各入口冷启动导入预算（毫秒），约为实测值的 1.6 倍：main 约 130、trading 约 450、update_markets 约 450、
+# update_stats 约 470、export_markets 约 350。重新引入 pandas（约 270）或 eth_account（约 350）会超出预算
+# 可通过环境变量 IMPORT_BUDGET_MS_<模块名大写> 覆盖，例如 IMPORT_BUDGET_MS_MAIN=1500
+IMPORT_BUDGETS_MS = {
+    'main': 250,
+    'trading': 750,
+    'update_markets': 750,
+    'update_stats': 750,
+    'export_markets': 600,
+}
+
+# 各入口导入时不应加载的重量级模块，与耗时无关，不受机器速度影响
+DEFERRED_MODULES = {
+    'main': ['pandas', 'eth_account', 'py_clob_client.client'],
+    'update_markets': ['eth_account', 'py_clob_client.client', 'langchain_core'],
+    'update_stats': ['eth_account', 'py_clob_client.client'],
+}
+
+# 仓库根目录，导入在此目录下执行
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_budget_ms(module):
+    """获取模块的导入预算（毫秒），未配置时返回 None"""
+    env_key = 'IMPORT_BUDGET_MS_' + module.upper().replace('.', '_')
+    if os.getenv(env_key):
+        return float(os.getenv(env_key))
+    return IMPORT_BUDGETS_MS.get(module)
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 的输出
+
+    返回:
+        list: [(cumulative_us, self_us, module_name), ...]，按出现顺序排列
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0].strip())
+            cumulative_us = int(parts[1].strip())
+        except ValueError:
+            # 表头行
+            continue
+        # 名称前的一个空格是分隔符，更多的缩进表示嵌套导入
+        entries.append((cumulative_us, self_us, parts[2][1:].rstrip()))
+    return entries
+
+
+def measure_import(module, python=sys.executable):
+    """
+    在新进程中冷导入模块并统计耗时
+
+    参数:
+        module: 模块名（如 'main'、'poly_data.trading_utils'）
+        python: Python 解释器路径
+
+    返回:
+        tuple: (总耗时毫秒, 解析后的条目列表)
+
+    异常:
+        RuntimeError: 导入失败时
+    """
+    result = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''
+        raise RuntimeError(f"导入 {module} 失败: {last_line}")
+
+    entries = parse_importtime(result.stderr)
+    # 只统计目标模块及其父包的顶层条目，排除解释器启动时的 site 等导入
+    targets = {'.'.join(module.split('.')[:i]) for i in range(1, module.count('.') + 2)}
+    total_us = sum(cum for cum, _, name in entries if name in targets)
+    return total_us / 1000, entries
+
+
+def imported_modules(entries):
+    """导入过程中加载的全部模块名"""
+    return {name.strip() for _, _, name in entries}
+
+
+def format_report(module, total_ms, entries, top=15):
+    """生成导入耗时报告文本"""
+    lines = [f"{module}: {total_ms:.0f} ms"]
+    slowest = sorted(entries, key=lambda e: e[0], reverse=True)[:top]
+    for cumulative_us, self_us, name in slowest:
+        lines.append(f"  {cumulative_us / 1000:8.1f} ms 累计  {self_us / 1000:7.1f} ms 自身  {name.strip()}")
+    return '\n'.join(lines)
+
+
+def check_budgets(modules=None, top=10):
+    """
+    检查各入口的导入耗时是否在预算内
+
+    返回:
+        list: 超出预算或导入失败的 (模块, 说明) 列表
+    """
+    modules = modules or list(IMPORT_BUDGETS_MS)
+    failures = []
+
+    for module in modules:
+        budget = get_budget_ms(module)
+        try:
+            total_ms, entries = measure_import(module)
+        except RuntimeError as e:
+            failures.append((module, str(e)))
+            continue
+
+        print(format_report(module, total_ms, entries, top=top))
+        if budget is not None and total_ms > budget:
+            failures.append((module, f"{total_ms:.0f} ms 超出预算 {budget:.0f} ms"))
+
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='统计入口模块的冷启动导入耗时')
+    parser.add_argument('modules', nargs='*', help='要分析的模块（默认：所有已配置预算的入口）')
+    parser.add_argument('--top', type=int, default=15, help='列出最慢的模块数量')
+    parser.add_argument('--check', action='store_true', help='超出预算时以非零状态码退出')
+    args = parser.parse_args()
+
+    failures = check_budgets(args.modules, top=args.top)
+
+    for module, msg in failures:
+        print(f"❌ {module}: {msg}")
+
+    if args.check and failures:
+        sys.exit(1)
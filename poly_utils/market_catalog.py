@@ -0,0 +1,336 @@
+"""
+本地市场目录 - 以 SQLite（WAL 模式）保存市场、评分、波动率、选择列表和超参数
+
+update_markets.py 把计算结果写入目录，机器人、AI 选择器和统计脚本从目录读取；
+Google Sheets 只作为展示层，由后台线程异步同步。
+
+表结构:
+    markets          每个市场一行，全部字段保存在 data(JSON) 中，
+                     condition_id / token / 评分 / 波动率单独成列并建立索引
+    market_views     各展示列表（All Markets、Volatility Markets、Full Markets）包含的市场及顺序
+    view_meta        各展示列表的列顺序、来源和更新时间
+    selections       Selected Markets
+    hyperparameters  Hyperparameters
+    meta             全局修订号（任何写入都会递增）和选择列表最后一次与表格同步的时间
+"""
+import os
+import json
+import math
+import time
+import sqlite3
+import threading
+
+# 目录文件路径
+CATALOG_PATH = os.getenv('MARKET_CATALOG_PATH', 'data/market_catalog.db')
+
+ALL_MARKETS_VIEW = 'All Markets'
+VOLATILITY_MARKETS_VIEW = 'Volatility Markets'
+FULL_MARKETS_VIEW = 'Full Markets'
+
+# 选择列表超过此时间（秒）未与表格同步时视为过期，读取方改为直接读表格。
+# 机器人每 SHEET_IMPORT_INTERVAL 秒导入一次，默认留出 3 倍的余量
+SELECTIONS_MAX_AGE = float(os.getenv('SELECTIONS_MAX_AGE', str(3 * float(os.getenv('SHEET_IMPORT_INTERVAL', '30')))))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS markets (
+    condition_id TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    token1 TEXT,
+    token2 TEXT,
+    gm_reward_per_100 REAL,
+    volatility_sum REAL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_markets_question ON markets(question);
+CREATE INDEX IF NOT EXISTS idx_markets_token1 ON markets(token1);
+CREATE INDEX IF NOT EXISTS idx_markets_token2 ON markets(token2);
+CREATE INDEX IF NOT EXISTS idx_markets_score ON markets(gm_reward_per_100 DESC);
+CREATE INDEX IF NOT EXISTS idx_markets_volatility ON markets(volatility_sum);
+
+CREATE TABLE IF NOT EXISTS market_views (
+    view TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    condition_id TEXT NOT NULL,
+    PRIMARY KEY (view, position)
+);
+CREATE INDEX IF NOT EXISTS idx_market_views_condition ON market_views(condition_id);
+
+CREATE TABLE IF NOT EXISTS view_meta (
+    view TEXT PRIMARY KEY,
+    columns TEXT NOT NULL,
+    source TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS selections (
+    position INTEGER PRIMARY KEY,
+    question TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_selections_question ON selections(question);
+
+CREATE TABLE IF NOT EXISTS hyperparameters (
+    position INTEGER PRIMARY KEY,
+    type TEXT,
+    param TEXT,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _plain(value):
+    """将 numpy 标量和 NaN 转换为可以写入 JSON 的值"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    return value
+
+
+def _record(row, columns):
+    return {col: _plain(value) for col, value in zip(columns, row)}
+
+
+def _float_or_none(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+
+class MarketCatalog:
+    """
+    本地市场目录
+
+    每个线程使用独立的连接；WAL 模式下读取不会被其他进程的写入阻塞。
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _bump_revision(self, conn):
+        conn.execute("INSERT INTO meta(key, value) VALUES ('revision', '1') "
+                     "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+    def revision(self):
+        """返回目录的修订号，任何写入都会使其递增"""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+
+    # ============ 市场展示列表 ============
+
+    def write_view(self, view, df, source='local'):
+        """
+        用 DataFrame 替换一个展示列表，并更新其中市场的字段
+
+        参数:
+            view: 列表名（如 'All Markets'）
+            df: 包含 condition_id 和 question 列的 DataFrame
+            source: 数据来源，'local' 表示本机计算，'sheet' 表示从表格导入
+        """
+        columns = [str(col) for col in df.columns]
+        records = [_record(row, columns) for row in df.itertuples(index=False, name=None)]
+        # 表格中的空行没有 condition_id
+        records = [r for r in records if r.get('condition_id') not in (None, '')]
+        now = time.time()
+
+        conn = self._conn()
+        with conn:
+            existing = {}
+            ids = [str(r['condition_id']) for r in records]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                query = f"SELECT condition_id, data FROM markets WHERE condition_id IN ({','.join('?' * len(chunk))})"
+                existing.update((cid, json.loads(data)) for cid, data in conn.execute(query, chunk))
+
+            rows = []
+            for condition_id, record in zip(ids, records):
+                data = {**existing.get(condition_id, {}), **record}
+                rows.append((condition_id, str(data['question']), str(data.get('token1', '')),
+                             str(data.get('token2', '')), _float_or_none(data.get('gm_reward_per_100')),
+                             _float_or_none(data.get('volatility_sum')), json.dumps(data), now))
+
+            conn.executemany(
+                "INSERT INTO markets(condition_id, question, token1, token2, gm_reward_per_100, volatility_sum, data, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(condition_id) DO UPDATE SET question = excluded.question, token1 = excluded.token1, "
+                "token2 = excluded.token2, gm_reward_per_100 = excluded.gm_reward_per_100, "
+                "volatility_sum = excluded.volatility_sum, data = excluded.data, updated_at = excluded.updated_at",
+                rows,
+            )
+
+            conn.execute("DELETE FROM market_views WHERE view = ?", (view,))
+            conn.executemany("INSERT INTO market_views(view, position, condition_id) VALUES (?, ?, ?)",
+                             [(view, i, cid) for i, cid in enumerate(ids)])
+            conn.execute("INSERT OR REPLACE INTO view_meta(view, columns, source, updated_at) VALUES (?, ?, ?, ?)",
+                         (view, json.dumps(columns), source, now))
+            self._bump_revision(conn)
+
+    def view_info(self, view):
+        """返回 {'columns', 'source', 'updated_at'}，列表不存在时返回 None"""
+        row = self._conn().execute("SELECT columns, source, updated_at FROM view_meta WHERE view = ?",
+                                   (view,)).fetchone()
+        if row is None:
+            return None
+        return {'columns': json.loads(row[0]), 'source': row[1], 'updated_at': row[2]}
+
+    def read_view_records(self, view):
+        """
+        按顺序读取展示列表中的市场
+
+        返回:
+            list: 字典列表，只包含该列表的列；列表不存在时返回空列表
+        """
+        info = self.view_info(view)
+        if info is None:
+            return []
+
+        columns = info['columns']
+        rows = self._conn().execute(
+            "SELECT m.data FROM market_views v JOIN markets m ON m.condition_id = v.condition_id "
+            "WHERE v.view = ? ORDER BY v.position", (view,))
+        records = []
+        for (data,) in rows:
+            data = json.loads(data)
+            records.append({col: data.get(col) for col in columns})
+        return records
+
+    def read_view(self, view):
+        """以 DataFrame 形式读取展示列表，列顺序与写入时相同"""
+        import pandas as pd
+
+        info = self.view_info(view)
+        if info is None:
+            return pd.DataFrame()
+        return pd.DataFrame(self.read_view_records(view), columns=info['columns'])
+
+    def get_market(self, condition_id):
+        """按 condition_id 查找市场的全部字段"""
+        row = self._conn().execute("SELECT data FROM markets WHERE condition_id = ?", (condition_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find_by_token(self, token):
+        """按任一 token ID 查找市场的全部字段"""
+        row = self._conn().execute("SELECT data FROM markets WHERE token1 = ? OR token2 = ? LIMIT 1",
+                                   (str(token), str(token))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def top_markets(self, limit=50, max_volatility_sum=None):
+        """按 gm_reward_per_100 从高到低返回市场"""
+        # 只返回仍在某个展示列表中的市场
+        query = "SELECT data FROM markets WHERE condition_id IN (SELECT condition_id FROM market_views)"
+        args = []
+        if max_volatility_sum is not None:
+            query += " AND volatility_sum < ?"
+            args.append(max_volatility_sum)
+        query += " ORDER BY gm_reward_per_100 DESC LIMIT ?"
+        args.append(limit)
+        return [json.loads(data) for (data,) in self._conn().execute(query, args)]
+
+    # ============ 选择列表和超参数 ============
+
+    def write_selections(self, records):
+        """
+        替换 Selected Markets，records 为 get_all_records 格式的字典列表
+
+        写入方（表格导入、AI 选择器）同时写入表格或刚从表格读取，因此同时记录同步时间。
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM selections")
+            conn.executemany(
+                "INSERT INTO selections(position, question, data) VALUES (?, ?, ?)",
+                [(i, str(r.get('question', '')), json.dumps({k: _plain(v) for k, v in r.items()}))
+                 for i, r in enumerate(records)],
+            )
+            self._set_selections_synced(conn, time.time())
+            self._bump_revision(conn)
+
+    def _set_selections_synced(self, conn, synced_at):
+        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('selections_synced_at', ?)",
+                     (str(synced_at),))
+
+    def mark_selections_synced(self, synced_at=None):
+        """记录选择列表已与表格核对（表格未变化时不重写选择列表，只更新同步时间）"""
+        conn = self._conn()
+        with conn:
+            self._set_selections_synced(conn, synced_at or time.time())
+
+    def selections_age(self):
+        """选择列表距离最后一次与表格同步的秒数，从未同步时为无穷大"""
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'selections_synced_at'").fetchone()
+        return time.time() - float(row[0]) if row else float('inf')
+
+    def read_selections(self, max_age=None):
+        """
+        按表格中的顺序返回 Selected Markets 记录
+
+        参数:
+            max_age: 超过此时间（秒）未与表格同步时返回空列表，调用方改为读取表格；
+                     None 表示不检查（机器人自己负责导入）
+        """
+        if max_age is not None and self.selections_age() > max_age:
+            return []
+        rows = self._conn().execute("SELECT data FROM selections ORDER BY position")
+        return [json.loads(data) for (data,) in rows]
+
+    def write_hyperparameters(self, records):
+        """替换 Hyperparameters，records 为 get_all_records 格式的字典列表"""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM hyperparameters")
+            conn.executemany(
+                "INSERT INTO hyperparameters(position, type, param, data) VALUES (?, ?, ?, ?)",
+                [(i, str(r.get('type', '')), str(r.get('param', '')),
+                  json.dumps({k: _plain(v) for k, v in r.items()})) for i, r in enumerate(records)],
+            )
+            self._bump_revision(conn)
+
+    def read_hyperparameters(self):
+        """按表格中的顺序返回 Hyperparameters 记录"""
+        rows = self._conn().execute("SELECT data FROM hyperparameters ORDER BY position")
+        return [json.loads(data) for (data,) in rows]
+
+    def has_config(self):
+        """是否已有机器人运行所需的选择列表和超参数"""
+        conn = self._conn()
+        return (conn.execute("SELECT 1 FROM selections LIMIT 1").fetchone() is not None
+                and conn.execute("SELECT 1 FROM hyperparameters LIMIT 1").fetchone() is not None)
+
+
+# 进程内共享的目录实例
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """获取进程内共享的市场目录"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = MarketCatalog()
+    return _catalog
@@ -0,0 +1,281 @@
+"""
+按键分区的列式时间序列存储
+
+每个键（如 token）对应一个目录，数据按追加顺序保存为若干段，每段是一个目录，
+每列一个 .npy 文件。读取时使用内存映射，段数过多时合并为一个段并丢弃过期数据。
+
+每个键的 manifest.json 列出当前有效的段，读取时只读取其中的段。合并时先写入新段并替换清单，
+再删除旧段；旧段仍被内存映射（Windows 上无法删除）时删除失败会记录警告，
+旧段留在磁盘上但不再被读取，下一次合并时重试删除。没有清单的旧目录视为所有段都有效。
+
+目录结构:
+    <root>/<key>/manifest.json
+    <root>/<key>/<first_t>-<last_t>/t.npy
+    <root>/<key>/<first_t>-<last_t>/<column>.npy
+    <root>/<key>/<first_t>-<last_t>.<generation>/...   （合并得到的段）
+
+使用示例:
+    store = SegmentStore('data/price_history', columns=['p'])
+    store.append(token, t=timestamps, p=prices)
+    t, cols = store.read(token, since=time.time() - 86400)
+"""
+import os
+import re
+import json
+import time
+import shutil
+import threading
+
+import numpy as np
+
+from poly_data.logger import get_logger
+
+# 创建列式存储日志记录器
+store_logger = get_logger('segment_store', console_output=True)
+
+# 时间列名
+TIME_COLUMN = 't'
+
+# 有效段清单的文件名
+MANIFEST_FILE = 'manifest.json'
+
+_SEGMENT_RE = re.compile(r'^(\d+)-(\d+)(?:\.(\d+))?$')
+
+
+class SegmentStore:
+    """
+    按键分区、追加写入的列式时间序列存储
+
+    同一个键的写入和合并在进程内加锁；不同键之间互不影响。
+    """
+
+    def __init__(self, root, columns, max_segments=16, retention=None):
+        """
+        参数:
+            root: 存储根目录
+            columns: 除时间列外的列名列表
+            max_segments: 每个键的段数超过此值时自动合并
+            retention: 数据保留时长（秒），合并时丢弃更早的数据；None 表示不丢弃
+        """
+        self.root = root
+        self.columns = list(columns)
+        self.max_segments = max_segments
+        self.retention = retention
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, key):
+        with self._locks_lock:
+            return self._locks.setdefault(key, threading.RLock())
+
+    def _key_dir(self, key):
+        return os.path.join(self.root, str(key))
+
+    def _manifest_path(self, key):
+        return os.path.join(self._key_dir(key), MANIFEST_FILE)
+
+    def _read_manifest(self, key):
+        """
+        读取有效段清单
+
+        返回:
+            dict: {'generation': 合并次数, 'segments': [段目录名, ...]}；没有清单时返回 None
+        """
+        try:
+            with open(self._manifest_path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_manifest(self, key, generation, names):
+        """先写临时文件再原子替换；Windows 上清单正被读取时替换会失败，稍后重试"""
+        path = self._manifest_path(key)
+        tmp_path = f"{path}.tmp-{threading.get_ident()}"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'generation': generation, 'segments': sorted(names)}, f)
+
+        for attempt in range(5):
+            try:
+                os.replace(tmp_path, path)
+                return
+            except PermissionError:
+                if attempt == 4:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+
+    def _segment_dirs(self, key):
+        """磁盘上所有段目录名，包括已被合并替代、尚未删除的段"""
+        key_dir = self._key_dir(key)
+        if not os.path.isdir(key_dir):
+            return []
+        return [name for name in os.listdir(key_dir) if _SEGMENT_RE.match(name)]
+
+    def _segments(self, key):
+        """返回按时间排序的有效段 [(first_t, last_t, path), ...]"""
+        manifest = self._read_manifest(key)
+        names = manifest['segments'] if manifest is not None else self._segment_dirs(key)
+
+        key_dir = self._key_dir(key)
+        segments = []
+        for name in names:
+            match = _SEGMENT_RE.match(name)
+            segments.append((int(match.group(1)), int(match.group(2)), os.path.join(key_dir, name)))
+        return sorted(segments)
+
+    def _write_segment(self, key, t, columns, generation=None):
+        """
+        先写入临时目录再重命名，读取方不会看到写了一半的段
+
+        合并得到的段以 generation 为后缀，不会与仍在磁盘上的旧段重名。
+        段写入后还需要加入清单（见 _write_manifest）才会被读取。
+        """
+        key_dir = self._key_dir(key)
+        os.makedirs(key_dir, exist_ok=True)
+
+        name = f"{int(t[0])}-{int(t[-1])}"
+        if generation is not None:
+            name = f"{name}.{generation}"
+        tmp_dir = os.path.join(key_dir, f".tmp-{name}-{threading.get_ident()}")
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        np.save(os.path.join(tmp_dir, f'{TIME_COLUMN}.npy'), t)
+        for col in self.columns:
+            np.save(os.path.join(tmp_dir, f'{col}.npy'), columns[col])
+
+        path = os.path.join(key_dir, name)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp_dir, path)
+        return path
+
+    def last_timestamp(self, key):
+        """返回该键最后一个数据点的时间戳，没有数据时返回 None"""
+        segments = self._segments(key)
+        return max(last for _, last, _ in segments) if segments else None
+
+    def append(self, key, t, **columns):
+        """
+        追加数据点，只保留比已有数据更新的部分
+
+        参数:
+            key: 分区键
+            t: 时间戳数组（秒）
+            **columns: 各列的数据数组，长度与 t 相同
+
+        返回:
+            int: 实际写入的数据点数量
+        """
+        t = np.asarray(t, dtype=np.int64)
+        columns = {col: np.asarray(columns[col], dtype=np.float64) for col in self.columns}
+
+        with self._lock(key):
+            last = self.last_timestamp(key)
+
+            order = np.argsort(t, kind='stable')
+            mask = np.ones(len(t), dtype=bool) if last is None else t[order] > last
+            # 同一时间戳保留最后一个
+            if len(t):
+                sorted_t = t[order]
+                mask &= np.r_[sorted_t[1:] != sorted_t[:-1], True]
+            idx = order[mask]
+
+            if len(idx) == 0:
+                return 0
+
+            manifest = self._read_manifest(key)
+            names = manifest['segments'] if manifest is not None else self._segment_dirs(key)
+            path = self._write_segment(key, t[idx], {col: values[idx] for col, values in columns.items()})
+            names = sorted(set(names) | {os.path.basename(path)})
+            self._write_manifest(key, manifest['generation'] if manifest is not None else 0, names)
+
+            if len(names) > self.max_segments:
+                self._compact_locked(key)
+
+        return len(idx)
+
+    def _read_segments(self, key, since):
+        """读取各段的内存映射；段在读取过程中被合并时返回 None"""
+        parts = []
+        for first, last, path in self._segments(key):
+            if since is not None and last < since:
+                continue
+            try:
+                t = np.load(os.path.join(path, f'{TIME_COLUMN}.npy'), mmap_mode='r')
+                cols = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r') for col in self.columns}
+            except FileNotFoundError:
+                return None
+            start = 0 if since is None else int(np.searchsorted(t, since))
+            parts.append((t[start:], {col: values[start:] for col, values in cols.items()}))
+        return parts
+
+    def read(self, key, since=None):
+        """
+        读取该键的数据
+
+        只有一个段时直接返回内存映射数组；多个段时拼接为新的数组。
+
+        参数:
+            key: 分区键
+            since: 只返回时间戳 >= since 的数据
+
+        返回:
+            tuple: (t, {column: values})
+        """
+        parts = self._read_segments(key, since)
+        if parts is None:
+            # 与合并并发时，在锁内重新读取
+            with self._lock(key):
+                parts = self._read_segments(key, since) or []
+
+        if not parts:
+            return np.empty(0, dtype=np.int64), {col: np.empty(0) for col in self.columns}
+        if len(parts) == 1:
+            return parts[0]
+
+        t = np.concatenate([p[0] for p in parts])
+        return t, {col: np.concatenate([p[1][col] for p in parts]) for col in self.columns}
+
+    def _compact_locked(self, key):
+        segments = self._segments(key)
+        if not segments:
+            return
+
+        manifest = self._read_manifest(key)
+        generation = (manifest['generation'] if manifest is not None else 0) + 1
+
+        t, cols = self.read(key)
+        if self.retention is not None and len(t):
+            start = int(np.searchsorted(t, t[-1] - self.retention))
+            t, cols = t[start:], {col: values[start:] for col, values in cols.items()}
+
+        # 复制为普通数组，释放本进程对旧段的内存映射，否则 Windows 上无法删除旧段
+        t, cols = np.array(t), {col: np.array(v) for col, v in cols.items()}
+
+        # 先写入合并后的段并替换清单，读取方从此只读取新段
+        names = []
+        if len(t):
+            names.append(os.path.basename(self._write_segment(key, t, cols, generation)))
+        self._write_manifest(key, generation, names)
+        self._remove_superseded(key, names)
+
+    def _remove_superseded(self, key, live):
+        """删除不在清单中的段；失败时记录警告，段不会再被读取，下一次合并时重试"""
+        for name in self._segment_dirs(key):
+            if name in live:
+                continue
+            try:
+                shutil.rmtree(os.path.join(self._key_dir(key), name))
+            except OSError as e:
+                store_logger.warning(f"删除已合并的段 {key}/{name} 失败，将在下一次合并时重试: "
+                                     f"{type(e).__name__}: {e}")
+
+    def compact(self, key):
+        """将该键的所有段合并为一个段，并丢弃超过保留时长的数据"""
+        with self._lock(key):
+            self._compact_locked(key)
+
+    def keys(self):
+        """返回所有已存储的键"""
+        if not os.path.isdir(self.root):
+            return []
+        return [name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name))]
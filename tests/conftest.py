@@ -0,0 +1,64 @@
+"""
+测试公共夹具
+
+各模块导入时会在当前目录下创建 logs/、positions/、data/ 等运行时目录，
+测试在临时目录中运行，不污染仓库。
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+_workdir = None
+
+
+def pytest_configure(config):
+    global _workdir
+    _workdir = tempfile.mkdtemp(prefix='poly-tests-')
+    os.chdir(_workdir)
+
+
+def pytest_unconfigure(config):
+    if _workdir:
+        os.chdir(str(config.rootpath))
+        shutil.rmtree(_workdir, ignore_errors=True)
+
+
+class StubClient:
+    """记录调用参数的 PolymarketClient 替身"""
+
+    def __init__(self):
+        self.calls = []
+
+    def named(self, name):
+        """返回某个方法的全部调用参数"""
+        return [call[1:] for call in self.calls if call[0] == name]
+
+    def create_order(self, marketId, action, price, size, neg_risk=False):
+        self.calls.append(('create_order', marketId, action, price, size, neg_risk))
+        return {}
+
+    def cancel_all_asset(self, asset_id):
+        self.calls.append(('cancel_all_asset', asset_id))
+
+    def cancel_all_market(self, marketId):
+        self.calls.append(('cancel_all_market', marketId))
+
+    def get_position(self, tokenId):
+        return 0, 0
+
+    def merge_positions(self, amount_to_merge, condition_id, is_neg_risk_market):
+        self.calls.append(('merge_positions', amount_to_merge, condition_id, is_neg_risk_market))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """替换全局客户端，并清空本地订单和持仓状态"""
+    import poly_data.global_state as global_state
+
+    stub = StubClient()
+    monkeypatch.setattr(global_state, 'client', stub)
+    monkeypatch.setattr(global_state, 'orders', {})
+    monkeypatch.setattr(global_state, 'positions', {})
+    return stub
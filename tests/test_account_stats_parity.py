@@ -0,0 +1,136 @@
+"""
+账户统计向量化合并与原有两次 merge 实现的一致性测试，以及 TokenIndex 测试
+
+使用示例:
+    python -m pytest tests/test_account_stats_parity.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from poly_stats.account_stats import TokenIndex, combine_dfs
+
+
+def combine_dfs_reference(orders_df, positions, markets_df, selected_df):
+    """原有的两次 merge 实现"""
+    merged_df = orders_df.merge(positions, left_on=['asset_id'], right_on=['asset'], how='outer')
+    merged_df['asset_id'] = merged_df['asset_id'].combine_first(merged_df['asset'])
+    merged_df = merged_df.drop(columns='asset', axis=1)
+
+    merge_token1 = merged_df.merge(markets_df, left_on='asset_id', right_on='token1', how='inner')
+    merge_token1['merged_with'] = 'token1'
+
+    merge_token2 = merged_df.merge(markets_df, left_on='asset_id', right_on='token2', how='inner')
+    merge_token2['merged_with'] = 'token2'
+
+    combined_df = pd.concat([merge_token1, merge_token2])
+    assert len(merged_df) == len(combined_df)
+
+    combined_df['answer'] = combined_df.apply(
+        lambda row: row['answer1'] if row['merged_with'] == 'token1' else row['answer2'], axis=1
+    )
+
+    combined_df = combined_df[['question', 'answer', 'order_size', 'order_side', 'order_price', 'position_size', 'avgPrice', 'curPrice']]
+    combined_df['order_side'] = combined_df['order_side'].fillna('')
+    combined_df = combined_df.fillna(0)
+
+    combined_df['marketInSelected'] = combined_df['question'].isin(selected_df['question'])
+    combined_df = combined_df.sort_values('question')
+    combined_df = combined_df.sort_values('marketInSelected')
+    return combined_df
+
+
+def random_account(n_markets, n_positions, n_orders, seed=0):
+    """随机的市场、持仓和订单"""
+    rng = np.random.default_rng(seed)
+    markets_df = pd.DataFrame({
+        'question': [f'Market {i}?' for i in range(n_markets)],
+        'answer1': 'Yes',
+        'answer2': 'No',
+        'token1': [str(10 ** 20 + 2 * i) for i in range(n_markets)],
+        'token2': [str(10 ** 20 + 2 * i + 1) for i in range(n_markets)],
+    })
+    tokens = np.concatenate([markets_df['token1'], markets_df['token2']])
+    n_positions = min(n_positions, len(tokens))
+
+    positions = pd.DataFrame({
+        'asset': rng.choice(tokens, size=n_positions, replace=False),
+        'position_size': rng.uniform(1, 500, n_positions).round(2),
+        'avgPrice': rng.uniform(0.01, 0.99, n_positions).round(3),
+        'curPrice': rng.uniform(0.01, 0.99, n_positions).round(3),
+        'percentPnl': 0.0,
+    })
+    orders_df = pd.DataFrame({
+        'asset_id': rng.choice(tokens, size=n_orders),
+        'order_size': rng.uniform(5, 200, n_orders).round(2),
+        'order_side': rng.choice(['BUY', 'SELL'], size=n_orders),
+        'order_price': rng.uniform(0.01, 0.99, n_orders).round(2),
+    })
+    selected_df = markets_df[['question']].sample(frac=0.1, random_state=seed)
+    return markets_df, positions, orders_df, selected_df
+
+
+def _markets(rows):
+    return pd.DataFrame(rows, columns=['question', 'answer1', 'answer2', 'token1', 'token2'])
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_combine_dfs_matches_reference(seed):
+    markets_df, positions, orders_df, selected_df = random_account(5000, 5000, 5000, seed)
+
+    expected = combine_dfs_reference(orders_df, positions, markets_df, selected_df)
+    actual = combine_dfs(orders_df, positions, TokenIndex(markets_df), set(selected_df['question']))
+
+    # 原有实现的排序不稳定，按全部列排序后比较
+    columns = list(expected.columns)
+    expected = expected.sort_values(columns).reset_index(drop=True)
+    actual = actual[columns].sort_values(columns).reset_index(drop=True)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_combine_dfs_sorts_selected_markets_last():
+    markets_df = _markets([('B?', 'Yes', 'No', '1', '2'), ('A?', 'Yes', 'No', '3', '4')])
+    orders_df = pd.DataFrame({'asset_id': ['1', '3'], 'order_size': [5.0, 6.0],
+                              'order_side': ['BUY', 'SELL'], 'order_price': [0.4, 0.6]})
+    positions = pd.DataFrame({'asset': ['4'], 'position_size': [10.0], 'avgPrice': [0.5],
+                              'curPrice': [0.55], 'percentPnl': [0.0]})
+
+    combined = combine_dfs(orders_df, positions, TokenIndex(markets_df), {'A?'})
+
+    assert list(zip(combined['question'], combined['answer'])) == [('B?', 'Yes'), ('A?', 'Yes'), ('A?', 'No')]
+    assert list(combined['marketInSelected']) == [False, True, True]
+    assert list(combined['order_side']) == ['BUY', 'SELL', '']
+    assert combined['position_size'].tolist() == [0, 0, 10.0]
+
+
+def test_token_index_keeps_first_market_for_duplicate_token():
+    index = TokenIndex(_markets([('First?', 'Yes', 'No', '1', '2'), ('Second?', 'Up', 'Down', '2', '3')]))
+
+    questions, answers, found = index.lookup(['2', '3'])
+
+    assert len(index) == 3
+    assert list(questions) == ['First?', 'Second?']
+    assert list(answers) == ['No', 'Down']
+    assert found.all()
+
+
+def test_token_index_reports_missing_tokens():
+    index = TokenIndex(_markets([('Q?', 'Yes', 'No', '1', '2')]))
+
+    # 整数和字符串形式的 token ID 都能找到
+    questions, answers, found = index.lookup([2, '9', '1'])
+
+    assert list(found) == [True, False, True]
+    assert list(questions[found]) == ['Q?', 'Q?']
+    assert list(answers[found]) == ['No', 'Yes']
+
+
+def test_combine_dfs_drops_unknown_tokens():
+    index = TokenIndex(_markets([('Q?', 'Yes', 'No', '1', '2')]))
+    orders_df = pd.DataFrame({'asset_id': ['1', 'unknown'], 'order_size': [5.0, 6.0],
+                              'order_side': ['BUY', 'BUY'], 'order_price': [0.4, 0.5]})
+
+    combined = combine_dfs(orders_df, pd.DataFrame(), index, set())
+
+    assert list(combined['question']) == ['Q?']
+    assert combined['order_size'].tolist() == [5.0]
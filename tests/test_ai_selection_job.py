@@ -0,0 +1,212 @@
+"""
+AI 选择后台任务的测试：正常结束时发布结果，失败、异常退出或超时被终止的子进程不发布
+
+使用示例:
+    python -m pytest tests/test_ai_selection_job.py
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import data_updater.ai_selection_job as ai_selection_job
+from data_updater.ai_selection_job import TERMINATE_GRACE, AISelectionJob
+
+ROWS = [['question', 'max_size'], ['Will it rain?', '100']]
+
+
+class FakeProcess:
+    """子进程替身：start 时按 behaviour 写入结果文件，可模拟卡住或忽略 terminate 的子进程"""
+
+    def __init__(self, behaviour, target, args, name, daemon):
+        self.behaviour = behaviour
+        self.result_path = args[1]
+        self.pid = 4242
+        self.exitcode = None
+        self.alive = False
+        self.exited = threading.Event()
+        self.calls = []
+
+    def start(self):
+        self.calls.append('start')
+        self.behaviour(self)
+        if not self.alive:
+            self.exited.set()
+
+    def join(self, timeout=None):
+        self.calls.append(('join', timeout))
+        self.exited.wait(timeout)
+
+    def is_alive(self):
+        return self.alive
+
+    def _exit(self, code):
+        self.alive = False
+        self.exitcode = code
+        self.exited.set()
+
+    def terminate(self):
+        self.calls.append('terminate')
+        if self.behaviour.stops_on_terminate:
+            self._exit(-15)
+
+    def kill(self):
+        self.calls.append('kill')
+        self._exit(-9)
+
+    def write_result(self, **result):
+        with open(self.result_path, 'w', encoding='utf-8') as f:
+            json.dump({'rows': None, 'output': None, 'cached': False, 'error': None, **result}, f)
+
+
+class FakeContext:
+    """替换 spawn 上下文，记录创建的子进程"""
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+        self.processes = []
+
+    def Process(self, **kwargs):
+        process = FakeProcess(self.behaviour, **kwargs)
+        self.processes.append(process)
+        return process
+
+
+def _behaviour(func, stops_on_terminate=True):
+    func.stops_on_terminate = stops_on_terminate
+    return func
+
+
+def _succeeds(process):
+    process.write_result(rows=ROWS, output='ok')
+    process.exitcode = 0
+
+
+def _reports_error(process):
+    # 子进程内的异常被捕获并写入结果文件，可能同时带有部分行
+    process.write_result(rows=ROWS, error='RuntimeError: LLM unavailable')
+    process.exitcode = 0
+
+
+def _crashes(process):
+    # 子进程在写入结果之前异常退出
+    process.exitcode = 1
+
+
+def _hangs(process):
+    # 已写入结果但未退出，例如卡在退出清理中
+    process.write_result(rows=ROWS, output='late')
+    process.alive = True
+
+
+@pytest.fixture
+def published():
+    return []
+
+
+def _job(tmp_path, published, behaviour):
+    job = AISelectionJob(timeout=0.5, job_dir=str(tmp_path / 'jobs'), publish=published.append)
+    job._context = FakeContext(behaviour)
+    return job
+
+
+def _run(job):
+    assert job.submit(pd.DataFrame({'question': ['Will it rain?']}), pd.DataFrame(), []) is True
+    assert job.wait(timeout=5)
+    return job._context.processes[-1]
+
+
+def test_successful_child_publishes_rows(tmp_path, published):
+    job = _job(tmp_path, published, _behaviour(_succeeds))
+    _run(job)
+
+    assert published == [ROWS]
+    assert job.last_result['output'] == 'ok'
+    # 快照和结果文件都被清理
+    assert os.listdir(tmp_path / 'jobs') == []
+
+
+@pytest.mark.parametrize('behaviour', [_reports_error, _crashes], ids=['error', 'crash'])
+def test_failed_child_does_not_publish(tmp_path, published, behaviour):
+    job = _job(tmp_path, published, _behaviour(behaviour))
+    _run(job)
+
+    assert published == []
+    assert job.last_result['error']
+    assert os.listdir(tmp_path / 'jobs') == []
+
+
+def test_hung_child_is_terminated_without_publishing(tmp_path, published):
+    job = _job(tmp_path, published, _behaviour(_hangs))
+    process = _run(job)
+
+    assert process.calls == ['start', ('join', 0.5), 'terminate', ('join', TERMINATE_GRACE)]
+    assert published == []
+    assert job.last_result == {'error': 'timeout'}
+    # 子进程写下的结果文件不会留到下一次任务
+    assert os.listdir(tmp_path / 'jobs') == []
+
+
+def test_child_ignoring_terminate_is_killed(tmp_path, published, monkeypatch):
+    monkeypatch.setattr(ai_selection_job, 'TERMINATE_GRACE', 0.2)
+    job = _job(tmp_path, published, _behaviour(_hangs, stops_on_terminate=False))
+    process = _run(job)
+
+    assert process.calls[-3:] == [('join', 0.2), 'kill', ('join', None)]
+    assert process.exitcode == -9
+    assert published == []
+
+
+def test_publish_error_is_contained(tmp_path):
+    def publish(rows):
+        raise ConnectionError('sheets unavailable')
+
+    job = AISelectionJob(timeout=0.5, job_dir=str(tmp_path / 'jobs'), publish=publish)
+    job._context = FakeContext(_behaviour(_succeeds))
+    _run(job)
+
+    assert not job.running()
+    assert os.listdir(tmp_path / 'jobs') == []
+
+
+def test_submit_is_skipped_while_running(tmp_path, published):
+    job = _job(tmp_path, published, _behaviour(_hangs))
+    job.timeout = 1
+    df = pd.DataFrame({'question': ['Will it rain?']})
+
+    assert job.submit(df, pd.DataFrame(), []) is True
+    assert job.submit(df, pd.DataFrame(), []) is False
+    assert len(job._context.processes) == 1
+    assert job.wait(timeout=5)
+    assert job.submit(df, pd.DataFrame(), []) is True
+    assert job.wait(timeout=5)
+
+
+class SleepingContext:
+    """创建真实的 spawn 子进程，但入口换成长时间 sleep，模拟卡住的 LLM 请求"""
+
+    def __init__(self):
+        self.context = multiprocessing.get_context('spawn')
+        self.processes = []
+
+    def Process(self, target, args, name, daemon):
+        process = self.context.Process(target=time.sleep, args=(60,), name=name, daemon=daemon)
+        self.processes.append(process)
+        return process
+
+
+def test_real_hung_process_is_terminated(tmp_path, published):
+    job = AISelectionJob(timeout=1, job_dir=str(tmp_path / 'jobs'), publish=published.append)
+    job._context = SleepingContext()
+    started = time.time()
+    process = _run(job)
+
+    assert time.time() - started < 10
+    assert not process.is_alive()
+    assert process.exitcode is not None and process.exitcode < 0
+    assert published == []
+    assert job.last_result == {'error': 'timeout'}
@@ -0,0 +1,161 @@
+"""
+AI 市场选择器的预先筛选和决策缓存测试（使用桩模型，不访问表格和 LLM）
+
+使用示例:
+    python -m pytest tests/test_ai_selector.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import ai_config
+import ai_market_selector as selector
+from poly_utils.decision_cache import DecisionCache
+
+
+def _synthetic_markets(n, seed=7):
+    """合成的流动性市场"""
+    rng = np.random.default_rng(seed)
+    volatility = rng.gamma(2.0, 5.0, n)
+    reward = rng.gamma(1.5, 0.6, n)
+    return pd.DataFrame({
+        'question': [f'Synthetic market {i}?' for i in range(n)],
+        'spread': rng.uniform(0.01, 0.1, n).round(3),
+        'rewards_daily_rate': rng.choice([5, 10, 20, 50, 100], n),
+        'gm_reward_per_100': reward.round(3),
+        'volatility_sum': volatility.round(2),
+        'volatilty/reward': (reward / volatility).round(2).astype(str),
+        'min_size': rng.choice([20, 50, 100], n),
+        'best_bid': rng.uniform(0.1, 0.8, n).round(2),
+        'best_ask': rng.uniform(0.2, 0.9, n).round(2),
+        '1_hour': rng.uniform(0, 5, n).round(2),
+        '3_hour': rng.uniform(0, 5, n).round(2),
+        '6_hour': rng.uniform(0, 5, n).round(2),
+        '12_hour': rng.uniform(0, 5, n).round(2),
+        '24_hour': rng.uniform(0, 5, n).round(2),
+    }).sort_values('volatilty/reward')
+
+
+def _config(wallet_balance=300.0):
+    return {'wallet_balance': wallet_balance, 'risk_preference': ai_config.RISK_PREFERENCES['balanced'],
+            'max_markets': 5, 'additional_preferences': ''}
+
+
+HYPERPARAMETERS = pd.DataFrame([{'type': 'mid', 'param': 'stop_loss_threshold', 'value': -5}])
+
+
+@pytest.fixture
+def markets():
+    return _synthetic_markets(400)
+
+
+@pytest.fixture
+def worst(markets):
+    """评分最低的市场，作为当前选择时必须保留在候选列表中"""
+    return markets['question'].iloc[int(np.argmin(selector.market_scores(markets)))]
+
+
+@pytest.fixture
+def selections(worst):
+    return pd.DataFrame([{'question': worst, 'max_size': 800, 'trade_size': 200,
+                          'param_type': 'mid', 'comments': 'manual'}])
+
+
+@pytest.fixture
+def writes():
+    """替换选择列表的写入函数，记录写入的行"""
+    written = []
+    selector.set_selection_writer(written.append)
+    yield written
+    selector.set_selection_writer(None)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DecisionCache(str(tmp_path / 'ai_selector'))
+
+
+def test_shortlist_is_order_independent_and_keeps_current_selection(markets, worst):
+    shortlist = selector.shortlist_markets(markets, {worst})
+    shuffled = selector.shortlist_markets(markets.sample(frac=1, random_state=1), {worst})
+
+    assert list(shortlist['question']) == list(shuffled['question'])
+    assert worst in set(shortlist['question'])
+    assert len(shortlist) == selector.AI_SHORTLIST_SIZE
+
+    full_chars = len(selector.format_markets_for_prompt(markets))
+    shortlist_chars = len(selector.format_markets_for_prompt(shortlist, limit=len(shortlist)))
+    assert shortlist_chars < full_chars
+
+
+def test_same_inputs_reuse_the_decision(markets, selections, writes, cache):
+    config = _config()
+    agent = selector.StubAgent(config)
+
+    first = selector.select_markets(markets, selections, HYPERPARAMETERS, config, agent=agent, cache=cache)
+    assert first is not None and not first['cached']
+    decided = pd.DataFrame(writes[-1][1:], columns=selector.SELECTION_HEADERS)
+
+    # 写入后的下一轮：价格有微小变化，当前选择为上一次的决策
+    jittered = markets.assign(best_bid=markets['best_bid'] * 1.0001)
+    second = selector.select_markets(jittered, decided, HYPERPARAMETERS, config, agent=agent, cache=cache)
+
+    assert second is not None and second['cached']
+    assert agent.calls == 1
+    # 当前选择已与决策一致，不重复写入
+    assert len(writes) == 1
+
+
+def test_changed_hyperparameters_invalidate_the_decision(markets, selections, writes, cache):
+    config = _config()
+    agent = selector.StubAgent(config)
+
+    selector.select_markets(markets, selections, HYPERPARAMETERS, config, agent=agent, cache=cache)
+    third = selector.select_markets(markets, selections, HYPERPARAMETERS.assign(value=-10), config,
+                                    agent=agent, cache=cache)
+
+    assert third is not None and not third['cached']
+    assert agent.calls == 2
+
+
+def test_balance_changes_within_a_step_reuse_the_decision(markets, selections, writes, cache, monkeypatch):
+    monkeypatch.setattr(selector, 'AI_CACHE_BALANCE_STEP', 50.0)
+    agent = selector.StubAgent(_config())
+
+    selector.select_markets(markets, selections, HYPERPARAMETERS, _config(300.0), agent=agent, cache=cache)
+
+    # 持仓市值每次运行都在变化，同一档内复用决策
+    ticked = selector.select_markets(markets, selections, HYPERPARAMETERS, _config(312.37),
+                                     agent=agent, cache=cache)
+    assert ticked['cached']
+    assert agent.calls == 1
+
+    # 跨档时重新决策
+    moved = selector.select_markets(markets, selections, HYPERPARAMETERS, _config(360.0),
+                                    agent=agent, cache=cache)
+    assert not moved['cached']
+    assert agent.calls == 2
+
+
+def test_balance_bucket():
+    assert selector.balance_bucket(349.99, 50) == 300
+    assert selector.balance_bucket(350.0, 50) == 350
+    assert selector.balance_bucket(0.5, 50) == 0
+    assert selector.balance_bucket(123.456, 0) == 123.456
+
+
+def test_failed_agent_does_not_cache(markets, selections, writes, cache):
+    class FailingAgent:
+        model_name = 'stub'
+
+        def invoke(self, inputs):
+            raise RuntimeError('model unavailable')
+
+    config = _config()
+    assert selector.select_markets(markets, selections, HYPERPARAMETERS, config,
+                                   agent=FailingAgent(), cache=cache) is None
+
+    agent = selector.StubAgent(config)
+    result = selector.select_markets(markets, selections, HYPERPARAMETERS, config, agent=agent, cache=cache)
+    assert not result['cached']
+    assert agent.calls == 1
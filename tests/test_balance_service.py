@@ -0,0 +1,237 @@
+"""
+共享余额服务的测试：缓存有效期、进程间的文件锁、获取失败时使用旧值，以及持仓的显式发布
+
+使用示例:
+    python -m pytest tests/test_balance_service.py
+"""
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import poly_data.balance_service as balance_service
+import poly_data.data_utils as data_utils
+from poly_data.balance_service import PUBLISH_INTERVAL, BalanceService
+
+T0 = 1_700_000_000
+WALLET = '0xAbC0000000000000000000000000000000000001'
+RECORDS = [{'asset': '111', 'size': 25.0, 'avgPrice': 0.48}]
+
+needs_flock = pytest.mark.skipif(balance_service.fcntl is None, reason='需要 fcntl 文件锁')
+
+
+class Fetch:
+    """计数的获取函数；error 不为空时抛出"""
+
+    def __init__(self, value):
+        self.value = value
+        self.error = None
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=T0)
+    monkeypatch.setattr(balance_service, 'time', SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'data' / 'balances.json')
+
+
+def _service(path, usdc=100.0, wallet=WALLET):
+    """模拟一个进程中的服务实例，USDC 获取被替换为计数的 Fetch"""
+    service = BalanceService(wallet=wallet, path=path, ttl=60)
+    service.fetch_usdc_balance = Fetch(usdc)
+    return service
+
+
+def test_value_is_cached_until_ttl(clock, path):
+    service = _service(path)
+
+    assert service.get_usdc_balance() == 100.0
+    clock.value += 60
+    service.fetch_usdc_balance.value = 120.0
+    assert service.get_usdc_balance() == 100.0
+    assert service.fetch_usdc_balance.calls == 1
+
+    clock.value += 1
+    assert service.get_usdc_balance() == 120.0
+    assert service.fetch_usdc_balance.calls == 2
+
+    # max_age 覆盖默认有效期
+    clock.value += 10
+    assert service.get_usdc_balance(max_age=5) == 120.0
+    assert service.fetch_usdc_balance.calls == 3
+
+
+def test_other_process_reads_shared_file(clock, path):
+    first = _service(path)
+    first.get_usdc_balance()
+
+    second = _service(path, usdc=999.0)
+    assert second.get_usdc_balance() == 100.0
+    assert second.fetch_usdc_balance.calls == 0
+
+
+def test_fields_expire_independently(clock, path):
+    service = _service(path)
+    service.fetch_position_value = Fetch(40.0)
+    service.get_usdc_balance()
+    clock.value += 30
+    service.get_position_value()
+
+    clock.value += 40
+    assert service.get_total_balance() == 140.0
+    assert service.fetch_usdc_balance.calls == 2
+    assert service.fetch_position_value.calls == 1
+
+
+def test_file_of_another_wallet_is_ignored(clock, path):
+    _service(path).get_usdc_balance()
+
+    other = _service(path, usdc=7.0, wallet='0x0000000000000000000000000000000000000002')
+    assert other.get_usdc_balance() == 7.0
+    assert other.fetch_usdc_balance.calls == 1
+
+
+def test_failed_fetch_falls_back_to_stale_value(clock, path):
+    service = _service(path)
+    service.get_usdc_balance()
+
+    clock.value += 3600
+    service.fetch_usdc_balance.error = ConnectionError('rpc down')
+    assert service.get_usdc_balance() == 100.0
+    # 旧值不会被当作新获取的值写回，下次调用仍会重试
+    assert service.get_usdc_balance() == 100.0
+    assert service.fetch_usdc_balance.calls == 3
+
+
+def test_failed_fetch_without_stale_value_raises(clock, path):
+    service = _service(path)
+    service.fetch_usdc_balance.error = ConnectionError('rpc down')
+
+    with pytest.raises(ConnectionError):
+        service.get_usdc_balance()
+
+
+def test_corrupt_file_is_refetched(clock, path):
+    service = _service(path)
+    service.get_usdc_balance()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{not json')
+
+    assert _service(path).get_usdc_balance() == 100.0
+
+
+@needs_flock
+def test_waiting_process_uses_result_of_fetch_lock_holder(clock, path):
+    holder = _service(path, usdc=55.0)
+    waiter = _service(path)
+    result = []
+
+    # holder 正在获取：持有获取锁，waiter 过期后等待而不是同时获取
+    fetch_lock = holder._locked('.fetch.lock')
+    thread = threading.Thread(target=lambda: result.append(waiter.get_usdc_balance()))
+    thread.start()
+    thread.join(0.3)
+    assert thread.is_alive()
+
+    holder._store('usdc', holder.fetch_usdc_balance())
+    fetch_lock.close()
+    thread.join(5)
+
+    assert result == [55.0]
+    assert waiter.fetch_usdc_balance.calls == 0
+
+
+@needs_flock
+def test_write_lock_is_not_held_during_fetch(clock, path):
+    service = _service(path)
+    other = _service(path)
+    held = []
+
+    def fetch():
+        # 获取期间其他进程仍能写文件
+        lock_file = other._locked(blocking=False)
+        held.append(lock_file is not None)
+        lock_file.close()
+        return 1.0
+
+    service.fetch_usdc_balance = fetch
+    service.get_usdc_balance()
+
+    assert held == [True]
+
+
+@needs_flock
+def test_publish_skips_when_write_lock_is_taken(clock, path):
+    service = _service(path)
+    lock_file = _service(path)._locked()
+    try:
+        assert service.publish_positions(RECORDS) is False
+    finally:
+        lock_file.close()
+
+    assert service.publish_positions(RECORDS) is True
+
+
+def test_publish_is_throttled_and_read_by_other_processes(clock, path):
+    service = _service(path)
+    assert service.publish_positions(pd.DataFrame(RECORDS)) is True
+
+    clock.value += PUBLISH_INTERVAL
+    assert service.publish_positions(RECORDS + RECORDS) is False
+
+    reader = _service(path)
+    reader.fetch_positions = Fetch([])
+    positions = reader.get_positions()
+    assert positions.to_dict('records') == RECORDS
+    assert reader.fetch_positions.calls == 0
+
+    clock.value += 1
+    assert service.publish_positions(RECORDS + RECORDS) is True
+
+
+class RecordingService:
+    def __init__(self):
+        self.published = []
+
+    def publish_positions(self, records):
+        self.published.append(records)
+        return True
+
+
+def test_update_positions_publishes_fetched_positions(client, monkeypatch):
+    recorder = RecordingService()
+    monkeypatch.setattr(data_utils, 'get_balance_service', lambda: recorder)
+    client.get_all_positions = lambda: pd.DataFrame(RECORDS)
+
+    data_utils.update_positions()
+
+    assert len(recorder.published) == 1
+    assert recorder.published[0].to_dict('records') == RECORDS
+    assert data_utils.global_state.positions['111']['size'] == 25.0
+
+
+def test_client_get_all_positions_has_no_side_effects(monkeypatch):
+    import poly_data.polymarket_client as polymarket_client
+
+    recorder = RecordingService()
+    monkeypatch.setattr(balance_service, '_service', recorder)
+    monkeypatch.setattr(polymarket_client.requests, 'get',
+                        lambda url, timeout: SimpleNamespace(json=lambda: RECORDS))
+
+    positions = polymarket_client.PolymarketClient.get_all_positions(SimpleNamespace(browser_wallet=WALLET))
+
+    assert positions.to_dict('records') == RECORDS
+    assert recorder.published == []
@@ -0,0 +1,51 @@
+"""
+基准测试与基线对比规则的测试
+
+使用示例:
+    python -m pytest tests/test_bench_compare.py
+"""
+from benchmarks.harness import compare
+
+
+def _report(calibration_us, **relatives):
+    return {'calibration_us': calibration_us,
+            'results': {name: {'us': relative * calibration_us, 'relative': relative}
+                        for name, relative in relatives.items()}}
+
+
+def test_ratio_over_tolerance_is_regression():
+    rows = compare(_report(1000, fast=1.0, slow=2.0), _report(1000, fast=1.0, slow=1.0), tolerance=1.5)
+
+    assert [(name, ratio, bad) for name, _, _, ratio, bad in rows] == [('fast', 1.0, False), ('slow', 2.0, True)]
+
+
+def test_small_absolute_delta_is_not_regression():
+    # 3 ms 的阶段慢了 3 倍，但只多了 6 ms；500 ms 的阶段慢了 2 倍，多了 500 ms
+    baseline = _report(1000, tiny=3.0, large=500.0)
+    report = _report(1000, tiny=9.0, large=1000.0)
+
+    rows = compare(report, baseline, tolerance=1.5, min_delta_us=50_000)
+
+    assert {name: bad for name, _, _, _, bad in rows} == {'tiny': False, 'large': True}
+
+
+def test_delta_is_converted_to_current_machine():
+    # 本机比记录基线的机器慢一倍，相对值的差按本机校准耗时折算
+    baseline = _report(1000, stage=30.0)
+    report = _report(2000, stage=60.0)
+
+    rows = compare(report, baseline, tolerance=1.5, min_delta_us=50_000)
+
+    assert rows[0][3] == 2.0
+    assert rows[0][4] is True
+
+
+def test_missing_or_differently_calibrated_baseline_is_not_compared():
+    report = _report(1000, new=1.0, pandas_case=1.0)
+    report['results']['pandas_case']['calibration'] = 'pandas'
+    report['calibrations_us'] = {'python': 1000, 'pandas': 1000}
+
+    rows = compare(report, _report(1000, pandas_case=0.1))
+
+    assert [(name, ratio, bad) for name, _, _, ratio, bad in rows] == [('new', None, False),
+                                                                       ('pandas_case', None, False)]
@@ -0,0 +1,42 @@
+"""
+本地市场目录配置源测试
+
+使用示例:
+    python -m pytest tests/test_catalog_config.py
+"""
+import pandas as pd
+import pytest
+
+from poly_data.sheet_config import CatalogConfigSource
+from poly_utils.market_catalog import MarketCatalog, ALL_MARKETS_VIEW
+
+
+def _catalog_with_market(path, neg_risk):
+    catalog = MarketCatalog(str(path))
+    catalog.write_view(ALL_MARKETS_VIEW, pd.DataFrame([{
+        'question': 'Will it rain?', 'answer1': 'Yes', 'answer2': 'No', 'neg_risk': neg_risk,
+        'max_spread': 3.0, 'tick_size': 0.01, 'token1': '111', 'token2': '222', 'condition_id': '0xabc',
+    }]))
+    catalog.write_selections([{'question': 'Will it rain?', 'max_size': 100, 'trade_size': 10, 'param_type': 'mid'}])
+    catalog.write_hyperparameters([{'type': 'mid', 'param': 'stop_loss_threshold', 'value': -5}])
+    return catalog
+
+
+@pytest.mark.parametrize('neg_risk', [True, False])
+def test_neg_risk_flag_reaches_create_order(tmp_path, client, neg_risk):
+    import trading
+
+    catalog = _catalog_with_market(tmp_path / 'catalog.db', neg_risk)
+    source = CatalogConfigSource(read_only=True, catalog=catalog, import_interval=float('inf'))
+    row = source.refresh().df.iloc[0]
+
+    # 与表格读取结果的格式相同
+    assert row['neg_risk'] == ('TRUE' if neg_risk else 'FALSE')
+
+    trading.send_buy_order({
+        'token': int(row['token1']), 'price': 0.5, 'size': 10, 'mid_price': 0.5,
+        'max_spread': row['max_spread'], 'neg_risk': row['neg_risk'],
+        'orders': {'buy': {'price': 0, 'size': 0}, 'sell': {'price': 0, 'size': 0}},
+    })
+
+    assert client.named('create_order') == [(111, 'BUY', 0.5, 10, neg_risk)]
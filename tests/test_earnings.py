@@ -0,0 +1,90 @@
+"""
+奖励收益获取的测试：按 next_cursor 遍历所有分页、在结束标记处停止、MAX_PAGES 上限
+
+使用示例:
+    python -m pytest tests/test_earnings.py
+"""
+import pytest
+
+import poly_stats.earnings as earnings
+from poly_stats.earnings import END_CURSOR, EarningsFetcher
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class FakeSession:
+    """按请求中的 nextCursor 返回对应分页，记录每次请求的游标"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.cursors = []
+
+    def get(self, url, params, timeout):
+        self.cursors.append(params['nextCursor'])
+        return FakeResponse(self.pages[params['nextCursor']])
+
+
+def _market(question, amount):
+    return {'question': question, 'earnings': [{'earnings': amount}], 'earning_percentage': 1.0}
+
+
+def _fetcher(pages):
+    fetcher = EarningsFetcher(client=None, maker_address='0xabc')
+    fetcher.session = FakeSession(pages)
+    # 不生成真实的 L2 签名
+    fetcher._l2_headers = lambda: '{}'
+    return fetcher
+
+
+def test_fetch_day_follows_cursors_until_end_marker():
+    fetcher = _fetcher({
+        '': {'data': [_market('A?', 1.0), _market('B?', 2.0)], 'next_cursor': 'MTA='},
+        'MTA=': {'data': [_market('C?', 3.0)], 'nextCursor': 'MjA='},
+        'MjA=': {'data': [_market('D?', 4.0), _market('E?', 0)], 'next_cursor': END_CURSOR},
+    })
+
+    day = fetcher.get_day()
+
+    assert fetcher.session.cursors == ['', 'MTA=', 'MjA=']
+    # 收益为 0 的市场被过滤
+    assert list(day['question']) == ['A?', 'B?', 'C?', 'D?']
+    assert day['earnings'].sum() == pytest.approx(10.0)
+
+
+def test_fetch_day_stops_without_cursor():
+    fetcher = _fetcher({'': {'data': [_market('A?', 1.0)]}})
+
+    assert len(fetcher.fetch_day()) == 1
+    assert fetcher.session.cursors == ['']
+
+
+def test_fetch_day_is_capped_at_max_pages(monkeypatch):
+    monkeypatch.setattr(earnings, 'MAX_PAGES', 3)
+
+    class LoopingSession(FakeSession):
+        # 分页标记异常：始终返回同一个游标
+        def get(self, url, params, timeout):
+            self.cursors.append(params['nextCursor'])
+            return FakeResponse({'data': [_market('A?', 1.0)], 'next_cursor': 'MTA='})
+
+    fetcher = _fetcher({})
+    fetcher.session = LoopingSession({})
+
+    assert len(fetcher.fetch_day()) == 3
+    assert fetcher.session.cursors == ['', 'MTA=', 'MTA=']
+
+
+def test_empty_day_has_columns():
+    fetcher = _fetcher({'': {'data': [], 'next_cursor': END_CURSOR}})
+
+    day = fetcher.get_day()
+    assert len(day) == 0 and list(day.columns) == ['question', 'earnings', 'earning_percentage']
@@ -0,0 +1,22 @@
+"""
+入口模块冷启动导入耗时预算测试
+
+使用示例:
+    python -m pytest tests/test_import_budget.py
+"""
+import pytest
+
+from poly_utils.import_profile import IMPORT_BUDGETS_MS, DEFERRED_MODULES, check_budgets, imported_modules, measure_import
+
+
+@pytest.mark.parametrize('module', list(IMPORT_BUDGETS_MS))
+def test_import_within_budget(module):
+    failures = check_budgets([module], top=0)
+    assert not failures, '; '.join(msg for _, msg in failures)
+
+
+@pytest.mark.parametrize('module', list(DEFERRED_MODULES))
+def test_heavy_modules_are_deferred(module):
+    _, entries = measure_import(module)
+    loaded = imported_modules(entries) & set(DEFERRED_MODULES[module])
+    assert not loaded, f'{module} 导入时加载了 {sorted(loaded)}'
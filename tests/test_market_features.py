@@ -0,0 +1,159 @@
+"""
+实时市场特征的测试：EWMA 波动率、预热期回退、订单簿不平衡度和环形缓冲区
+
+使用示例:
+    python -m pytest tests/test_market_features.py
+"""
+import math
+from types import SimpleNamespace
+
+import pytest
+from sortedcontainers import SortedDict
+
+import poly_data.global_state as global_state
+import poly_data.market_features as market_features
+from poly_data.market_features import (ANNUALIZATION, HORIZONS, RETURN_MINUTES, SAMPLE_SECONDS, WARMUP_FRACTION,
+                                       MarketFeatures, get_features, get_volatility, update_market_features)
+
+T0 = 1_700_000_000
+
+
+def _book(bid, ask, bid_sizes=(100,), ask_sizes=(100,)):
+    """最优价为 bid/ask，向外每档相差 0.01"""
+    bids = SortedDict({round(bid - 0.01 * i, 2): size for i, size in enumerate(bid_sizes)})
+    asks = SortedDict({round(ask + 0.01 * i, 2): size for i, size in enumerate(ask_sizes)})
+    return {'bids': bids, 'asks': asks}
+
+
+def _annualized(per_minute_var):
+    return math.sqrt(per_minute_var * RETURN_MINUTES) * ANNUALIZATION
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """独立的特征表、订单簿和可控的当前时间"""
+    monkeypatch.setattr(market_features, '_features', {})
+    monkeypatch.setattr(global_state, 'all_data', {})
+    now = SimpleNamespace(value=T0)
+    monkeypatch.setattr(market_features, 'time', SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def _feed(clock, market, mids, step=SAMPLE_SECONDS):
+    """每隔 step 秒推送一个中间价为 mid、价差为 0.02 的订单簿"""
+    for mid in mids:
+        global_state.all_data[market] = _book(mid - 0.01, mid + 0.01)
+        update_market_features(market)
+        clock.value += step
+
+
+def test_constant_returns_give_exact_volatility():
+    features = MarketFeatures()
+    for i, mid in enumerate([0.50, 0.55] * 10):
+        features.update(_book(mid - 0.01, mid + 0.01), T0 + i * SAMPLE_SECONDS)
+
+    # 收益率绝对值恒定，EWMA 等于每分钟方差
+    r = math.log(0.55 / 0.50)
+    for name in HORIZONS:
+        assert features.ewma_var[name] == pytest.approx(r * r)
+    now = T0 + HORIZONS['24_hour']
+    assert features.volatility('1_hour', now) == pytest.approx(_annualized(r * r))
+
+
+def test_ewma_weights_new_return_by_elapsed_time():
+    features = MarketFeatures()
+    features.update(_book(0.49, 0.51), T0)
+    features.update(_book(0.54, 0.56), T0 + 60)
+    r1 = math.log(0.55 / 0.50)
+    assert features.ewma_var['1_hour'] == pytest.approx(r1 * r1)
+
+    # 间隔 120 秒的收益率按每分钟方差计入，权重为 1 - exp(-elapsed / tau)
+    features.update(_book(0.49, 0.51), T0 + 180)
+    r2 = math.log(0.50 / 0.55)
+    for name, tau in HORIZONS.items():
+        alpha = 1 - math.exp(-120 / tau)
+        assert features.ewma_var[name] == pytest.approx((1 - alpha) * r1 * r1 + alpha * r2 * r2 / 2)
+
+
+def test_updates_within_sample_interval_only_refresh_mid():
+    features = MarketFeatures()
+    features.update(_book(0.49, 0.51), T0)
+    features.update(_book(0.59, 0.61), T0 + SAMPLE_SECONDS - 1)
+
+    assert features.mid == pytest.approx(0.60)
+    assert len(features.samples) == 1 and len(features.returns) == 0
+    assert features.ewma_var['1_hour'] is None
+
+
+def test_get_volatility_returns_fallback_until_warm(clock):
+    market = '0xabc'
+    assert get_volatility(market, '3_hour', fallback=12.5) == 12.5
+
+    _feed(clock, market, [0.50, 0.52])
+    # 已有采样但观测时长不足，交易逻辑使用表格中的值（会按 :.2f 格式化）
+    value = get_volatility(market, '3_hour', fallback=12.5)
+    assert value == 12.5
+    assert f'{value:.2f}' == '12.50'
+    assert get_features(market)['volatility']['3_hour'] is None
+
+    clock.value = T0 + HORIZONS['3_hour'] * WARMUP_FRACTION
+    value = get_volatility(market, '3_hour', fallback=12.5)
+    assert value != 12.5 and value > 0
+    # 更长的窗口仍在预热
+    assert get_volatility(market, '24_hour', fallback=7.0) == 7.0
+
+
+def test_get_volatility_without_returns_is_fallback(clock):
+    _feed(clock, '0xabc', [0.50])
+    clock.value += HORIZONS['24_hour']
+
+    assert get_volatility('0xabc', '1_hour', fallback=3.0) == 3.0
+
+
+def test_imbalance_uses_top_levels():
+    features = MarketFeatures()
+    # 买方 7 档、卖方 2 档；只计算最优的 IMBALANCE_LEVELS 档
+    features.update(_book(0.49, 0.51, bid_sizes=(10, 10, 10, 10, 10, 1000, 1000), ask_sizes=(30, 20)), T0)
+
+    assert features.imbalance == pytest.approx((50 - 50) / 100)
+    assert features.spread == pytest.approx(0.02)
+
+
+def test_imbalance_of_one_sided_and_empty_books():
+    features = MarketFeatures()
+    features.update(_book(0.49, 0.51, ask_sizes=()), T0)
+    assert features.imbalance == 1
+    # 单边订单簿没有中间价，不采样
+    assert features.mid is None and len(features.samples) == 0
+
+    features.update({'bids': SortedDict(), 'asks': SortedDict()}, T0 + 60)
+    assert features.imbalance is None
+
+
+def test_ring_buffer_wraps_without_losing_ewma():
+    features = MarketFeatures(ring_size=3)
+    mids = [0.50, 0.52, 0.51, 0.55, 0.53]
+    for i, mid in enumerate(mids):
+        features.update(_book(mid - 0.01, mid + 0.01), T0 + i * SAMPLE_SECONDS)
+
+    # 只保留最近 3 个采样点和收益率，收益率仍相对上一个采样点计算
+    assert [round(mid, 2) for _, mid in features.samples] == [0.51, 0.55, 0.53]
+    assert [ret for _, ret in features.returns] == pytest.approx(
+        [math.log(0.51 / 0.52), math.log(0.55 / 0.51), math.log(0.53 / 0.55)])
+    assert features.first_sample == T0
+
+    reference = MarketFeatures(ring_size=100)
+    for i, mid in enumerate(mids):
+        reference.update(_book(mid - 0.01, mid + 0.01), T0 + i * SAMPLE_SECONDS)
+    assert features.ewma_var == pytest.approx(reference.ewma_var)
+
+
+def test_get_features_snapshot(clock):
+    assert get_features('0xabc') is None
+
+    _feed(clock, '0xabc', [0.50, 0.51, 0.52])
+    features = get_features('0xabc')
+
+    assert features['mid'] == pytest.approx(0.52)
+    assert features['samples'] == 3
+    assert features['updated'] == T0 + 2 * SAMPLE_SECONDS
@@ -0,0 +1,203 @@
+"""
+异步市场扫描器的测试：限速器、扫描结果、波动率阶段的顺序和背压
+
+使用示例:
+    python -m pytest tests/test_market_scanner.py
+"""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_updater.find_markets as find_markets
+import data_updater.market_scanner as market_scanner
+from data_updater.market_scanner import RateLimiter, ScanMetrics, scan_markets, with_volatility
+
+NOW = 1_700_000_000
+
+
+def _history(token):
+    t = NOW - np.arange(120)[::-1] * 60
+    return t, np.linspace(0.4, 0.6, 120)
+
+
+def _row(i):
+    return {
+        'question': f'Market {i}?',
+        'neg_risk': False,
+        'tokens': [{'token_id': str(2 * i), 'outcome': 'Yes'}, {'token_id': str(2 * i + 1), 'outcome': 'No'}],
+        'rewards': {'min_size': 50, 'max_spread': 3,
+                    'rates': [{'asset_address': '0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174',
+                               'rewards_daily_rate': 10}]},
+        'minimum_tick_size': 0.01,
+        'end_date_iso': '2030-01-01T00:00:00Z',
+        'market_slug': f'market-{i}',
+        'condition_id': f'0x{i:064x}',
+    }
+
+
+class BookClient:
+    """只支持逐个获取订单簿的客户端替身"""
+
+    def __init__(self):
+        self.requested = []
+
+    def get_order_book(self, token_id):
+        self.requested.append(token_id)
+        return SimpleNamespace(bids=[SimpleNamespace(price='0.48', size='100')],
+                               asks=[SimpleNamespace(price='0.52', size='100')])
+
+
+async def _results(items, produced=None):
+    for item in items:
+        if produced is not None:
+            produced.append(item)
+        yield item
+
+
+async def _collect(stream):
+    return [item async for item in stream]
+
+
+def test_rate_limiter_allows_burst_then_limits_rate():
+    async def run():
+        limiter = RateLimiter(rate=50, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            await limiter.acquire()
+        burst = time.monotonic() - start
+        for _ in range(5):
+            await limiter.acquire()
+        return burst, time.monotonic() - start
+
+    burst, total = asyncio.run(run())
+
+    # 前 5 个令牌立即可用，之后每秒 50 个
+    assert burst < 0.05
+    assert total >= 5 / 50
+    assert total < 2
+
+
+def test_scan_markets_scores_rows_and_skips_malformed(monkeypatch):
+    client = BookClient()
+    rows = [_row(i) for i in range(7)]
+    rows.insert(3, {'question': 'Broken?', 'tokens': []})
+    metrics = ScanMetrics()
+    live_books = {'2': BookClient().get_order_book('2')}
+
+    results = asyncio.run(_collect(scan_markets(client, rows=rows, max_concurrency=2, rate_limit=1e6,
+                                                batch_size=3, metrics=metrics, live_books=live_books)))
+
+    assert sorted(r['question'] for r in results) == [f'Market {i}?' for i in range(7)]
+    assert metrics.counters['errors'] == 1
+    assert metrics.counters['live_books'] == 1
+    # 实时订单簿中已有的 token 不再请求
+    assert sorted(client.requested, key=int) == [str(2 * i) for i in range(7) if i != 1]
+
+
+def test_with_volatility_keeps_order(monkeypatch):
+    monkeypatch.setattr(market_scanner, 'get_price_history', _history)
+    items = [{'token1': str(i), 'candidate': i % 3 != 0} for i in range(20)]
+
+    out = asyncio.run(_collect(with_volatility(_results(items), lambda r: r['candidate'], batch_size=4)))
+
+    # 非候选市场立即产出，候选市场按批次产出，各自保持输入顺序
+    assert len(out) == len(items)
+    assert [r['token1'] for r, _ in out if not r['candidate']] == [r['token1'] for r in items if not r['candidate']]
+    assert [r['token1'] for r, _ in out if r['candidate']] == [r['token1'] for r in items if r['candidate']]
+    assert all((stats is None) != r['candidate'] for r, stats in out)
+    assert all(stats['volatility_price'] == 0.6 for r, stats in out if stats)
+
+
+def test_with_volatility_applies_backpressure(monkeypatch):
+    release = threading.Event()
+
+    def blocked_history(token):
+        release.wait(5)
+        return _history(token)
+
+    monkeypatch.setattr(market_scanner, 'get_price_history', blocked_history)
+    items = [{'token1': str(i)} for i in range(20)]
+    produced = []
+
+    async def run():
+        consumer = asyncio.ensure_future(_collect(with_volatility(
+            _results(items, produced), lambda r: True, batch_size=2, max_batches=2)))
+        await asyncio.sleep(0.2)
+        # 最多 max_batches 批同时进行，此时不再读取上游
+        blocked_at = len(produced)
+        release.set()
+        return blocked_at, await consumer
+
+    blocked_at, out = asyncio.run(run())
+
+    assert blocked_at == 2 * 2
+    assert [r['token1'] for r, _ in out] == [r['token1'] for r in items]
+
+
+def test_with_volatility_failed_history_has_no_stats(monkeypatch):
+    def history(token):
+        if token == '1':
+            raise ConnectionError('down')
+        return _history(token) if token != '2' else (np.array([]), np.array([]))
+
+    monkeypatch.setattr(market_scanner, 'get_price_history', history)
+    metrics = ScanMetrics()
+    items = [{'token1': str(i)} for i in range(4)]
+
+    out = asyncio.run(_collect(with_volatility(_results(items), lambda r: True, metrics=metrics, batch_size=10)))
+
+    assert [stats is None for _, stats in out] == [False, True, True, False]
+    assert metrics.counters['histories'] == 4
+
+
+def test_add_volatility_to_df_reports_failures_through_metrics(monkeypatch):
+    def history(token):
+        if token == 'bad':
+            raise ConnectionError('down')
+        return _history(token)
+
+    messages = []
+    monkeypatch.setattr(find_markets, 'get_price_history', history)
+    monkeypatch.setattr(market_scanner, 'scanner_logger', SimpleNamespace(warning=messages.append))
+    metrics = ScanMetrics()
+
+    df = find_markets.add_volatility_to_df(pd.DataFrame({'token1': ['a', 'bad', 'b']}), metrics=metrics)
+
+    assert list(df['token1']) == ['a', 'b']
+    assert metrics.counters['errors'] == 1 and metrics.counters['histories'] == 3
+    assert len(messages) == 1 and 'bad' in messages[0]
+
+
+@pytest.mark.parametrize('max_batches', [1, 3])
+def test_with_volatility_in_flight_never_exceeds_max_batches(monkeypatch, max_batches):
+    active, peak = set(), []
+    lock = threading.Lock()
+
+    def history(token):
+        batch = int(token) // 2
+        with lock:
+            active.add(batch)
+            peak.append(len(active))
+        time.sleep(0.01)
+        return _history(token)
+
+    monkeypatch.setattr(market_scanner, 'get_price_history', history)
+    items = [{'token1': str(i)} for i in range(16)]
+
+    async def consume():
+        out = []
+        async for item in with_volatility(_results(items), lambda r: True, batch_size=2, max_batches=max_batches,
+                                          max_workers=8):
+            # 产出即表示该批已完成
+            with lock:
+                active.discard(int(item[0]['token1']) // 2)
+            out.append(item)
+        return out
+
+    assert len(asyncio.run(consume())) == 16
+    assert max(peak) <= max_batches
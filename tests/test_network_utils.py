@@ -0,0 +1,269 @@
+"""
+熔断器状态转换和网络重试装饰器的测试
+
+使用示例:
+    python -m pytest tests/test_network_utils.py
+"""
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+import poly_data.network_utils as network_utils
+from poly_data.network_utils import CircuitBreaker, CircuitOpenError, retry_on_network_error
+
+_endpoints = itertools.count()
+
+
+class FakeClock:
+    """替换模块中的 time：手动推进时间，sleep 只记录等待时长"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.records = []
+
+    def __getattr__(self, level):
+        return lambda message: self.records.append((level, message))
+
+    def messages(self, level):
+        return [message for lvl, message in self.records if lvl == level]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(network_utils, 'time', SimpleNamespace(time=clock.time, sleep=clock.sleep))
+    return clock
+
+
+@pytest.fixture
+def log(monkeypatch):
+    logger = RecordingLogger()
+    monkeypatch.setattr(network_utils, 'network_logger', logger)
+    return logger
+
+
+@pytest.fixture
+def endpoint():
+    """每个测试使用独立的端点名，避免共享全局注册表中的熔断器"""
+    return f'test-endpoint-{next(_endpoints)}'
+
+
+class Flaky:
+    """前 failures 次调用抛出 exc，之后返回 'ok'"""
+
+    def __init__(self, failures, exc=ConnectionError):
+        self.__name__ = 'flaky'
+        self.failures = failures
+        self.exc = exc
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exc('boom')
+        return 'ok'
+
+
+def _open(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker('b', failure_threshold=3, recovery_timeout=10)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.retry_after() == 10
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    metrics = breaker.metrics()
+    assert metrics['times_opened'] == 1 and metrics['total_rejected'] == 2 and metrics['open'] == 1
+
+
+def test_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker('b', failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_a_single_probe_then_closes(clock):
+    breaker = CircuitBreaker('b', failure_threshold=2, recovery_timeout=10)
+    _open(breaker)
+
+    clock.now += 10
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    # 探测进行中，其他请求被拒绝
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker('b', failure_threshold=2, recovery_timeout=10)
+    _open(breaker)
+
+    clock.now += 10
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    # 半开状态下一次失败就重新打开，并重新计时
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_after() == 10
+    assert breaker.metrics()['times_opened'] == 2
+
+
+def test_release_probe_frees_half_open_slot(clock):
+    breaker = CircuitBreaker('b', failure_threshold=2, recovery_timeout=10)
+    _open(breaker)
+    clock.now += 10
+
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.release_probe()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_sync_retries_then_succeeds(clock, log, endpoint):
+    func = Flaky(2)
+    wrapped = retry_on_network_error(max_retries=3, delay=1, backoff=2, jitter=0, endpoint=endpoint)(func)
+
+    assert wrapped() == 'ok'
+    assert func.calls == 3
+    assert clock.sleeps == [1, 2]
+    metrics = network_utils.get_circuit_breaker(endpoint).metrics()
+    assert metrics['total_failures'] == 2 and metrics['consecutive_failures'] == 0
+
+
+def test_final_failure_is_counted(clock, log, endpoint):
+    func = Flaky(10)
+    wrapped = retry_on_network_error(max_retries=2, delay=1, jitter=0, endpoint=endpoint, failure_threshold=10)(func)
+
+    with pytest.raises(ConnectionError):
+        wrapped()
+
+    # 3 次尝试全部计入熔断器，包括最后一次
+    assert func.calls == 3
+    assert network_utils.get_circuit_breaker(endpoint).metrics()['total_failures'] == 3
+
+
+def test_open_breaker_stops_retrying_and_fails_fast(clock, log, endpoint):
+    func = Flaky(10)
+    wrapped = retry_on_network_error(max_retries=5, delay=1, jitter=0, endpoint=endpoint,
+                                     failure_threshold=2, recovery_timeout=30)(func)
+
+    with pytest.raises(ConnectionError):
+        wrapped()
+    assert func.calls == 2
+
+    # 熔断打开后不再调用函数
+    with pytest.raises(CircuitOpenError):
+        wrapped()
+    assert func.calls == 2
+
+
+def test_non_network_error_is_not_retried_and_releases_probe(clock, log, endpoint):
+    wrapped = retry_on_network_error(max_retries=3, delay=1, endpoint=endpoint,
+                                     failure_threshold=1, recovery_timeout=10)(Flaky(10, ValueError))
+    breaker = network_utils.get_circuit_breaker(endpoint)
+    breaker.record_failure()
+    clock.now += 10
+
+    with pytest.raises(ValueError):
+        wrapped()
+
+    assert breaker.metrics()['total_failures'] == 1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+
+
+def test_async_retries_then_succeeds(log, endpoint):
+    calls = []
+
+    @retry_on_network_error(max_retries=3, delay=0, endpoint=endpoint)
+    async def fetch():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TimeoutError('slow')
+        return 'ok'
+
+    assert asyncio.run(fetch()) == 'ok'
+    assert len(calls) == 3
+    assert network_utils.get_circuit_breaker(endpoint).metrics()['total_failures'] == 2
+
+
+def test_async_final_failure_is_counted(log, endpoint):
+    @retry_on_network_error(max_retries=1, delay=0, endpoint=endpoint, failure_threshold=10)
+    async def fetch():
+        raise ConnectionError('down')
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(fetch())
+    assert network_utils.get_circuit_breaker(endpoint).metrics()['total_failures'] == 2
+
+
+def test_async_cancel_releases_probe(clock, log, endpoint):
+    @retry_on_network_error(max_retries=1, delay=0, endpoint=endpoint, failure_threshold=1, recovery_timeout=10)
+    async def fetch():
+        raise asyncio.CancelledError()
+
+    breaker = network_utils.get_circuit_breaker(endpoint)
+    breaker.record_failure()
+    clock.now += 10
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(fetch())
+    assert breaker.allow_request()
+
+
+def test_sync_call_on_event_loop_thread_does_not_retry(clock, log, endpoint):
+    func = Flaky(1)
+    wrapped = retry_on_network_error(max_retries=3, delay=1, jitter=0, endpoint=endpoint)(func)
+
+    async def on_loop():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                wrapped()
+            func.calls = 0
+
+    asyncio.run(on_loop())
+
+    # 不重试，也不阻塞休眠；每个函数只警告一次，失败日志中注明原因
+    assert clock.sleeps == []
+    assert sum('事件循环线程' in message for message in log.messages('warning')) == 1
+    assert any('不重试' in message for message in log.messages('error'))
+
+    # 在普通线程中调用时正常重试
+    assert wrapped() == 'ok'
+    assert func.calls == 2
+    assert clock.sleeps == [1]
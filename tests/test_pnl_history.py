@@ -0,0 +1,196 @@
+"""
+PnL 和库存历史的测试：汇总行的增量更新、read_rollups 的各维度、原始序列和退出前写入
+
+使用示例:
+    python -m pytest tests/test_pnl_history.py
+"""
+import queue
+import threading
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+from sortedcontainers import SortedDict
+
+import poly_data.global_state as global_state
+import poly_data.pnl_history as pnl_history
+import poly_data.supervisor as supervisor
+from poly_data.pnl_history import PnlRecorder, read_rollups, record_rewards
+
+# 2023-11-14 22:13:20 UTC
+T0 = 1_700_000_000
+DAY = '2023-11-14'
+NEXT_DAY = '2023-11-15'
+
+
+@pytest.fixture
+def state(monkeypatch):
+    """两个市场，各有一个 token 持仓或挂单"""
+    monkeypatch.setattr(global_state, 'df', pd.DataFrame([
+        {'question': 'Rain?', 'answer1': 'Yes', 'answer2': 'No', 'token1': '1', 'token2': '2',
+         'condition_id': '0xa', 'param_type': 'mid'},
+        {'question': 'Snow?', 'answer1': 'Yes', 'answer2': 'No', 'token1': '3', 'token2': '4',
+         'condition_id': '0xb', 'param_type': 'high'},
+    ]))
+    monkeypatch.setattr(global_state, 'all_data', {
+        '0xa': {'bids': SortedDict({0.39: 10.0}), 'asks': SortedDict({0.41: 10.0})},
+    })
+    monkeypatch.setattr(global_state, 'positions', {'1': {'size': 100.0, 'avgPrice': 0.30},
+                                                    '4': {'size': 0, 'avgPrice': 0}})
+    monkeypatch.setattr(global_state, 'orders', {
+        '4': {'buy': {'price': 0.2, 'size': 50.0}, 'sell': {'price': 0, 'size': 0}},
+    })
+    return global_state
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return PnlRecorder(root=str(tmp_path / 'pnl'), flush_interval=3600)
+
+
+def _rollup(recorder, token, day=DAY):
+    conn = recorder._db()
+    conn.row_factory = lambda cursor, row: dict(zip([c[0] for c in cursor.description], row))
+    try:
+        return conn.execute('SELECT * FROM rollups WHERE day = ? AND token = ?', (day, token)).fetchone()
+    finally:
+        conn.row_factory = None
+
+
+def test_snapshot_upserts_daily_rollup(state, recorder):
+    assert recorder.snapshot(T0) == 2
+
+    # token1 标记价格为订单簿中间价 0.4
+    row = _rollup(recorder, '1')
+    assert (row['question'], row['answer'], row['param_type']) == ('Rain?', 'Yes', 'mid')
+    assert row['samples'] == 1
+    assert row['exposure_sum'] == pytest.approx(40.0)
+    assert row['first_unrealized'] == pytest.approx(10.0)
+
+    state.positions['1'] = {'size': 50.0, 'avgPrice': 0.30}
+    state.all_data['0xa'] = {'bids': SortedDict({0.49: 10.0}), 'asks': SortedDict({0.51: 10.0})}
+    recorder.snapshot(T0 + 60)
+
+    row = _rollup(recorder, '1')
+    assert row['samples'] == 2
+    assert row['position_sum'] == pytest.approx(150.0)
+    assert row['exposure_sum'] == pytest.approx(40.0 + 25.0)
+    assert row['max_exposure'] == pytest.approx(40.0)
+    # 首个未实现盈亏保持不变，最后一个随快照更新
+    assert row['first_unrealized'] == pytest.approx(10.0)
+    assert row['last_unrealized'] == pytest.approx(10.0)
+    assert (row['last_position'], row['last_mark']) == (50.0, pytest.approx(0.5))
+
+    # 只有挂单、没有订单簿的 token：按均价计算敞口，没有未实现盈亏
+    row = _rollup(recorder, '4')
+    assert row['samples'] == 2 and row['open_buy_sum'] == pytest.approx(20.0)
+    assert row['last_unrealized'] is None and row['last_mark'] is None
+
+
+def test_new_day_starts_new_rollup(state, recorder):
+    recorder.snapshot(T0)
+    recorder.snapshot(T0 + 24 * 3600)
+
+    assert _rollup(recorder, '1')['samples'] == 1
+    assert _rollup(recorder, '1', NEXT_DAY)['samples'] == 1
+
+
+def test_tokens_without_position_or_orders_are_skipped(state, recorder):
+    state.positions = {'1': {'size': 0, 'avgPrice': 0.3}}
+    state.orders = {}
+
+    assert recorder.snapshot(T0) == 0
+    assert _rollup(recorder, '1') is None
+
+
+def test_read_rollups_groups_and_merges_rewards(state, recorder):
+    recorder.snapshot(T0)
+    recorder.snapshot(T0 + 60)
+    recorder.snapshot(T0 + 24 * 3600)
+    record_rewards(DAY, pd.DataFrame({'question': ['Rain?', 'Snow?'], 'earnings': [1.5, 0.5]}), root=recorder.root)
+    record_rewards(NEXT_DAY, pd.DataFrame({'question': ['Rain?'], 'earnings': [2.0]}), root=recorder.root)
+    # 同一天重复记录时覆盖
+    record_rewards(NEXT_DAY, pd.DataFrame({'question': ['Rain?'], 'earnings': [2.5]}), root=recorder.root)
+
+    by_market = read_rollups('market', root=recorder.root).set_index('question')
+    assert by_market.loc['Rain?', 'samples'] == 3
+    assert by_market.loc['Rain?', 'avg_position'] == pytest.approx(100.0)
+    assert by_market.loc['Rain?', 'earnings'] == pytest.approx(4.0)
+    assert by_market.loc['Snow?', 'earnings'] == pytest.approx(0.5)
+
+    by_day = read_rollups('day', root=recorder.root).set_index('day')
+    assert by_day.loc[DAY, 'earnings'] == pytest.approx(2.0)
+    assert by_day.loc[NEXT_DAY, 'earnings'] == pytest.approx(2.5)
+
+    by_param = read_rollups('param_type', root=recorder.root).set_index('param_type')
+    assert by_param.loc['mid', 'earnings'] == pytest.approx(4.0)
+    assert by_param.loc['high', 'avg_open_notional'] == pytest.approx(10.0)
+
+    since = read_rollups('market_day', since_day=NEXT_DAY, root=recorder.root)
+    assert list(since['day']) == [NEXT_DAY, NEXT_DAY]
+
+    tokens = read_rollups('token_day', root=recorder.root)
+    assert 'earnings' not in tokens.columns and len(tokens) == 4
+
+
+def test_series_are_buffered_then_flushed(state, recorder):
+    # 写入间隔从记录器创建时开始计时，与注入的快照时间对齐
+    recorder._last_flush = T0
+    recorder.snapshot(T0)
+    recorder.snapshot(T0 + 60)
+    assert recorder.store.last_timestamp('1') is None
+
+    # 未写入存储的部分也能读到
+    series = recorder.read_series('1')
+    assert list(series['t']) == [T0, T0 + 60]
+    assert list(series['mark']) == pytest.approx([0.4, 0.4])
+
+    # 超过写入间隔的快照触发写入
+    recorder.snapshot(T0 + 3600)
+    assert recorder.store.last_timestamp('1') == T0 + 3600
+    series = recorder.read_series('1', since=T0 + 60)
+    assert list(series['t']) == [T0 + 60, T0 + 3600]
+    assert series['mark'].isna().tolist() == [False, False]
+    assert recorder.read_series('4')['mark'].isna().all()
+
+
+def test_shared_recorder_flushes_at_exit(state, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pnl_history, '_recorder', None)
+    registered = []
+    monkeypatch.setattr(pnl_history, 'atexit', SimpleNamespace(register=registered.append))
+
+    recorder = pnl_history.get_recorder()
+    assert pnl_history.get_recorder() is recorder
+    assert registered == [pnl_history.flush_recorder]
+
+    recorder.snapshot(T0)
+    registered[0]()
+    assert recorder.store.last_timestamp('1') == T0
+
+
+def test_flush_recorder_without_recorder_is_noop(monkeypatch):
+    monkeypatch.setattr(pnl_history, '_recorder', None)
+    pnl_history.flush_recorder()
+
+
+def test_stop_message_flushes_before_exit(state, recorder, monkeypatch):
+    monkeypatch.setattr(pnl_history, '_recorder', recorder)
+    recorder.snapshot(T0)
+
+    class Exited(BaseException):
+        pass
+
+    def fake_exit(code):
+        raise Exited(code)
+
+    monkeypatch.setattr(supervisor.os, '_exit', fake_exit)
+    inbox = queue.Queue()
+    inbox.put(('stop', None))
+
+    # 工作进程用 os._exit 退出，不执行 atexit；stop 消息处理中先写入缓冲
+    with pytest.raises(Exited):
+        supervisor._apply_messages(0, inbox, threading.Event())
+
+    assert recorder.store.last_timestamp('1') == T0
+    assert recorder._buffer == {}
@@ -0,0 +1,166 @@
+"""
+持续增量重新评分服务的测试：到期队列顺序和评分不变时的间隔退避
+
+使用示例:
+    python -m pytest tests/test_rescoring_service.py
+"""
+import pytest
+
+import data_updater.rescoring_service as rescoring_service
+from data_updater.rescoring_service import (BASE_INTERVAL, MAX_INTERVAL, MAX_QUIET_STEPS, MIN_INTERVAL,
+                                            RETRY_INTERVAL, RescoreQueue, RescoringService, rescore_interval)
+
+T0 = 1_700_000_000
+
+
+def test_queue_pops_due_markets_earliest_first():
+    queue = RescoreQueue()
+    for cid, due in [('c', 30), ('a', 10), ('d', 40), ('b', 20)]:
+        queue.schedule(cid, due)
+
+    assert queue.pop_due(25) == ['a', 'b']
+    assert len(queue) == 2 and 'a' not in queue and 'c' in queue
+    assert queue.pop_due(100, limit=1) == ['c']
+    assert queue.pop_due(100) == ['d']
+    assert queue.pop_due(100) == []
+
+
+def test_rescheduling_supersedes_old_entry():
+    queue = RescoreQueue()
+    queue.schedule('a', 10)
+    queue.schedule('b', 20)
+    # 推迟 a，提前 b
+    queue.schedule('a', 50)
+    queue.schedule('b', 5)
+
+    assert queue.pop_due(30) == ['b']
+    assert queue.pop_due(60) == ['a']
+    assert len(queue) == 0
+
+
+def test_removed_market_is_never_popped():
+    queue = RescoreQueue()
+    queue.schedule('a', 10)
+    queue.schedule('b', 10)
+    queue.remove('a')
+    queue.remove('missing')
+
+    assert queue.pop_due(10) == ['b']
+
+
+def test_heap_is_rebuilt_when_stale_entries_pile_up():
+    queue = RescoreQueue()
+    for i in range(3000):
+        queue.schedule('a', T0 + i)
+    queue.schedule('b', 0)
+
+    assert queue.pop_due(1) == ['b']
+    assert len(queue._heap) == 1
+    assert queue.pop_due(T0 + 3000) == ['a']
+
+
+def test_interval_doubles_while_quiet_and_is_clamped():
+    result = {'gm_reward_per_100': 1.0}
+    intervals = [rescore_interval(result, steps) for steps in range(MAX_QUIET_STEPS + 3)]
+
+    assert intervals[0] == BASE_INTERVAL / 2
+    assert intervals[1] == 2 * intervals[0]
+    # 超过 MAX_QUIET_STEPS 后不再延长
+    assert intervals[MAX_QUIET_STEPS] == intervals[-1] <= MAX_INTERVAL
+    assert rescore_interval({'gm_reward_per_100': 1000}, 0) == MIN_INTERVAL
+    assert rescore_interval({'gm_reward_per_100': None}, MAX_QUIET_STEPS) == MAX_INTERVAL
+
+
+class FakeScanner:
+    """替换 scan_all_results，按 condition_id 返回可修改的评分结果"""
+
+    def __init__(self, results):
+        self.results = results
+        self.rows = []
+
+    def __call__(self, client, rows, metrics):
+        self.rows.append([row['condition_id'] for row in rows])
+        return [dict(self.results[row['condition_id']]) for row in rows if row['condition_id'] in self.results]
+
+
+def _result(cid, best_bid=0.48, reward=1.0, **extra):
+    return {'condition_id': cid, 'question': f'{cid}?', 'best_bid': best_bid, 'best_ask': 0.52,
+            'bid_reward_per_100': reward, 'ask_reward_per_100': reward, 'gm_reward_per_100': reward,
+            'rewards_daily_rate': 10, 'token1': '1', **extra}
+
+
+@pytest.fixture
+def scanner(monkeypatch):
+    scanner = FakeScanner({'a': _result('a'), 'b': _result('b')})
+    monkeypatch.setattr(rescoring_service, 'scan_all_results', scanner)
+    return scanner
+
+
+@pytest.fixture
+def service():
+    service = RescoringService(client=None, publish=lambda results, volatility: None)
+    for cid in ['a', 'b']:
+        service.rows[cid] = {'condition_id': cid}
+        service.queue.schedule(cid, T0)
+    return service
+
+
+def _next_due(service, cid):
+    return service.queue._due[cid]
+
+
+def test_unchanged_scores_back_off(service, scanner):
+    now = T0
+    gaps = []
+    for _ in range(MAX_QUIET_STEPS + 2):
+        service.rescore_due(now)
+        gaps.append(_next_due(service, 'a') - now)
+        now = _next_due(service, 'a')
+
+    base = rescore_interval(_result('a'), 0)
+    assert gaps == [base * 2 ** min(step, MAX_QUIET_STEPS) for step in range(MAX_QUIET_STEPS + 2)]
+    assert service.quiet_steps['a'] == MAX_QUIET_STEPS + 1
+
+
+def test_score_change_resets_backoff(service, scanner):
+    now = T0
+    for _ in range(3):
+        service.rescore_due(now)
+        now = _next_due(service, 'a')
+    assert service.quiet_steps['a'] == 2
+
+    scanner.results['a'] = _result('a', best_bid=0.47)
+    scored, changed = service.rescore_due(now)
+
+    assert (scored, changed) == (2, 1)
+    assert service.quiet_steps['a'] == 0 and service.quiet_steps['b'] == 3
+    assert _next_due(service, 'a') - now == rescore_interval(_result('a'), 0)
+    assert service.dirty
+
+
+def test_fields_outside_score_do_not_reset_backoff(service, scanner):
+    """只跟踪评分结果：不影响 SCORE_FIELDS 的变化（如奖励区间外的深度导致的中间价变化）不算活跃"""
+    service.rescore_due(T0)
+    scanner.results['a'] = _result('a', midpoint=0.505)
+    service.rescore_due(_next_due(service, 'a'))
+
+    assert service.quiet_steps['a'] == 1
+
+
+def test_failed_market_is_retried_soon(service, scanner):
+    del scanner.results['b']
+
+    assert service.rescore_due(T0) == (1, 1)
+    assert _next_due(service, 'b') == T0 + RETRY_INTERVAL
+
+
+def test_round_limit_takes_stalest_markets_first(service, scanner):
+    service.rescore_due(T0)
+    service.max_books_per_round = 1
+    service.queue.schedule('a', T0 + 20)
+    service.queue.schedule('b', T0 + 10)
+
+    service.rescore_due(T0 + 30)
+
+    assert scanner.rows[-1] == ['b']
+    assert 'a' in service.queue and _next_due(service, 'a') == T0 + 20
@@ -0,0 +1,126 @@
+"""
+向量化奖励计算与逐行参考实现（find_markets.process_single_row）的一致性测试
+
+使用示例:
+    python -m pytest tests/test_reward_parity.py
+"""
+import math
+import random
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import pytest
+
+from data_updater.find_markets import process_single_row
+from data_updater.reward_engine import score_markets, REWARD_COLUMNS, USDC_ADDRESS
+
+
+@dataclass
+class Level:
+    """与 py_clob_client 的 OrderSummary 结构相同"""
+    price: str
+    size: str
+
+
+def _book_side(rng, mid_ticks, scale, decimals, direction):
+    levels = []
+    for j in range(rng.choice([0, 1, 3, 8, 15])):
+        p = mid_ticks + direction * (rng.randint(0, 3) + j * rng.randint(1, 3))
+        if 0 < p < scale:
+            levels.append(Level(price=f"{p / scale:.{decimals}f}", size=f"{rng.uniform(5, 5000):.2f}"))
+    # 买单按价格升序、卖单按价格降序排列，最优价格在最后
+    unique = {level.price: level for level in levels}
+    return sorted(unique.values(), key=lambda level: float(level.price), reverse=direction > 0)
+
+
+def _market_row(idx, tick_size=0.01, max_spread=3, rate=25):
+    return {
+        'question': f'Market {idx}?',
+        'neg_risk': idx % 3 == 0,
+        'tokens': [{'token_id': str(2 * idx), 'outcome': 'Yes'}, {'token_id': str(2 * idx + 1), 'outcome': 'No'}],
+        'rewards': {
+            'min_size': 50,
+            'max_spread': max_spread,
+            'rates': [{'asset_address': USDC_ADDRESS, 'rewards_daily_rate': rate}],
+        },
+        'minimum_tick_size': tick_size,
+        'end_date_iso': '2030-01-01T00:00:00Z',
+        'market_slug': f'market-{idx}',
+        'condition_id': f'0x{idx:064x}',
+    }
+
+
+def random_market(rng, idx):
+    """随机市场及其 token1 订单簿"""
+    tick_size = rng.choice([0.01, 0.01, 0.01, 0.001])
+    decimals = len(str(tick_size).split('.')[1])
+    scale = 10 ** decimals
+    mid_ticks = rng.randint(int(0.05 * scale), int(0.95 * scale))
+
+    row = _market_row(idx, tick_size, rng.choice([1, 1.5, 2, 3, 3.5, 4.5, 5]),
+                      rng.choice([0, 1, 5, 25, 100, 250]))
+    row['rewards']['min_size'] = rng.choice([20, 50, 100])
+    book = SimpleNamespace(bids=_book_side(rng, mid_ticks, scale, decimals, -1),
+                           asks=_book_side(rng, mid_ticks, scale, decimals, 1))
+    return row, book
+
+
+def assert_same_result(expected, actual):
+    """逐字段比较；奖励已四舍五入到分，两种实现应完全相同"""
+    assert actual is not None, expected['question']
+    assert list(actual) == list(expected)
+    for key, value in expected.items():
+        if isinstance(value, float) and math.isnan(value):
+            assert math.isnan(actual[key]), (expected['question'], key)
+        elif isinstance(value, float):
+            assert actual[key] == pytest.approx(value, rel=0, abs=1e-9), (expected['question'], key)
+        else:
+            assert actual[key] == value, (expected['question'], key)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_random_markets_match_reference(seed):
+    rng = random.Random(seed)
+    markets = [random_market(rng, i) for i in range(300)]
+
+    actual = score_markets([row for row, _ in markets], [book for _, book in markets])
+
+    for (row, book), result in zip(markets, actual):
+        assert_same_result(process_single_row(row, None, book), result)
+
+
+def test_random_markets_cover_nonzero_rewards():
+    """随机市场中必须有非零奖励，否则一致性测试没有意义"""
+    rng = random.Random(0)
+    markets = [random_market(rng, i) for i in range(300)]
+    actual = score_markets([row for row, _ in markets], [book for _, book in markets])
+
+    nonzero = [r for r in actual if r['gm_reward_per_100'] > 0]
+    assert len(nonzero) > 50
+
+
+def test_missing_book_is_skipped():
+    row = _market_row(0)
+    assert score_markets([row], [None]) == [None]
+
+
+def test_empty_side_scores_zero():
+    row = _market_row(0)
+    book = SimpleNamespace(bids=[Level('0.48', '100'), Level('0.49', '200')], asks=[])
+
+    result = score_markets([row], [book])[0]
+    assert_same_result(process_single_row(row, None, book), result)
+    assert result['ask_reward_per_100'] == 0
+    assert result['gm_reward_per_100'] == 0
+    assert result['bid_reward_per_100'] > 0
+
+
+def test_coarse_tick_uses_explicit_ladder():
+    """0.1 的 tick 不在整数网格上，退回 generate_numbers 生成阶梯"""
+    row = _market_row(0, tick_size=0.1, max_spread=20)
+    book = SimpleNamespace(bids=[Level('0.3', '100'), Level('0.4', '50')],
+                           asks=[Level('0.7', '100'), Level('0.6', '50')])
+
+    result = score_markets([row], [book])[0]
+    assert_same_result(process_single_row(row, None, book), result)
+    assert all(not math.isnan(result[col]) for col in REWARD_COLUMNS)
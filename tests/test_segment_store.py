@@ -0,0 +1,127 @@
+"""
+按键分区的列式时间序列存储测试
+
+使用示例:
+    python -m pytest tests/test_segment_store.py
+"""
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import poly_utils.segment_store as segment_store
+from poly_utils.segment_store import SegmentStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SegmentStore(str(tmp_path / 'store'), columns=['p'], max_segments=4)
+
+
+def _segment_dirs(store, key):
+    return sorted(name for name in os.listdir(store._key_dir(key)) if segment_store._SEGMENT_RE.match(name))
+
+
+def test_append_then_read(store):
+    assert store.append('tok', t=[30, 10, 20], p=[0.3, 0.1, 0.2]) == 3
+    # 不比已有数据更新的点被丢弃，同一时间戳保留最后一个
+    assert store.append('tok', t=[20, 40, 40], p=[9.0, 0.4, 0.45]) == 1
+
+    t, cols = store.read('tok')
+    assert t.tolist() == [10, 20, 30, 40]
+    assert cols['p'].tolist() == [0.1, 0.2, 0.3, 0.45]
+    assert store.last_timestamp('tok') == 40
+
+    t, cols = store.read('tok', since=25)
+    assert t.tolist() == [30, 40]
+    assert cols['p'].tolist() == [0.3, 0.45]
+
+
+def test_read_missing_key(store):
+    t, cols = store.read('missing')
+    assert len(t) == 0 and len(cols['p']) == 0
+    assert store.last_timestamp('missing') is None
+
+
+def test_compaction_merges_segments_and_keeps_data(store):
+    for i in range(5):
+        store.append('tok', t=[10 * i + 1, 10 * i + 2], p=[i, i + 0.5])
+
+    # 第 5 段超过 max_segments，合并为一个段
+    assert len(store._segments('tok')) == 1
+    assert _segment_dirs(store, 'tok') == [os.path.basename(store._segments('tok')[0][2])]
+
+    t, cols = store.read('tok')
+    assert t.tolist() == [1, 2, 11, 12, 21, 22, 31, 32, 41, 42]
+    assert cols['p'].tolist() == [0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4, 4.5]
+
+    # 合并后继续追加
+    store.append('tok', t=[50], p=[5.0])
+    assert store.read('tok')[0].tolist()[-3:] == [41, 42, 50]
+
+
+def test_compaction_applies_retention(tmp_path):
+    store = SegmentStore(str(tmp_path / 'store'), columns=['p'], retention=100)
+    store.append('tok', t=[0, 50, 100], p=[0.0, 0.5, 1.0])
+    store.append('tok', t=[150, 200], p=[1.5, 2.0])
+
+    store.compact('tok')
+
+    t, cols = store.read('tok')
+    assert t.tolist() == [100, 150, 200]
+    assert cols['p'].tolist() == [1.0, 1.5, 2.0]
+
+
+def test_failed_delete_does_not_duplicate_rows(store, monkeypatch):
+    store.append('tok', t=[1, 2], p=[0.1, 0.2])
+    store.append('tok', t=[3], p=[0.3])
+
+    # 模拟 Windows 上旧段仍被内存映射、无法删除
+    rmtree = shutil.rmtree
+
+    def locked(path, *args, **kwargs):
+        raise PermissionError(13, 'The process cannot access the file', path)
+
+    monkeypatch.setattr(segment_store.shutil, 'rmtree', locked)
+    store.compact('tok')
+
+    # 旧段留在磁盘上，但不在清单中，读取时被忽略
+    assert len(_segment_dirs(store, 'tok')) == 3
+    t, cols = store.read('tok')
+    assert t.tolist() == [1, 2, 3]
+    assert cols['p'].tolist() == [0.1, 0.2, 0.3]
+
+    store.append('tok', t=[4], p=[0.4])
+    assert store.read('tok')[0].tolist() == [1, 2, 3, 4]
+
+    # 下一次合并时删除之前遗留的旧段
+    monkeypatch.setattr(segment_store.shutil, 'rmtree', rmtree)
+    store.compact('tok')
+    assert len(_segment_dirs(store, 'tok')) == 1
+    assert store.read('tok')[0].tolist() == [1, 2, 3, 4]
+
+
+def test_read_holds_map_during_compaction(store):
+    store.append('tok', t=[1, 2], p=[0.1, 0.2])
+    t, cols = store.read('tok')
+    assert isinstance(t, np.memmap)
+
+    store.append('tok', t=[3], p=[0.3])
+    store.compact('tok')
+
+    # 合并前得到的内存映射仍然可用
+    assert t.tolist() == [1, 2]
+    assert store.read('tok')[0].tolist() == [1, 2, 3]
+
+
+def test_directory_without_manifest_is_read(store):
+    """清单引入之前写入的目录中所有段都有效"""
+    store.append('tok', t=[1, 2], p=[0.1, 0.2])
+    store.append('tok', t=[3], p=[0.3])
+    os.remove(store._manifest_path('tok'))
+
+    assert store.read('tok')[0].tolist() == [1, 2, 3]
+    store.append('tok', t=[4], p=[0.4])
+    assert store.read('tok')[0].tolist() == [1, 2, 3, 4]
+    assert len(store._read_manifest('tok')['segments']) == 3
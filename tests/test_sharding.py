@@ -0,0 +1,241 @@
+"""
+多进程分片和全局风险额度测试
+
+使用示例:
+    python -m pytest tests/test_sharding.py
+"""
+import asyncio
+import queue
+
+import pandas as pd
+import pytest
+
+import poly_data.data_utils as data_utils
+import poly_data.global_state as global_state
+import poly_data.risk_limits as risk_limits
+from poly_data.sheet_config import ConfigUpdate
+from poly_data.supervisor import ShardMap, Supervisor, _refresh_requester
+
+
+def _markets(*condition_ids):
+    return pd.DataFrame([{'condition_id': cid, 'question': f'Q {cid}', 'token1': f'{cid}-yes',
+                          'token2': f'{cid}-no'} for cid in condition_ids])
+
+
+def _buy_order(token, price, size, existing_buy=(0, 0), existing_sell=(0, 0)):
+    return {
+        'token': token, 'price': price, 'size': size, 'mid_price': price, 'max_spread': 5,
+        'neg_risk': 'FALSE',
+        'orders': {'buy': {'price': existing_buy[0], 'size': existing_buy[1]},
+                   'sell': {'price': existing_sell[0], 'size': existing_sell[1]}},
+    }
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """替换本进程的额度，测试结束后恢复"""
+    current = {'exposure': None, 'open_buys': None}
+    monkeypatch.setattr(risk_limits, '_limits', current)
+    return current
+
+
+def test_assign_balances_new_markets_and_keeps_existing_ones():
+    shard_map = ShardMap(2)
+    shard_map.assign(_markets('a', 'b', 'c'))
+    first = dict(shard_map.markets)
+
+    assert first == {'a': 0, 'b': 1, 'c': 0}
+    assert shard_map.shard_of('a-yes') == shard_map.shard_of('a-no') == first['a']
+
+    # 移除 a 后新市场 d 放到市场较少的分片，其他市场不移动
+    shard_map.assign(_markets('b', 'c', 'd'))
+    assert shard_map.markets['b'] == first['b']
+    assert shard_map.markets['c'] == first['c']
+    assert shard_map.markets['d'] == 0
+    assert shard_map.counts() == [2, 1]
+    assert shard_map.shard_of('a-yes') is None
+
+
+def test_assign_empty_config_releases_everything():
+    shard_map = ShardMap(3)
+    shard_map.assign(_markets('a', 'b'))
+    shard_map.assign(None)
+
+    assert shard_map.counts() == [0, 0, 0]
+    assert shard_map.shard_of('a-yes') is None
+
+
+def test_route_splits_rows_by_token_and_leaves_orphans():
+    shard_map = ShardMap(2)
+    shard_map.assign(_markets('a', 'b'))
+    positions = pd.DataFrame({'asset': ['a-yes', 'b-no', 'gone'], 'size': [1.0, 2.0, 3.0]})
+
+    routed = shard_map.route(positions, 'asset')
+    assert sorted(len(frame) for frame in routed) == [1, 1]
+    assert list(routed[shard_map.shard_of('a-yes')]['asset']) == ['a-yes']
+    assert list(shard_map.orphans(positions, 'asset')['asset']) == ['gone']
+
+    # 缺少列或空表时每个分片都是空表
+    assert [len(frame) for frame in shard_map.route(pd.DataFrame(), 'asset')] == [0, 0]
+
+
+def test_split_update_sends_changes_and_removals_to_owning_shard():
+    shard_map = ShardMap(2)
+    shard_map.assign(_markets('a', 'b'))
+    previous = dict(shard_map.markets)
+
+    new_df = _markets('b')
+    shard_map.assign(new_df)
+    update = ConfigUpdate(new_df, {}, pd.DataFrame(), ['a'], 7)
+    updates = shard_map.split_update(update, previous)
+
+    owner_a, owner_b = previous['a'], previous['b']
+    assert updates[owner_b] is None
+    assert updates[owner_a].removed == ['a']
+    assert len(updates[owner_a].df) == 0
+    # 分片的市场全部被移除时以 'clear' 发送
+    assert ShardMap.config_message(updates[owner_a]) == ('clear', None)
+
+
+def test_split_limits_is_proportional_and_sums_to_total():
+    parts = risk_limits.split_limits({'exposure': 300.0, 'open_buys': None}, [1, 2, 0])
+
+    assert [part['exposure'] for part in parts] == pytest.approx([100.0, 200.0, 0.0])
+    assert all(part['open_buys'] is None for part in parts)
+    assert risk_limits.split_limits({'exposure': 300.0, 'open_buys': 50.0}, [0, 0]) == [
+        {'exposure': 0.0, 'open_buys': 0.0}, {'exposure': 0.0, 'open_buys': 0.0}]
+
+
+def test_reserve_limits_never_goes_negative():
+    limits = {'exposure': 100.0, 'open_buys': 40.0}
+
+    assert risk_limits.reserve_limits(limits, 30.0, 10.0) == {'exposure': 70.0, 'open_buys': 30.0}
+    assert risk_limits.reserve_limits(limits, 500.0, 500.0) == {'exposure': 0.0, 'open_buys': 0.0}
+    assert risk_limits.reserve_limits({'exposure': None, 'open_buys': 40.0}, 30.0, 10.0) == {
+        'exposure': None, 'open_buys': 30.0}
+    # 原额度不被修改
+    assert limits == {'exposure': 100.0, 'open_buys': 40.0}
+
+
+def test_frame_usage_counts_long_positions_and_remaining_buys():
+    positions = pd.DataFrame({'size': ['10', '-5'], 'avgPrice': ['0.5', '0.4']})
+    orders = pd.DataFrame({'side': ['BUY', 'SELL'], 'original_size': [20.0, 30.0],
+                           'size_matched': [5.0, 0.0], 'price': [0.4, 0.6]})
+
+    exposure, open_buys = risk_limits.frame_usage(positions, orders)
+    assert open_buys == pytest.approx(15 * 0.4)
+    assert exposure == pytest.approx(10 * 0.5 + 15 * 0.4)
+    assert risk_limits.frame_usage(None, pd.DataFrame()) == (0.0, 0.0)
+
+
+def test_allow_buy_replaces_existing_order_of_same_token(limits, monkeypatch):
+    monkeypatch.setattr(global_state, 'positions', {'p': {'size': 10, 'avgPrice': 0.5}})
+    monkeypatch.setattr(global_state, 'orders', {'t': {'buy': {'price': 0.5, 'size': 10}},
+                                                 'u': {'buy': {'price': 0.5, 'size': 4}}})
+
+    # 没有额度时始终允许
+    assert risk_limits.allow_buy('t', 0.5, 1000)
+
+    # 敞口 5（持仓）+ 2（u 的买单），t 的旧买单不计入
+    limits['exposure'] = 12.0
+    assert risk_limits.allow_buy('t', 0.5, 10)
+    assert not risk_limits.allow_buy('t', 0.5, 11)
+    assert not risk_limits.allow_buy('v', 0.5, 10)
+
+    limits['exposure'] = None
+    limits['open_buys'] = 7.0
+    assert risk_limits.allow_buy('t', 0.5, 10)
+    assert not risk_limits.allow_buy('t', 0.5, 11)
+
+
+def test_blocked_replacement_cancels_stale_buy(client, limits):
+    import trading
+
+    global_state.orders['111'] = {'buy': {'price': 0.4, 'size': 10}, 'sell': {'price': 0.6, 'size': 5}}
+    limits['open_buys'] = 1.0
+
+    trading.send_buy_order(_buy_order(111, 0.5, 10, existing_buy=(0.4, 10), existing_sell=(0.6, 5)))
+
+    assert client.named('cancel_all_asset') == [(111,)]
+    assert client.named('create_order') == []
+    assert global_state.orders['111']['buy'] == {'price': 0, 'size': 0}
+
+
+def test_blocked_buy_without_existing_order_does_nothing(client, limits):
+    import trading
+
+    limits['open_buys'] = 1.0
+    trading.send_buy_order(_buy_order(111, 0.5, 10))
+
+    assert client.calls == []
+
+
+class NullBalanceService:
+    def publish_positions(self, records):
+        return False
+
+
+def _failed_trade(token):
+    return {'event_type': 'trade', 'market': '0xa', 'side': 'BUY', 'asset_id': token, 'outcome': 'Yes',
+            'maker_orders': [], 'size': '10', 'price': '0.5', 'status': 'FAILED', 'id': 'trade-1'}
+
+
+def test_failed_trade_in_worker_only_refreshes_own_shard(client, monkeypatch):
+    from poly_data.data_processing import process_user_data
+
+    shard_map = ShardMap(2)
+    shard_map.assign(_markets('a', 'b'))
+    shard = shard_map.shard_of('a-yes')
+    assert shard_map.shard_of('b-yes') != shard
+
+    # 账户同时持有其他分片的 token 和不属于任何分片的 token
+    account = pd.DataFrame({'asset': ['a-yes', 'b-yes', 'gone'], 'size': [10.0, 100.0, 50.0],
+                            'avgPrice': [0.5, 0.5, 0.5]})
+    fetches = []
+    client.get_all_positions = lambda: fetches.append('positions') or account.copy()
+    client.get_all_orders = lambda: pd.DataFrame()
+    monkeypatch.setattr(data_utils, 'get_balance_service', lambda: NullBalanceService())
+    monkeypatch.setattr(global_state, 'REVERSE_TOKENS', {'a-yes': 'a-no', 'a-no': 'a-yes'})
+    monkeypatch.setattr(global_state, 'performing', {})
+
+    # 工作进程：交易失败时不获取整个账户的持仓，而是向协调进程请求刷新
+    outbox = queue.Queue()
+    monkeypatch.setattr(data_utils, 'state_refresh', _refresh_requester(shard, outbox))
+
+    async def receive():
+        process_user_data([_failed_trade('a-yes')])
+
+    asyncio.run(receive())
+    assert fetches == []
+    assert global_state.positions == {}
+
+    # 协调进程：读取请求，重新获取并只把本分片的持仓发给该工作进程
+    supervisor = Supervisor(2)
+    supervisor.shard_map = shard_map
+    supervisor._outbox = outbox
+    supervisor.inboxes = [queue.Queue(), queue.Queue()]
+    assert supervisor._drain_reports() is False
+    supervisor._poll_state(avg_only=False)
+    assert fetches == ['positions']
+
+    _, state = supervisor.inboxes[shard].get_nowait()
+    data_utils.apply_positions(state['positions'], avgOnly=state['avg_only'])
+
+    assert set(global_state.positions) == {'a-yes'}
+    assert risk_limits.current_usage() == (pytest.approx(5.0), 0.0)
+
+
+def test_drain_reports_merges_refresh_requests():
+    supervisor = Supervisor(2)
+    supervisor._outbox = queue.Queue()
+    assert supervisor._drain_reports() is None
+
+    supervisor._outbox.put(('refresh', 0, {'avg_only': True}))
+    supervisor._outbox.put(('report', 1, {'exposure': 1.0, 'open_buys': 0.0, 'markets': 1, 'messages': {}}))
+    assert supervisor._drain_reports() is True
+    assert supervisor.reports[1]['exposure'] == 1.0
+
+    # 任一请求需要完整持仓时按完整持仓刷新
+    supervisor._outbox.put(('refresh', 0, {'avg_only': True}))
+    supervisor._outbox.put(('refresh', 1, {'avg_only': False}))
+    assert supervisor._drain_reports() is False
@@ -0,0 +1,206 @@
+"""
+表格配置源的测试：修订版本短路、内容哈希缓存、本地缓存文件和 diff_rows（使用内存中的表格替身）
+
+使用示例:
+    python -m pytest tests/test_sheet_config.py
+"""
+import pandas as pd
+import pytest
+
+import poly_data.sheet_config as sheet_config
+from poly_data.sheet_config import SheetConfigSource, diff_rows
+
+SELECTED = [['question', 'max_size', 'trade_size', 'param_type'],
+            ['Will it rain?', '100', '10', 'mid'],
+            ['Will it snow?', '50', '5', 'mid']]
+ALL = [['question', 'token1', 'token2', 'condition_id'],
+       ['Will it rain?', '111', '222', '0xa'],
+       ['Will it snow?', '333', '444', '0xb'],
+       ['Will it hail?', '555', '666', '0xc']]
+PARAMS = [['type', 'param', 'value'],
+          ['mid', 'stop_loss_threshold', '-5'],
+          ['', 'take_profit_threshold', '2.5']]
+
+
+class FakeSpreadsheet:
+    """认证模式的表格替身：可修改修订版本和内容，记录批量读取次数"""
+
+    def __init__(self, revision='r1'):
+        self.revision = revision
+        self.sheets = {'Selected Markets': SELECTED, 'All Markets': ALL, 'Hyperparameters': PARAMS}
+        self.fetches = 0
+        self.fail = False
+
+    def get_lastUpdateTime(self):
+        return self.revision
+
+    def values_batch_get(self, ranges):
+        if self.fail:
+            raise ConnectionError('sheets unavailable')
+        self.fetches += 1
+        return {'valueRanges': [{'values': [list(row) for row in self.sheets[r.strip("'")]]} for r in ranges]}
+
+
+@pytest.fixture
+def spreadsheet():
+    return FakeSpreadsheet()
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'cache' / 'sheet_config.json')
+
+
+def _source(spreadsheet, cache_file):
+    source = SheetConfigSource(read_only=False, cache_file=cache_file)
+    source._spreadsheet = spreadsheet
+    return source
+
+
+def test_first_refresh_parses_sheets(spreadsheet, cache_file):
+    update = _source(spreadsheet, cache_file).refresh()
+
+    assert list(update.df['question']) == ['Will it rain?', 'Will it snow?']
+    assert update.df.iloc[0]['max_size'] == 100
+    assert update.params == {'mid': {'stop_loss_threshold': -5.0, 'take_profit_threshold': 2.5}}
+    assert len(update.changed) == 2 and update.removed == []
+    assert update.revision == 'r1'
+
+
+def test_unchanged_revision_skips_download(spreadsheet, cache_file):
+    source = _source(spreadsheet, cache_file)
+    source.refresh()
+
+    assert source.refresh() is None
+    assert spreadsheet.fetches == 1
+
+    # force 忽略修订版本
+    assert source.refresh(force=True) is not None
+    assert spreadsheet.fetches == 2
+
+
+def test_unchanged_content_skips_parsing(spreadsheet, cache_file, monkeypatch):
+    source = _source(spreadsheet, cache_file)
+    source.refresh()
+    df = source.df
+
+    parsed = []
+    monkeypatch.setattr(sheet_config, 'build_market_df', lambda *args: parsed.append(args))
+    # 修订版本变化（如只改了格式），内容相同
+    spreadsheet.revision = 'r2'
+
+    assert source.refresh() is None
+    assert spreadsheet.fetches == 2
+    assert parsed == []
+    assert source.df is df
+    assert source.revision == 'r2'
+
+
+def test_changed_content_reports_changed_and_removed_rows(spreadsheet, cache_file):
+    source = _source(spreadsheet, cache_file)
+    source.refresh()
+
+    spreadsheet.revision = 'r2'
+    spreadsheet.sheets['Selected Markets'] = [SELECTED[0], ['Will it rain?', '200', '10', 'mid'],
+                                              ['Will it hail?', '30', '3', 'mid']]
+    update = source.refresh()
+
+    assert sorted(update.changed['question']) == ['Will it hail?', 'Will it rain?']
+    assert update.removed == ['0xb']
+
+
+def test_changed_params_mark_all_rows_changed(spreadsheet, cache_file):
+    source = _source(spreadsheet, cache_file)
+    source.refresh()
+
+    spreadsheet.revision = 'r2'
+    spreadsheet.sheets['Hyperparameters'] = [PARAMS[0], ['mid', 'stop_loss_threshold', '-8']]
+    update = source.refresh()
+
+    assert len(update.changed) == 2
+    assert update.params == {'mid': {'stop_loss_threshold': -8.0}}
+
+
+def test_cache_file_round_trip(spreadsheet, cache_file, monkeypatch):
+    expected = _source(spreadsheet, cache_file).refresh()
+
+    # 新进程启动时表格不可用，使用本地缓存；失败后下次刷新重新连接
+    down = FakeSpreadsheet()
+    down.fail = True
+    monkeypatch.setattr(sheet_config, 'get_spreadsheet', lambda read_only=False: down)
+    source = _source(down, cache_file)
+    cached = source.refresh()
+
+    pd.testing.assert_frame_equal(cached.df, expected.df)
+    assert cached.params == expected.params
+    assert cached.revision == 'r1'
+    assert source.content_hash is not None
+
+    # 表格恢复后内容相同，不重新解析
+    down.fail = False
+    down.revision = 'r2'
+    assert source.refresh() is None
+
+
+def test_failure_after_load_keeps_current_config(spreadsheet, cache_file):
+    source = _source(spreadsheet, cache_file)
+    source.refresh()
+    df = source.df
+
+    spreadsheet.fail = True
+    spreadsheet.revision = 'r2'
+    with pytest.raises(ConnectionError):
+        source.refresh()
+    assert source.df is df
+
+
+def test_no_cache_and_no_sheet_raises(cache_file):
+    down = FakeSpreadsheet()
+    down.fail = True
+
+    with pytest.raises(ConnectionError):
+        _source(down, cache_file).refresh()
+
+
+def test_corrupt_cache_file_is_ignored(cache_file, tmp_path):
+    source = SheetConfigSource(read_only=False, cache_file=str(tmp_path / 'broken.json'))
+    (tmp_path / 'broken.json').write_text('{not json', encoding='utf-8')
+
+    assert source.load_cached() is None
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=['condition_id', 'question', 'max_size'])
+
+
+OLD_ROWS = [('0xa', 'A?', 100), ('0xb', 'B?', 50)]
+
+
+def test_diff_rows_unchanged():
+    changed, removed = diff_rows(_frame(OLD_ROWS), _frame(OLD_ROWS))
+    assert len(changed) == 0 and removed == []
+
+
+def test_diff_rows_changed_added_and_removed():
+    changed, removed = diff_rows(_frame(OLD_ROWS), _frame([('0xa', 'A?', 200), ('0xc', 'C?', 10)]))
+
+    assert list(changed['condition_id']) == ['0xa', '0xc']
+    assert removed == ['0xb']
+
+
+def test_diff_rows_from_and_to_empty():
+    changed, removed = diff_rows(None, _frame(OLD_ROWS))
+    assert len(changed) == 2 and removed == []
+
+    changed, removed = diff_rows(_frame(OLD_ROWS), pd.DataFrame())
+    assert len(changed) == 0 and removed == ['0xa', '0xb']
+
+
+def test_diff_rows_keys_by_question_without_condition_id():
+    old = pd.DataFrame({'question': ['A?', 'B?'], 'max_size': [1, 2]})
+    new = pd.DataFrame({'question': ['B?', 'C?'], 'max_size': [2, 3]})
+
+    changed, removed = diff_rows(old, new)
+
+    assert list(changed['question']) == ['C?']
+    assert removed == ['A?']
@@ -0,0 +1,119 @@
+"""
+差异化表格写入的测试：diff_ranges 的区域计算和 DiffSheetWriter 的网格大小
+
+使用示例:
+    python -m pytest tests/test_sheet_writer.py
+"""
+import pandas as pd
+
+from data_updater.sheet_writer import DiffSheetWriter, diff_ranges, frame_to_matrix
+
+
+class FakeWorksheet:
+    """记录 resize 和 batch_update 调用的工作表替身"""
+
+    def __init__(self, values, rows=1000, cols=26):
+        self.id = 1
+        self.title = 'Test'
+        self.values = [list(row) for row in values]
+        self.row_count = rows
+        self.col_count = cols
+        self.calls = []
+
+    def get_all_values(self):
+        return [list(row) for row in self.values]
+
+    def resize(self, rows=None, cols=None):
+        self.calls.append(('resize', rows, cols))
+        self.row_count, self.col_count = rows, cols
+        self.values = [row[:cols] for row in self.values[:rows]]
+
+    def batch_update(self, updates, value_input_option=None):
+        self.calls.append(('batch_update', [u['range'] for u in updates]))
+        for update in updates:
+            start = update['range'].split(':')[0]
+            row, col = int(start[1:]) - 1, ord(start[0]) - 65
+            for i, values in enumerate(update['values']):
+                while len(self.values) <= row + i:
+                    self.values.append([])
+                target = self.values[row + i]
+                target.extend([''] * (col + len(values) - len(target)))
+                target[col:col + len(values)] = values
+
+    def grid(self):
+        """按网格大小补齐的单元格内容"""
+        rows = [row + [''] * (self.col_count - len(row)) for row in self.values]
+        return rows + [[''] * self.col_count] * (self.row_count - len(rows))
+
+
+OLD = [['a', 'b', 'c'], ['1', '2', '3'], ['4', '5', '6']]
+
+
+def test_unchanged_matrix_has_no_updates():
+    assert diff_ranges(OLD, [list(row) for row in OLD]) == []
+
+
+def test_changed_cells_are_merged_per_row_and_across_rows():
+    new = [['a', 'b', 'c'], ['1', 'x', 'y'], ['4', 'z', 'w']]
+    assert diff_ranges(OLD, new) == [{'range': 'B2:C3', 'values': [['x', 'y'], ['z', 'w']]}]
+
+    # 不相邻的变化在同一行内合并为一个区间
+    new = [['a', 'b', 'c'], ['X', '2', 'Z'], ['4', '5', '6']]
+    assert diff_ranges(OLD, new) == [{'range': 'A2:C2', 'values': [['X', '2', 'Z']]}]
+
+
+def test_added_rows_and_columns():
+    new = [['a', 'b', 'c', 'd'], ['1', '2', '3', ''], ['4', '5', '6', ''], ['7', '8', '9', '0']]
+    assert diff_ranges(OLD, new) == [
+        {'range': 'D1:D1', 'values': [['d']]},
+        {'range': 'A4:D4', 'values': [['7', '8', '9', '0']]},
+    ]
+
+
+def test_removed_rows_are_cleared():
+    assert diff_ranges(OLD, OLD[:1]) == [{'range': 'A2:C3', 'values': [[''] * 3, [''] * 3]}]
+
+
+def test_first_write_resizes_grid_to_frame():
+    sheet = FakeWorksheet([])
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']})
+
+    assert DiffSheetWriter().write(sheet, df) == 6
+    assert (sheet.row_count, sheet.col_count) == (3, 2)
+    assert sheet.grid() == frame_to_matrix(df)
+
+
+def test_shrinking_frame_resizes_down_instead_of_writing_blanks():
+    sheet = FakeWorksheet(OLD, rows=3, cols=3)
+    writer = DiffSheetWriter()
+
+    cells = writer.write(sheet, pd.DataFrame({'a': [9], 'b': [2]}))
+
+    # 删除的行列随网格一起删除，只写入变化的单元格
+    assert sheet.calls == [('resize', 2, 2), ('batch_update', ['A2:A2'])]
+    assert cells == 1
+    assert sheet.grid() == [['a', 'b'], ['9', '2']]
+
+    # 内容和大小都没有变化时不调用 API
+    sheet.calls.clear()
+    assert writer.write(sheet, pd.DataFrame({'a': [9], 'b': [2]})) == 0
+    assert sheet.calls == []
+
+
+def test_row_removal_alone_only_resizes():
+    sheet = FakeWorksheet(OLD, rows=3, cols=3)
+
+    assert DiffSheetWriter().write(sheet, pd.DataFrame({'a': [1], 'b': [2], 'c': [3]})) == 0
+    assert sheet.calls == [('resize', 2, 3)]
+    assert sheet.grid() == OLD[:2]
+
+
+def test_grow_after_shrink_does_not_resurrect_old_cells():
+    sheet = FakeWorksheet(OLD, rows=3, cols=3)
+    writer = DiffSheetWriter()
+    writer.write(sheet, pd.DataFrame({'a': [1]}))
+
+    df = pd.DataFrame({'a': [1, 4], 'b': [2, 5], 'c': [3, 6]})
+    writer.write(sheet, df)
+
+    assert sheet.grid() == frame_to_matrix(df) == OLD
@@ -0,0 +1,159 @@
+"""
+状态快照和热启动的测试：保存的快照经 bootstrap 热启动恢复，过期或损坏的快照回退到冷启动
+
+使用示例:
+    python -m pytest tests/test_snapshot.py
+"""
+import json
+import time
+
+import pandas as pd
+import pytest
+from sortedcontainers import SortedDict
+
+import poly_data.bootstrap as bootstrap_module
+import poly_data.global_state as global_state
+from poly_data.bootstrap import bootstrap
+from poly_data.snapshot import SNAPSHOT_FILE, save_snapshot
+
+
+def _reset(state, monkeypatch):
+    """全局状态替换为空的新对象，模拟进程重启"""
+    for name, value in [('all_tokens', []), ('REVERSE_TOKENS', {}), ('all_data', {}), ('df', None),
+                        ('params', {}), ('orders', {}), ('positions', {}), ('performing', {})]:
+        monkeypatch.setattr(state, name, value)
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    """在临时目录中运行，使用空的全局状态"""
+    monkeypatch.chdir(tmp_path)
+    _reset(global_state, monkeypatch)
+    monkeypatch.setattr(global_state, 'client', None)
+    return global_state
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    """替换 REST 获取函数，记录冷启动和后台校正的调用"""
+    calls = []
+    for name in ['update_markets', 'update_positions', 'update_orders']:
+        monkeypatch.setattr(bootstrap_module, name, lambda name=name: calls.append(name))
+    reconciles = []
+    monkeypatch.setattr(bootstrap_module, 'reconcile_in_background', lambda: reconciles.append(True))
+    return calls, reconciles
+
+
+def _populate(state):
+    state.df = pd.DataFrame([{'question': 'Will it rain?', 'token1': '111', 'token2': '222',
+                              'condition_id': '0xabc', 'max_spread': 3.0, 'trade_size': 10}])
+    state.params = {'mid': {'stop_loss_threshold': -5.0}}
+    state.positions = {'111': {'size': 25.0, 'avgPrice': 0.48}}
+    state.orders = {'111': {'buy': {'price': 0.47, 'size': 10.0}, 'sell': {'price': 0, 'size': 0}}}
+    state.all_tokens.append('111')
+    state.REVERSE_TOKENS.update({'111': '222', '222': '111'})
+    state.all_data['0xabc'] = {'asset_id': '111', 'bids': SortedDict({0.47: 100.0, 0.48: 50.0}),
+                               'asks': SortedDict({0.52: 80.0})}
+
+
+def test_saved_snapshot_round_trips_through_warm_start(state, fetches, monkeypatch):
+    _populate(state)
+    expected = {'df': state.df.copy(), 'params': state.params, 'positions': state.positions,
+                'orders': state.orders, 'all_data': state.all_data}
+    save_snapshot()
+    _reset(state, monkeypatch)
+    calls, reconciles = fetches
+
+    assert bootstrap(lambda: 'client', use_snapshot=True) is True
+
+    assert state.client == 'client'
+    pd.testing.assert_frame_equal(state.df, expected['df'])
+    assert state.params == expected['params']
+    assert state.positions == expected['positions']
+    assert state.orders == expected['orders']
+    assert state.all_tokens == ['111']
+    assert state.REVERSE_TOKENS == {'111': '222', '222': '111'}
+    book = state.all_data['0xabc']
+    assert isinstance(book['bids'], SortedDict)
+    assert dict(book['bids']) == {0.47: 100.0, 0.48: 50.0} and dict(book['asks']) == {0.52: 80.0}
+    assert set(state.performing) == {'111_buy', '111_sell', '222_buy', '222_sell'}
+
+    # 热启动不等待 REST 请求，由后台线程校正
+    assert calls == []
+    assert reconciles == [True]
+
+
+def _cold_start(state, fetches):
+    calls, reconciles = fetches
+    assert bootstrap(lambda: 'client', use_snapshot=True) is False
+    assert state.client == 'client'
+    assert sorted(calls) == ['update_markets', 'update_orders', 'update_positions']
+    assert reconciles == []
+    assert state.df is None
+
+
+def test_stale_snapshot_falls_back_to_cold_fetch(state, fetches, monkeypatch):
+    _populate(state)
+    save_snapshot()
+    _reset(state, monkeypatch)
+
+    with open(SNAPSHOT_FILE, encoding='utf-8') as f:
+        snapshot = json.load(f)
+    snapshot['saved_at'] = time.time() - 3600
+    with open(SNAPSHOT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+
+    _cold_start(state, fetches)
+
+
+def test_corrupt_snapshot_falls_back_to_cold_fetch(state, fetches, monkeypatch):
+    _populate(state)
+    save_snapshot()
+    _reset(state, monkeypatch)
+
+    # 模拟写入中途被打断的文件
+    with open(SNAPSHOT_FILE, 'r+', encoding='utf-8') as f:
+        f.truncate(40)
+
+    _cold_start(state, fetches)
+
+
+@pytest.mark.parametrize('damage', [
+    lambda snapshot: snapshot.pop('books'),
+    lambda snapshot: snapshot['books']['0xabc'].update(bids=[['0.47']]),
+    lambda snapshot: snapshot.update(df='not a table'),
+])
+def test_incomplete_snapshot_falls_back_without_partial_restore(state, fetches, monkeypatch, damage):
+    _populate(state)
+    save_snapshot()
+    _reset(state, monkeypatch)
+
+    with open(SNAPSHOT_FILE, encoding='utf-8') as f:
+        snapshot = json.load(f)
+    damage(snapshot)
+    with open(SNAPSHOT_FILE, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+
+    _cold_start(state, fetches)
+    assert state.positions == {} and state.all_tokens == [] and state.all_data == {}
+
+
+def test_missing_snapshot_falls_back_to_cold_fetch(state, fetches):
+    _cold_start(state, fetches)
+
+
+def test_warm_start_disabled_ignores_fresh_snapshot(state, fetches, monkeypatch):
+    _populate(state)
+    save_snapshot()
+    _reset(state, monkeypatch)
+    calls, _ = fetches
+
+    assert bootstrap(lambda: 'client', use_snapshot=False) is False
+    assert sorted(calls) == ['update_markets', 'update_orders', 'update_positions']
+    assert state.df is None
+
+
+def test_snapshot_is_not_written_without_config(state):
+    save_snapshot()
+    with pytest.raises(FileNotFoundError):
+        open(SNAPSHOT_FILE)
@@ -0,0 +1,107 @@
+"""
+多时间窗口波动率批量计算与原有实现（find_markets.calculate_annualized_volatility）的一致性测试
+
+使用示例:
+    python -m pytest tests/test_volatility_parity.py
+"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_updater.find_markets import calculate_annualized_volatility
+from data_updater.volatility import HORIZONS, multi_horizon_volatility, volatility_stats
+
+# 批量计算不应产生 NaN/除零警告；参考实现的警告在 reference_stats 中显式屏蔽
+pytestmark = pytest.mark.filterwarnings('error')
+
+NOW = 1_700_000_000
+COLUMNS = list(HORIZONS) + ['volatility_price']
+
+
+def reference_stats(t, p):
+    """原有的逐窗口 pandas 实现"""
+    price_df = pd.DataFrame({'t': pd.to_datetime(np.asarray(t), unit='s'), 'p': np.asarray(p)})
+    price_df['p'] = price_df['p'].round(2)
+    # 价格为 0 时收益率为无穷，窗口不足两个收益率时标准差为 NaN，都是预期的结果
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_df['log_return'] = np.log(price_df['p'] / price_df['p'].shift(1))
+        stats = {name: calculate_annualized_volatility(price_df, hours) for name, hours in HORIZONS.items()}
+    stats['volatility_price'] = price_df['p'].iloc[-1]
+    return stats
+
+
+def random_series(rng):
+    """随机的10分钟间隔价格序列，包含缺失点和价格为 0 的情况"""
+    n = int(rng.integers(1, 4300))
+    t = NOW - np.sort(rng.choice(30 * 24 * 6, size=n, replace=False))[::-1] * 600
+    p = np.clip(rng.uniform(0.05, 0.95) + np.cumsum(rng.normal(0, 0.01, n)), 0, 1)
+    if rng.random() < 0.05:
+        p[rng.integers(0, n)] = 0
+    return t, p
+
+
+def _minutes(n, start=NOW):
+    return start - np.arange(n)[::-1] * 60
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_random_series_match_reference(seed):
+    rng = np.random.default_rng(seed)
+    series = [random_series(rng) for _ in range(150)]
+
+    actual = multi_horizon_volatility(series)
+
+    for i, (t, p) in enumerate(series):
+        for name, value in reference_stats(t, p).items():
+            if math.isnan(value):
+                assert np.isnan(actual[name][i]), (i, name)
+            else:
+                # 两种实现都四舍五入到分，结果应完全相同
+                assert actual[name][i] == pytest.approx(value, rel=0, abs=1e-9), (i, name)
+
+
+def test_no_series():
+    result = multi_horizon_volatility([])
+    assert set(result) == set(COLUMNS)
+    assert all(len(values) == 0 for values in result.values())
+
+
+def test_empty_series_is_nan_and_does_not_shift_neighbours():
+    t, p = _minutes(120), np.linspace(0.4, 0.6, 120)
+    result = multi_horizon_volatility([(np.array([], dtype=np.int64), np.array([])), (t, p)])
+
+    assert all(np.isnan(result[name][0]) for name in COLUMNS)
+    assert result['volatility_price'][1] == 0.6
+    assert result['1_hour'][1] == volatility_stats(t, p)['1_hour']
+
+
+def test_single_point_has_price_but_no_volatility():
+    stats = volatility_stats(np.array([NOW]), np.array([0.42]))
+
+    assert stats['volatility_price'] == 0.42
+    assert all(np.isnan(stats[name]) for name in HORIZONS)
+
+
+def test_constant_window_is_exactly_zero():
+    t = _minutes(240)
+    p = np.r_[np.linspace(0.3, 0.5, 120), np.full(120, 0.5)]
+    stats = volatility_stats(t, p)
+
+    # 最近1小时价格不变，波动率为 0 而不是很小的负数开方得到的 NaN
+    assert stats['1_hour'] == 0.0
+    assert stats['3_hour'] > 0
+    assert stats == pytest.approx(reference_stats(t, p), nan_ok=True)
+
+
+def test_zero_price_invalidates_windows_that_contain_it():
+    t = _minutes(240)
+    p = np.linspace(0.3, 0.5, 240)
+    p[60] = 0
+    stats = volatility_stats(t, p)
+
+    # 价格为 0 的点在3小时窗口内，1小时窗口之外
+    assert np.isnan(stats['3_hour'])
+    assert not np.isnan(stats['1_hour'])
+    assert stats == pytest.approx(reference_stats(t, p), nan_ok=True)
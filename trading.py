@@ -13,6 +13,8 @@ import poly_data.CONSTANTS as CONSTANTS
 # 导入交易工具函数
 from poly_data.trading_utils import get_best_bid_ask_deets, get_order_prices, get_buy_sell_amount, round_down, round_up
 from poly_data.data_utils import get_position, get_order, set_position
+from poly_data.market_features import get_volatility
+from poly_data.risk_limits import allow_buy
 from poly_data.logger import get_logger
 
 # 创建交易日志记录器
@@ -50,6 +52,18 @@ def send_buy_order(order):
         existing_buy_size == 0  # 如果没有现有买单则取消
     )
 
+    # 超出全局风险或余额额度时不下新单；现有买单的价格已过时，撤销而不是继续挂着
+    if should_cancel and not allow_buy(order['token'], order['price'], order['size']):
+        if existing_buy_size > 0:
+            trading_logger.info(f"额度不足，撤销过时买单 - Token: {order['token']}, 价格: {existing_buy_price}")
+            client.cancel_all_asset(order['token'])
+
+            # cancel_all_asset 同时撤销了卖单，与上面的撤单路径一样清空本地订单状态
+            token_str = str(order['token'])
+            if token_str in global_state.orders:
+                global_state.orders[token_str] = {'buy': {'price': 0, 'size': 0}, 'sell': {'price': 0, 'size': 0}}
+        return
+
     if should_cancel and (existing_buy_size > 0 or order['orders']['sell']['size'] > 0):
         trading_logger.info(f"取消买单 - 价格差: {price_diff:.4f}, 数量差: {size_diff:.1f}")
         client.cancel_all_asset(order['token'])
@@ -193,6 +207,9 @@ async def perform_trade(market):
             # 获取此市场类型的交易参数
             params = global_state.params[row['param_type']]
 
+            # 优先使用订单簿实时计算的3小时波动率，预热完成前使用表格中的值
+            volatility_3h = get_volatility(market, '3_hour', fallback=row['3_hour'])
+
             # 创建包含市场两个结果的列表
             deets = [
                 {'name': 'token1', 'token': row['token1'], 'answer': row['answer1']},
@@ -369,9 +386,9 @@ async def perform_trade(market):
                     # 触发止损如果满足以下任一条件：
                     # 1. 盈亏低于阈值且价差足够小可以退出
                     # 2. 波动性过高
-                    if (pnl < params['stop_loss_threshold'] and spread <= params['spread_threshold']) or row['3_hour'] > params['volatility_threshold']:
+                    if (pnl < params['stop_loss_threshold'] and spread <= params['spread_threshold']) or volatility_3h > params['volatility_threshold']:
                         risk_details['msg'] = (f"卖出 {pos_to_sell}，因为价差为 {spread}，盈亏为 {pnl}，"
-                                              f"比率为 {ratio}，3小时波动率为 {row['3_hour']}")
+                                              f"比率为 {ratio}，3小时波动率为 {volatility_3h:.2f}")
                         trading_logger.warning(f"止损触发: {risk_details['msg']}")
 
                         # 以市场最佳买价卖出以确保成交
@@ -431,11 +448,11 @@ async def perform_trade(market):
                     # 只有在不处于风险规避期时才继续
                     if send_buy:
                         # 如果波动性高或价格远离参考值，不要买入
-                        if row['3_hour'] > params['volatility_threshold'] or price_change >= 0.05:
+                        if volatility_3h > params['volatility_threshold'] or price_change >= 0.05:
                             # 明确指出触发原因
                             reasons = []
-                            if row['3_hour'] > params['volatility_threshold']:
-                                reasons.append(f"3小时波动率 {row['3_hour']} 超过阈值 {params['volatility_threshold']}")
+                            if volatility_3h > params['volatility_threshold']:
+                                reasons.append(f"3小时波动率 {volatility_3h:.2f} 超过阈值 {params['volatility_threshold']}")
                             if price_change >= 0.05:
                                 reasons.append(f"价格 {order['price']} 偏离参考值 {sheet_value} 达 {price_change:.4f} (>= 0.05)")
 
@@ -1,46 +1,41 @@
 import time
+import argparse
 import pandas as pd
-from data_updater.trading_utils import get_clob_client
 from data_updater.google_utils import get_spreadsheet
-from data_updater.find_markets import get_sel_df, get_all_markets, get_all_results, get_markets, add_volatility_to_df
-from gspread_dataframe import set_with_dataframe
+from data_updater.find_markets import get_sel_df, get_markets
+from data_updater.market_scanner import scan_all_with_volatility
+from data_updater.rescoring_service import RescoringService
+from data_updater.sheet_writer import SheetPublisher
+from data_updater.ai_selection_job import AISelectionJob
+from poly_utils.market_catalog import (get_catalog, ALL_MARKETS_VIEW, VOLATILITY_MARKETS_VIEW, FULL_MARKETS_VIEW,
+                                       SELECTIONS_MAX_AGE)
 import traceback
 
-# 导入 AI 市场选择器
-try:
-    from ai_market_selector import run_ai_selector
-    AI_SELECTOR_AVAILABLE = True
-except ImportError:
-    print("⚠️  AI 市场选择器不可用，将跳过自动选择")
-    AI_SELECTOR_AVAILABLE = False
+# 全局变量在 fetch_and_process_data 中初始化，导入本模块时不访问网络
+spreadsheet = None
+client = None
+wk_all = None
+wk_vol = None
+wk_full = None
+sel_df = None
 
-# 初始化全局变量
-spreadsheet = get_spreadsheet()
-client = get_clob_client()
+# 本地市场目录是主存储，表格只作为展示层在后台同步；目录在第一次使用时通过 get_catalog() 打开
+sheet_publisher = SheetPublisher()
 
-wk_all = spreadsheet.worksheet("All Markets")
-wk_vol = spreadsheet.worksheet("Volatility Markets")
-
-sel_df = get_sel_df(spreadsheet, "Selected Markets")
+# AI 市场选择在独立进程中运行，不阻塞下一次市场刷新
+ai_job = AISelectionJob()
 
 def update_sheet(data, worksheet):
-    all_values = worksheet.get_all_values()
-    existing_num_rows = len(all_values)
-    existing_num_cols = len(all_values[0]) if all_values else 0
-
-    num_rows, num_cols = data.shape
-    max_rows = max(num_rows, existing_num_rows)
-    max_cols = max(num_cols, existing_num_cols)
-
-    # 创建最大尺寸的DataFrame并用空字符串填充
-    padded_data = pd.DataFrame('', index=range(max_rows), columns=range(max_cols))
+    """在后台将数据写入工作表，只发送与上一次写入相比变化的单元格"""
+    sheet_publisher.publish(worksheet, data)
 
-    # 用原始数据及其列更新填充的DataFrame
-    padded_data.iloc[:num_rows, :num_cols] = data.values
-    padded_data.columns = list(data.columns) + [''] * (max_cols - num_cols)
-
-    # 用填充的DataFrame更新表格，包括列标题
-    set_with_dataframe(worksheet, padded_data, include_index=False, include_column_header=True, resize=True)
+def get_selected_df(spreadsheet):
+    """读取 Selected Markets，本地目录中的列表最近与表格同步过时优先使用"""
+    records = get_catalog().read_selections(max_age=SELECTIONS_MAX_AGE)
+    if records:
+        sel_df = pd.DataFrame(records)
+        return sel_df[sel_df['question'] != ""].reset_index(drop=True)
+    return get_sel_df(spreadsheet, "Selected Markets")
 
 def sort_df(df):
     # 计算每列的均值和标准差
@@ -82,8 +77,22 @@ def sort_df(df):
 
     return sorted_df
 
-def fetch_and_process_data():
-    global spreadsheet, client, wk_all, wk_vol, sel_df
+# 输出到 All Markets / Volatility Markets 的列
+VIEW_COLUMNS = ['question', 'answer1', 'answer2', 'spread', 'rewards_daily_rate', 'gm_reward_per_100', 'sm_reward_per_100', 'bid_reward_per_100', 'ask_reward_per_100',  'volatility_sum', 'volatilty/reward', 'min_size', '1_hour', '3_hour', '6_hour', '12_hour', '24_hour', '7_day', '30_day',
+                'best_bid', 'best_ask', 'volatility_price', 'max_spread', 'tick_size',
+                'neg_risk',  'market_slug', 'token1', 'token2', 'condition_id']
+
+# AI 市场选择器的最短运行间隔（秒）
+AI_SELECTOR_INTERVAL = 60 * 60
+last_ai_run = 0
+
+
+def open_worksheets():
+    """连接表格和CLOB客户端，初始化模块级全局变量"""
+    # py_clob_client 和 eth_account 导入较慢，只在连接时导入
+    from data_updater.trading_utils import get_clob_client
+
+    global spreadsheet, client, wk_all, wk_vol, wk_full
 
     spreadsheet = get_spreadsheet()
     client = get_clob_client()
@@ -92,26 +101,19 @@ def fetch_and_process_data():
     wk_vol = spreadsheet.worksheet("Volatility Markets")
     wk_full = spreadsheet.worksheet("Full Markets")
 
-    sel_df = get_sel_df(spreadsheet, "Selected Markets")
-
+def build_views(new_df):
+    """
+    由带波动率的市场数据生成 All Markets 和 Volatility Markets
 
-    all_df = get_all_markets(client)
-    print("获取了所有市场")
-    all_results = get_all_results(all_df, client)
-    print("获取了所有结果")
-    m_data, all_markets = get_markets(all_results, sel_df, maker_reward=0.75)
-    print("获取了所有订单簿")
-
-    print(f'{pd.to_datetime("now")}: 获取了长度为{len(all_markets)}的所有市场数据。')
-    new_df = add_volatility_to_df(all_markets)
+    返回:
+        tuple: (new_df, volatility_df)
+    """
     new_df['volatility_sum'] =  new_df['24_hour'] + new_df['7_day'] + new_df['14_day']
 
     new_df = new_df.sort_values('volatility_sum', ascending=True)
     new_df['volatilty/reward'] = ((new_df['gm_reward_per_100'] / new_df['volatility_sum']).round(2)).astype(str)
 
-    new_df = new_df[['question', 'answer1', 'answer2', 'spread', 'rewards_daily_rate', 'gm_reward_per_100', 'sm_reward_per_100', 'bid_reward_per_100', 'ask_reward_per_100',  'volatility_sum', 'volatilty/reward', 'min_size', '1_hour', '3_hour', '6_hour', '12_hour', '24_hour', '7_day', '30_day',
-                     'best_bid', 'best_ask', 'volatility_price', 'max_spread', 'tick_size',
-                     'neg_risk',  'market_slug', 'token1', 'token2', 'condition_id']]
+    new_df = new_df[VIEW_COLUMNS]
 
 
     volatility_df = new_df.copy()
@@ -120,36 +122,119 @@ def fetch_and_process_data():
     volatility_df = volatility_df.sort_values('gm_reward_per_100', ascending=False)
 
     new_df = new_df.sort_values('gm_reward_per_100', ascending=False)
+    return new_df, volatility_df
 
+def run_ai_selection(volatility_df):
+    """用刚发布的 Volatility Markets 在后台开始一次 AI 市场选择，立即返回"""
+    global last_ai_run
 
+    if ai_job.submit(volatility_df, sel_df, get_catalog().read_hyperparameters()):
+        last_ai_run = time.time()
+
+def publish_views(new_df, volatility_df, m_data):
+    """
+    写入本地市场目录并在后台同步表格
+
+    返回:
+        bool: 是否写入（市场数量过少时不写入）
+    """
     print(f'{pd.to_datetime("now")}: 获取了长度为{len(new_df)}的选定市场。')
 
-    if len(new_df) > 50:
-        update_sheet(new_df, wk_all)
-        update_sheet(volatility_df, wk_vol)
-        update_sheet(m_data, wk_full)
-
-        # 市场波动率检测完成后，调用 AI 市场选择器
-        if AI_SELECTOR_AVAILABLE:
-            print("\n" + "=" * 80)
-            print("🤖 启动 AI 市场选择器...")
-            print("=" * 80)
-            try:
-                # 使用默认配置运行 AI 选择器
-                run_ai_selector(config=None)
-                print("✅ AI 市场选择完成")
-            except Exception as ai_error:
-                print(f"⚠️  AI 市场选择失败: {ai_error}")
-                traceback.print_exc()
-        else:
-            print("⚠️  跳过 AI 市场选择（AI 选择器不可用）")
-    else:
+    if len(new_df) <= 50:
         print(f'{pd.to_datetime("now")}: 由于长度为{len(new_df)}，未更新表格。')
+        return False
+
+    catalog = get_catalog()
+    catalog.write_view(ALL_MARKETS_VIEW, new_df)
+    catalog.write_view(VOLATILITY_MARKETS_VIEW, volatility_df)
+    catalog.write_view(FULL_MARKETS_VIEW, m_data)
+    print(f'{pd.to_datetime("now")}: 已写入本地市场目录。')
+
+    update_sheet(new_df, wk_all)
+    update_sheet(volatility_df, wk_vol)
+    update_sheet(m_data, wk_full)
+    return True
+
+def merge_volatility(all_markets, volatility):
+    """为候选市场添加波动率字段，没有波动率的市场被丢弃（与 add_volatility_to_df 一致）"""
+    rows = [{**row, **volatility[row['condition_id']]} for row in all_markets.to_dict('records')
+            if row['condition_id'] in volatility]
+    return pd.DataFrame(rows)
+
+def is_candidate(result, selected):
+    """与 get_markets 的筛选条件一致：已选择的，以及奖励达到阈值的"""
+    return result['question'] in selected or result['gm_reward_per_100'] >= 0.75
+
+def fetch_and_process_data():
+    global sel_df
+
+    open_worksheets()
+    sel_df = get_selected_df(spreadsheet)
+    selected = set(sel_df['question']) if 'question' in sel_df.columns else set()
+
+
+    # 分页、订单簿、奖励计算和候选市场的波动率在同一条流水线中进行
+    all_results, volatility = scan_all_with_volatility(client, lambda result: is_candidate(result, selected))
+    print("获取了所有结果")
+    m_data, all_markets = get_markets(all_results, sel_df, maker_reward=0.75)
+    print("获取了所有订单簿")
+
+    print(f'{pd.to_datetime("now")}: 获取了长度为{len(all_markets)}的所有市场数据。')
+    new_df, volatility_df = build_views(merge_volatility(all_markets, volatility))
+
+    if publish_views(new_df, volatility_df, m_data):
+        # 市场波动率检测完成后，在后台调用 AI 市场选择器
+        run_ai_selection(volatility_df)
+
+def publish_rescored(all_results, volatility):
+    """
+    持续重新评分服务的发布回调
+
+    参数:
+        all_results: 所有市场的最新评分结果
+        volatility: {condition_id: 波动率字段}
+    """
+    global sel_df
+
+    sel_df = get_selected_df(spreadsheet)
+    if 'question' not in sel_df.columns:
+        sel_df = pd.DataFrame(columns=['question'])
+
+    m_data, all_markets = get_markets(all_results, sel_df, maker_reward=0.75)
+    new_df = merge_volatility(all_markets, volatility)
+    if len(new_df) == 0:
+        print(f'{pd.to_datetime("now")}: 还没有市场的波动率，暂不发布。')
+        return
+
+    new_df, volatility_df = build_views(new_df)
+    if publish_views(new_df, volatility_df, m_data) and time.time() - last_ai_run >= AI_SELECTOR_INTERVAL:
+        run_ai_selection(volatility_df)
+
+def selected_questions():
+    """当前 Selected Markets 中的问题集合"""
+    df = get_selected_df(spreadsheet)
+    return set(df['question']) if 'question' in df.columns else set()
+
+def run_continuous():
+    """持续重新评分：只重新计算有变化或到期的市场"""
+    open_worksheets()
+    service = RescoringService(client, publish=publish_rescored, selected_questions=selected_questions,
+                               maker_reward=0.75)
+    service.run_forever()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='更新市场评分、波动率和表格')
+    parser.add_argument('--hourly', action='store_true', help='每小时完整重建一次，而不是持续增量重新评分')
+    args = parser.parse_args()
+
+    if not args.hourly:
+        run_continuous()
+
     while True:
         try:
             fetch_and_process_data()
+            # 表格同步在后台进行，下一轮开始前等待其完成
+            sheet_publisher.flush(timeout=10 * 60)
             time.sleep(60 * 60)  # 休眠一小时
         except Exception as e:
             traceback.print_exc()
@@ -1,13 +1,14 @@
-from poly_data.polymarket_client import PolymarketClient
 from poly_stats.account_stats import update_stats_once
 
-import pandas as pd
 import time
 import traceback
 
-client = PolymarketClient()
-
 if __name__ == '__main__':
+    # 交易客户端导入较慢（py_clob_client、eth_account），只在运行时导入
+    from poly_data.polymarket_client import PolymarketClient
+
+    client = PolymarketClient()
+
     while True:
         try:
             update_stats_once(client)